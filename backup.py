@@ -0,0 +1,431 @@
+"""
+Backup, exportação e importação do histórico de conversas (SQLite local).
+
+Responsável por:
+- Snapshot consistente do banco com VACUUM INTO, numa única transação de
+  leitura que não bloqueia o bot em execução (WAL)
+- Exportar a tabela messages para JSONL (comprimido se terminar em .gz) ou
+  Parquet (com pyarrow), lendo o snapshot em lotes
+- Importar um arquivo exportado em lotes de executemany, preservando os IDs
+  (pergunta e resposta continuam consecutivas), ignorando mensagens já
+  importadas e recusando IDs já usados por outras mensagens
+- Checkpoints para retomar exportações e importações interrompidas
+- Relatar a vazão (linhas/s e MB/s) durante a operação
+
+A memória usada não depende do tamanho do banco: só um lote fica em memória.
+
+Uso:
+    python backup.py snapshot destino.db
+    python backup.py export historico.jsonl.gz [--batch-size N] [--resume]
+    python backup.py import historico.jsonl.gz [--batch-size N] [--resume]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, cast
+
+from config import settings
+from database import init_db
+from logger import logger
+from migrations import INT_TO_ROLE, ROLE_TO_INT
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # dependência opcional: pip install "sherlock-bot[parquet]"
+    pyarrow = None
+
+# Linhas por lote de leitura/escrita (e por checkpoint)
+DEFAULT_BATCH_SIZE = 10_000
+
+# Intervalo mínimo entre relatórios de vazão
+REPORT_INTERVAL_SECONDS = 5.0
+
+COLUMNS = ("id", "user_id", "channel_id", "role", "content", "created_at", "tokens")
+
+
+@dataclass
+class Progresso:
+    """Linhas e bytes processados por uma exportação ou importação."""
+
+    operacao: str
+    linhas: int = 0
+    ignoradas: int = 0
+    bytes: int = 0
+    inicio: float = 0.0
+    ultimo_relatorio: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.inicio = self.ultimo_relatorio = time.perf_counter()
+
+    @property
+    def segundos(self) -> float:
+        """Tempo decorrido desde o início."""
+        return time.perf_counter() - self.inicio
+
+    def relatar(self, final: bool = False) -> None:
+        """Registra a vazão (a cada REPORT_INTERVAL_SECONDS, ou sempre se final)."""
+        agora = time.perf_counter()
+        if not final and agora - self.ultimo_relatorio < REPORT_INTERVAL_SECONDS:
+            return
+        self.ultimo_relatorio = agora
+        segundos = max(self.segundos, 1e-9)
+        logger.info(
+            f"{self.operacao.capitalize()} {'concluída' if final else 'em andamento'}",
+            extra={
+                "rows": self.linhas,
+                "skipped": self.ignoradas,
+                "megabytes": round(self.bytes / 1e6, 1),
+                "rows_per_s": round(self.linhas / segundos),
+                "mb_per_s": round(self.bytes / 1e6 / segundos, 1),
+                "elapsed_s": round(segundos, 1),
+            },
+        )
+
+
+# =============================================================================
+# Checkpoints
+# =============================================================================
+def _ler_checkpoint(path: Path) -> dict[str, Any] | None:
+    if not path.exists():
+        return None
+    return cast(dict[str, Any], json.loads(path.read_text()))
+
+
+def _gravar_checkpoint(path: Path, estado: dict[str, Any]) -> None:
+    # Escrita atômica: um checkpoint nunca fica pela metade
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(estado))
+    os.replace(tmp, path)
+
+
+def _eh_parquet(path: Path) -> bool:
+    return path.suffix == ".parquet"
+
+
+def _exigir_pyarrow() -> None:
+    if pyarrow is None:
+        raise RuntimeError('Parquet exige pyarrow: pip install "sherlock-bot[parquet]"')
+
+
+# =============================================================================
+# Snapshot
+# =============================================================================
+def snapshot(destino: Path) -> None:
+    """
+    Copia o banco configurado para `destino` com VACUUM INTO.
+
+    A cópia lê tudo numa única transação de leitura: com WAL o bot continua
+    escrevendo enquanto ela roda e o resultado é um snapshot consistente. (A
+    API de backup em passos recomeça do zero a cada escrita na origem, e com
+    o bot ativo podia nunca terminar.)
+
+    Args:
+        destino: Arquivo do snapshot (sobrescrito se existir)
+    """
+    destino.unlink(missing_ok=True)
+    inicio = time.perf_counter()
+    origem = sqlite3.connect(str(settings.db_path), timeout=settings.db_busy_timeout_seconds)
+    try:
+        origem.execute("VACUUM INTO ?", (str(destino),))
+    finally:
+        origem.close()
+    logger.info(
+        "Snapshot do banco criado",
+        extra={
+            "path": str(destino),
+            "megabytes": round(destino.stat().st_size / 1e6, 1),
+            "elapsed_ms": round((time.perf_counter() - inicio) * 1000),
+        },
+    )
+
+
+# =============================================================================
+# Exportação
+# =============================================================================
+def _lotes_exportacao(
+    conn: sqlite3.Connection, depois_do_id: int, batch_size: int
+) -> Iterator[list[dict[str, Any]]]:
+    """Mensagens com id > depois_do_id em ordem de id, em lotes."""
+    cursor = conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM messages WHERE id > ? ORDER BY id",
+        (depois_do_id,),
+    )
+    while rows := cursor.fetchmany(batch_size):
+        yield [
+            {
+                "id": row[0],
+                "user_id": row[1],
+                "channel_id": row[2],
+                "role": INT_TO_ROLE[row[3]],
+                "content": row[4],
+                "created_at": row[5],
+                "tokens": row[6],
+            }
+            for row in rows
+        ]
+
+
+def exportar(
+    destino: Path, batch_size: int = DEFAULT_BATCH_SIZE, resume: bool = False
+) -> Progresso:
+    """
+    Exporta a tabela messages a partir de um snapshot consistente.
+
+    Em JSONL cada lote é gravado como um membro gzip independente seguido de
+    um checkpoint (último id e tamanho do arquivo); --resume trunca o que foi
+    escrito depois do último checkpoint e continua do mesmo snapshot.
+
+    Args:
+        destino: Arquivo .jsonl, .jsonl.gz ou .parquet
+        batch_size: Linhas por lote
+        resume: Continua uma exportação interrompida (só JSONL)
+
+    Returns:
+        Progresso final
+    """
+    parquet = _eh_parquet(destino)
+    if parquet:
+        _exigir_pyarrow()
+        if resume:
+            raise ValueError("Exportação em Parquet não pode ser retomada; use JSONL")
+
+    checkpoint = destino.with_name(destino.name + ".checkpoint")
+    snapshot_path = destino.with_name(destino.name + ".snapshot.db")
+    estado = _ler_checkpoint(checkpoint) if resume else None
+    if estado is None or not snapshot_path.exists():
+        if resume:
+            logger.warning("Sem checkpoint para retomar; exportando do início")
+        snapshot(snapshot_path)
+        estado = {"last_id": 0, "rows": 0, "offset": 0}
+        _gravar_checkpoint(checkpoint, estado)
+
+    progresso = Progresso("exportação", linhas=estado["rows"])
+    conn = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    try:
+        lotes = _lotes_exportacao(conn, estado["last_id"], batch_size)
+        if parquet:
+            _exportar_parquet(destino, lotes, progresso)
+        else:
+            _exportar_jsonl(destino, lotes, progresso, estado, checkpoint)
+    finally:
+        conn.close()
+
+    checkpoint.unlink(missing_ok=True)
+    snapshot_path.unlink(missing_ok=True)
+    progresso.relatar(final=True)
+    return progresso
+
+
+def _exportar_jsonl(
+    destino: Path,
+    lotes: Iterator[list[dict[str, Any]]],
+    progresso: Progresso,
+    estado: dict[str, Any],
+    checkpoint: Path,
+) -> None:
+    comprimir = destino.suffix == ".gz"
+    with open(destino, "r+b" if estado["offset"] else "wb") as f:
+        f.truncate(estado["offset"])
+        f.seek(estado["offset"])
+        for lote in lotes:
+            dados = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in lote).encode()
+            progresso.bytes += len(dados)
+            f.write(gzip.compress(dados) if comprimir else dados)
+            f.flush()
+            os.fsync(f.fileno())
+            progresso.linhas += len(lote)
+            _gravar_checkpoint(
+                checkpoint,
+                {"last_id": lote[-1]["id"], "rows": progresso.linhas, "offset": f.tell()},
+            )
+            progresso.relatar()
+
+
+def _exportar_parquet(
+    destino: Path, lotes: Iterator[list[dict[str, Any]]], progresso: Progresso
+) -> None:
+    schema = pyarrow.schema(
+        [
+            ("id", pyarrow.int64()),
+            ("user_id", pyarrow.int64()),
+            ("channel_id", pyarrow.int64()),
+            ("role", pyarrow.string()),
+            ("content", pyarrow.string()),
+            ("created_at", pyarrow.int64()),
+            ("tokens", pyarrow.int64()),
+        ]
+    )
+    with pyarrow.parquet.ParquetWriter(str(destino), schema, compression="zstd") as writer:
+        for lote in lotes:
+            tabela = pyarrow.Table.from_pylist(lote, schema=schema)
+            writer.write_table(tabela)
+            progresso.linhas += len(lote)
+            progresso.bytes += tabela.nbytes
+            progresso.relatar()
+
+
+# =============================================================================
+# Importação
+# =============================================================================
+def _ler_lotes(origem: Path, batch_size: int) -> Iterator[list[dict[str, Any]]]:
+    """Registros do arquivo exportado, em lotes."""
+    if _eh_parquet(origem):
+        _exigir_pyarrow()
+        for batch in pyarrow.parquet.ParquetFile(str(origem)).iter_batches(batch_size):
+            yield batch.to_pylist()
+        return
+
+    abrir = gzip.open if origem.suffix == ".gz" else open
+    with abrir(origem, "rt", encoding="utf-8") as f:
+        lote = []
+        for linha in f:
+            if linha.strip():
+                lote.append(json.loads(linha))
+            if len(lote) >= batch_size:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+
+def _linha_messages(registro: dict[str, Any]) -> tuple:
+    role = registro["role"]
+    if role not in ROLE_TO_INT:
+        raise ValueError(f"Role inválido na mensagem {registro.get('id')}: {role}")
+    return (
+        registro["id"],
+        registro["user_id"],
+        registro["channel_id"],
+        ROLE_TO_INT[role],
+        registro["content"],
+        registro["created_at"],
+        registro.get("tokens", 0),
+    )
+
+
+def _conferir_ids_existentes(conn: sqlite3.Connection, linhas: list[tuple]) -> None:
+    """
+    Garante que os IDs ignorados pelo INSERT OR IGNORE são das mesmas mensagens.
+
+    Um ID igual com conteúdo igual é uma reimportação (ex.: lote repetido ao
+    retomar). Com conteúdo diferente a mensagem do arquivo seria descartada
+    em silêncio, então a importação é interrompida.
+
+    Raises:
+        ValueError: Se algum ID já pertence a outra mensagem
+    """
+    existentes: dict[int, tuple] = {}
+    ids = [linha[0] for linha in linhas]
+    for i in range(0, len(ids), 500):
+        parte = ids[i : i + 500]
+        existentes.update(
+            (row[0], row)
+            for row in conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM messages "
+                f"WHERE id IN ({', '.join('?' * len(parte))})",
+                parte,
+            )
+        )
+    colisoes = [linha[0] for linha in linhas if existentes.get(linha[0], linha) != linha]
+    if colisoes:
+        raise ValueError(
+            f"{len(colisoes)} ID(s) já usados por outras mensagens no banco de destino "
+            f"(ex.: {colisoes[:5]}); importe em um banco vazio"
+        )
+
+
+def importar(origem: Path, batch_size: int = DEFAULT_BATCH_SIZE, resume: bool = False) -> Progresso:
+    """
+    Importa um arquivo exportado para o banco configurado.
+
+    Os IDs são preservados; mensagens já presentes (mesmo ID e mesmo
+    conteúdo) são ignoradas, então repetir um lote (ex.: depois de uma
+    interrupção) não duplica o histórico. Um ID já usado por outra mensagem
+    interrompe a importação, com o lote desfeito. Estatísticas e índices de
+    busca são atualizados pelos triggers. Cada lote é uma transação curta,
+    permitindo importar com o bot em execução.
+
+    Args:
+        origem: Arquivo .jsonl, .jsonl.gz ou .parquet gerado por exportar()
+        batch_size: Linhas por transação
+        resume: Pula as linhas já importadas segundo o checkpoint
+
+    Returns:
+        Progresso final (linhas lidas e ignoradas)
+
+    Raises:
+        ValueError: Se um registro for inválido ou seu ID pertencer a outra mensagem
+    """
+    init_db()
+    checkpoint = origem.with_name(origem.name + ".import-checkpoint")
+    pular = (_ler_checkpoint(checkpoint) or {}).get("rows", 0) if resume else 0
+
+    progresso = Progresso("importação")
+    conn = sqlite3.connect(str(settings.db_path), timeout=settings.db_busy_timeout_seconds)
+    try:
+        for lote in _ler_lotes(origem, batch_size):
+            if pular >= len(lote):
+                pular -= len(lote)
+                progresso.linhas += len(lote)
+                continue
+            progresso.linhas += pular
+            lote, pular = lote[pular:], 0
+            linhas = [_linha_messages(r) for r in lote]
+            with conn:
+                cursor = conn.executemany(
+                    f"INSERT OR IGNORE INTO messages ({', '.join(COLUMNS)}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    linhas,
+                )
+                if cursor.rowcount < len(linhas):
+                    _conferir_ids_existentes(conn, linhas)
+            progresso.linhas += len(lote)
+            progresso.ignoradas += len(lote) - cursor.rowcount
+            progresso.bytes += sum(len(r["content"]) for r in lote)
+            _gravar_checkpoint(checkpoint, {"rows": progresso.linhas})
+            progresso.relatar()
+    finally:
+        conn.close()
+
+    checkpoint.unlink(missing_ok=True)
+    progresso.relatar(final=True)
+    return progresso
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Executa snapshot, exportação ou importação pela linha de comando."""
+    parser = argparse.ArgumentParser(description="Backup do histórico do Sherlock Bot")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_snapshot = sub.add_parser("snapshot", help="Cópia consistente do banco (VACUUM INTO)")
+    p_snapshot.add_argument("destino", type=Path)
+
+    for nome, ajuda in (
+        ("export", "Exporta o histórico para .jsonl[.gz] ou .parquet"),
+        ("import", "Importa um histórico exportado"),
+    ):
+        p = sub.add_parser(nome, help=ajuda)
+        p.add_argument("arquivo", type=Path)
+        p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        p.add_argument("--resume", action="store_true", help="Retoma a partir do último checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.comando == "snapshot":
+        snapshot(args.destino)
+    elif args.comando == "export":
+        exportar(args.arquivo, args.batch_size, args.resume)
+    else:
+        importar(args.arquivo, args.batch_size, args.resume)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
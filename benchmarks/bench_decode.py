@@ -0,0 +1,105 @@
+"""
+Benchmark de decodificação de mensagens: timestamps em texto vs epoch-ms.
+
+Cria um banco temporário no formato legado (created_at em texto, role em
+texto), mede linhas/s decodificadas com parse_datetime, migra para o schema
+atual medindo a vazão da migração e mede novamente com from_epoch_ms.
+
+Uso:
+    python benchmarks/bench_decode.py [--rows N] [--chunk-size N]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py exige credenciais; o benchmark não acessa Discord nem OpenRouter
+os.environ.setdefault("DISCORD_TOKEN", "x" * 50)
+os.environ.setdefault("OPENROUTER_API_KEY", "x" * 50)
+
+from database import Message, _row_to_message, parse_datetime  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+def _criar_banco_legado(path: Path, rows: int) -> None:
+    conn = sqlite3.connect(str(path))
+    conn.execute("""
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO messages (user_id, channel_id, role, content, created_at) "
+        "VALUES (?, ?, ?, ?, datetime(1700000000 + ?, 'unixepoch'))",
+        (
+            (i % 1000, i % 37, "user" if i % 2 else "assistant", f"mensagem {i}", i)
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _decode_legado(row: sqlite3.Row) -> Message:
+    """Decodificação equivalente à anterior ao schema v2."""
+    return Message(
+        id=row["id"],
+        user_id=row["user_id"],
+        channel_id=row["channel_id"],
+        role=row["role"],
+        content=row["content"],
+        created_at=parse_datetime(row["created_at"]),
+    )
+
+
+def _medir(conn: sqlite3.Connection, decode) -> float:
+    inicio = time.perf_counter()
+    count = 0
+    for row in conn.execute(
+        "SELECT id, user_id, channel_id, role, content, created_at FROM messages"
+    ):
+        decode(row)
+        count += 1
+    return count / (time.perf_counter() - inicio)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        _criar_banco_legado(path, args.rows)
+        conn = sqlite3.connect(str(path))
+        conn.row_factory = sqlite3.Row
+
+        texto = _medir(conn, _decode_legado)
+
+        inicio = time.perf_counter()
+        migrate(conn, chunk_size=args.chunk_size)
+        migracao = args.rows / (time.perf_counter() - inicio)
+
+        inteiro = _medir(conn, _row_to_message)
+        conn.close()
+
+    print(f"linhas: {args.rows}")
+    print(f"decode texto (parse_datetime):      {texto:>12,.0f} linhas/s")
+    print(f"decode epoch-ms (from_epoch_ms):    {inteiro:>12,.0f} linhas/s")
+    print(f"migração v1 -> atual:               {migracao:>12,.0f} linhas/s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
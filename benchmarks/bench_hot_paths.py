@@ -0,0 +1,245 @@
+"""
+Microbenchmarks dos caminhos quentes de database.py e rate_limiter.py.
+
+Mede o tempo por operação de add_message, get_context_messages,
+get_user_stats, parse_datetime e RateLimiter.is_allowed contra um banco
+sintético de --rows mensagens de --users usuários (e um rate limiter com
+--users usuários ativos). Cada caso roda --repeat rodadas de --number
+operações; o resultado é o tempo por operação da rodada mais rápida (como no
+timeit: as mais lentas refletem ruído da máquina, não o código).
+
+Os resultados podem ser gravados como baseline (por caso e escala) e
+comparados depois: --check termina com código 1 se algum caso ficar mais
+de --threshold (fração) mais lento que o baseline. Baselines dependem da
+máquina; gere-os no mesmo host em que o --check vai rodar.
+
+baselines.json cobre a matriz --rows 10k/100k/1M × --users 1k/10k/100k/1M e,
+com 10M mensagens, só --users 1M: montar um banco de 10M leva ~12 min por
+escala (e ~2 GB em disco), e as outras combinações de 10M ficaram de fora.
+Com mais usuários que mensagens (ex.: --rows 10k com --users 1M) parte não tem
+histórico, o que também é um caso real (usuários novos).
+
+Uso:
+    python benchmarks/bench_hot_paths.py [--rows N] [--users N]
+        [--save-baseline] [--check] [--threshold 0.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import cast
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py exige credenciais; o benchmark não acessa Discord nem OpenRouter
+os.environ.setdefault("DISCORD_TOKEN", "x" * 50)
+os.environ.setdefault("OPENROUTER_API_KEY", "x" * 50)
+
+from config import settings  # noqa: E402
+from database import (  # noqa: E402
+    add_message,
+    get_context_messages,
+    get_user_stats,
+    init_db,
+    parse_datetime,
+)
+from rate_limiter import RateLimiter  # noqa: E402
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baselines.json"
+CHANNELS = 50
+
+DATETIME_SAMPLES = (
+    "2025-01-01 10:00:00",
+    "2025-01-01 10:00:01.500000",
+    "2025-01-01T10:00:02",
+    "2025-02-01T00:00:00.250000+00:00",
+)
+
+
+def _criar_banco(path: Path, rows: int, users: int) -> None:
+    """Banco no schema atual com `rows` mensagens distribuídas entre `users` usuários."""
+    settings.db_path = path
+    init_db()
+    conn = sqlite3.connect(str(path))
+    conn.executemany(
+        "INSERT INTO messages (user_id, channel_id, role, content, created_at, tokens) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                i % users,
+                i % CHANNELS,
+                i % 2,
+                f"mensagem {i} sobre o assunto {i % 97}",
+                1_700_000_000_000 + i * 1000,
+                i % 50,
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _rate_limiter(users: int) -> RateLimiter:
+    """Rate limiter com `users` usuários ativos, cada um com 3 requisições na janela."""
+    limiter = RateLimiter(max_requests=5)
+    agora = datetime.now(UTC)
+    for user_id in range(users):
+        limiter.requests[user_id] = [agora - timedelta(seconds=s) for s in (30, 20, 10)]
+    return limiter
+
+
+def _casos(rows: int, users: int, seed: int) -> dict[str, Callable[[int], None]]:
+    """Casos de benchmark: cada um executa `n` operações."""
+    rnd = random.Random(seed)
+    limiter = _rate_limiter(users)
+
+    def conversa() -> tuple[int, int]:
+        # Mesma distribuição do banco sintético (user i % users, canal i % CHANNELS)
+        i = rnd.randrange(rows)
+        return i % users, i % CHANNELS
+
+    def caso_add_message(n: int) -> None:
+        for _ in range(n):
+            user_id, channel_id = conversa()
+            add_message(user_id, channel_id, "user", "pergunta do benchmark", tokens=10)
+
+    def caso_get_context_messages(n: int) -> None:
+        for _ in range(n):
+            get_context_messages(*conversa())
+
+    def caso_get_user_stats(n: int) -> None:
+        for _ in range(n):
+            get_user_stats(rnd.randrange(users))
+
+    def caso_parse_datetime(n: int) -> None:
+        for i in range(n):
+            parse_datetime(DATETIME_SAMPLES[i % len(DATETIME_SAMPLES)])
+
+    def caso_is_allowed(n: int) -> None:
+        # Usuários aleatórios: cada um fica bem abaixo do limite mesmo com n grande
+        for _ in range(n):
+            limiter.is_allowed(rnd.randrange(users))
+
+    return {
+        "add_message": caso_add_message,
+        "get_context_messages": caso_get_context_messages,
+        "get_user_stats": caso_get_user_stats,
+        "parse_datetime": caso_parse_datetime,
+        "rate_limiter.is_allowed": caso_is_allowed,
+    }
+
+
+def _medir(caso: Callable[[int], None], number: int, repeat: int) -> float:
+    """Tempo por operação (microssegundos) da rodada mais rápida."""
+    caso(max(1, number // 10))  # aquecimento (cache de páginas, prepared statements)
+    rodadas = []
+    for _ in range(repeat):
+        inicio = time.perf_counter_ns()
+        caso(number)
+        rodadas.append((time.perf_counter_ns() - inicio) / number / 1000)
+    return min(rodadas)
+
+
+def _chave(caso: str, rows: int, users: int) -> str:
+    return f"{caso}[rows={rows},users={users}]"
+
+
+def _carregar_baselines(path: Path) -> dict[str, float]:
+    if not path.exists():
+        return {}
+    return cast(dict[str, float], json.loads(path.read_text())["results"])
+
+
+def _salvar_baselines(path: Path, resultados: dict[str, float]) -> None:
+    baselines = _carregar_baselines(path) | resultados
+    path.write_text(
+        json.dumps(
+            {
+                "machine": f"{platform.machine()} {platform.processor() or platform.system()}",
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "unit": "us/op",
+                "results": dict(sorted(baselines.items())),
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000, help="Mensagens no banco sintético")
+    parser.add_argument("--users", type=int, default=1_000, help="Usuários distintos")
+    parser.add_argument("--number", type=int, default=500, help="Operações por rodada")
+    parser.add_argument("--repeat", type=int, default=5, help="Rodadas por caso")
+    parser.add_argument("--only", help="Casos separados por vírgula (padrão: todos)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline-file", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados")
+    parser.add_argument(
+        "--check", action="store_true", help="Falha se algum caso regredir além do limite"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Regressão tolerada (0.25 = 25%%)"
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inicio = time.perf_counter()
+        _criar_banco(Path(tmp) / "bench.db", args.rows, args.users)
+        print(
+            f"banco sintético: {args.rows} mensagens, {args.users} usuários "
+            f"({time.perf_counter() - inicio:.1f}s)"
+        )
+
+        casos = _casos(args.rows, args.users, args.seed)
+        if args.only:
+            nomes = [n.strip() for n in args.only.split(",")]
+            desconhecidos = set(nomes) - casos.keys()
+            if desconhecidos:
+                parser.error(f"casos desconhecidos: {', '.join(sorted(desconhecidos))}")
+            casos = {n: casos[n] for n in nomes}
+
+        resultados = {
+            _chave(nome, args.rows, args.users): _medir(caso, args.number, args.repeat)
+            for nome, caso in casos.items()
+        }
+
+    baselines = _carregar_baselines(args.baseline_file)
+    regressoes = []
+    print(f"\n{'caso':<52} {'us/op':>10} {'ops/s':>12} {'baseline':>10} {'delta':>8}")
+    for chave, us in resultados.items():
+        base = baselines.get(chave)
+        delta = f"{(us / base - 1):+.0%}" if base else "-"
+        print(f"{chave:<52} {us:>10.2f} {1e6 / us:>12,.0f} {base if base else '-':>10} {delta:>8}")
+        if base and us > base * (1 + args.threshold):
+            regressoes.append(chave)
+
+    if args.save_baseline:
+        _salvar_baselines(args.baseline_file, {k: round(v, 2) for k, v in resultados.items()})
+        print(f"\nbaseline gravado em {args.baseline_file}")
+
+    if args.check:
+        if regressoes:
+            print(f"\nREGRESSÃO (> {args.threshold:.0%}): {', '.join(regressoes)}")
+            return 1
+        faltando = [k for k in resultados if k not in baselines]
+        if faltando:
+            print(f"\nsem baseline para: {', '.join(faltando)}")
+        print("\nsem regressões")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
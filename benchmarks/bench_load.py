@@ -0,0 +1,435 @@
+"""
+Teste de carga ponta a ponta do bot com Discord e OpenRouter simulados.
+
+Sobe um servidor local compatível com a API OpenAI (/v1/chat/completions)
+com latência configurável e injeção de respostas 429, aponta o cliente do
+bot para ele e dispara on_message (DMs e menções) e os slash commands (/ia,
+/stats, /buscar) com objetos Discord sintéticos, em chegadas de Poisson na
+taxa pedida. O banco é um SQLite temporário.
+
+Ao final relata requisições/s, latência p50/p95/p99 por etapa (contexto,
+IA, gravação, envio e total por cenário) e o atraso do event loop.
+
+Uso:
+    python benchmarks/bench_load.py [--rate 20] [--duration 30] [--users 200]
+        [--mix dm=5,mention=2,ia=2,stats=1,buscar=1]
+        [--ai-latency-ms 800] [--ai-latency-dist lognormal] [--rate-429 0.02]
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py exige credenciais; o benchmark não acessa Discord nem OpenRouter
+os.environ.setdefault("DISCORD_TOKEN", "x" * 50)
+os.environ.setdefault("OPENROUTER_API_KEY", "x" * 50)
+
+import discord  # noqa: E402
+from aiohttp import web  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+import bot as sherlock  # noqa: E402
+from config import settings  # noqa: E402
+from database import init_db  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+CENARIOS = ("dm", "mention", "ia", "stats", "buscar")
+PALAVRAS = (
+    "bolo cenoura receita capital frança previsão tempo python discord banco "
+    "dados índice cache latência fila mensagem histórico contexto resposta"
+).split()
+
+
+# =============================================================================
+# OpenRouter simulado
+# =============================================================================
+class ServidorIAFalso:
+    """Servidor HTTP local compatível com POST /v1/chat/completions."""
+
+    def __init__(self, latencia_ms: float, distribuicao: str, taxa_429: float, seed: int):
+        self.latencia_ms = latencia_ms
+        self.distribuicao = distribuicao
+        self.taxa_429 = taxa_429
+        self.random = random.Random(seed)
+        self.requisicoes = 0
+        self.respostas_429 = 0
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    def _latencia(self) -> float:
+        media = self.latencia_ms / 1000
+        if self.distribuicao == "const":
+            return media
+        if self.distribuicao == "exp":
+            return self.random.expovariate(1 / media)
+        # lognormal com a média pedida e cauda longa (sigma 0.5)
+        sigma = 0.5
+        return self.random.lognormvariate(0, sigma) * media / math.exp(sigma**2 / 2)
+
+    async def _completions(self, request: web.Request) -> web.Response:
+        self.requisicoes += 1
+        corpo = await request.json()
+        if self.random.random() < self.taxa_429:
+            self.respostas_429 += 1
+            return web.json_response(
+                {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        await asyncio.sleep(self._latencia())
+
+        caracteres = 0
+        for mensagem in corpo["messages"]:
+            conteudo = mensagem["content"]
+            if isinstance(conteudo, list):  # blocos com cache_control
+                conteudo = "".join(parte.get("text", "") for parte in conteudo)
+            caracteres += len(conteudo)
+        resposta = " ".join(self.random.choices(PALAVRAS, k=self.random.randint(20, 120)))
+        prompt_tokens = caracteres // 4 + 1
+        completion_tokens = len(resposta) // 4 + 1
+        return web.json_response(
+            {
+                "id": f"bench-{self.requisicoes}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": corpo["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": resposta},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+    async def iniciar(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        porta = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        self.url = f"http://127.0.0.1:{porta}/v1"
+
+    async def parar(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# =============================================================================
+# Discord simulado
+# =============================================================================
+class _Digitando:
+    async def __aenter__(self) -> None:
+        return None
+
+    async def __aexit__(self, *exc: object) -> None:
+        return None
+
+
+class _Autor:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.bot = False
+        self.display_name = f"usuario{user_id}"
+
+
+class UsuarioBotFalso:
+    """Usuário do próprio bot (bot.user), para detectar menções."""
+
+    id = 999_999
+    bot = True
+
+    def mentioned_in(self, message: Any) -> bool:
+        return any(user.id == self.id for user in message.mentions)
+
+
+class CanalDMFalso(discord.DMChannel):
+    """DMChannel sem estado de conexão; isinstance(..., DMChannel) continua valendo."""
+
+    def __init__(self, channel_id: int, enviar: Callable[..., Awaitable[None]]):
+        self.id = channel_id
+        self._enviar = enviar
+
+    async def send(self, *args: Any, **kwargs: Any) -> None:  # type: ignore[override]
+        await self._enviar(*args, **kwargs)
+
+    def typing(self) -> _Digitando:  # type: ignore[override]
+        return _Digitando()
+
+
+class CanalServidorFalso:
+    """Canal de texto de servidor."""
+
+    def __init__(self, channel_id: int, enviar: Callable[..., Awaitable[None]]):
+        self.id = channel_id
+        self.send = enviar
+
+    def typing(self) -> _Digitando:
+        return _Digitando()
+
+
+class MensagemFalsa:
+    """Subconjunto de discord.Message usado por on_message e enviar_resposta."""
+
+    def __init__(self, autor: _Autor, canal: Any, conteudo: str, guild_id: int | None, envio):
+        self.author = autor
+        self.channel = canal
+        self.content = conteudo
+        self.guild = type("Guild", (), {"id": guild_id})() if guild_id else None
+        self.mentions = [UsuarioBotFalso()] if guild_id else []
+        self.mention_everyone = False
+        self.reply = envio
+
+
+class _RespostaInteracao:
+    def __init__(self, envio: Callable[..., Awaitable[None]]):
+        self.send_message = envio
+
+    async def defer(self, **kwargs: Any) -> None:
+        return None
+
+
+class InteracaoFalsa(discord.Interaction):
+    """Interaction sem estado de conexão; isinstance(..., Interaction) continua valendo."""
+
+    response: Any = None
+    followup: Any = None
+    channel_id: Any = None
+
+    def __init__(
+        self,
+        user_id: int,
+        channel_id: int,
+        guild_id: int | None,
+        envio: Callable[..., Awaitable[None]],
+    ):
+        self.user = _Autor(user_id)  # type: ignore[assignment]
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.response = _RespostaInteracao(envio)
+        self.followup = type("Followup", (), {"send": staticmethod(envio)})()
+
+
+# =============================================================================
+# Carga
+# =============================================================================
+class Carga:
+    """Gera a carga e coleta as medições."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.medidas = Metrics(reservoir_size=1_000_000)
+        self.concluidas = 0
+        self.erros: dict[str, int] = {}
+        self.cenarios, self.pesos = zip(*_parse_mix(args.mix).items(), strict=True)
+
+    async def _enviar_discord(self, *args: Any, **kwargs: Any) -> None:
+        await asyncio.sleep(self.args.discord_latency_ms / 1000)
+
+    def _cronometrar(self, etapa: str, func: Callable[..., Awaitable[Any]]):
+        async def medir(*args: Any, **kwargs: Any) -> Any:
+            inicio = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.medidas.observe(etapa, (time.perf_counter() - inicio) * 1000)
+
+        return medir
+
+    def instrumentar(self) -> None:
+        """Envolve as etapas do bot com cronômetros."""
+        sherlock.montar_contexto = self._cronometrar("contexto", sherlock.montar_contexto)
+        sherlock.chamar_ia = self._cronometrar("ia", sherlock.chamar_ia)
+        sherlock.enviar_resposta = self._cronometrar("envio", sherlock.enviar_resposta)
+        sherlock.storage.add_messages = self._cronometrar(  # type: ignore[method-assign]
+            "gravacao", sherlock.storage.add_messages
+        )
+
+    def _pergunta(self) -> str:
+        return " ".join(self.random.choices(PALAVRAS, k=self.random.randint(3, 15))) + "?"
+
+    async def _requisicao(self, cenario: str) -> None:
+        user_id = 1 + self.random.randrange(self.args.users)
+        guild_id = 1 + user_id % self.args.guilds
+        canal_servidor = 100_000 + user_id % self.args.channels
+        inicio = time.perf_counter()
+        try:
+            if cenario == "dm":
+                dm = CanalDMFalso(user_id, self._enviar_discord)
+                mensagem = MensagemFalsa(
+                    _Autor(user_id), dm, self._pergunta(), None, self._enviar_discord
+                )
+                await sherlock.on_message(mensagem)  # type: ignore[arg-type]
+            elif cenario == "mention":
+                canal = CanalServidorFalso(canal_servidor, self._enviar_discord)
+                conteudo = f"<@{UsuarioBotFalso.id}> {self._pergunta()}"
+                mensagem = MensagemFalsa(
+                    _Autor(user_id), canal, conteudo, guild_id, self._enviar_discord
+                )
+                await sherlock.on_message(mensagem)  # type: ignore[arg-type]
+            else:
+                interacao = InteracaoFalsa(user_id, canal_servidor, guild_id, self._enviar_discord)
+                if cenario == "ia":
+                    ia: Callable[..., Awaitable[None]] = sherlock.slash_ia.callback
+                    await ia(interacao, pergunta=self._pergunta())
+                elif cenario == "stats":
+                    stats: Callable[..., Awaitable[None]] = sherlock.slash_stats.callback
+                    await stats(interacao)
+                else:
+                    buscar: Callable[..., Awaitable[None]] = sherlock.slash_buscar.callback
+                    await buscar(interacao, termo=self.random.choice(PALAVRAS), pagina=1)
+            self.concluidas += 1
+        except Exception as e:
+            chave = f"{cenario}: {type(e).__name__}: {e}"[:120]
+            self.erros[chave] = self.erros.get(chave, 0) + 1
+        finally:
+            self.medidas.observe("total", (time.perf_counter() - inicio) * 1000, cenario=cenario)
+
+    async def _medir_atraso_loop(self, parar: asyncio.Event) -> None:
+        intervalo = 0.01
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            await asyncio.sleep(intervalo)
+            atraso = time.perf_counter() - inicio - intervalo
+            self.medidas.observe("atraso_loop", max(0.0, atraso) * 1000)
+
+    async def executar(self) -> float:
+        """Dispara a carga pela duração pedida e aguarda as requisições em voo."""
+        parar = asyncio.Event()
+        monitor = asyncio.create_task(self._medir_atraso_loop(parar))
+        tarefas: set[asyncio.Task] = set()
+        inicio = time.perf_counter()
+        proxima = inicio
+        while (agora := time.perf_counter()) - inicio < self.args.duration:
+            if agora < proxima:
+                await asyncio.sleep(proxima - agora)
+            cenario = self.random.choices(self.cenarios, self.pesos)[0]
+            tarefa = asyncio.create_task(self._requisicao(cenario))
+            tarefas.add(tarefa)
+            tarefa.add_done_callback(tarefas.discard)
+            proxima += self.random.expovariate(self.args.rate)
+        if tarefas:
+            await asyncio.wait(tarefas, timeout=self.args.drain_timeout)
+        elapsed = time.perf_counter() - inicio
+        parar.set()
+        await monitor
+        return elapsed
+
+
+def _parse_mix(texto: str) -> dict[str, float]:
+    mix = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip()
+        if nome not in CENARIOS:
+            raise argparse.ArgumentTypeError(f"Cenário desconhecido: {nome} (use {CENARIOS})")
+        mix[nome] = float(peso or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def _linha(nome: str, resumo: dict[str, float] | None) -> str:
+    if not resumo:
+        return f"{nome:<22} {'-':>8}"
+    return (
+        f"{nome:<22} {resumo['count']:>8.0f} {resumo['p50']:>9.1f} {resumo['p95']:>9.1f} "
+        f"{resumo['p99']:>9.1f} {resumo['max']:>9.1f}"
+    )
+
+
+async def _rodar(args: argparse.Namespace) -> None:
+    servidor = ServidorIAFalso(args.ai_latency_ms, args.ai_latency_dist, args.rate_429, args.seed)
+    await servidor.iniciar()
+    sherlock.openai_client = AsyncOpenAI(api_key="bench", base_url=servidor.url)
+    sherlock.bot._connection.user = UsuarioBotFalso()  # type: ignore[assignment]
+
+    async def _sem_comandos(message: Any) -> None:
+        return None
+
+    sherlock.bot.process_commands = _sem_comandos  # type: ignore[method-assign]
+    sherlock.usage_recorder.iniciar()
+
+    carga = Carga(args)
+    carga.instrumentar()
+    try:
+        elapsed = await carga.executar()
+    finally:
+        await sherlock.usage_recorder.parar()
+        await servidor.parar()
+
+    erros = sum(carga.erros.values())
+    print(f"duração: {elapsed:.1f}s  taxa pedida: {args.rate:.1f}/s")
+    print(
+        f"requisições: {carga.concluidas + erros} ({carga.concluidas} ok, {erros} erros)  "
+        f"vazão: {carga.concluidas / elapsed:.1f} req/s"
+    )
+    for erro, quantidade in sorted(carga.erros.items(), key=lambda e: -e[1]):
+        print(f"  {quantidade:>6}x {erro}")
+    print(f"chamadas à IA simulada: {servidor.requisicoes} ({servidor.respostas_429} com 429)")
+    print()
+    print(f"{'etapa (ms)':<22} {'n':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for etapa in ("contexto", "ia", "gravacao", "envio"):
+        print(_linha(etapa, carga.medidas.histogram_summary(etapa)))
+    for cenario in carga.cenarios:
+        print(_linha(f"total/{cenario}", carga.medidas.histogram_summary("total", cenario=cenario)))
+    print(_linha("atraso do event loop", carga.medidas.histogram_summary("atraso_loop")))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=20.0, help="Requisições por segundo")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument(
+        "--mix",
+        default="dm=5,mention=2,ia=2,stats=1,buscar=1",
+        help=f"Pesos por cenário ({', '.join(CENARIOS)})",
+    )
+    parser.add_argument("--ai-latency-ms", type=float, default=800.0)
+    parser.add_argument(
+        "--ai-latency-dist", choices=("const", "exp", "lognormal"), default="lognormal"
+    )
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fração de respostas 429")
+    parser.add_argument("--discord-latency-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--drain-timeout", type=float, default=60.0, help="Espera pelas requisições em voo"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Mantém os logs do bot")
+    args = parser.parse_args(argv)
+    _parse_mix(args.mix)
+
+    if not args.verbose:
+        from loguru import logger as _loguru
+
+        _loguru.remove()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.db_path = Path(tmp) / "bench.db"
+        settings.rate_limit_enabled = False
+        init_db()
+        asyncio.run(_rodar(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
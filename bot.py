@@ -8,30 +8,52 @@ Responde em 3 cenários:
 """
 
 import asyncio
+import functools
+import sys
+import threading
+import time
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 import discord
 from discord import app_commands
-from discord.ext import commands
-from openai import APIConnectionError, AsyncOpenAI, RateLimitError
 from tenacity import (
     retry,
-    retry_if_exception_type,
+    retry_if_exception,
     stop_after_attempt,
     wait_exponential,
 )
 
+from channel_context import ContextoCanal
+from command_sync import CommandSyncManager
 from config import settings
-from database import (
-    add_message,
-    clear_user_history,
-    get_context_messages,
-    get_user_stats,
-    init_db,
-)
-from logger import logger
+from conversation_queue import fila_conversas
+from database import USAGE_FLAG_CACHE_HIT, SearchHit, UsageRecord, estimar_tokens, init_db
+from lanes import FAIXA_IA, FAIXA_RAPIDA, executar_na_faixa, fechar_faixas, na_faixa
+from lifecycle import ciclo_de_vida
+from logger import configurar_log_arquivo, configurar_log_discord, logger
+from message_splitter import DISCORD_MESSAGE_LIMIT, Envio, planejar_envio
+from metrics import metrics
+from profiler import PerfilEmAndamentoError, etiquetar, profiler
 from prompt_loader import load_system_prompt
+from quota import QuotaExceededError, quota_engine
 from rate_limiter import rate_limit
+from retention import criar_pruner
+from retrieval import montar_contexto
+from send_queue import EnviarFn, dispatcher
+from sharding import (
+    BotDiscord,
+    MonitorShards,
+    criar_bot,
+    processo_coordenador,
+    registrar_eventos_shards,
+)
+from storage import criar_storage
+from usage import ResumoUso, resumir_uso, usage_recorder
+from watchdog import loop_watchdog
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 
 class EmptyAIResponseError(Exception):
@@ -40,23 +62,28 @@ class EmptyAIResponseError(Exception):
     pass
 
 
-# Cliente OpenRouter (compatível com OpenAI)
-# Configuração é validada automaticamente via config.py
-openai_client = AsyncOpenAI(
-    api_key=settings.openrouter_api_key,
-    base_url="https://openrouter.ai/api/v1",
-)
-
-# Carregar system prompt na inicialização (cache global)
-SYSTEM_PROMPT = load_system_prompt()
+# Cliente OpenRouter (compatível com OpenAI), criado sob demanda por cliente_ia():
+# o SDK da OpenAI é a dependência mais lenta de importar
+openai_client: "AsyncOpenAI | None" = None
+_openai_lock = threading.Lock()
 
 # Configurar intents
 intents = discord.Intents.default()
 intents.message_content = True  # Para ler conteúdo de mensagens (menções/DMs)
 intents.dm_messages = True  # Para receber DMs
 
-# Inicializar bot
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Inicializar bot (AutoShardedBot quando SHARDING_ENABLED=true)
+bot = criar_bot(intents)
+registrar_eventos_shards(bot)
+monitor_shards = MonitorShards(bot, settings.shard_metrics_interval_seconds)
+
+storage = criar_storage()
+# Limpeza periódica do histórico (TTL, limite por conversa, arquivamento)
+retention_pruner = criar_pruner(storage)
+contexto_canal = ContextoCanal(storage)
+
+# Sincroniza slash commands apenas quando o command tree muda
+command_sync = CommandSyncManager(bot.tree, dev_guild_id=settings.dev_guild_id)
 
 
 # =============================================================================
@@ -69,7 +96,9 @@ class AIResponse:
     content: str
     tokens_prompt: int = 0
     tokens_completion: int = 0
+    tokens_cached: int = 0
     model: str = ""
+    latency_ms: int = 0
 
     @property
     def tokens_total(self) -> int:
@@ -77,11 +106,105 @@ class AIResponse:
         return self.tokens_prompt + self.tokens_completion
 
 
+# =============================================================================
+# Cache de prompt
+# =============================================================================
+# Provedores que só fazem cache de prefixo com marcadores explícitos (cache_control).
+# OpenAI, DeepSeek e afins fazem cache automático de prefixos idênticos.
+PROVEDORES_CACHE_EXPLICITO = ("anthropic/", "google/")
+
+
+def _marcar_cache(message: dict) -> dict:
+    """Converte o conteúdo da mensagem em bloco de texto com cache_control."""
+    return {
+        "role": message["role"],
+        "content": [
+            {
+                "type": "text",
+                "text": message["content"],
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
+    }
+
+
+def aplicar_cache_prompt(messages: list[dict], model: str) -> list[dict]:
+    """
+    Adiciona marcadores de cache de prompt às mensagens quando o provedor exige.
+
+    Marca o system prompt (idêntico em todas as requisições) e a última mensagem
+    do histórico, de modo que o prefixo estável (system + histórico) seja
+    reaproveitado entre turnos. A mensagem atual do usuário nunca é marcada.
+
+    Args:
+        messages: Lista de mensagens no formato OpenAI (system primeiro)
+        model: Identificador do modelo no OpenRouter
+
+    Returns:
+        Nova lista de mensagens (a original não é modificada)
+    """
+    if not settings.prompt_cache_enabled or not model.startswith(PROVEDORES_CACHE_EXPLICITO):
+        return messages
+
+    marcadas = list(messages)
+    # Índices dos breakpoints: system prompt e fim do histórico (antes da pergunta atual)
+    breakpoints = {0, len(marcadas) - 2}
+    for i in sorted(breakpoints):
+        if 0 <= i < len(marcadas) - 1 and isinstance(marcadas[i].get("content"), str):
+            marcadas[i] = _marcar_cache(marcadas[i])
+    return marcadas
+
+
+def _extrair_tokens_cache(usage: object | None) -> int:
+    """Extrai a contagem de tokens lidos do cache a partir do usage da API."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    return cached or 0
+
+
 # =============================================================================
 # Chamada à API com retry
 # =============================================================================
+def cliente_ia() -> "AsyncOpenAI":
+    """
+    Retorna o cliente OpenRouter, importando o SDK e criando o cliente na primeira chamada.
+
+    Seguro para chamar de outra thread (o aquecimento na inicialização roda
+    em paralelo ao login no Discord).
+    """
+    global openai_client
+    if openai_client is None:
+        with _openai_lock:
+            if openai_client is None:
+                from openai import AsyncOpenAI
+
+                # Configuração é validada automaticamente via config.py
+                openai_client = AsyncOpenAI(
+                    api_key=settings.openrouter_api_key,
+                    base_url="https://openrouter.ai/api/v1",
+                )
+    return openai_client
+
+
+async def fechar_cliente_ia() -> None:
+    """Fecha as conexões HTTP do cliente OpenRouter, se ele chegou a ser criado."""
+    if openai_client is not None:
+        await openai_client.close()
+
+
+def _erro_da_api(erro: BaseException, *tipos: str) -> bool:
+    """Se `erro` é uma das exceções do SDK da OpenAI (sem importar o SDK à toa)."""
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(erro, tuple(getattr(openai, t) for t in tipos))
+
+
+def _erro_transitorio(erro: BaseException) -> bool:
+    """Erros da API que valem nova tentativa (rate limit e falhas de conexão)."""
+    return _erro_da_api(erro, "RateLimitError", "APIConnectionError")
+
+
 @retry(
-    retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+    retry=retry_if_exception(_erro_transitorio),
     wait=wait_exponential(multiplier=1, min=2, max=30),
     stop=stop_after_attempt(3),
     reraise=True,
@@ -102,10 +225,11 @@ async def chamar_ia(messages: list[dict]) -> AIResponse:
         asyncio.TimeoutError: Se a requisição exceder o tempo limite
     """
     try:
+        inicio = time.perf_counter()
         async with asyncio.timeout(settings.request_timeout_seconds):
-            response = await openai_client.chat.completions.create(
+            response = await cliente_ia().chat.completions.create(
                 model=settings.ai_model,
-                messages=messages,  # type: ignore
+                messages=aplicar_cache_prompt(messages, settings.ai_model),  # type: ignore
             )
 
         if not response.choices:
@@ -116,7 +240,9 @@ async def chamar_ia(messages: list[dict]) -> AIResponse:
             content=response.choices[0].message.content or "",
             tokens_prompt=usage.prompt_tokens if usage else 0,
             tokens_completion=usage.completion_tokens if usage else 0,
+            tokens_cached=_extrair_tokens_cache(usage),
             model=response.model,
+            latency_ms=round((time.perf_counter() - inicio) * 1000),
         )
     except TimeoutError:
         logger.error(f"Timeout de {settings.request_timeout_seconds}s atingido na chamada da IA")
@@ -126,7 +252,13 @@ async def chamar_ia(messages: list[dict]) -> AIResponse:
 # =============================================================================
 # Função centralizada para processar IA
 # =============================================================================
-async def processar_ia(conteudo: str, user_id: int, channel_id: int) -> str:
+async def processar_ia(
+    conteudo: str,
+    user_id: int,
+    channel_id: int,
+    guild_id: int | None = None,
+    autor: str | None = None,
+) -> str:
     """
     Envia pergunta para a IA usando histórico como contexto.
 
@@ -134,6 +266,9 @@ async def processar_ia(conteudo: str, user_id: int, channel_id: int) -> str:
         conteudo: Texto da pergunta do usuário
         user_id: ID do usuário Discord
         channel_id: ID do canal/DM
+        guild_id: ID do servidor (None em DMs), usado na cota do servidor
+        autor: Nome exibido do usuário, que identifica a pergunta nos canais
+            com contexto compartilhado
 
     Returns:
         Resposta da IA ou mensagem de erro
@@ -141,15 +276,34 @@ async def processar_ia(conteudo: str, user_id: int, channel_id: int) -> str:
     if not conteudo.strip():
         return "🤔 Por favor, envie uma pergunta para eu responder!"
 
+    etiquetar(guild=guild_id)
+    reserva = None
     try:
-        # Buscar histórico de contexto (sem salvar a mensagem atual ainda)
-        context_messages = get_context_messages(user_id, channel_id)
+        # Reserva de tokens antes de qualquer trabalho: rejeita cedo quem
+        # esgotou a cota (verificação em memória)
+        if quota_engine.habilitado:
+            reserva = quota_engine.reservar(
+                user_id,
+                guild_id,
+                estimar_tokens(conteudo) + settings.quota_reserve_tokens,
+            )
 
-        # Montar mensagens com system prompt + histórico + mensagem atual
+        # Buscar histórico de contexto (sem salvar a mensagem atual ainda).
+        # Nos canais compartilhados o contexto é do canal e vem da memória.
+        compartilhado = ContextoCanal.compartilhado(channel_id)
+        if compartilhado:
+            conteudo = ContextoCanal.formatar_pergunta(autor or f"Usuário {user_id}", conteudo)
+            context_messages = await contexto_canal.contexto(channel_id)
+        else:
+            context_messages = await montar_contexto(storage, user_id, channel_id, conteudo)
+
+        # Montar mensagens com system prompt + histórico + mensagem atual.
+        # A ordem (prefixo fixo primeiro, pergunta nova por último) maximiza o
+        # reaproveitamento do cache de prompt do provedor.
         messages = [
             {
                 "role": "system",
-                "content": SYSTEM_PROMPT,
+                "content": load_system_prompt(),
             },
             *context_messages,
             {"role": "user", "content": conteudo},
@@ -158,10 +312,31 @@ async def processar_ia(conteudo: str, user_id: int, channel_id: int) -> str:
         # Chamar IA com retry automático
         ai_response = await chamar_ia(messages)
         resposta = ai_response.content or "🤷 Não consegui gerar uma resposta."
+        if reserva is not None:
+            quota_engine.confirmar(reserva, ai_response.tokens_total)
 
         # Salvar ambas as mensagens no histórico apenas após o sucesso
-        add_message(user_id, channel_id, "user", conteudo)
-        add_message(user_id, channel_id, "assistant", resposta)
+        turno = [
+            ("user", conteudo, ai_response.tokens_prompt),
+            ("assistant", resposta, ai_response.tokens_completion),
+        ]
+        if compartilhado:
+            contexto_canal.registrar(channel_id, user_id, turno)
+        else:
+            await storage.add_messages(user_id, channel_id, turno)
+
+        usage_recorder.registrar(
+            UsageRecord(
+                user_id=user_id,
+                channel_id=channel_id,
+                model=ai_response.model or settings.ai_model,
+                tokens_prompt=ai_response.tokens_prompt,
+                tokens_completion=ai_response.tokens_completion,
+                tokens_cached=ai_response.tokens_cached,
+                latency_ms=ai_response.latency_ms,
+                flags=USAGE_FLAG_CACHE_HIT if ai_response.tokens_cached else 0,
+            )
+        )
 
         # Log de tokens
         if ai_response.tokens_total > 0:
@@ -170,6 +345,7 @@ async def processar_ia(conteudo: str, user_id: int, channel_id: int) -> str:
                 extra={
                     "tokens_prompt": ai_response.tokens_prompt,
                     "tokens_completion": ai_response.tokens_completion,
+                    "tokens_cached": ai_response.tokens_cached,
                     "model": ai_response.model,
                     "user_id": user_id,
                 },
@@ -177,16 +353,30 @@ async def processar_ia(conteudo: str, user_id: int, channel_id: int) -> str:
 
         return resposta
 
-    except RateLimitError:
-        return "⚠️ Muitas requisições. Aguarde alguns segundos e tente novamente."
-    except APIConnectionError:
-        return "⚠️ Erro de conexão com a IA. Tente novamente em instantes."
+    except QuotaExceededError as e:
+        logger.warning(
+            "Cota de tokens esgotada",
+            extra={"user_id": user_id, "guild_id": guild_id, "scope": e.scope},
+        )
+        alvo = "sua cota diária" if e.scope == "user" else "a cota diária deste servidor"
+        return (
+            f"⏳ Você atingiu {alvo} de tokens ({e.limit}). "
+            f"Tente novamente em ~{max(1, (e.retry_after_seconds + 3599) // 3600)}h."
+        )
     except TimeoutError:
         return "⚠️ A IA demorou muito para responder. Tente novamente."
     except EmptyAIResponseError:
         return "⚠️ A IA retornou uma resposta vazia. Tente novamente."
     except Exception as e:
+        if _erro_da_api(e, "RateLimitError"):
+            return "⚠️ Muitas requisições. Aguarde alguns segundos e tente novamente."
+        if _erro_da_api(e, "APIConnectionError"):
+            return "⚠️ Erro de conexão com a IA. Tente novamente em instantes."
         return f"❌ Erro ao processar: {e!s}"
+    finally:
+        # Falhas liberam a reserva sem debitar (confirmar já finalizou em caso de sucesso)
+        if reserva is not None:
+            quota_engine.cancelar(reserva)
 
 
 async def enviar_resposta(
@@ -194,29 +384,35 @@ async def enviar_resposta(
     resposta: str,
 ) -> None:
     """
-    Envia resposta dividindo em chunks se necessário (limite Discord: 2000 chars).
+    Envia resposta no menor número de mensagens (limite Discord: 2000 chars).
+
+    A divisão respeita Markdown (blocos de código, parágrafos, palavras) e
+    respostas longas vão como embeds ou arquivo anexo. Os envios passam pela
+    fila do canal, que respeita o rate limit do Discord e preserva a ordem.
 
     Args:
         destino: Interaction (slash) ou Message (menção/DM)
         resposta: Texto da resposta
     """
-    # Dividir em chunks de 2000 caracteres
-    chunks = [resposta[i : i + 2000] for i in range(0, len(resposta), 2000)]
+    envios = planejar_envio(resposta)
+    if not envios:
+        return
 
+    pedidos: list[tuple[EnviarFn, Envio]]
     if isinstance(destino, discord.Interaction):
         # Slash command - usar followup
-        for i, chunk in enumerate(chunks):
-            if i == 0:
-                await destino.followup.send(chunk)
-            else:
-                await destino.followup.send(chunk)
+        channel_id = destino.channel_id or destino.user.id
+        pedidos = [(destino.followup.send, envio) for envio in envios]
     else:
-        # Mensagem (menção/DM) - usar reply
-        for i, chunk in enumerate(chunks):
-            if i == 0:
-                await destino.reply(chunk)
-            else:
-                await destino.channel.send(chunk)
+        # Mensagem (menção/DM) - primeira como reply, demais no canal
+        channel_id = destino.channel.id
+        pedidos = [
+            (destino.reply if i == 0 else destino.channel.send, envio)
+            for i, envio in enumerate(envios)
+        ]
+
+    # Fila por canal: espaça envios conforme o limite do Discord
+    await dispatcher.enviar_varios(channel_id, pedidos)
 
 
 # =============================================================================
@@ -233,47 +429,74 @@ async def on_ready() -> None:
         f"Modelo de IA configurado: {settings.ai_model}",
         extra={"model": settings.ai_model},
     )
-    logger.info("Sincronizando slash commands...")
-
-    try:
-        synced = await bot.tree.sync()
-        logger.info(
-            "Slash commands sincronizados",
-            extra={"count": len(synced), "commands": [cmd.name for cmd in synced]},
-        )
-    except Exception as e:
-        logger.error(
-            "Erro ao sincronizar comandos",
-            extra={"error": str(e)},
-        )
+    # Sincronização roda em background para não atrasar a prontidão do bot;
+    # em reconexões (on_ready repetido) ela não é refeita.
+    command_sync.agendar()
+    monitor_shards.iniciar()
+    # A retenção apaga do banco compartilhado: um worker basta
+    if processo_coordenador():
+        retention_pruner.iniciar()
+    usage_recorder.iniciar()
+    contexto_canal.iniciar()
+    quota_engine.iniciar()
+    loop_watchdog.iniciar()
+    profiler.instalar_sinal()
+
+    global _inicio_app
+    if _inicio_app is not None:
+        # Só no primeiro on_ready: reconexões não são inicialização
+        segundos = time.monotonic() - _inicio_app
+        _inicio_app = None
+        metrics.gauge("startup_seconds", segundos)
+        logger.info("Bot pronto", extra={"startup_seconds": round(segundos, 2)})
 
 
 # =============================================================================
 # SLASH COMMAND /ia
 # =============================================================================
+# Resposta a perguntas recebidas depois do SIGTERM (o processo está drenando)
+MENSAGEM_ENCERRANDO = "🔄 Estou reiniciando. Envie sua pergunta de novo em alguns segundos."
+
+
 @bot.tree.command(name="ia", description="Faça uma pergunta para a IA")
 @app_commands.describe(pergunta="Sua pergunta para a IA")
+@na_faixa(FAIXA_IA)
 @rate_limit
 async def slash_ia(interaction: discord.Interaction, pergunta: str) -> None:
     """Slash command para interagir com a IA."""
-    await interaction.response.defer(thinking=True)
-    logger.info(
-        "Comando /ia recebido",
-        extra={"user_id": interaction.user.id, "question_length": len(pergunta)},
-    )
+    if ciclo_de_vida.encerrando:
+        await interaction.response.send_message(MENSAGEM_ENCERRANDO, ephemeral=True)
+        return
+    async with ciclo_de_vida.trabalho():
+        await interaction.response.defer(thinking=True)
+        logger.info(
+            "Comando /ia recebido",
+            extra={"user_id": interaction.user.id, "question_length": len(pergunta)},
+        )
 
-    resposta = await processar_ia(
-        pergunta,
-        user_id=interaction.user.id,
-        channel_id=interaction.channel_id or interaction.user.id,
-    )
-    await enviar_resposta(interaction, resposta)
+        channel_id = interaction.channel_id or interaction.user.id
+        # A interação exige resposta própria: o turno espera a vez, sem mesclar
+        resposta = await fila_conversas.executar(
+            ContextoCanal.chave_conversa(interaction.user.id, channel_id),
+            pergunta,
+            functools.partial(
+                processar_ia,
+                user_id=interaction.user.id,
+                channel_id=channel_id,
+                guild_id=interaction.guild_id,
+                autor=interaction.user.display_name,
+            ),
+            mesclavel=False,
+        )
+        assert resposta is not None  # turnos não mescláveis sempre executam
+        await enviar_resposta(interaction, resposta)
 
 
 # =============================================================================
 # SLASH COMMAND /limpar - Limpar histórico
 # =============================================================================
 @bot.tree.command(name="limpar", description="Limpa seu histórico de conversas")
+@na_faixa(FAIXA_RAPIDA)
 async def slash_limpar(interaction: discord.Interaction) -> None:
     """Limpa o histórico do usuário no canal atual."""
     channel_id = interaction.channel_id or interaction.user.id
@@ -281,7 +504,13 @@ async def slash_limpar(interaction: discord.Interaction) -> None:
         "Comando /limpar recebido",
         extra={"user_id": interaction.user.id, "channel_id": channel_id},
     )
-    removed = clear_user_history(interaction.user.id, channel_id)
+    compartilhado = ContextoCanal.compartilhado(channel_id)
+    if compartilhado:
+        # Turnos ainda em memória são gravados antes, para serem removidos também
+        await contexto_canal.flush()
+    removed = await storage.clear_user_history(interaction.user.id, channel_id)
+    if compartilhado:
+        contexto_canal.descartar(channel_id)
     logger.info(
         "Histórico limpo",
         extra={"user_id": interaction.user.id, "messages_removed": removed},
@@ -296,6 +525,7 @@ async def slash_limpar(interaction: discord.Interaction) -> None:
 # SLASH COMMAND /stats - Estatísticas
 # =============================================================================
 @bot.tree.command(name="stats", description="Mostra suas estatísticas de uso")
+@na_faixa(FAIXA_RAPIDA)
 @rate_limit
 async def slash_stats(interaction: discord.Interaction) -> None:
     """Mostra estatísticas do usuário."""
@@ -303,11 +533,162 @@ async def slash_stats(interaction: discord.Interaction) -> None:
         "Comando /stats recebido",
         extra={"user_id": interaction.user.id},
     )
-    stats = get_user_stats(interaction.user.id)
+    stats = await storage.get_user_stats(interaction.user.id)
+    ultima_atividade = (
+        discord.utils.format_dt(stats["last_active_at"], "R") if stats["last_active_at"] else "—"
+    )
     await interaction.response.send_message(
         f"📊 **Suas estatísticas:**\n"
         f"• Mensagens: {stats['total_messages']}\n"
-        f"• Canais: {stats['total_channels']}",
+        f"• Canais: {stats['total_channels']}\n"
+        f"• Tokens: {stats['total_tokens']}\n"
+        f"• Última atividade: {ultima_atividade}",
+        ephemeral=True,
+    )
+
+
+# =============================================================================
+# SLASH COMMAND /buscar - Busca no histórico
+# =============================================================================
+RESULTADOS_POR_PAGINA = 5
+
+
+def formatar_busca(termo: str, pagina: int, hits: list[SearchHit], tem_mais: bool) -> str:
+    """Formata uma página de resultados da busca para o Discord."""
+    if not hits:
+        if pagina == 1:
+            return f"🔎 Nada encontrado para **{termo}** no seu histórico."
+        return f"🔎 Não há resultados na página {pagina} para **{termo}**."
+
+    inicio = (pagina - 1) * RESULTADOS_POR_PAGINA
+    linhas = [f"🔎 Resultados para **{termo}** (página {pagina}):"]
+    for i, hit in enumerate(hits, start=inicio + 1):
+        autor = "você" if hit.message.role == "user" else "Sherlock"
+        quando = discord.utils.format_dt(hit.message.created_at, "R")
+        trecho = " ".join(hit.snippet.split())
+        linhas.append(f"**{i}.** <#{hit.message.channel_id}> · {quando} · {autor}: {trecho}")
+    if tem_mais:
+        linhas.append(f"➡️ Mais resultados: `/buscar termo:{termo} pagina:{pagina + 1}`")
+    return "\n".join(linhas)
+
+
+@bot.tree.command(name="buscar", description="Busca no seu histórico de conversas")
+@app_commands.describe(termo="Palavras a buscar", pagina="Página de resultados")
+@na_faixa(FAIXA_RAPIDA)
+@rate_limit
+async def slash_buscar(
+    interaction: discord.Interaction,
+    termo: str,
+    pagina: app_commands.Range[int, 1, 100] = 1,
+) -> None:
+    """Busca textual ranqueada no histórico do próprio usuário."""
+    logger.info(
+        "Comando /buscar recebido",
+        extra={"user_id": interaction.user.id, "query_length": len(termo), "page": pagina},
+    )
+    # Um resultado a mais indica se existe a próxima página
+    hits = await storage.search_messages(
+        interaction.user.id,
+        termo,
+        limit=RESULTADOS_POR_PAGINA + 1,
+        offset=(pagina - 1) * RESULTADOS_POR_PAGINA,
+    )
+    texto = formatar_busca(
+        termo, pagina, hits[:RESULTADOS_POR_PAGINA], len(hits) > RESULTADOS_POR_PAGINA
+    )
+    await interaction.response.send_message(texto[:DISCORD_MESSAGE_LIMIT], ephemeral=True)
+
+
+# =============================================================================
+# SLASH COMMAND /uso - Uso da IA (administradores)
+# =============================================================================
+def eh_admin(interaction: discord.Interaction) -> bool:
+    """Administradores: ADMIN_USER_IDS ou quem administra o servidor atual."""
+    if interaction.user.id in settings.admin_user_ids:
+        return True
+    permissions = getattr(interaction.user, "guild_permissions", None)
+    return bool(interaction.guild and permissions and permissions.administrator)
+
+
+def formatar_uso(horas: int, resumos: list[ResumoUso]) -> str:
+    """Formata o resumo de uso por modelo para o Discord."""
+    if not resumos:
+        return f"📈 Nenhum uso registrado nas últimas {horas}h."
+    linhas = [f"📈 **Uso nas últimas {horas}h:**"]
+    for r in resumos:
+        linhas.append(
+            f"• `{r.model}`: {r.requests} respostas, "
+            f"{r.tokens_prompt} prompt + {r.tokens_completion} completion tokens "
+            f"({r.tokens_cached} em cache, {r.cache_hit_rate:.0%} com cache), "
+            f"latência média {r.latency_ms_avg:.0f} ms (máx. {r.latency_ms_max} ms)"
+        )
+    return "\n".join(linhas)
+
+
+@bot.tree.command(name="uso", description="Uso de tokens e latência da IA (administradores)")
+@app_commands.describe(horas="Período em horas (padrão: 24)")
+@na_faixa(FAIXA_RAPIDA)
+async def slash_uso(
+    interaction: discord.Interaction,
+    horas: app_commands.Range[int, 1, 720] = 24,
+) -> None:
+    """Mostra o uso agregado por modelo a partir dos agregados por hora."""
+    logger.info(
+        "Comando /uso recebido",
+        extra={"user_id": interaction.user.id, "hours": horas},
+    )
+    if not eh_admin(interaction):
+        await interaction.response.send_message(
+            "⛔ Comando restrito a administradores.", ephemeral=True
+        )
+        return
+
+    # Inclui os registros ainda não gravados no lote corrente; se a gravação
+    # falhar (eles voltam para a fila), responde com o que já está no banco
+    try:
+        await executar_na_faixa(usage_recorder.flush)
+    except Exception as e:
+        logger.error(
+            "Erro ao gravar registros de uso antes do /uso",
+            extra={"pending": usage_recorder.pendentes, "error": str(e)},
+        )
+    resumos = await executar_na_faixa(resumir_uso, horas)
+    await interaction.response.send_message(formatar_uso(horas, resumos), ephemeral=True)
+
+
+# =============================================================================
+# SLASH COMMAND /perfil - Profiler por amostragem (administradores)
+# =============================================================================
+@bot.tree.command(name="perfil", description="Coleta um perfil de CPU do bot (administradores)")
+@app_commands.describe(segundos="Duração da coleta em segundos (padrão: 30)")
+async def slash_perfil(
+    interaction: discord.Interaction,
+    segundos: app_commands.Range[int, 1, 600] = 30,
+) -> None:
+    """Amostra o event loop por alguns segundos e grava um arquivo collapsed stacks."""
+    logger.info(
+        "Comando /perfil recebido",
+        extra={"user_id": interaction.user.id, "seconds": segundos},
+    )
+    if not eh_admin(interaction):
+        await interaction.response.send_message(
+            "⛔ Comando restrito a administradores.", ephemeral=True
+        )
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        perfil = await profiler.perfilar(segundos)
+    except PerfilEmAndamentoError:
+        await interaction.followup.send("⏳ Já existe uma coleta em andamento.", ephemeral=True)
+        return
+
+    handlers = ", ".join(
+        f"`{h}` {n / perfil.amostras:.0%}" for h, n in perfil.por_handler.most_common(5)
+    )
+    await interaction.followup.send(
+        f"🔥 Perfil de {perfil.segundos:g}s gravado em `{perfil.arquivo}` "
+        f"({perfil.amostras} amostras).\nHandlers: {handlers or '—'}",
         ephemeral=True,
     )
 
@@ -316,6 +697,7 @@ async def slash_stats(interaction: discord.Interaction) -> None:
 # MENÇÕES (@bot) e MENSAGENS DIRETAS (DMs)
 # =============================================================================
 @bot.event
+@na_faixa(FAIXA_IA)
 async def on_message(message: discord.Message) -> None:
     """Handler para menções e DMs."""
     # Ignorar próprias mensagens
@@ -354,29 +736,109 @@ async def on_message(message: discord.Message) -> None:
             },
         )
 
-        # Mostrar indicador de digitação
-        async with message.channel.typing():
-            resposta = await processar_ia(
+        if ciclo_de_vida.encerrando:
+            await enviar_resposta(message, MENSAGEM_ENCERRANDO)
+            return
+
+        async with ciclo_de_vida.trabalho():
+            # Em DMs, mensagens seguidas dentro da janela viram uma só pergunta.
+            # O indicador de digitação fica com o turno que responde, da chegada
+            # (inclusive a espera pela vez na conversa) até a resposta.
+            compartilhado = ContextoCanal.compartilhado(message.channel.id)
+            resposta = await fila_conversas.executar(
+                ContextoCanal.chave_conversa(message.author.id, message.channel.id),
                 conteudo,
-                user_id=message.author.id,
-                channel_id=message.channel.id,
+                functools.partial(
+                    processar_ia,
+                    user_id=message.author.id,
+                    channel_id=message.channel.id,
+                    guild_id=message.guild.id if message.guild else None,
+                    autor=message.author.display_name,
+                ),
+                # Num canal compartilhado a vez é do canal: a pergunta de outro
+                # autor não pode entrar no turno (seria respondida em nome dele)
+                mesclavel=not compartilhado,
+                espera=settings.dm_debounce_ms / 1000 if message_type == "DM" else 0.0,
+                indicador=message.channel.typing(),
             )
 
-        await enviar_resposta(message, resposta)
+            if resposta is None:
+                # Mesclada no turno que aguardava a vez: a resposta sai por ele
+                logger.info(
+                    "Mensagem mesclada",
+                    extra={"user_id": message.author.id, "channel_id": message.channel.id},
+                )
+            else:
+                await enviar_resposta(message, resposta)
 
     # Processar comandos de prefixo normalmente
     await bot.process_commands(message)
 
 
+@bot.event
+async def setup_hook() -> None:
+    """Executado uma vez no loop do bot, antes da conexão com o gateway."""
+    # Antes do on_ready: um SIGTERM enquanto o gateway conecta (ou reconecta)
+    # também passa pelo encerramento gracioso
+    ciclo_de_vida.instalar_sinais()
+
+
 # =============================================================================
 # Iniciar Bot
 # =============================================================================
-if __name__ == "__main__":
+_inicio_app: float | None = None
+
+
+def criar_app() -> BotDiscord:
+    """
+    Prepara o processo para rodar o bot e retorna o bot pronto para bot.run().
+
+    Importar este módulo só registra comandos e eventos; o trabalho de
+    inicialização (arquivo de log, migrações do banco, SDK da OpenAI, leitura
+    do system prompt) fica aqui, fora do import de testes e ferramentas. O SDK
+    e o prompt são carregados em uma thread, em paralelo ao login no Discord.
+
+    Returns:
+        O bot configurado
+    """
+    global _inicio_app
+    _inicio_app = time.monotonic()
+    configurar_log_arquivo()
+    configurar_log_discord()
     logger.info("Iniciando Sherlock Bot...")
     logger.info(f"Configuração: {settings}")
     init_db()  # Inicializar banco de dados explicitamente
+    threading.Thread(target=_aquecer, name="aquecimento", daemon=True).start()
+
+    # No SIGTERM, depois de drenar as respostas em andamento; o Discord por
+    # último, porque desconectar faz bot.run() retornar
+    ciclo_de_vida.ao_encerrar("monitor de shards", monitor_shards.parar)
+    ciclo_de_vida.ao_encerrar("retenção", retention_pruner.parar)
+    ciclo_de_vida.ao_encerrar("watchdog", loop_watchdog.parar)
+    ciclo_de_vida.ao_encerrar("registro de uso", usage_recorder.parar)
+    ciclo_de_vida.ao_encerrar("cotas", quota_engine.parar)
+    ciclo_de_vida.ao_encerrar("cliente da IA", fechar_cliente_ia)
+    ciclo_de_vida.ao_encerrar("contexto compartilhado", contexto_canal.parar)
+    ciclo_de_vida.ao_encerrar("storage", storage.close)
+    ciclo_de_vida.ao_encerrar("faixas", fechar_faixas)
+    ciclo_de_vida.ao_encerrar("discord", bot.close)
+    return bot
+
+
+def _aquecer() -> None:
+    """Carrega o que a primeira resposta precisaria (SDK da OpenAI e system prompt)."""
+    inicio = time.monotonic()
+    cliente_ia()
+    load_system_prompt()
+    logger.debug(
+        "Cliente da IA carregado",
+        extra={"warmup_ms": round((time.monotonic() - inicio) * 1000)},
+    )
+
+
+if __name__ == "__main__":
     try:
-        bot.run(settings.discord_token)
+        criar_app().run(settings.discord_token)
     except Exception as e:
         logger.critical(
             "Erro crítico ao iniciar bot",
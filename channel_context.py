@@ -0,0 +1,242 @@
+"""
+Contexto compartilhado por canal para conversas em grupo.
+
+Por padrão o histórico é de cada (usuário, canal): num canal movimentado em
+que várias pessoas mencionam o bot, cada uma tem seu próprio fio e a IA não vê
+o que foi respondido às outras. Nos canais de SHARED_CONTEXT_CHANNEL_IDS o
+contexto é um só para o canal.
+
+Responsável por:
+- Manter em memória as últimas SHARED_CONTEXT_MESSAGES mensagens de cada canal
+  compartilhado (ring buffer), carregadas do histórico no primeiro uso; a
+  montagem do contexto não lê o banco depois disso
+- Identificar o autor de cada pergunta no conteúdo ("Ana: ...")
+- Gravar as mensagens novas em lotes, em background, cada turno com o autor
+  da pergunta: /limpar, /stats e /buscar alcançam as mensagens de cada um,
+  e a carga lê as do canal inteiro (idx_channel_created)
+- Descartar o contexto em memória de um canal depois de um /limpar
+- Limitar os canais mantidos em memória (SHARED_CONTEXT_MAX_CHANNELS)
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from config import settings
+from conversation_queue import ChaveConversa
+from logger import logger
+from metrics import metrics
+from storage import NovaMensagem, Storage
+
+# Mensagens pendentes que antecipam a gravação
+BATCH_SIZE = 50
+
+
+@dataclass
+class _Canal:
+    mensagens: deque[dict[str, str]]
+    carregado: bool = False
+    trava: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ContextoCanal:
+    """Ring buffer do contexto de cada canal compartilhado, gravado em lotes."""
+
+    def __init__(
+        self,
+        storage: Storage,
+        tamanho: int | None = None,
+        max_canais: int | None = None,
+        flush_interval: float | None = None,
+    ):
+        """
+        Inicializa o contexto (valores None usam as configurações).
+
+        Args:
+            storage: Backend do histórico
+            tamanho: Mensagens mantidas por canal
+            max_canais: Canais mantidos em memória
+            flush_interval: Intervalo máximo entre gravações em segundos
+        """
+        self.storage = storage
+        self.tamanho = tamanho or settings.shared_context_messages
+        self.max_canais = max_canais or settings.shared_context_max_channels
+        self.flush_interval = flush_interval or settings.shared_context_flush_interval_seconds
+        self._canais: OrderedDict[int, _Canal] = OrderedDict()
+        # (channel_id, user_id, mensagem), na ordem de chegada
+        self._pendentes: list[tuple[int, int, NovaMensagem]] = []
+        # Uma carga não pode ler o banco enquanto um lote sai de _pendentes e
+        # ainda não foi gravado: as mensagens não estariam em nenhum dos dois
+        self._gravacao = asyncio.Lock()
+        self._lote_cheio: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def compartilhado(channel_id: int) -> bool:
+        """Indica se o canal usa o contexto compartilhado."""
+        return channel_id in settings.shared_context_channel_ids
+
+    @classmethod
+    def chave_conversa(cls, user_id: int, channel_id: int) -> ChaveConversa:
+        """
+        Chave da fila de turnos (conversation_queue): num canal compartilhado o
+        contexto é um só, então os turnos de todos os autores esperam a vez
+        juntos em vez de lerem e gravarem o contexto em paralelo.
+        """
+        if cls.compartilhado(channel_id):
+            return (0, channel_id)  # IDs do Discord nunca são 0
+        return (user_id, channel_id)
+
+    @staticmethod
+    def formatar_pergunta(autor: str, conteudo: str) -> str:
+        """Identifica o autor da pergunta para a IA e para o histórico do canal."""
+        return f"{autor}: {conteudo}"
+
+    @property
+    def pendentes(self) -> int:
+        """Mensagens ainda não gravadas."""
+        return len(self._pendentes)
+
+    async def contexto(self, channel_id: int) -> list[dict[str, str]]:
+        """
+        Retorna o contexto do canal no formato da API OpenAI.
+
+        Args:
+            channel_id: ID do canal compartilhado
+
+        Returns:
+            Últimas mensagens do canal, da mais antiga para a mais recente
+        """
+        canal = self._obter(channel_id)
+        if not canal.carregado:
+            async with canal.trava:
+                if not canal.carregado:
+                    await self._carregar(channel_id, canal)
+        else:
+            metrics.incr("shared_context_hits")
+        return list(canal.mensagens)
+
+    def registrar(self, channel_id: int, user_id: int, mensagens: list[NovaMensagem]) -> None:
+        """
+        Acrescenta um turno ao contexto do canal (a gravação ocorre em background).
+
+        Args:
+            channel_id: ID do canal compartilhado
+            user_id: Autor da pergunta, dono das mensagens do turno no histórico
+            mensagens: Lista de (role, content, tokens), na ordem da conversa
+        """
+        canal = self._canais.get(channel_id)
+        for role, content, tokens in mensagens:
+            if canal is not None and canal.carregado:
+                canal.mensagens.append({"role": role, "content": content})
+            self._pendentes.append((channel_id, user_id, (role, content, tokens)))
+        if len(self._pendentes) >= BATCH_SIZE and self._lote_cheio is not None:
+            self._lote_cheio.set()
+
+    async def flush(self) -> int:
+        """
+        Grava as mensagens pendentes, uma transação por sequência de turnos
+        do mesmo autor no mesmo canal (mantém a ordem do canal no banco).
+
+        Em caso de erro as mensagens da sequência que falhou (e das seguintes)
+        voltam para a fila e a próxima gravação tenta novamente.
+
+        Returns:
+            Número de mensagens gravadas
+        """
+        async with self._gravacao:
+            return await self._gravar()
+
+    async def _gravar(self) -> int:
+        lote, self._pendentes = self._pendentes, []
+        # Sequências consecutivas do mesmo (canal, autor): gravar por autor
+        # fora de ordem trocaria a ordem das perguntas no histórico do canal
+        sequencias: list[list[tuple[int, int, NovaMensagem]]] = []
+        for item in lote:
+            if sequencias and sequencias[-1][0][:2] == item[:2]:
+                sequencias[-1].append(item)
+            else:
+                sequencias.append([item])
+
+        gravadas = 0
+        for i, sequencia in enumerate(sequencias):
+            channel_id, user_id, _ = sequencia[0]
+            try:
+                await self.storage.add_messages(
+                    user_id, channel_id, [mensagem for _, _, mensagem in sequencia]
+                )
+            except Exception:
+                self._pendentes[:0] = [item for s in sequencias[i:] for item in s]
+                raise
+            gravadas += len(sequencia)
+        if gravadas:
+            metrics.incr("shared_context_messages_written", gravadas)
+        return gravadas
+
+    def iniciar(self) -> None:
+        """Inicia a gravação periódica em background."""
+        if self._task is None or self._task.done():
+            self._lote_cheio = asyncio.Event()
+            self._task = asyncio.create_task(self._loop(), name="shared-context")
+
+    async def parar(self) -> None:
+        """Cancela o loop em background e grava o que estiver pendente."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def descartar(self, channel_id: int) -> None:
+        """
+        Tira o canal da memória: o próximo uso recarrega o contexto do banco.
+
+        Chamado pelo /limpar (depois de flush() e da remoção), para que as
+        mensagens apagadas saiam também do contexto.
+
+        Args:
+            channel_id: ID do canal compartilhado
+        """
+        self._canais.pop(channel_id, None)
+        metrics.gauge("shared_context_channels", len(self._canais))
+
+    async def _loop(self) -> None:
+        assert self._lote_cheio is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._lote_cheio.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._lote_cheio.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(
+                    "Erro ao gravar o contexto compartilhado",
+                    extra={"pending": self.pendentes, "error": str(e)},
+                )
+
+    async def _carregar(self, channel_id: int, canal: _Canal) -> None:
+        async with self._gravacao:
+            historico = await self.storage.get_channel_history(channel_id, self.tamanho)
+            canal.mensagens.extend(m.to_openai_format() for m in historico)
+            # Turnos registrados e ainda não gravados são mais novos que o histórico
+            canal.mensagens.extend(
+                {"role": role, "content": content}
+                for c, _, (role, content, _) in self._pendentes
+                if c == channel_id
+            )
+            canal.carregado = True
+        metrics.incr("shared_context_loads")
+
+    def _obter(self, channel_id: int) -> _Canal:
+        canal = self._canais.get(channel_id)
+        if canal is not None:
+            self._canais.move_to_end(channel_id)
+            return canal
+
+        canal = self._canais[channel_id] = _Canal(deque(maxlen=self.tamanho))
+        if len(self._canais) > self.max_canais:
+            # O canal mais antigo volta a ser carregado do banco no próximo uso
+            self._canais.popitem(last=False)
+        metrics.gauge("shared_context_channels", len(self._canais))
+        return canal
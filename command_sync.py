@@ -0,0 +1,129 @@
+"""
+Sincronização de slash commands do Sherlock Bot.
+
+O discord.py dispara on_ready a cada reconexão, e chamar tree.sync() em todas
+elas gasta chamadas de API e arrisca o rate limit global de comandos. Este
+módulo calcula um hash do command tree local e só sincroniza quando ele muda
+em relação ao último hash persistido no banco.
+"""
+
+import asyncio
+import hashlib
+import json
+
+import discord
+from discord import app_commands
+
+from database import get_command_sync_hash, set_command_sync_hash
+from logger import logger
+
+
+def calcular_hash_arvore(
+    tree: app_commands.CommandTree,
+    guild: discord.abc.Snowflake | None = None,
+) -> str:
+    """
+    Calcula um hash estável do payload de comandos que seria enviado ao Discord.
+
+    Args:
+        tree: Command tree do bot
+        guild: Guild do escopo (None para comandos globais)
+
+    Returns:
+        Hash SHA-256 hexadecimal do payload
+    """
+    payload = sorted(
+        (cmd.to_dict(tree) for cmd in tree.get_commands(guild=guild)),
+        key=lambda cmd: (cmd.get("type", 1), cmd["name"]),
+    )
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class CommandSyncManager:
+    """Sincroniza o command tree apenas quando ele muda, fora do caminho crítico."""
+
+    def __init__(self, tree: app_commands.CommandTree, dev_guild_id: int | None = None):
+        """
+        Inicializa o gerenciador.
+
+        Args:
+            tree: Command tree do bot
+            dev_guild_id: Se definido, sincroniza só nesta guild (desenvolvimento)
+        """
+        self.tree = tree
+        self.dev_guild_id = dev_guild_id
+        self._task: asyncio.Task | None = None
+
+    @property
+    def guild(self) -> discord.Object | None:
+        """Guild alvo da sincronização (None para global)."""
+        return discord.Object(id=self.dev_guild_id) if self.dev_guild_id else None
+
+    @property
+    def scope(self) -> str:
+        """Chave do escopo persistido (inclui application_id e guild)."""
+        app_id = self.tree.client.application_id
+        if self.dev_guild_id:
+            return f"guild:{self.dev_guild_id}:{app_id}"
+        return f"global:{app_id}"
+
+    async def sync(self, force: bool = False) -> bool:
+        """
+        Sincroniza o command tree se o hash local mudou.
+
+        Args:
+            force: Sincroniza mesmo que o hash seja igual ao persistido
+
+        Returns:
+            True se sincronizou, False se a sincronização foi pulada
+        """
+        guild = self.guild
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+
+        tree_hash = calcular_hash_arvore(self.tree, guild)
+        scope = self.scope
+        stored_hash = await asyncio.to_thread(get_command_sync_hash, scope)
+
+        if not force and stored_hash == tree_hash:
+            logger.info(
+                "Slash commands inalterados, sincronização pulada",
+                extra={"scope": scope, "tree_hash": tree_hash[:12]},
+            )
+            return False
+
+        synced = await self.tree.sync(guild=guild)
+        await asyncio.to_thread(set_command_sync_hash, scope, tree_hash)
+        logger.info(
+            "Slash commands sincronizados",
+            extra={
+                "scope": scope,
+                "count": len(synced),
+                "commands": [cmd.name for cmd in synced],
+            },
+        )
+        return True
+
+    def agendar(self) -> None:
+        """
+        Agenda a sincronização em background, uma vez por processo.
+
+        Chamadas repetidas (ex.: on_ready em reconexões) são ignoradas enquanto a
+        sincronização estiver em andamento ou já tiver sido concluída com sucesso.
+        """
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._executar(), name="command-sync")
+
+    async def _executar(self) -> None:
+        """Executa a sincronização registrando erros sem derrubar o bot."""
+        try:
+            await self.sync()
+        except Exception as e:
+            # Permite nova tentativa no próximo on_ready
+            self._task = None
+            logger.error(
+                "Erro ao sincronizar comandos",
+                extra={"error": str(e)},
+            )
@@ -0,0 +1,167 @@
+"""
+Serialização de turnos por conversa (usuário + canal).
+
+Sem ela, duas menções rápidas do mesmo usuário rodam processar_ia em
+paralelo: as duas leem o mesmo contexto (sem a pergunta uma da outra), pagam
+duas chamadas à IA e gravam o histórico intercalado.
+
+Responsável por:
+- Executar no máximo um turno por vez em cada conversa (user_id, channel_id),
+  na ordem de chegada; conversas diferentes continuam em paralelo
+- Opcionalmente (CONVERSATION_MERGE_MESSAGES) mesclar as mensagens que chegam
+  enquanto um turno espera a vez em uma única chamada à IA
+- Opcionalmente (DM_DEBOUNCE_MS) esperar uma pausa nas mensagens de uma DM e
+  responder tudo o que chegou nesse intervalo com uma única chamada à IA
+- Manter a tabela de conversas limitada (CONVERSATION_MAX_TRACKED), removendo
+  primeiro as ociosas usadas há mais tempo
+- Métricas: conversation_waits, conversation_wait_ms, conversation_merged,
+  conversation_turn_messages e conversation_tracked
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractAsyncContextManager, nullcontext
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+from config import settings
+from metrics import metrics
+
+T = TypeVar("T")
+
+ChaveConversa = tuple[int, int]
+
+# Teto do debounce, em janelas: quem não para de digitar ainda recebe resposta
+MAX_DEBOUNCE_WINDOWS = 5
+
+
+@dataclass
+class _Turno:
+    """Turno aguardando a vez; mensagens novas da conversa podem entrar nele."""
+
+    partes: list[str]
+    ultima: float  # chegada da mensagem mais recente (time.monotonic)
+
+
+@dataclass
+class _Conversa:
+    trava: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pendente: _Turno | None = None
+    ativos: int = 0  # turnos em execução ou aguardando
+
+
+class FilaConversas:
+    """Executa os turnos de cada conversa um de cada vez."""
+
+    def __init__(self, max_conversas: int | None = None, mesclar: bool | None = None):
+        """
+        Inicializa a fila (valores None usam as configurações).
+
+        Args:
+            max_conversas: Conversas mantidas na tabela (as ocupadas nunca saem)
+            mesclar: Mesclar mensagens que chegam enquanto um turno espera a vez
+        """
+        self.max_conversas = max_conversas or settings.conversation_max_tracked
+        self.mesclar = settings.conversation_merge_messages if mesclar is None else mesclar
+        self._conversas: OrderedDict[ChaveConversa, _Conversa] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._conversas)
+
+    async def executar(
+        self,
+        chave: ChaveConversa,
+        conteudo: str,
+        processar: Callable[[str], Awaitable[T]],
+        mesclavel: bool = True,
+        espera: float = 0.0,
+        indicador: AbstractAsyncContextManager | None = None,
+    ) -> T | None:
+        """
+        Executa `processar(conteudo)` depois dos turnos anteriores da conversa.
+
+        Se houver um turno da conversa aceitando mensagens (esperando a vez com
+        a mesclagem ligada, ou na janela de `espera`), `conteudo` é acrescentado
+        a ele e nada é executado aqui.
+
+        Args:
+            chave: (user_id, channel_id)
+            conteudo: Mensagem do usuário
+            processar: Corrotina que responde ao conteúdo (final) do turno
+            mesclavel: False para turnos que precisam de resposta própria
+                (ex.: /ia, cuja interação exige um followup)
+            espera: Segundos sem mensagens novas antes de responder (debounce);
+                as que chegarem nesse intervalo entram no turno
+            indicador: Context manager mantido aberto só pelo turno que
+                responde (ex.: channel.typing()), da chegada até a resposta
+
+        Returns:
+            Resultado de `processar`, ou None se a mensagem foi mesclada em
+            outro turno (que responderá por ela)
+        """
+        conversa = self._obter(chave)
+        if mesclavel and conversa.pendente is not None:
+            conversa.pendente.partes.append(conteudo)
+            conversa.pendente.ultima = time.monotonic()
+            metrics.incr("conversation_merged")
+            return None
+
+        turno = _Turno([conteudo], time.monotonic())
+        conversa.ativos += 1
+        inicio = time.perf_counter()
+        try:
+            if conversa.trava.locked():
+                metrics.incr("conversation_waits")
+            if mesclavel and (espera > 0 or (self.mesclar and conversa.trava.locked())):
+                conversa.pendente = turno
+            async with indicador or nullcontext():
+                if espera > 0:
+                    await self._aguardar_silencio(turno, espera)
+                async with conversa.trava:
+                    # A partir daqui o contexto já foi lido: nada mais entra no turno
+                    if conversa.pendente is turno:
+                        conversa.pendente = None
+                    metrics.observe("conversation_wait_ms", (time.perf_counter() - inicio) * 1000)
+                    metrics.observe("conversation_turn_messages", len(turno.partes))
+                    return await processar("\n".join(turno.partes))
+        finally:
+            if conversa.pendente is turno:
+                conversa.pendente = None
+            conversa.ativos -= 1
+
+    @staticmethod
+    async def _aguardar_silencio(turno: _Turno, espera: float) -> None:
+        """Dorme até `espera` segundos sem mensagens novas no turno (com teto)."""
+        limite = turno.ultima + espera * MAX_DEBOUNCE_WINDOWS
+        while (resta := min(turno.ultima + espera, limite) - time.monotonic()) > 0:
+            await asyncio.sleep(resta)
+
+    def _obter(self, chave: ChaveConversa) -> _Conversa:
+        conversa = self._conversas.get(chave)
+        if conversa is not None:
+            self._conversas.move_to_end(chave)
+            return conversa
+
+        conversa = self._conversas[chave] = _Conversa()
+        if len(self._conversas) > self.max_conversas:
+            self._podar(manter=chave)
+        metrics.gauge("conversation_tracked", len(self._conversas))
+        return conversa
+
+    def _podar(self, manter: ChaveConversa) -> None:
+        """Remove as conversas ociosas usadas há mais tempo até caber no limite."""
+        excesso = len(self._conversas) - self.max_conversas
+        ociosas: list[ChaveConversa] = []
+        for chave, conversa in self._conversas.items():
+            if len(ociosas) == excesso or chave == manter:
+                break
+            if conversa.ativos == 0:
+                ociosas.append(chave)
+        for chave in ociosas:
+            del self._conversas[chave]
+
+
+# Singleton global
+fila_conversas = FilaConversas()
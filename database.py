@@ -4,14 +4,18 @@ Módulo de banco de dados SQLite para histórico de conversas.
 Armazena mensagens por usuário/canal com contexto para IA.
 """
 
+import re
 import sqlite3
+import time
 from collections.abc import Generator
 from contextlib import contextmanager
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any
 
 from config import settings
 from logger import logger
+from migrations import INT_TO_ROLE, ROLE_TO_INT, migrate
 
 
 @dataclass
@@ -30,11 +34,50 @@ class Message:
         return {"role": self.role, "content": self.content}
 
 
+@dataclass
+class SearchHit:
+    """Mensagem encontrada pela busca textual."""
+
+    message: Message
+    snippet: str  # trecho com os termos encontrados em **negrito**
+
+
+# Termos de busca: palavras (letras/dígitos) de pelo menos 2 caracteres
+_SEARCH_TERM_RE = re.compile(r"\w{2,}")
+
+# Flags de usage_ledger.flags
+USAGE_FLAG_CACHE_HIT = 1  # parte do prompt veio do cache do provedor
+USAGE_FLAG_HEDGED = 2  # resposta veio de uma requisição duplicada (hedge)
+
+# Duração de um bucket de usage_hourly em milissegundos
+HOUR_MS = 3_600_000
+
+# Aproximação de caracteres por token (cotas e orçamento de contexto)
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class UsageRecord:
+    """Uso de tokens e latência de uma resposta da IA."""
+
+    user_id: int
+    channel_id: int
+    model: str
+    tokens_prompt: int
+    tokens_completion: int
+    tokens_cached: int
+    latency_ms: int
+    flags: int = 0
+    created_at: int = field(default_factory=lambda: now_epoch_ms())  # epoch-ms
+
+
 def parse_datetime(dt_str: str) -> datetime:
     """
-    Converte string de data do banco para objeto datetime de forma robusta.
+    Converte string de data para objeto datetime de forma robusta.
 
-    Tenta múltiplos formatos comuns do SQLite.
+    Tenta múltiplos formatos comuns do SQLite. Desde o schema v2 o banco guarda
+    epoch-ms (ver from_epoch_ms); esta função atende timestamps em texto de
+    bancos antigos e arquivos importados.
     """
     formats = [
         "%Y-%m-%d %H:%M:%S.%f",  # ISO com microsegundos
@@ -59,12 +102,46 @@ def parse_datetime(dt_str: str) -> datetime:
     raise ValueError(f"Não foi possível parsear a data: {dt_str}")
 
 
+def _row_to_message(row: sqlite3.Row) -> Message:
+    """Converte uma linha da tabela messages em Message."""
+    return Message(
+        id=row["id"],
+        user_id=row["user_id"],
+        channel_id=row["channel_id"],
+        role=INT_TO_ROLE[row["role"]],
+        content=row["content"],
+        created_at=from_epoch_ms(row["created_at"]),
+    )
+
+
+def to_epoch_ms(dt: datetime) -> int:
+    """Converte datetime em epoch-milissegundos (datetimes sem fuso são tratados como UTC)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return int(dt.timestamp() * 1000)
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    """Converte epoch-milissegundos (formato de messages.created_at) em datetime UTC."""
+    return datetime.fromtimestamp(ms / 1000, UTC)
+
+
+def now_epoch_ms() -> int:
+    """Instante atual em epoch-milissegundos."""
+    return time.time_ns() // 1_000_000
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa grosseira de tokens de um texto."""
+    return len(texto) // CHARS_PER_TOKEN + 1
+
+
 @contextmanager
 def get_connection() -> Generator[sqlite3.Connection, None, None]:
     """Context manager para conexão com o banco."""
     conn = None
     try:
-        conn = sqlite3.connect(str(settings.db_path))
+        conn = sqlite3.connect(str(settings.db_path), timeout=settings.db_busy_timeout_seconds)
         conn.row_factory = sqlite3.Row
         yield conn
         conn.commit()
@@ -97,23 +174,20 @@ def init_db() -> None:
     )
     try:
         with get_connection() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    channel_id INTEGER NOT NULL,
-                    role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
-                    content TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            # Índice para busca rápida por usuário/canal
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_user_channel
-                ON messages(user_id, channel_id, created_at DESC)
-            """)
+            # Deve vir antes da criação das tabelas: só tem efeito em bancos novos
+            # (os antigos são convertidos pela migração v8). Permite devolver
+            # páginas livres aos poucos (PRAGMA incremental_vacuum)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL permite leitores concorrentes com um escritor, necessário quando
+            # vários processos (shards) compartilham o mesmo arquivo
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Criação e evolução do schema (versionado em PRAGMA user_version)
+            version = migrate(conn)
             # Commit é feito automaticamente pelo context manager
-        logger.info("Banco de dados inicializado com sucesso")
+        logger.info(
+            "Banco de dados inicializado com sucesso",
+            extra={"schema_version": version},
+        )
     except Exception as e:
         logger.error(
             "Erro ao inicializar banco de dados",
@@ -122,7 +196,7 @@ def init_db() -> None:
         raise
 
 
-def add_message(user_id: int, channel_id: int, role: str, content: str) -> int:
+def add_message(user_id: int, channel_id: int, role: str, content: str, tokens: int = 0) -> int:
     """
     Adiciona uma mensagem ao histórico.
 
@@ -131,6 +205,7 @@ def add_message(user_id: int, channel_id: int, role: str, content: str) -> int:
         channel_id: ID do canal (ou DM)
         role: "user" ou "assistant"
         content: Conteúdo da mensagem
+        tokens: Tokens consumidos por esta mensagem (somados em user_stats)
 
     Returns:
         ID da mensagem inserida
@@ -146,10 +221,10 @@ def add_message(user_id: int, channel_id: int, role: str, content: str) -> int:
         with get_connection() as conn:
             cursor = conn.execute(
                 """
-                INSERT INTO messages (user_id, channel_id, role, content)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO messages (user_id, channel_id, role, content, created_at, tokens)
+                VALUES (?, ?, ?, ?, ?, ?)
                 """,
-                (user_id, channel_id, role, content),
+                (user_id, channel_id, ROLE_TO_INT[role], content, now_epoch_ms(), tokens),
             )
             # Commit é feito automaticamente pelo context manager
 
@@ -181,6 +256,63 @@ def add_message(user_id: int, channel_id: int, role: str, content: str) -> int:
         raise
 
 
+def add_messages(
+    user_id: int,
+    channel_id: int,
+    messages: list[tuple[str, str, int]],
+) -> list[int]:
+    """
+    Adiciona várias mensagens de uma conversa em uma única transação.
+
+    Usado para gravar pergunta e resposta juntas (um commit em vez de dois).
+
+    Args:
+        user_id: ID do usuário Discord
+        channel_id: ID do canal (ou DM)
+        messages: Lista de (role, content, tokens), na ordem da conversa
+
+    Returns:
+        IDs das mensagens inseridas, na mesma ordem
+
+    Raises:
+        ValueError: Se algum role for inválido
+    """
+    for role, _, _ in messages:
+        if role not in ROLE_TO_INT:
+            raise ValueError(f"Role inválido: {role}. Deve ser 'user' ou 'assistant'.")
+
+    created_at = now_epoch_ms()
+    try:
+        with get_connection() as conn:
+            ids = [
+                conn.execute(
+                    """
+                    INSERT INTO messages (user_id, channel_id, role, content, created_at, tokens)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (user_id, channel_id, ROLE_TO_INT[role], content, created_at, tokens),
+                ).lastrowid
+                for role, content, tokens in messages
+            ]
+
+        logger.debug(
+            "Mensagens inseridas",
+            extra={"user_id": user_id, "channel_id": channel_id, "message_ids": ids},
+        )
+        return ids  # type: ignore[return-value]
+    except Exception as e:
+        logger.error(
+            "Erro ao inserir mensagens",
+            extra={
+                "user_id": user_id,
+                "channel_id": channel_id,
+                "messages": len(messages),
+                "error": str(e),
+            },
+        )
+        raise
+
+
 def get_conversation_history(
     user_id: int,
     channel_id: int,
@@ -214,20 +346,7 @@ def get_conversation_history(
             ).fetchall()
 
         # Converter para objetos Message e inverter ordem (mais antiga primeiro)
-        messages = []
-        for row in reversed(rows):
-            created_at = parse_datetime(row["created_at"])
-
-            messages.append(
-                Message(
-                    id=row["id"],
-                    user_id=row["user_id"],
-                    channel_id=row["channel_id"],
-                    role=row["role"],
-                    content=row["content"],
-                    created_at=created_at,
-                )
-            )
+        messages = [_row_to_message(row) for row in reversed(rows)]
 
         logger.debug(
             "Histórico recuperado",
@@ -251,6 +370,41 @@ def get_conversation_history(
         raise
 
 
+def get_channel_history(channel_id: int, limit: int) -> list[Message]:
+    """
+    Recupera as mensagens mais recentes de um canal, de todos os usuários.
+
+    Usado pelos canais com contexto compartilhado, em que cada mensagem fica
+    com o autor da pergunta.
+
+    Args:
+        channel_id: ID do canal
+        limit: Número máximo de mensagens
+
+    Returns:
+        Lista de mensagens ordenadas da mais antiga para a mais recente
+    """
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, user_id, channel_id, role, content, created_at
+                FROM messages
+                WHERE channel_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                """,
+                (channel_id, limit),
+            ).fetchall()
+        return [_row_to_message(row) for row in reversed(rows)]
+    except Exception as e:
+        logger.error(
+            "Erro ao recuperar histórico do canal",
+            extra={"channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+
 def get_context_messages(user_id: int, channel_id: int) -> list[dict[str, str]]:
     """
     Retorna mensagens formatadas para API OpenAI.
@@ -314,33 +468,49 @@ def clear_user_history(user_id: int, channel_id: int | None = None) -> int:
         raise
 
 
-def get_user_stats(user_id: int) -> dict[str, int]:
+def get_user_stats(user_id: int) -> dict[str, Any]:
     """
     Retorna estatísticas do usuário.
 
+    Lê a linha de user_stats, mantida por triggers a cada inserção/remoção
+    em messages (custo constante, independente do tamanho do histórico).
+
     Args:
         user_id: ID do usuário Discord
 
     Returns:
-        Dict com total_messages e total_channels
+        Dict com total_messages, total_channels, total_tokens e
+        last_active_at (datetime UTC ou None se não houver histórico)
     """
     try:
         with get_connection() as conn:
             row = conn.execute(
                 """
-                SELECT
-                    COUNT(*) as total_messages,
-                    COUNT(DISTINCT channel_id) as total_channels
-                FROM messages
+                SELECT total_messages, total_channels, total_tokens, last_active_at
+                FROM user_stats
                 WHERE user_id = ?
                 """,
                 (user_id,),
             ).fetchone()
 
-        stats = {
-            "total_messages": row["total_messages"],
-            "total_channels": row["total_channels"],
-        }
+        if row is None:
+            stats: dict[str, Any] = {
+                "total_messages": 0,
+                "total_channels": 0,
+                "total_tokens": 0,
+                "last_active_at": None,
+            }
+        else:
+            stats = {
+                "total_messages": row["total_messages"],
+                "total_channels": row["total_channels"],
+                "total_tokens": row["total_tokens"],
+                "last_active_at": (
+                    from_epoch_ms(row["last_active_at"])
+                    if row["last_active_at"] is not None
+                    else None
+                ),
+            }
 
         logger.debug(
             "Estatísticas recuperadas",
@@ -360,5 +530,654 @@ def get_user_stats(user_id: int) -> dict[str, int]:
         raise
 
 
+def build_fts_query(text: str, any_term: bool = False) -> str | None:
+    """
+    Converte texto livre em uma expressão FTS5 segura.
+
+    Cada palavra vira uma frase entre aspas, então operadores e sintaxe do
+    FTS5 digitados pelo usuário são tratados como texto.
+
+    Args:
+        text: Texto digitado pelo usuário
+        any_term: Se True, basta um dos termos (OR); senão todos (AND)
+
+    Returns:
+        Expressão para MATCH, ou None se não houver termos pesquisáveis
+    """
+    terms = list(dict.fromkeys(t.lower() for t in _SEARCH_TERM_RE.findall(text)))
+    if not terms:
+        return None
+    return (" OR " if any_term else " AND ").join(f'"{t}"' for t in terms)
+
+
+def search_messages(
+    user_id: int,
+    query: str,
+    limit: int,
+    offset: int = 0,
+    channel_id: int | None = None,
+    any_term: bool = False,
+) -> list[SearchHit]:
+    """
+    Busca no histórico de um usuário, das mensagens mais relevantes (bm25) para as menos.
+
+    Args:
+        user_id: ID do usuário Discord (a busca nunca cruza usuários)
+        query: Texto livre a buscar
+        limit: Máximo de resultados
+        offset: Resultados a pular (paginação)
+        channel_id: Se definido, busca apenas neste canal
+        any_term: Se True, basta um dos termos aparecer
+
+    Returns:
+        Lista de resultados (vazia se a consulta não tiver termos)
+    """
+    fts_query = build_fts_query(query, any_term)
+    if fts_query is None:
+        return []
+
+    match = f'user_id:"{int(user_id)}"'
+    if channel_id is not None:
+        match += f' AND channel_id:"{int(channel_id)}"'
+    match += f" AND ({fts_query})"
+
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT
+                    m.id, m.user_id, m.channel_id, m.role, m.content, m.created_at,
+                    snippet(messages_fts, 0, '**', '**', '…', 16) AS snippet
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+                """,
+                (match, limit, offset),
+            ).fetchall()
+        return [SearchHit(_row_to_message(row), row["snippet"]) for row in rows]
+    except Exception as e:
+        logger.error(
+            "Erro na busca textual",
+            extra={"user_id": user_id, "channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+
+def get_turns(user_id: int, channel_id: int, message_ids: list[int]) -> list[Message]:
+    """
+    Retorna as mensagens indicadas junto com o par de cada uma (pergunta/resposta).
+
+    Pergunta e resposta são gravadas juntas (IDs consecutivos), então o turno
+    de uma mensagem é ela mais a vizinha anterior ou seguinte da mesma conversa.
+
+    Args:
+        user_id: ID do usuário Discord
+        channel_id: ID do canal
+        message_ids: IDs das mensagens de interesse
+
+    Returns:
+        Mensagens dos turnos em ordem cronológica, sem repetições
+    """
+    ids = turn_candidate_ids(message_ids)
+    if not ids:
+        return []
+    placeholders = ", ".join("?" * len(ids))
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT id, user_id, channel_id, role, content, created_at
+                FROM messages
+                WHERE id IN ({placeholders}) AND user_id = ? AND channel_id = ?
+                ORDER BY id
+                """,
+                (*ids, user_id, channel_id),
+            ).fetchall()
+    except Exception as e:
+        logger.error(
+            "Erro ao recuperar turnos",
+            extra={"user_id": user_id, "channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+    return pair_turns([_row_to_message(row) for row in rows], message_ids)
+
+
+def turn_candidate_ids(message_ids: list[int]) -> list[int]:
+    """IDs das mensagens e de suas vizinhas (candidatas a par do turno)."""
+    return sorted({i + d for i in message_ids for d in (-1, 0, 1)})
+
+
+def pair_turns(candidates: list[Message], message_ids: list[int]) -> list[Message]:
+    """
+    Monta os turnos das mensagens indicadas a partir das candidatas.
+
+    Args:
+        candidates: Mensagens com IDs em turn_candidate_ids(message_ids)
+        message_ids: IDs das mensagens de interesse
+
+    Returns:
+        Mensagens dos turnos em ordem cronológica, sem repetições
+    """
+    messages = {m.id: m for m in candidates}
+    turns: dict[int, Message] = {}
+    for message_id in set(message_ids) & messages.keys():
+        message = messages[message_id]
+        # Usuário -> resposta seguinte; assistente -> pergunta anterior
+        pair_id = message_id + 1 if message.role == "user" else message_id - 1
+        pair = messages.get(pair_id)
+        turns[message_id] = message
+        if pair is not None and pair.role != message.role:
+            turns[pair_id] = pair
+    return [turns[i] for i in sorted(turns)]
+
+
+def get_unindexed_messages(user_id: int, channel_id: int, limit: int) -> list[Message]:
+    """
+    Retorna as mensagens da conversa gravadas depois da última com vetor.
+
+    Args:
+        user_id: ID do usuário Discord
+        channel_id: ID do canal
+        limit: Máximo de mensagens (as mais recentes)
+
+    Returns:
+        Mensagens sem vetor, da mais recente para a mais antiga
+    """
+    try:
+        with get_connection() as conn:
+            (ultimo,) = conn.execute(
+                """
+                SELECT MAX(message_id) FROM message_vectors
+                WHERE user_id = ? AND channel_id = ?
+                """,
+                (user_id, channel_id),
+            ).fetchone()
+            desde = 0
+            if ultimo is not None:
+                row = conn.execute(
+                    "SELECT created_at FROM messages WHERE id = ?", (ultimo,)
+                ).fetchone()
+                desde = row["created_at"] if row else 0
+            # O filtro por created_at limita a varredura do índice às mensagens novas
+            rows = conn.execute(
+                """
+                SELECT id, user_id, channel_id, role, content, created_at
+                FROM messages
+                WHERE user_id = ? AND channel_id = ? AND created_at >= ? AND id > ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                """,
+                (user_id, channel_id, desde, ultimo or 0, limit),
+            ).fetchall()
+    except Exception as e:
+        logger.error(
+            "Erro ao recuperar mensagens sem vetor",
+            extra={"user_id": user_id, "channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+    return [_row_to_message(row) for row in rows]
+
+
+def save_message_vectors(user_id: int, channel_id: int, vectors: list[tuple[int, bytes]]) -> None:
+    """
+    Grava os vetores de mensagens de uma conversa.
+
+    Args:
+        user_id: ID do usuário Discord
+        channel_id: ID do canal
+        vectors: Lista de (message_id, vetor)
+    """
+    if not vectors:
+        return
+    try:
+        with get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO message_vectors (user_id, channel_id, message_id, vector)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(user_id, channel_id, message_id, vector) for message_id, vector in vectors],
+            )
+    except Exception as e:
+        logger.error(
+            "Erro ao gravar vetores",
+            extra={"user_id": user_id, "channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+
+def get_message_vectors(user_id: int, channel_id: int, limit: int) -> list[tuple[int, bytes]]:
+    """
+    Retorna os vetores das mensagens mais recentes de uma conversa.
+
+    Args:
+        user_id: ID do usuário Discord
+        channel_id: ID do canal
+        limit: Máximo de vetores
+
+    Returns:
+        Lista de (message_id, vetor), da mensagem mais recente para a mais antiga
+    """
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT message_id, vector FROM message_vectors
+                WHERE user_id = ? AND channel_id = ?
+                ORDER BY message_id DESC
+                LIMIT ?
+                """,
+                (user_id, channel_id, limit),
+            ).fetchall()
+    except Exception as e:
+        logger.error(
+            "Erro ao recuperar vetores",
+            extra={"user_id": user_id, "channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+    return [(row["message_id"], row["vector"]) for row in rows]
+
+
+def get_expired_messages(
+    cutoff: datetime,
+    limit: int,
+    channel_id: int | None = None,
+    exclude_channel_ids: tuple[int, ...] = (),
+) -> list[Message]:
+    """
+    Retorna um lote das mensagens mais antigas criadas antes de `cutoff`.
+
+    Args:
+        cutoff: Data limite (UTC); mensagens anteriores estão expiradas
+        limit: Tamanho máximo do lote
+        channel_id: Se definido, considera apenas este canal
+        exclude_channel_ids: Canais ignorados (possuem TTL próprio)
+
+    Returns:
+        Lista de mensagens expiradas, da mais antiga para a mais recente
+    """
+    conditions = ["created_at < ?"]
+    params: list[object] = [to_epoch_ms(cutoff)]
+    if channel_id is not None:
+        conditions.append("channel_id = ?")
+        params.append(channel_id)
+    if exclude_channel_ids:
+        placeholders = ",".join("?" * len(exclude_channel_ids))
+        conditions.append(f"channel_id NOT IN ({placeholders})")
+        params.extend(exclude_channel_ids)
+    params.append(limit)
+
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT id, user_id, channel_id, role, content, created_at
+                FROM messages
+                WHERE {" AND ".join(conditions)}
+                ORDER BY created_at, id
+                LIMIT ?
+                """,
+                params,
+            ).fetchall()
+        return [_row_to_message(row) for row in rows]
+    except Exception as e:
+        logger.error(
+            "Erro ao buscar mensagens expiradas",
+            extra={"channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+
+def get_oversized_conversations(max_messages: int) -> list[tuple[int, int]]:
+    """
+    Retorna as conversas (user_id, channel_id) com mais de `max_messages` mensagens.
+
+    Args:
+        max_messages: Máximo de mensagens mantidas por conversa
+
+    Returns:
+        Lista de tuplas (user_id, channel_id)
+    """
+    try:
+        with get_connection() as conn:
+            # conversation_stats já guarda a contagem (triggers da v3); agrupar
+            # messages aqui faria cada ciclo crescer com o tamanho da tabela
+            rows = conn.execute(
+                """
+                SELECT user_id, channel_id
+                FROM conversation_stats
+                WHERE message_count > ?
+                """,
+                (max_messages,),
+            ).fetchall()
+        return [(row["user_id"], row["channel_id"]) for row in rows]
+    except Exception as e:
+        logger.error(
+            "Erro ao buscar conversas acima do limite",
+            extra={"max_messages": max_messages, "error": str(e)},
+        )
+        raise
+
+
+def get_overflow_messages(
+    user_id: int,
+    channel_id: int,
+    keep: int,
+    limit: int,
+) -> list[Message]:
+    """
+    Retorna um lote das mensagens de uma conversa além das `keep` mais recentes.
+
+    Args:
+        user_id: ID do usuário Discord
+        channel_id: ID do canal
+        keep: Quantidade de mensagens recentes preservadas
+        limit: Tamanho máximo do lote
+
+    Returns:
+        Lista de mensagens excedentes (das mais recentes para as mais antigas)
+    """
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, user_id, channel_id, role, content, created_at
+                FROM messages
+                WHERE user_id = ? AND channel_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ? OFFSET ?
+                """,
+                (user_id, channel_id, limit, keep),
+            ).fetchall()
+        return [_row_to_message(row) for row in rows]
+    except Exception as e:
+        logger.error(
+            "Erro ao buscar mensagens excedentes",
+            extra={"user_id": user_id, "channel_id": channel_id, "error": str(e)},
+        )
+        raise
+
+
+def delete_messages(message_ids: list[int]) -> int:
+    """
+    Remove mensagens pelo ID em uma única transação curta.
+
+    Args:
+        message_ids: IDs das mensagens
+
+    Returns:
+        Número de mensagens removidas
+    """
+    if not message_ids:
+        return 0
+    try:
+        with get_connection() as conn:
+            cursor = conn.executemany(
+                "DELETE FROM messages WHERE id = ?",
+                ((message_id,) for message_id in message_ids),
+            )
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(
+            "Erro ao remover mensagens",
+            extra={"count": len(message_ids), "error": str(e)},
+        )
+        raise
+
+
+def incremental_vacuum(pages: int) -> int:
+    """
+    Devolve até `pages` páginas livres ao sistema de arquivos.
+
+    Só tem efeito com auto_vacuum=INCREMENTAL (bancos novos ou migrados para v8).
+
+    Args:
+        pages: Máximo de páginas liberadas nesta chamada
+
+    Returns:
+        Número de páginas livres restantes
+    """
+    try:
+        with get_connection() as conn:
+            # executescript avança o PRAGMA até o fim; execute() para no primeiro
+            # passo (o pragma não retorna colunas) e libera uma página só
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            return int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+    except Exception as e:
+        logger.error("Erro no incremental vacuum", extra={"error": str(e)})
+        raise
+
+
+def get_command_sync_hash(scope: str) -> str | None:
+    """
+    Retorna o hash do último command tree sincronizado em um escopo.
+
+    Args:
+        scope: Escopo da sincronização (ex.: "global:<app_id>")
+
+    Returns:
+        Hash persistido ou None se nunca sincronizado
+    """
+    try:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT tree_hash FROM command_sync_state WHERE scope = ?",
+                (scope,),
+            ).fetchone()
+        return row["tree_hash"] if row else None
+    except Exception as e:
+        logger.error(
+            "Erro ao ler estado de sincronização de comandos",
+            extra={"scope": scope, "error": str(e)},
+        )
+        raise
+
+
+def set_command_sync_hash(scope: str, tree_hash: str) -> None:
+    """
+    Persiste o hash do command tree sincronizado em um escopo.
+
+    Args:
+        scope: Escopo da sincronização
+        tree_hash: Hash do command tree local
+    """
+    try:
+        with get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO command_sync_state (scope, tree_hash, synced_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(scope) DO UPDATE SET
+                    tree_hash = excluded.tree_hash,
+                    synced_at = excluded.synced_at
+                """,
+                (scope, tree_hash),
+            )
+    except Exception as e:
+        logger.error(
+            "Erro ao salvar estado de sincronização de comandos",
+            extra={"scope": scope, "error": str(e)},
+        )
+        raise
+
+
+def add_usage_records(records: list[UsageRecord]) -> None:
+    """
+    Grava um lote de registros de uso e atualiza os agregados por hora.
+
+    Ledger e agregados são gravados na mesma transação; os agregados do lote
+    são somados em memória antes, resultando em um upsert por (hora, modelo).
+
+    Args:
+        records: Registros a gravar
+    """
+    if not records:
+        return
+
+    rollups: dict[tuple[int, str], list[int]] = {}
+    for r in records:
+        key = (r.created_at // HOUR_MS * HOUR_MS, r.model)
+        acc = rollups.setdefault(key, [0, 0, 0, 0, 0, 0, 0])
+        acc[0] += 1
+        acc[1] += r.tokens_prompt
+        acc[2] += r.tokens_completion
+        acc[3] += r.tokens_cached
+        acc[4] += r.latency_ms
+        acc[5] = max(acc[5], r.latency_ms)
+        acc[6] += 1 if r.flags & USAGE_FLAG_CACHE_HIT else 0
+
+    try:
+        with get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO usage_ledger (
+                    created_at, user_id, channel_id, model, tokens_prompt,
+                    tokens_completion, tokens_cached, latency_ms, flags
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        r.created_at,
+                        r.user_id,
+                        r.channel_id,
+                        r.model,
+                        r.tokens_prompt,
+                        r.tokens_completion,
+                        r.tokens_cached,
+                        r.latency_ms,
+                        r.flags,
+                    )
+                    for r in records
+                ],
+            )
+            conn.executemany(
+                """
+                INSERT INTO usage_hourly (
+                    hour, model, requests, tokens_prompt, tokens_completion,
+                    tokens_cached, latency_ms_total, latency_ms_max, cache_hits
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hour, model) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    tokens_prompt = tokens_prompt + excluded.tokens_prompt,
+                    tokens_completion = tokens_completion + excluded.tokens_completion,
+                    tokens_cached = tokens_cached + excluded.tokens_cached,
+                    latency_ms_total = latency_ms_total + excluded.latency_ms_total,
+                    latency_ms_max = MAX(latency_ms_max, excluded.latency_ms_max),
+                    cache_hits = cache_hits + excluded.cache_hits
+                """,
+                [(hour, model, *acc) for (hour, model), acc in rollups.items()],
+            )
+        logger.debug(
+            "Registros de uso gravados",
+            extra={"records": len(records), "rollups": len(rollups)},
+        )
+    except Exception as e:
+        logger.error(
+            "Erro ao gravar registros de uso",
+            extra={"records": len(records), "error": str(e)},
+        )
+        raise
+
+
+def get_usage_hourly(since: datetime) -> list[dict[str, Any]]:
+    """
+    Retorna os agregados de uso por (hora, modelo) a partir de `since`.
+
+    Args:
+        since: Início do período (UTC); a hora que o contém é incluída
+
+    Returns:
+        Lista de dicts com hour (datetime UTC), model e os totais da hora
+    """
+    since_hour = to_epoch_ms(since) // HOUR_MS * HOUR_MS
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT hour, model, requests, tokens_prompt, tokens_completion,
+                    tokens_cached, latency_ms_total, latency_ms_max, cache_hits
+                FROM usage_hourly
+                WHERE hour >= ?
+                ORDER BY hour, model
+                """,
+                (since_hour,),
+            ).fetchall()
+        return [{**dict(row), "hour": from_epoch_ms(row["hour"])} for row in rows]
+    except Exception as e:
+        logger.error(
+            "Erro ao ler agregados de uso",
+            extra={"since": since.isoformat(), "error": str(e)},
+        )
+        raise
+
+
+def get_quota_usage(since_hour: int) -> list[tuple[int, str, int, int]]:
+    """
+    Retorna o consumo das cotas a partir de uma hora.
+
+    Args:
+        since_hour: Início (epoch-ms de uma hora cheia), inclusive
+
+    Returns:
+        Lista de (hour, scope, subject_id, tokens)
+    """
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT hour, scope, subject_id, tokens
+                FROM quota_usage
+                WHERE hour >= ?
+                """,
+                (since_hour,),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+    except Exception as e:
+        logger.error(
+            "Erro ao ler consumo das cotas",
+            extra={"since_hour": since_hour, "error": str(e)},
+        )
+        raise
+
+
+def save_quota_usage(rows: list[tuple[int, str, int, int]], before_hour: int) -> None:
+    """
+    Soma o consumo das cotas ao gravado e remove as horas fora da janela.
+
+    Os valores são incrementos: vários processos (workers do launcher, hosts)
+    gravam no mesmo banco sem apagar o consumo uns dos outros.
+
+    Args:
+        rows: Lista de (hour, scope, subject_id, tokens) com o consumo da hora
+            desde a última gravação deste processo
+        before_hour: Horas anteriores a esta (epoch-ms) são removidas
+    """
+    try:
+        with get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO quota_usage (hour, scope, subject_id, tokens)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(hour, scope, subject_id)
+                DO UPDATE SET tokens = tokens + excluded.tokens
+                """,
+                rows,
+            )
+            conn.execute("DELETE FROM quota_usage WHERE hour < ?", (before_hour,))
+    except Exception as e:
+        logger.error(
+            "Erro ao gravar consumo das cotas",
+            extra={"rows": len(rows), "error": str(e)},
+        )
+        raise
+
+
 # Removida inicialização automática no import para evitar efeitos colaterais.
 # Chame database.init_db() explicitamente no ponto de entrada da aplicação.
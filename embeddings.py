@@ -0,0 +1,123 @@
+"""
+Vetores de mensagens para a recuperação de contexto por similaridade.
+
+Os vetores são bag-of-words com feature hashing: cada palavra (e cada par de
+palavras vizinhas) é mapeada por CRC32 para uma das DIMENSIONS posições, com
+sinal também derivado do hash, e o vetor é normalizado (L2). Não há modelo a
+baixar nem estado a treinar, o cálculo é local e determinístico entre
+processos, e a similaridade de cosseno é o produto escalar.
+
+Os vetores são gravados como float32 little-endian (BLOB/BYTEA). Com o NumPy
+instalado a similaridade é calculada em lote com uma multiplicação de
+matrizes; sem ele, em Python puro.
+"""
+
+import functools
+import importlib
+import math
+import re
+import sys
+import unicodedata
+import zlib
+from array import array
+from collections import Counter
+from types import ModuleType
+
+# Posições do vetor; mudar o valor invalida os vetores já gravados
+DIMENSIONS = 256
+
+
+@functools.cache
+def _numpy() -> ModuleType | None:
+    """NumPy, importado no primeiro uso: só o modo vector precisa dele."""
+    try:
+        return importlib.import_module("numpy")
+    except ImportError:  # dependência opcional: pip install "sherlock-bot[vector]"
+        return None
+
+
+# Peso dos pares de palavras vizinhas em relação às palavras isoladas
+BIGRAM_WEIGHT = 0.5
+
+_TERM_RE = re.compile(r"\w{2,}")
+
+
+def _termos(texto: str) -> list[str]:
+    """Palavras em minúsculas e sem acentos."""
+    sem_acentos = "".join(
+        c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c)
+    )
+    return _TERM_RE.findall(sem_acentos)
+
+
+def embed(texto: str) -> bytes:
+    """
+    Calcula o vetor normalizado de um texto.
+
+    Args:
+        texto: Conteúdo da mensagem ou pergunta
+
+    Returns:
+        DIMENSIONS floats float32 little-endian (zeros se não houver palavras)
+    """
+    termos = _termos(texto)
+    pesos: dict[str, float] = dict(Counter(termos))
+    for a, b in zip(termos, termos[1:], strict=False):
+        bigrama = f"{a} {b}"
+        pesos[bigrama] = pesos.get(bigrama, 0.0) + BIGRAM_WEIGHT
+
+    vetor: array[float] = array("f", bytes(4 * DIMENSIONS))
+    for termo, contagem in pesos.items():
+        h = zlib.crc32(termo.encode())
+        # Frequência sublinear: repetir uma palavra não domina o vetor
+        vetor[h % DIMENSIONS] += (1.0 + math.log(contagem)) * (1 if h & (1 << 31) else -1)
+
+    norma = math.sqrt(sum(v * v for v in vetor))
+    if norma:
+        for i in range(DIMENSIONS):
+            vetor[i] /= norma
+    if sys.byteorder != "little":
+        vetor.byteswap()
+    return vetor.tobytes()
+
+
+def _decodificar(blob: bytes) -> "array[float]":
+    vetor: array[float] = array("f", blob)
+    if sys.byteorder != "little":
+        vetor.byteswap()
+    return vetor
+
+
+def similaridades(consulta: bytes, vetores: list[bytes]) -> list[float]:
+    """
+    Similaridade de cosseno entre a consulta e cada vetor.
+
+    Vetores de outra dimensão (gravados com outro DIMENSIONS) recebem 0.
+
+    Args:
+        consulta: Vetor da pergunta (embed)
+        vetores: Vetores das mensagens
+
+    Returns:
+        Uma similaridade por vetor, na mesma ordem
+    """
+    tamanho = 4 * DIMENSIONS
+    validos = [i for i, v in enumerate(vetores) if len(v) == tamanho]
+    resultado = [0.0] * len(vetores)
+    if not validos or len(consulta) != tamanho:
+        return resultado
+
+    numpy = _numpy()
+    if numpy is not None:
+        matriz = numpy.frombuffer(b"".join(vetores[i] for i in validos), dtype="<f4")
+        matriz = matriz.reshape(len(validos), DIMENSIONS)
+        scores = (matriz @ numpy.frombuffer(consulta, dtype="<f4")).tolist()
+    else:
+        q = _decodificar(consulta)
+        scores = [
+            sum(a * b for a, b in zip(q, _decodificar(vetores[i]), strict=True)) for i in validos
+        ]
+
+    for i, score in zip(validos, scores, strict=True):
+        resultado[i] = float(score)
+    return resultado
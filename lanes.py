@@ -0,0 +1,150 @@
+"""
+Faixas de prioridade: comandos baratos nunca esperam atrás de trabalho da IA.
+
+Todos os handlers dividem o event loop, mas o gargalo sob carga é a
+capacidade de banco: as chamadas ao SQLite rodam em threads e o PostgreSQL
+tem um pool finito. Sem separação, uma rajada de /ia ocupa todas as threads
+(contexto, vetores, gravação do histórico) e um /stats espera na fila.
+
+Responsável por:
+- Classificar cada handler em uma faixa (decorator na_faixa): "rapida" para
+  comandos locais (/limpar, /stats, /buscar, /uso) e "ia" para o que chama a IA
+- Executar o trabalho de banco de cada faixa em um pool de threads próprio
+  (executar_na_faixa); LANE_FAST_DB_WORKERS threads são só da faixa rápida
+- Informar quantas conexões do pool do PostgreSQL ficam reservadas para a
+  faixa rápida (conexoes_reservadas)
+- Métricas por faixa: lane_latency_ms (handler inteiro) e lane_queue_ms
+  (espera por uma thread de banco)
+
+Trabalho fora de um handler (retenção, gravação do uso, migrações) continua
+no executor padrão do asyncio.
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+from collections.abc import Callable, Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, ParamSpec, TypeVar
+
+from config import settings
+from metrics import metrics
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class Faixa:
+    """Faixa de prioridade com pool de threads de banco próprio."""
+
+    def __init__(self, nome: str, workers: int):
+        """
+        Inicializa a faixa (o pool de threads é criado no primeiro uso).
+
+        Args:
+            nome: Nome usado nas métricas
+            workers: Threads de banco exclusivas da faixa
+        """
+        self.nome = nome
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _obter_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix=f"faixa-{self.nome}"
+            )
+        return self._executor
+
+    async def executar(self, func: Callable[..., T], *args: Any) -> T:
+        """Executa `func(*args)` em uma thread da faixa."""
+        enviado = time.perf_counter()
+
+        def rodar() -> T:
+            metrics.observe("lane_queue_ms", (time.perf_counter() - enviado) * 1000, lane=self.nome)
+            return func(*args)
+
+        contexto = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._obter_executor(), contexto.run, rodar)
+
+    def fechar(self) -> None:
+        """Encerra o pool de threads (trabalho já enviado termina normalmente)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+FAIXA_RAPIDA = Faixa("rapida", settings.lane_fast_db_workers)
+FAIXA_IA = Faixa("ia", settings.lane_ai_db_workers)
+
+
+def fechar_faixas() -> None:
+    """Encerra os pools de threads de todas as faixas."""
+    for faixa in (FAIXA_RAPIDA, FAIXA_IA):
+        faixa.fechar()
+
+
+# Faixa do handler em execução (propagada para as tarefas que ele criar)
+faixa_atual: contextvars.ContextVar[Faixa | None] = contextvars.ContextVar(
+    "faixa_atual", default=None
+)
+
+
+def na_faixa(
+    faixa: Faixa,
+) -> Callable[[Callable[P, Coroutine[Any, Any, T]]], Callable[P, Coroutine[Any, Any, T]]]:
+    """
+    Decorator que executa o handler na faixa indicada e mede sua latência.
+
+    Args:
+        faixa: FAIXA_RAPIDA ou FAIXA_IA
+
+    Returns:
+        Decorator para handlers assíncronos (preserva a assinatura)
+    """
+
+    def decorator(
+        func: Callable[P, Coroutine[Any, Any, T]],
+    ) -> Callable[P, Coroutine[Any, Any, T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            token = faixa_atual.set(faixa)
+            inicio = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                faixa_atual.reset(token)
+                metrics.observe(
+                    "lane_latency_ms",
+                    (time.perf_counter() - inicio) * 1000,
+                    lane=faixa.nome,
+                    handler=func.__name__,
+                )
+
+        return wrapper
+
+    return decorator
+
+
+async def executar_na_faixa(func: Callable[..., T], *args: Any) -> T:
+    """
+    Executa trabalho bloqueante (banco, CPU) no pool da faixa atual.
+
+    Fora de um handler classificado usa o executor padrão (asyncio.to_thread).
+    """
+    faixa = faixa_atual.get()
+    if faixa is None:
+        return await asyncio.to_thread(func, *args)
+    return await faixa.executar(func, *args)
+
+
+def conexoes_reservadas(max_size: int) -> int:
+    """
+    Conexões de um pool de `max_size` reservadas para a faixa rápida.
+
+    As demais faixas disputam no máximo `max_size - reservadas` conexões
+    (pelo menos uma).
+    """
+    return min(settings.lane_fast_db_workers, max_size - 1)
@@ -0,0 +1,223 @@
+"""
+Launcher multi-processo do Sherlock Bot.
+
+Divide os shards entre N processos worker (cada um executando bot.py em modo
+sharded com sua faixa de shards), supervisiona os workers e os reinicia em
+caso de falha. Todos compartilham o mesmo banco SQLite em modo WAL.
+
+Uso:
+    python launcher.py [--processos N] [--shards TOTAL]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+from config import settings
+from database import init_db
+from logger import configurar_log_arquivo, logger
+
+BOT_SCRIPT = Path(__file__).parent / "bot.py"
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+# Backoff entre reinícios de um worker que caiu (segundos)
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 60.0
+# Folga sobre SHUTDOWN_TIMEOUT_SECONDS antes de matar um worker que não saiu
+STOP_MARGIN_SECONDS = 5.0
+
+
+def dividir_shards(shard_count: int, processos: int) -> list[list[int]]:
+    """
+    Divide os shards em faixas contíguas, uma por processo.
+
+    Args:
+        shard_count: Total de shards
+        processos: Número de processos worker
+
+    Returns:
+        Lista de faixas de shard_ids (processos sem shards são omitidos)
+    """
+    if shard_count < 1 or processos < 1:
+        raise ValueError("shard_count e processos devem ser >= 1")
+
+    base, extra = divmod(shard_count, processos)
+    faixas = []
+    inicio = 0
+    for i in range(processos):
+        tamanho = base + (1 if i < extra else 0)
+        if tamanho:
+            faixas.append(list(range(inicio, inicio + tamanho)))
+        inicio += tamanho
+    return faixas
+
+
+async def obter_shard_count_recomendado(token: str) -> int:
+    """
+    Consulta o número de shards recomendado pelo Discord (GET /gateway/bot).
+
+    Args:
+        token: Token do bot
+
+    Returns:
+        Número recomendado de shards
+    """
+    headers = {"Authorization": f"Bot {token}"}
+    async with (
+        aiohttp.ClientSession() as session,
+        session.get(GATEWAY_BOT_URL, headers=headers) as response,
+    ):
+        response.raise_for_status()
+        data = await response.json()
+    return int(data["shards"])
+
+
+class Worker:
+    """Processo worker responsável por uma faixa de shards."""
+
+    def __init__(self, index: int, shard_ids: list[int], shard_count: int):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process: subprocess.Popen | None = None
+        self.restarts = 0
+        self.next_start = 0.0
+
+    def env(self) -> dict[str, str]:
+        """Variáveis de ambiente do worker."""
+        env = dict(os.environ)
+        env.update(
+            {
+                "SHARDING_ENABLED": "true",
+                "SHARD_COUNT": str(self.shard_count),
+                "SHARD_IDS": json.dumps(self.shard_ids),
+                "SHERLOCK_WORKER_INDEX": str(self.index),
+            }
+        )
+        return env
+
+    def start(self) -> None:
+        """Inicia o processo worker."""
+        self.process = subprocess.Popen([sys.executable, str(BOT_SCRIPT)], env=self.env())
+        logger.info(
+            "Worker iniciado",
+            extra={"worker": self.index, "pid": self.process.pid, "shard_ids": self.shard_ids},
+        )
+
+    def poll(self) -> int | None:
+        """Retorna o exit code se o processo terminou, None se ainda roda."""
+        return self.process.poll() if self.process else None
+
+
+class Launcher:
+    """Supervisiona os workers e propaga sinais de encerramento."""
+
+    def __init__(self, shard_count: int, processos: int):
+        self.workers = [
+            Worker(i, faixa, shard_count)
+            for i, faixa in enumerate(dividir_shards(shard_count, processos))
+        ]
+        self._stopping = False
+
+    def stop(self, *_: object) -> None:
+        """Encaminha SIGTERM para todos os workers."""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process and worker.poll() is None:
+                worker.process.terminate()
+
+    def run(self) -> int:
+        """Inicia e supervisiona os workers até o encerramento."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for worker in self.workers:
+            worker.start()
+
+        while True:
+            time.sleep(1)
+            if self._stopping:
+                break
+            now = time.monotonic()
+            for worker in self.workers:
+                code = worker.poll()
+                if code is None:
+                    continue
+                if worker.next_start == 0.0:
+                    backoff = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_MIN * 2**worker.restarts)
+                    worker.next_start = now + backoff
+                    logger.error(
+                        "Worker encerrou inesperadamente",
+                        extra={"worker": worker.index, "exit_code": code, "restart_in": backoff},
+                    )
+                elif now >= worker.next_start:
+                    worker.restarts += 1
+                    worker.next_start = 0.0
+                    worker.start()
+
+        self.aguardar_workers(settings.shutdown_timeout_seconds + STOP_MARGIN_SECONDS)
+        logger.info("Launcher encerrado")
+        return 0
+
+    def aguardar_workers(self, timeout: float) -> None:
+        """
+        Espera os workers saírem e mata os que passarem do prazo.
+
+        Args:
+            timeout: Prazo total, em segundos, compartilhado por todos os workers
+        """
+        prazo = time.monotonic() + timeout
+        for worker in self.workers:
+            if not worker.process:
+                continue
+            try:
+                worker.process.wait(timeout=max(prazo - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                logger.warning(
+                    "Worker não encerrou no prazo, forçando",
+                    extra={"worker": worker.index, "pid": worker.process.pid},
+                )
+                worker.process.kill()
+                worker.process.wait()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Ponto de entrada do launcher."""
+    parser = argparse.ArgumentParser(description="Launcher multi-processo do Sherlock Bot")
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=settings.launcher_processes,
+        help="Número de processos worker (padrão: LAUNCHER_PROCESSES)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=settings.shard_count,
+        help="Total de shards (padrão: SHARD_COUNT ou recomendado pelo Discord)",
+    )
+    args = parser.parse_args(argv)
+    configurar_log_arquivo()
+
+    shard_count = args.shards or asyncio.run(obter_shard_count_recomendado(settings.discord_token))
+    processos = min(args.processos, shard_count)
+    logger.info(
+        "Iniciando launcher",
+        extra={"shard_count": shard_count, "processos": processos},
+    )
+
+    # Migrações/criação de tabelas uma única vez, antes dos workers
+    init_db()
+    return Launcher(shard_count, processos).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Ciclo de vida do processo: encerramento gracioso com drenagem do trabalho em andamento.
+
+Responsável por:
+- Tratar SIGTERM/SIGINT dentro do event loop (o padrão do Python mataria o
+  processo no meio de uma geração já paga)
+- Parar de admitir trabalho novo assim que o encerramento começa
+- Aguardar o trabalho em andamento (pergunta à IA + envio da resposta +
+  gravação do histórico) até SHUTDOWN_DRAIN_SECONDS
+- Executar as etapas de encerramento registradas (gravar lotes pendentes,
+  fechar clientes e pools, desconectar do Discord), cada uma com prazo e
+  isolada das falhas das outras
+- Respeitar um prazo total (SHUTDOWN_TIMEOUT_SECONDS), que é o que o stop.sh
+  espera antes do SIGKILL
+"""
+
+import asyncio
+import inspect
+import signal
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+from config import settings
+from logger import logger
+from metrics import metrics
+
+EtapaEncerramento = Callable[[], Awaitable[object] | object]
+
+
+class CicloDeVida:
+    """Controla a admissão de trabalho e a sequência de encerramento."""
+
+    def __init__(
+        self,
+        drain_seconds: float | None = None,
+        step_seconds: float | None = None,
+        timeout_seconds: float | None = None,
+    ):
+        """
+        Inicializa o gerenciador (valores None usam as configurações).
+
+        Args:
+            drain_seconds: Prazo para o trabalho em andamento terminar
+            step_seconds: Prazo de cada etapa de encerramento
+            timeout_seconds: Prazo total do encerramento (drenagem + etapas)
+        """
+        self.drain_seconds = drain_seconds or settings.shutdown_drain_seconds
+        self.step_seconds = step_seconds or settings.shutdown_step_seconds
+        self.timeout_seconds = timeout_seconds or settings.shutdown_timeout_seconds
+        self.encerrando = False
+        self._em_andamento = 0
+        self._ocioso = asyncio.Event()
+        self._ocioso.set()
+        self._etapas: list[tuple[str, EtapaEncerramento]] = []
+        self._encerramento: asyncio.Task | None = None
+
+    @property
+    def em_andamento(self) -> int:
+        """Quantidade de trabalhos admitidos e ainda não concluídos."""
+        return self._em_andamento
+
+    @asynccontextmanager
+    async def trabalho(self) -> AsyncIterator[None]:
+        """
+        Marca um trabalho em andamento (o encerramento espera ele terminar).
+
+        Verifique `encerrando` antes de entrar: trabalho novo deve ser recusado.
+        """
+        self._em_andamento += 1
+        self._ocioso.clear()
+        try:
+            yield
+        finally:
+            self._em_andamento -= 1
+            if self._em_andamento == 0:
+                self._ocioso.set()
+
+    def ao_encerrar(self, nome: str, etapa: EtapaEncerramento) -> None:
+        """
+        Registra uma etapa de encerramento (executadas na ordem de registro).
+
+        Args:
+            nome: Nome usado nos logs
+            etapa: Função ou corrotina sem argumentos
+        """
+        self._etapas.append((nome, etapa))
+
+    def instalar_sinais(self) -> None:
+        """Faz SIGTERM e SIGINT iniciarem o encerramento no loop atual."""
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sinal, self.solicitar_encerramento, sinal.name)
+            except NotImplementedError:  # Windows
+                return
+
+    def solicitar_encerramento(self, motivo: str = "solicitado") -> None:
+        """Inicia o encerramento em background (chamadas repetidas são ignoradas)."""
+        if self._encerramento is None:
+            self._encerramento = asyncio.create_task(self.encerrar(motivo), name="encerramento")
+
+    async def encerrar(self, motivo: str = "solicitado") -> None:
+        """
+        Recusa trabalho novo, drena o trabalho em andamento e executa as etapas.
+
+        Tudo cabe em `timeout_seconds`: a drenagem e cada etapa recebem no
+        máximo o tempo que resta, e etapas que não couberem são puladas.
+
+        Args:
+            motivo: Origem do encerramento (ex.: nome do sinal), para os logs
+        """
+        self.encerrando = True
+        inicio = time.monotonic()
+        prazo = inicio + self.timeout_seconds
+        logger.info(
+            "Encerramento iniciado",
+            extra={"reason": motivo, "in_flight": self._em_andamento},
+        )
+
+        try:
+            await asyncio.wait_for(
+                self._ocioso.wait(), timeout=min(self.drain_seconds, self.timeout_seconds)
+            )
+        except TimeoutError:
+            metrics.incr("shutdown_abandoned", self._em_andamento)
+            logger.warning(
+                "Prazo de drenagem esgotado",
+                extra={"abandoned": self._em_andamento, "drain_seconds": self.drain_seconds},
+            )
+        metrics.observe("shutdown_drain_ms", (time.monotonic() - inicio) * 1000)
+
+        for nome, etapa in self._etapas:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                metrics.incr("shutdown_steps_skipped")
+                logger.warning(
+                    "Prazo do encerramento esgotado",
+                    extra={"step": nome, "timeout_seconds": self.timeout_seconds},
+                )
+                continue
+            try:
+                resultado = etapa()
+                if inspect.isawaitable(resultado):
+                    await asyncio.wait_for(resultado, timeout=min(self.step_seconds, restante))
+            except Exception as e:
+                logger.error(
+                    "Erro no encerramento",
+                    extra={"step": nome, "error": f"{type(e).__name__}: {e}"},
+                )
+
+        logger.info(
+            "Encerramento concluído",
+            extra={
+                "seconds": round(time.monotonic() - inicio, 2),
+                "metrics": metrics.snapshot(),
+            },
+        )
+
+
+# Singleton global
+ciclo_de_vida = CicloDeVida()
@@ -4,33 +4,19 @@ Logging configurado com loguru para o Sherlock Bot.
 Fornece logging estruturado, centralizado e rotacionado automaticamente.
 """
 
+import logging
 import sys
 from pathlib import Path
 
 from loguru import logger as _logger
 
+from metrics import metrics
+
 # Remove o handler padrão do loguru
 _logger.remove()
 
-# Criar diretório de logs de forma robusta
+# Diretório do handler de arquivo (None até configurar_log_arquivo)
 logs_dir: Path | None = None
-try:
-    logs_dir = Path(__file__).parent.resolve() / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-except Exception as e:
-    # Se falhar ao criar diretório de logs, usa tempfile como fallback
-    import tempfile
-
-    try:
-        logs_dir = Path(tempfile.mkdtemp(prefix="sherlock_logs_"))
-        logs_dir.mkdir(parents=True, exist_ok=True)
-    except Exception as fallback_e:
-        # Se até tempfile falhar, desabilita logging para arquivo
-        logs_dir = None
-        print(
-            f"ERRO: Não foi possível criar diretório de logs: {e}, fallback também falhou: {fallback_e}",
-            file=sys.stderr,
-        )
 
 # Handler para stderr (console)
 _logger.add(
@@ -45,8 +31,44 @@ _logger.add(
     colorize=True,
 )
 
-# Handler para arquivo com rotação (só se logs_dir for válido)
-if logs_dir is not None:
+
+def configurar_log_arquivo(diretorio: Path | None = None) -> Path | None:
+    """
+    Adiciona o handler de arquivo com rotação diária.
+
+    Chamado pelos pontos de entrada (bot.py, launcher.py) e não no import:
+    testes, benchmarks e ferramentas de linha de comando não criam diretórios
+    nem arquivos de log.
+
+    Args:
+        diretorio: Diretório dos logs (padrão: logs/ ao lado deste arquivo)
+
+    Returns:
+        Diretório usado, ou None se nenhum pôde ser criado (só console)
+    """
+    global logs_dir
+    if logs_dir is not None:
+        return logs_dir
+
+    # Criar diretório de logs de forma robusta
+    try:
+        logs_dir = diretorio or Path(__file__).parent.resolve() / "logs"
+        logs_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        # Se falhar ao criar diretório de logs, usa tempfile como fallback
+        import tempfile
+
+        try:
+            logs_dir = Path(tempfile.mkdtemp(prefix="sherlock_logs_"))
+        except Exception as fallback_e:
+            # Se até tempfile falhar, desabilita logging para arquivo
+            logs_dir = None
+            print(
+                f"ERRO: Não foi possível criar diretório de logs: {e}, fallback também falhou: {fallback_e}",
+                file=sys.stderr,
+            )
+            return None
+
     _logger.add(
         logs_dir / "sherlock_{time:YYYY-MM-DD}.log",
         format=("{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"),
@@ -55,6 +77,34 @@ if logs_dir is not None:
         retention="7 days",  # Mantém 7 dias
         compression="zip",  # Comprime logs antigos
     )
+    return logs_dir
+
+
+class _ContadorRateLimit(logging.Handler):
+    """Conta os 429 tratados internamente pelo discord.py (logados em discord.http)."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if "rate limited" in record.getMessage():
+            metrics.incr("discord_429")
+
+
+_contador_rate_limit: _ContadorRateLimit | None = None
+
+
+def configurar_log_discord() -> None:
+    """
+    Conta na métrica discord_429 os rate limits que o discord.py trata sozinho.
+
+    O discord.py espera o retry_after de um 429 internamente e só registra um
+    aviso em "discord.http"; o handler transforma esse aviso em métrica.
+    Chamado pelo bot.py junto com o arquivo de log (chamadas repetidas são
+    ignoradas).
+    """
+    global _contador_rate_limit
+    if _contador_rate_limit is None:
+        _contador_rate_limit = _ContadorRateLimit(level=logging.WARNING)
+        logging.getLogger("discord.http").addHandler(_contador_rate_limit)
+
 
 # Exportar logger para uso em outros módulos
 logger = _logger
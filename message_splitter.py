@@ -0,0 +1,256 @@
+"""
+Divisão de respostas longas para o Discord respeitando Markdown.
+
+Responsável por:
+- Dividir texto em blocos de até N caracteres sem quebrar palavras
+- Preferir quebras em parágrafos, depois linhas, frases e palavras
+- Fechar e reabrir blocos de código (```) que cruzam a divisão
+- Planejar o envio no menor número de mensagens (texto, embeds ou anexo)
+"""
+
+import io
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+import discord
+
+from config import settings
+
+# Limites do Discord
+DISCORD_MESSAGE_LIMIT = 2000
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+EMBEDS_PER_MESSAGE = 10
+
+# Espaço reservado em cada bloco para fechar/reabrir cercas de código
+_FENCE_RESERVE = 32
+_FENCE_HEADER_MAX = 20
+
+_FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+_SPACE_RE = re.compile(r"\s+")
+
+ATTACHMENT_FILENAME = "resposta.md"
+ATTACHMENT_NOTICE = "\n\n📎 Resposta completa no arquivo anexo."
+
+
+def _partes(texto: str, separador: re.Pattern[str]) -> list[str]:
+    """Divide o texto após cada separador, mantendo o separador na parte anterior."""
+    partes = []
+    inicio = 0
+    for match in separador.finditer(texto):
+        partes.append(texto[inicio : match.end()])
+        inicio = match.end()
+    if inicio < len(texto):
+        partes.append(texto[inicio:])
+    return partes
+
+
+def _agrupar(partes: list[str], limite: int) -> list[str]:
+    """Concatena partes consecutivas em pedaços de até `limite` caracteres."""
+    pedacos: list[str] = []
+    atual = ""
+    for parte in partes:
+        if atual and len(atual) + len(parte) > limite:
+            pedacos.append(atual)
+            atual = ""
+        atual += parte
+    if atual:
+        pedacos.append(atual)
+    return pedacos
+
+
+def _quebrar_linha(linha: str, limite: int) -> list[str]:
+    """Quebra uma linha longa em frases, depois palavras e, em último caso, caracteres."""
+    if len(linha) <= limite:
+        return [linha]
+
+    partes: list[str] = []
+    for frase in _partes(linha, _SENTENCE_RE):
+        if len(frase) <= limite:
+            partes.append(frase)
+            continue
+        for palavra in _partes(frase, _SPACE_RE):
+            if len(palavra) <= limite:
+                partes.append(palavra)
+            else:
+                partes.extend(palavra[i : i + limite] for i in range(0, len(palavra), limite))
+    return _agrupar(partes, limite)
+
+
+def _cabecalho_fence(linha: str, marcador: str) -> str:
+    """Linha usada para reabrir um bloco de código (ex.: ```python)."""
+    cabecalho = linha.strip()
+    return cabecalho if len(cabecalho) <= _FENCE_HEADER_MAX else marcador
+
+
+class _Divisor:
+    """Empacotador guloso de pedaços de linha em blocos com limite de tamanho."""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.blocos: list[str] = []
+        # Pedaços do bloco atual: (texto, cerca aberta após o pedaço)
+        self.pecas: list[tuple[str, tuple[str, str] | None]] = []
+        self.tamanho = 0
+        # Cerca aberta no início do bloco atual: (cabeçalho, marcador)
+        self.fence_inicial: tuple[str, str] | None = None
+        # Índice após o último fim de parágrafo fora de bloco de código
+        self.quebra_paragrafo = 0
+        self.tamanho_quebra = 0
+
+    def _custo_extra(self, fence_final: tuple[str, str] | None) -> int:
+        custo = len(self.fence_inicial[0]) + 1 if self.fence_inicial else 0
+        if fence_final:
+            custo += len(fence_final[1]) + 1
+        return custo
+
+    def adicionar(self, texto: str, fence: tuple[str, str] | None) -> None:
+        while self.pecas and self.tamanho + len(texto) + self._custo_extra(fence) > self.limite:
+            self._emitir()
+        self.pecas.append((texto, fence))
+        self.tamanho += len(texto)
+        if fence is None and texto.strip() == "" and texto.endswith("\n"):
+            self.quebra_paragrafo = len(self.pecas)
+            self.tamanho_quebra = self.tamanho
+
+    def _emitir(self) -> None:
+        # Prefere cortar no último parágrafo se isso não desperdiçar meio bloco
+        corte = len(self.pecas)
+        if self.quebra_paragrafo and self.tamanho_quebra >= self.limite // 2:
+            corte = self.quebra_paragrafo
+
+        emitidas, restantes = self.pecas[:corte], self.pecas[corte:]
+        fence_final = emitidas[-1][1]
+        self._fechar_bloco(emitidas, fence_final)
+
+        self.pecas = []
+        self.tamanho = 0
+        self.quebra_paragrafo = 0
+        self.tamanho_quebra = 0
+        self.fence_inicial = fence_final
+        for texto, fence in restantes:
+            self.adicionar(texto, fence)
+
+    def _fechar_bloco(
+        self,
+        pecas: list[tuple[str, tuple[str, str] | None]],
+        fence_final: tuple[str, str] | None,
+    ) -> None:
+        corpo = "".join(texto for texto, _ in pecas)
+        if self.fence_inicial:
+            corpo = f"{self.fence_inicial[0]}\n{corpo}"
+        if fence_final:
+            if not corpo.endswith("\n"):
+                corpo += "\n"
+            corpo += fence_final[1]
+        corpo = corpo.strip("\n")
+        if corpo.strip():
+            self.blocos.append(corpo)
+
+    def finalizar(self) -> list[str]:
+        if self.pecas:
+            self._fechar_bloco(self.pecas, self.pecas[-1][1])
+        return self.blocos
+
+
+def dividir_markdown(texto: str, limite: int = DISCORD_MESSAGE_LIMIT) -> list[str]:
+    """
+    Divide texto em blocos de até `limite` caracteres respeitando Markdown.
+
+    Quebra preferencialmente entre parágrafos, depois entre linhas, frases e
+    palavras. Blocos de código que cruzam uma divisão são fechados no fim de
+    um bloco e reabertos (com a mesma linguagem) no início do seguinte.
+    Executa em tempo linear no tamanho do texto.
+
+    Args:
+        texto: Texto a dividir
+        limite: Tamanho máximo de cada bloco
+
+    Returns:
+        Lista de blocos (vazia se o texto for vazio)
+    """
+    texto = texto.strip()
+    if not texto:
+        return []
+    if len(texto) <= limite:
+        return [texto]
+    if limite <= _FENCE_RESERVE * 2:
+        raise ValueError(f"limite deve ser maior que {_FENCE_RESERVE * 2}")
+
+    divisor = _Divisor(limite)
+    fence: tuple[str, str] | None = None
+    limite_linha = limite - _FENCE_RESERVE
+
+    for linha in texto.splitlines(keepends=True):
+        match = _FENCE_RE.match(linha)
+        if match:
+            marcador = match.group(1)
+            if fence is None:
+                fence = (_cabecalho_fence(linha, marcador), marcador)
+            elif marcador.startswith(fence[1]) and linha.strip() == marcador:
+                fence = None
+        for pedaco in _quebrar_linha(linha, limite_linha):
+            divisor.adicionar(pedaco, fence)
+
+    return divisor.finalizar()
+
+
+@dataclass
+class Envio:
+    """Uma mensagem a enviar ao Discord."""
+
+    content: str | None = None
+    embeds: list[discord.Embed] = field(default_factory=list)
+    anexo: bytes | None = None  # conteúdo do arquivo ATTACHMENT_FILENAME
+
+    def kwargs(self) -> dict[str, Any]:
+        """
+        Argumentos para send/reply, omitindo campos vazios.
+
+        O discord.File é criado a cada chamada: o discord.py fecha o arquivo
+        depois do envio, então um reenvio (ex.: após 429) precisa de outro.
+        """
+        kwargs: dict[str, Any] = {}
+        if self.content:
+            kwargs["content"] = self.content
+        if self.embeds:
+            kwargs["embeds"] = self.embeds
+        if self.anexo is not None:
+            kwargs["file"] = discord.File(io.BytesIO(self.anexo), filename=ATTACHMENT_FILENAME)
+        return kwargs
+
+
+def planejar_envio(resposta: str) -> list[Envio]:
+    """
+    Planeja o envio de uma resposta no menor número de mensagens.
+
+    - Até 2000 caracteres: uma mensagem de texto
+    - Até 6000 caracteres: uma mensagem com embeds (até 4096 caracteres cada)
+    - Acima de RESPONSE_ATTACHMENT_THRESHOLD: prévia + arquivo .md anexo
+    - Entre os dois (se o limiar for maior que 6000): várias mensagens de texto
+
+    Args:
+        resposta: Texto completo da resposta
+
+    Returns:
+        Lista ordenada de envios (vazia se não houver texto a enviar)
+    """
+    if not resposta.strip():
+        # O Discord rejeita mensagens sem conteúdo (400 Cannot send an empty message)
+        return []
+
+    if len(resposta) <= DISCORD_MESSAGE_LIMIT:
+        return [Envio(content=resposta)]
+
+    if len(resposta) <= min(EMBED_TOTAL_LIMIT, settings.response_attachment_threshold):
+        blocos = dividir_markdown(resposta, EMBED_DESCRIPTION_LIMIT)
+        if len(blocos) <= EMBEDS_PER_MESSAGE and sum(map(len, blocos)) <= EMBED_TOTAL_LIMIT:
+            return [Envio(embeds=[discord.Embed(description=bloco) for bloco in blocos])]
+
+    if len(resposta) > settings.response_attachment_threshold:
+        previa = dividir_markdown(resposta, DISCORD_MESSAGE_LIMIT - len(ATTACHMENT_NOTICE))[0]
+        return [Envio(content=previa + ATTACHMENT_NOTICE, anexo=resposta.encode("utf-8"))]
+
+    return [Envio(content=bloco) for bloco in dividir_markdown(resposta)]
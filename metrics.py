@@ -0,0 +1,126 @@
+"""
+Métricas em memória para o Sherlock Bot.
+
+Registro simples de contadores, gauges e histogramas (com reservatório
+limitado para percentis), seguro para uso entre threads. As métricas são
+expostas via snapshot() e registradas periodicamente nos logs.
+"""
+
+import threading
+from collections import defaultdict, deque
+from typing import Any
+
+
+def _chave(name: str, labels: dict[str, Any]) -> str:
+    """Monta a chave da métrica no formato nome{label=valor,...}."""
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class _Histogram:
+    """Histograma com contagem/soma totais e reservatório das últimas amostras."""
+
+    __slots__ = ("count", "max", "samples", "total")
+
+    def __init__(self, reservoir_size: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: deque[float] = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """Registro de métricas em memória."""
+
+    def __init__(self, reservoir_size: int = 1024):
+        """
+        Inicializa o registro.
+
+        Args:
+            reservoir_size: Número de amostras mantidas por histograma
+        """
+        self.reservoir_size = reservoir_size
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._histograms: dict[str, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Incrementa um contador."""
+        with self._lock:
+            self._counters[_chave(name, labels)] += value
+
+    def gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Define o valor atual de um gauge."""
+        with self._lock:
+            self._gauges[_chave(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Registra uma amostra em um histograma."""
+        key = _chave(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.reservoir_size)
+            histogram.observe(value)
+
+    def counter_value(self, name: str, **labels: Any) -> float:
+        """Retorna o valor atual de um contador (0 se inexistente)."""
+        with self._lock:
+            return self._counters.get(_chave(name, labels), 0)
+
+    def gauge_value(self, name: str, **labels: Any) -> float | None:
+        """Retorna o valor atual de um gauge (None se inexistente)."""
+        with self._lock:
+            return self._gauges.get(_chave(name, labels))
+
+    def histogram_summary(self, name: str, **labels: Any) -> dict[str, float] | None:
+        """Retorna o resumo (count/avg/p50/p95/p99/max) de um histograma."""
+        with self._lock:
+            histogram = self._histograms.get(_chave(name, labels))
+            return histogram.summary() if histogram else None
+
+    def snapshot(self) -> dict[str, Any]:
+        """Retorna uma cópia de todas as métricas."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {k: h.summary() for k, h in self._histograms.items()},
+            }
+
+    def reset(self) -> None:
+        """Remove todas as métricas (útil para testes)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+# Singleton global
+metrics = Metrics()
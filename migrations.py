@@ -0,0 +1,580 @@
+"""
+Migrações versionadas do schema SQLite do Sherlock Bot.
+
+A versão do schema fica em PRAGMA user_version. Cada migração leva o banco
+da versão N-1 para N e é aplicada em ordem por migrate(), chamada por
+database.init_db(). Bancos antigos sem versão (user_version = 0) passam por
+todas as migrações a partir da primeira, que é idempotente.
+
+Uso direto (ex.: migrar um banco grande antes de um deploy):
+    python migrations.py [--chunk-size N]
+
+Verificar/recalcular as estatísticas por usuário (user_stats):
+    python migrations.py --check-stats
+    python migrations.py --rebuild-stats
+"""
+
+import argparse
+import sqlite3
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from logger import logger
+
+# Linhas copiadas por transação nas migrações que reescrevem tabelas
+DEFAULT_CHUNK_SIZE = 5000
+
+# Papéis armazenados como inteiros pequenos (messages.role)
+ROLE_TO_INT = {"user": 0, "assistant": 1}
+INT_TO_ROLE = {v: k for k, v in ROLE_TO_INT.items()}
+
+# Expressão SQL para "agora" em epoch-milissegundos (sem depender de unixepoch())
+NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Uma migração de schema."""
+
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection, int], None]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Retorna a versão atual do schema (PRAGMA user_version)."""
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def _set_schema_version(conn: sqlite3.Connection, version: int) -> None:
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+# =============================================================================
+# v1 - schema original (timestamps em texto, role em texto)
+# =============================================================================
+def _v1_schema_inicial(conn: sqlite3.Connection, chunk_size: int) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_channel
+        ON messages(user_id, channel_id, created_at DESC)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS command_sync_state (
+            scope TEXT PRIMARY KEY,
+            tree_hash TEXT NOT NULL,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+# =============================================================================
+# v2 - timestamps em epoch-ms (INTEGER), role como inteiro, índices enxutos
+# =============================================================================
+def _v2_timestamps_inteiros(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Reescreve messages com created_at em epoch-ms e role inteiro.
+
+    A cópia é feita em lotes, cada um em sua própria transação, para não
+    bloquear outros processos. A troca final (cópia das linhas inseridas
+    durante a migração, remoção das apagadas, DROP/RENAME) ocorre numa única
+    transação IMMEDIATE curta.
+    """
+    conn.execute("DROP TABLE IF EXISTS messages_v2")
+    conn.execute(f"""
+        CREATE TABLE messages_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            role INTEGER NOT NULL CHECK(role IN (0, 1)),
+            content TEXT NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT ({NOW_MS_SQL})
+        )
+    """)
+    conn.commit()
+
+    copy_sql = """
+        INSERT INTO messages_v2 (id, user_id, channel_id, role, content, created_at)
+        SELECT
+            id,
+            user_id,
+            channel_id,
+            CASE role WHEN 'user' THEN 0 ELSE 1 END,
+            content,
+            COALESCE(
+                CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER),
+                0
+            )
+        FROM messages
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """
+
+    last_id = 0
+    copied = 0
+    inicio = time.perf_counter()
+    while True:
+        cursor = conn.execute(copy_sql, (last_id, chunk_size))
+        batch = cursor.rowcount
+        conn.commit()
+        if batch <= 0:
+            break
+        copied += batch
+        last_id = conn.execute("SELECT MAX(id) FROM messages_v2").fetchone()[0]
+        elapsed = time.perf_counter() - inicio
+        logger.info(
+            "Migrando mensagens para v2",
+            extra={"copied": copied, "rows_per_second": round(copied / elapsed) if elapsed else 0},
+        )
+        if batch < chunk_size:
+            break
+
+    # Troca atômica: inclui linhas inseridas/removidas durante a cópia
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(copy_sql, (last_id, -1))
+    conn.execute("DELETE FROM messages_v2 WHERE id NOT IN (SELECT id FROM messages)")
+    conn.execute("DROP TABLE messages")
+    conn.execute("ALTER TABLE messages_v2 RENAME TO messages")
+    # Índice da consulta de contexto: (user_id, channel_id, created_at) + rowid implícito
+    # atende WHERE user_id/channel_id e ORDER BY created_at DESC, id DESC sem ordenação
+    conn.execute("""
+        CREATE INDEX idx_user_channel
+        ON messages(user_id, channel_id, created_at)
+    """)
+    conn.execute("CREATE INDEX idx_created_at ON messages(created_at)")
+
+
+# =============================================================================
+# v3 - estatísticas por usuário mantidas por triggers
+# =============================================================================
+# Recalcula as tabelas de resumo a partir de messages (backfill e rebuild)
+REBUILD_STATS_SQL = (
+    "DELETE FROM conversation_stats",
+    "DELETE FROM user_stats",
+    """
+    INSERT INTO user_stats (user_id, total_messages, total_channels, total_tokens, last_active_at)
+    SELECT user_id, COUNT(*), 0, SUM(tokens), MAX(created_at)
+    FROM messages
+    GROUP BY user_id
+    """,
+    # O trigger de conversation_stats preenche total_channels
+    """
+    INSERT INTO conversation_stats (user_id, channel_id, message_count)
+    SELECT user_id, channel_id, COUNT(*)
+    FROM messages
+    GROUP BY user_id, channel_id
+    """,
+)
+
+
+# Usuários cujo resumo diverge do histórico (em qualquer direção)
+CHECK_STATS_SQL = """
+    WITH
+    expected_users AS (
+        SELECT user_id, COUNT(*), COUNT(DISTINCT channel_id), SUM(tokens), MAX(created_at)
+        FROM messages
+        GROUP BY user_id
+    ),
+    actual_users AS (
+        SELECT user_id, total_messages, total_channels, total_tokens, last_active_at
+        FROM user_stats
+    ),
+    expected_conversations AS (
+        SELECT user_id, channel_id, COUNT(*) FROM messages GROUP BY user_id, channel_id
+    ),
+    actual_conversations AS (
+        SELECT user_id, channel_id, message_count FROM conversation_stats
+    )
+    SELECT user_id FROM (SELECT * FROM expected_users EXCEPT SELECT * FROM actual_users)
+    UNION
+    SELECT user_id FROM (SELECT * FROM actual_users EXCEPT SELECT * FROM expected_users)
+    UNION
+    SELECT user_id FROM (
+        SELECT * FROM expected_conversations EXCEPT SELECT * FROM actual_conversations
+    )
+    UNION
+    SELECT user_id FROM (
+        SELECT * FROM actual_conversations EXCEPT SELECT * FROM expected_conversations
+    )
+    ORDER BY user_id
+"""
+
+
+def check_stats(conn: sqlite3.Connection) -> list[int]:
+    """
+    Compara as tabelas de resumo com um recálculo completo do histórico.
+
+    Args:
+        conn: Conexão com o banco
+
+    Returns:
+        IDs dos usuários com estatísticas divergentes (vazio se consistente)
+    """
+    return [row[0] for row in conn.execute(CHECK_STATS_SQL)]
+
+
+def rebuild_stats(conn: sqlite3.Connection) -> None:
+    """
+    Recalcula user_stats e conversation_stats a partir de messages.
+
+    Deve rodar dentro de uma transação para que as tabelas de resumo nunca
+    fiquem parcialmente preenchidas para os leitores.
+
+    Args:
+        conn: Conexão com o banco
+    """
+    for sql in REBUILD_STATS_SQL:
+        conn.execute(sql)
+
+
+def _v3_estatisticas_usuario(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Cria user_stats/conversation_stats, mantidas por triggers em messages.
+
+    /stats passa a ler uma única linha em vez de agregar o histórico do
+    usuário. conversation_stats guarda a contagem por (usuário, canal) para
+    que total_channels possa ser mantido sem COUNT(DISTINCT).
+    """
+    conn.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TABLE user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_messages INTEGER NOT NULL DEFAULT 0,
+            total_channels INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            last_active_at INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE conversation_stats (
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, channel_id)
+        ) WITHOUT ROWID
+    """)
+    # user_stats primeiro: o trigger de conversation_stats atualiza a linha do usuário
+    conn.execute("""
+        CREATE TRIGGER messages_stats_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO user_stats (user_id, total_messages, total_tokens, last_active_at)
+            VALUES (NEW.user_id, 1, NEW.tokens, NEW.created_at)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total_messages = total_messages + 1,
+                total_tokens = total_tokens + excluded.total_tokens,
+                last_active_at = MAX(COALESCE(last_active_at, 0), excluded.last_active_at);
+            INSERT INTO conversation_stats (user_id, channel_id, message_count)
+            VALUES (NEW.user_id, NEW.channel_id, 1)
+            ON CONFLICT (user_id, channel_id) DO UPDATE SET message_count = message_count + 1;
+        END
+    """)
+    # last_active_at só é recalculado quando a mensagem mais recente é removida
+    conn.execute("""
+        CREATE TRIGGER messages_stats_delete AFTER DELETE ON messages
+        BEGIN
+            UPDATE conversation_stats SET message_count = message_count - 1
+            WHERE user_id = OLD.user_id AND channel_id = OLD.channel_id;
+            DELETE FROM conversation_stats
+            WHERE user_id = OLD.user_id AND channel_id = OLD.channel_id AND message_count <= 0;
+            UPDATE user_stats SET
+                total_messages = total_messages - 1,
+                total_tokens = total_tokens - OLD.tokens
+            WHERE user_id = OLD.user_id;
+            UPDATE user_stats SET
+                last_active_at = (SELECT MAX(created_at) FROM messages WHERE user_id = OLD.user_id)
+            WHERE user_id = OLD.user_id AND last_active_at <= OLD.created_at;
+            DELETE FROM user_stats WHERE user_id = OLD.user_id AND total_messages <= 0;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER conversation_stats_insert AFTER INSERT ON conversation_stats
+        BEGIN
+            UPDATE user_stats SET total_channels = total_channels + 1
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER conversation_stats_delete AFTER DELETE ON conversation_stats
+        BEGIN
+            UPDATE user_stats SET total_channels = total_channels - 1
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+    rebuild_stats(conn)
+
+
+# =============================================================================
+# v4 - registro de uso por resposta e agregados por hora
+# =============================================================================
+def _v4_registro_uso(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Cria usage_ledger (uma linha por resposta) e usage_hourly (agregados).
+
+    usage_hourly é atualizada pelo UsageRecorder na mesma transação do lote
+    gravado no ledger, então consultas de custo não precisam ler o ledger.
+    """
+    conn.execute("""
+        CREATE TABLE usage_ledger (
+            id INTEGER PRIMARY KEY,
+            created_at INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            tokens_prompt INTEGER NOT NULL,
+            tokens_completion INTEGER NOT NULL,
+            tokens_cached INTEGER NOT NULL,
+            latency_ms INTEGER NOT NULL,
+            flags INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX idx_usage_ledger_created_at ON usage_ledger(created_at)")
+    conn.execute("""
+        CREATE TABLE usage_hourly (
+            hour INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            requests INTEGER NOT NULL,
+            tokens_prompt INTEGER NOT NULL,
+            tokens_completion INTEGER NOT NULL,
+            tokens_cached INTEGER NOT NULL,
+            latency_ms_total INTEGER NOT NULL,
+            latency_ms_max INTEGER NOT NULL,
+            cache_hits INTEGER NOT NULL,
+            PRIMARY KEY (hour, model)
+        ) WITHOUT ROWID
+    """)
+
+
+# =============================================================================
+# v5 - consumo das cotas de tokens por hora
+# =============================================================================
+def _v5_cotas(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Cria quota_usage: tokens consumidos por (hora, escopo, id).
+
+    A hora vem primeiro na chave para que a carga das últimas 24h e a
+    remoção das horas antigas sejam buscas por intervalo.
+    """
+    conn.execute("""
+        CREATE TABLE quota_usage (
+            hour INTEGER NOT NULL,
+            scope TEXT NOT NULL CHECK(scope IN ('user', 'guild')),
+            subject_id INTEGER NOT NULL,
+            tokens INTEGER NOT NULL,
+            PRIMARY KEY (hour, scope, subject_id)
+        ) WITHOUT ROWID
+    """)
+
+
+# =============================================================================
+# v6 - busca textual (FTS5) no histórico
+# =============================================================================
+def _v6_busca_textual(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Cria messages_fts, índice FTS5 de conteúdo externo sobre messages.
+
+    user_id e channel_id são indexados como colunas para que a busca de um
+    usuário seja um filtro no próprio índice (user_id:"123" AND ...); o
+    ranking (bm25) considera apenas o conteúdo. Triggers mantêm o índice a
+    cada inserção, remoção ou edição.
+    """
+    conn.execute("""
+        CREATE VIRTUAL TABLE messages_fts USING fts5(
+            content,
+            user_id,
+            channel_id,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute(
+        "INSERT INTO messages_fts (messages_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0, 0.0)')"
+    )
+    conn.execute("""
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, content, user_id, channel_id)
+            VALUES (NEW.id, NEW.content, NEW.user_id, NEW.channel_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content, user_id, channel_id)
+            VALUES ('delete', OLD.id, OLD.content, OLD.user_id, OLD.channel_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content, user_id, channel_id
+        ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content, user_id, channel_id)
+            VALUES ('delete', OLD.id, OLD.content, OLD.user_id, OLD.channel_id);
+            INSERT INTO messages_fts (rowid, content, user_id, channel_id)
+            VALUES (NEW.id, NEW.content, NEW.user_id, NEW.channel_id);
+        END
+    """)
+    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def _v7_vetores(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Cria message_vectors, os vetores das mensagens para a busca por similaridade.
+
+    A chave (user_id, channel_id, message_id) agrupa os vetores de cada
+    conversa, que é o escopo da busca. Os vetores são calculados em Python
+    (embeddings.py) na primeira busca de cada conversa, então não há backfill
+    aqui; o trigger remove o vetor junto com a mensagem.
+    """
+    conn.execute("""
+        CREATE TABLE message_vectors (
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (user_id, channel_id, message_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER message_vectors_delete AFTER DELETE ON messages
+        BEGIN
+            DELETE FROM message_vectors
+            WHERE user_id = OLD.user_id AND channel_id = OLD.channel_id AND message_id = OLD.id;
+        END
+    """)
+
+
+# =============================================================================
+# v8 - auto_vacuum incremental em bancos criados antes dele
+# =============================================================================
+def _v8_auto_vacuum_incremental(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Converte o banco para auto_vacuum=INCREMENTAL (exige um VACUUM completo).
+
+    init_db() só consegue ligar o modo em bancos novos; sem esta conversão o
+    PRAGMA incremental_vacuum da retenção não devolve espaço nenhum. O VACUUM
+    reescreve o arquivo inteiro e bloqueia as escritas enquanto roda: em
+    bancos grandes, rode `python migrations.py` antes do deploy.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.commit()  # VACUUM não roda dentro de transação
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+# =============================================================================
+# v9 - índice por canal para o contexto compartilhado
+# =============================================================================
+def _v9_indice_canal(conn: sqlite3.Connection, chunk_size: int) -> None:
+    """
+    Cria idx_channel_created: os canais com contexto compartilhado carregam as
+    últimas mensagens do canal, de todos os autores, sem varrer messages.
+    """
+    conn.execute("CREATE INDEX idx_channel_created ON messages(channel_id, created_at)")
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Schema inicial", _v1_schema_inicial),
+    Migration(2, "Timestamps epoch-ms e role inteiro", _v2_timestamps_inteiros),
+    Migration(3, "Estatísticas por usuário", _v3_estatisticas_usuario),
+    Migration(4, "Registro de uso e agregados por hora", _v4_registro_uso),
+    Migration(5, "Consumo das cotas de tokens", _v5_cotas),
+    Migration(6, "Busca textual no histórico", _v6_busca_textual),
+    Migration(7, "Vetores das mensagens", _v7_vetores),
+    Migration(8, "auto_vacuum incremental", _v8_auto_vacuum_incremental),
+    Migration(9, "Índice por canal", _v9_indice_canal),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def migrate(conn: sqlite3.Connection, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Aplica as migrações pendentes em ordem.
+
+    Args:
+        conn: Conexão com o banco (sem transação aberta)
+        chunk_size: Linhas por transação nas migrações que reescrevem tabelas
+
+    Returns:
+        Versão final do schema
+    """
+    version = get_schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        logger.info(
+            "Aplicando migração",
+            extra={"version": migration.version, "description": migration.description},
+        )
+        inicio = time.perf_counter()
+        migration.apply(conn, chunk_size)
+        _set_schema_version(conn, migration.version)
+        conn.commit()
+        version = migration.version
+        logger.info(
+            "Migração aplicada",
+            extra={
+                "version": version,
+                "elapsed_ms": round((time.perf_counter() - inicio) * 1000),
+            },
+        )
+    return version
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Aplica as migrações pendentes no banco configurado."""
+    from database import get_connection
+
+    parser = argparse.ArgumentParser(description="Migrações do banco do Sherlock Bot")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--check-stats",
+        action="store_true",
+        help="Verifica user_stats contra o histórico (código de saída 1 se divergir)",
+    )
+    parser.add_argument(
+        "--rebuild-stats",
+        action="store_true",
+        help="Recalcula user_stats e conversation_stats a partir do histórico",
+    )
+    args = parser.parse_args(argv)
+
+    with get_connection() as conn:
+        version = migrate(conn, args.chunk_size)
+        logger.info("Banco na versão mais recente", extra={"version": version})
+
+        if args.check_stats or args.rebuild_stats:
+            divergentes = check_stats(conn)
+            logger.info(
+                "Verificação de estatísticas concluída",
+                extra={"divergent_users": len(divergentes), "user_ids": divergentes[:20]},
+            )
+            if args.rebuild_stats:
+                inicio = time.perf_counter()
+                conn.execute("BEGIN IMMEDIATE")
+                rebuild_stats(conn)
+                conn.commit()
+                logger.info(
+                    "Estatísticas recalculadas",
+                    extra={"elapsed_ms": round((time.perf_counter() - inicio) * 1000)},
+                )
+            elif divergentes:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+"""
+Profiler por amostragem para o processo do bot em produção.
+
+Responsável por:
+- Amostrar, a partir de uma thread separada, a pilha da thread do event loop
+  a cada PROFILER_INTERVAL_MS durante N segundos (sem reiniciar o bot e sem
+  instrumentar chamadas: o custo é só o da amostragem)
+- Etiquetar as amostras com o handler em execução (on_message, slash_ia, ...)
+  e com as etiquetas da tarefa atual (ex.: guild), definidas por etiquetar()
+- Gravar o resultado em formato "collapsed stacks" (uma pilha por linha com a
+  contagem), aceito por flamegraph.pl, speedscope e inferno
+
+Disparado pelo comando /perfil (administradores) ou pelo sinal SIGUSR2.
+
+A thread de amostragem precisa do GIL para ler a pilha, então trechos muito
+curtos entre chamadas de sistema tendem a aparecer como o loop ocioso
+(selectors); trabalho de CPU que segura o loop por vários milissegundos, que é
+o que interessa encontrar, é amostrado normalmente.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from types import FrameType
+
+from config import settings
+from logger import logger
+from metrics import metrics
+from watchdog import DECORATOR_FRAMES
+
+PROJECT_DIR = str(Path(__file__).resolve().parent)
+
+# Etiquetas por tarefa asyncio; a thread de amostragem lê a da tarefa atual do loop
+_etiquetas: "weakref.WeakKeyDictionary[asyncio.Task, dict[str, object]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class PerfilEmAndamentoError(RuntimeError):
+    """Já existe uma coleta de perfil em andamento neste processo."""
+
+
+@dataclass
+class Perfil:
+    """Resultado de uma coleta de perfil."""
+
+    arquivo: Path
+    segundos: float
+    amostras: int
+    por_handler: Counter
+
+
+def etiquetar(**etiquetas: object) -> None:
+    """
+    Etiqueta as amostras da tarefa asyncio atual (ex.: etiquetar(guild=123)).
+
+    Valores None são ignorados. Fora de uma tarefa asyncio não faz nada.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return
+    if task is None:
+        return
+    atuais = _etiquetas.setdefault(task, {})
+    atuais.update((k, v) for k, v in etiquetas.items() if v is not None)
+
+
+def _nome(frame: FrameType) -> str:
+    codigo = frame.f_code
+    # ";" separa frames e " " separa a contagem no formato collapsed
+    nome = f"{Path(codigo.co_filename).stem}.{codigo.co_qualname}"
+    return nome.replace(";", ":").replace(" ", "_")
+
+
+def colapsar(frame: FrameType, etiquetas: dict[str, object] | None = None) -> tuple[str, str]:
+    """
+    Converte uma pilha em uma linha do formato collapsed.
+
+    Args:
+        frame: Frame mais interno da pilha
+        etiquetas: Etiquetas da tarefa (viram frames na raiz, ex.: "guild:123")
+
+    Returns:
+        Tupla (handler, pilha) - handler é "-" se nenhum código do projeto estiver
+        rodando (loop ocioso ou callbacks de bibliotecas)
+    """
+    frames: list[FrameType] = []
+    atual: FrameType | None = frame
+    while atual is not None:
+        frames.append(atual)
+        atual = atual.f_back
+    frames.reverse()
+
+    # Só o que roda dentro do callback atual do loop identifica o handler
+    inicio = 0
+    for i, f in enumerate(frames):
+        if f.f_code.co_name == "_run" and f.f_code.co_filename.endswith("events.py"):
+            inicio = i + 1
+    handler = next(
+        (
+            f.f_code.co_name
+            for f in frames[inicio:]
+            if f.f_code.co_filename.startswith(PROJECT_DIR)
+            and "site-packages" not in f.f_code.co_filename
+            and f.f_code.co_name not in DECORATOR_FRAMES
+        ),
+        "-",
+    )
+
+    raiz = [f"handler:{handler}"]
+    raiz += [f"{k}:{v}" for k, v in sorted((etiquetas or {}).items())]
+    return handler, ";".join(raiz + [_nome(f) for f in frames])
+
+
+class ProfilerAmostragem:
+    """Coleta perfis do event loop em que é chamado (uma coleta por vez)."""
+
+    def __init__(self) -> None:
+        # Lock de thread: a coleta pode ser pedida pelo comando e pelo sinal ao mesmo tempo
+        self._ativo = threading.Lock()
+        self._tarefas: set[asyncio.Task] = set()
+
+    def instalar_sinal(self) -> None:
+        """Faz SIGUSR2 disparar uma coleta de PROFILER_SIGNAL_SECONDS no loop atual."""
+        if not hasattr(signal, "SIGUSR2"):  # Windows
+            return
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, self._perfilar_por_sinal)
+
+    def _perfilar_por_sinal(self) -> None:
+        tarefa = asyncio.create_task(self._coletar_por_sinal())
+        # Referência forte até o fim: o loop só guarda referências fracas às tarefas
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _coletar_por_sinal(self) -> None:
+        try:
+            await self.perfilar(settings.profiler_signal_seconds)
+        except PerfilEmAndamentoError:
+            logger.warning("SIGUSR2 ignorado: coleta de perfil já em andamento")
+
+    async def perfilar(self, segundos: float, intervalo_ms: float | None = None) -> Perfil:
+        """
+        Amostra o event loop atual por `segundos` e grava o arquivo collapsed.
+
+        Args:
+            segundos: Duração da coleta (limitada por PROFILER_MAX_SECONDS)
+            intervalo_ms: Intervalo entre amostras (None = PROFILER_INTERVAL_MS)
+
+        Returns:
+            Perfil com o arquivo gravado e as amostras por handler
+
+        Raises:
+            PerfilEmAndamentoError: Se já houver uma coleta em andamento
+        """
+        if not self._ativo.acquire(blocking=False):
+            raise PerfilEmAndamentoError("Já existe uma coleta de perfil em andamento")
+        try:
+            segundos = min(segundos, settings.profiler_max_seconds)
+            intervalo = (intervalo_ms or settings.profiler_interval_ms) / 1000
+            loop = asyncio.get_running_loop()
+            thread_id = threading.get_ident()
+            logger.info(
+                "Coleta de perfil iniciada",
+                extra={"seconds": segundos, "interval_ms": intervalo * 1000},
+            )
+            pilhas, por_handler = await asyncio.to_thread(
+                self._amostrar, loop, thread_id, segundos, intervalo
+            )
+            arquivo = await asyncio.to_thread(self._gravar, pilhas)
+        finally:
+            self._ativo.release()
+
+        amostras = sum(pilhas.values())
+        metrics.incr("profiler_samples", amostras)
+        logger.info(
+            "Coleta de perfil concluída",
+            extra={
+                "file": str(arquivo),
+                "samples": amostras,
+                "top_handlers": dict(por_handler.most_common(5)),
+            },
+        )
+        return Perfil(arquivo, segundos, amostras, por_handler)
+
+    @staticmethod
+    def _amostrar(
+        loop: asyncio.AbstractEventLoop, thread_id: int, segundos: float, intervalo: float
+    ) -> tuple[Counter, Counter]:
+        """Thread de amostragem: conta pilhas da thread do loop até o prazo."""
+        pilhas: Counter = Counter()
+        por_handler: Counter = Counter()
+        fim = time.monotonic() + segundos
+        proxima = time.monotonic()
+        while proxima < fim:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            task = asyncio.current_task(loop)
+            handler, pilha = colapsar(frame, _etiquetas.get(task) if task else None)
+            del frame
+            pilhas[pilha] += 1
+            por_handler[handler] += 1
+            proxima += intervalo
+            time.sleep(max(0.0, proxima - time.monotonic()))
+        return pilhas, por_handler
+
+    @staticmethod
+    def _gravar(pilhas: Counter) -> Path:
+        diretorio = settings.profiler_dir
+        diretorio.mkdir(parents=True, exist_ok=True)
+        arquivo = diretorio / f"perfil-{datetime.now(UTC):%Y%m%dT%H%M%S}-{os.getpid()}.collapsed"
+        with open(arquivo, "w", encoding="utf-8") as f:
+            for pilha, contagem in pilhas.most_common():
+                f.write(f"{pilha} {contagem}\n")
+        return arquivo
+
+
+# Singleton global
+profiler = ProfilerAmostragem()
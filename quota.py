@@ -0,0 +1,336 @@
+"""
+Cotas de tokens por usuário e por servidor em janelas móveis de 24h.
+
+O rate limiter conta requisições; as cotas contam custo. Antes de chamar a
+IA é reservada uma estimativa de tokens; depois da resposta a reserva é
+trocada pelo consumo real (AIResponse.tokens_total).
+
+As verificações são feitas em memória, em tempo constante: cada usuário ou
+servidor tem 24 buckets de uma hora e um total corrente. O consumo por hora
+é gravado periodicamente em quota_usage como incremento (somado ao que os
+outros processos gravaram) e recarregado a cada gravação: cada worker do
+launcher aplica a cota ao consumo de todos, com atraso de até
+QUOTA_PERSIST_INTERVAL_SECONDS.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+
+from config import settings
+from database import HOUR_MS, get_quota_usage, now_epoch_ms, save_quota_usage
+from logger import logger
+from metrics import metrics
+
+# Buckets de uma hora na janela móvel
+WINDOW_HOURS = 24
+
+Chave = tuple[str, int]  # (escopo, id)
+
+
+class QuotaExceededError(Exception):
+    """Cota de tokens esgotada para um usuário ou servidor."""
+
+    def __init__(self, scope: str, limit: int, remaining: int, retry_after_seconds: int):
+        """
+        Args:
+            scope: "user" ou "guild"
+            limit: Cota configurada para o escopo
+            remaining: Tokens ainda disponíveis na janela
+            retry_after_seconds: Tempo até o bucket mais antigo com consumo sair da janela
+        """
+        super().__init__(f"Cota de tokens ({scope}) esgotada")
+        self.scope = scope
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after_seconds = retry_after_seconds
+
+
+class _JanelaDiaria:
+    """Consumo de tokens em buckets de uma hora cobrindo as últimas 24h."""
+
+    __slots__ = ("buckets", "hora_atual", "total", "reservado")
+
+    def __init__(self, hora: int):
+        self.buckets = [0] * WINDOW_HOURS
+        self.hora_atual = hora
+        self.total = 0
+        self.reservado = 0
+
+    def avancar(self, hora: int) -> None:
+        """Descarta os buckets que saíram da janela (no máximo 24 por chamada)."""
+        if hora <= self.hora_atual:
+            return
+        if hora - self.hora_atual >= WINDOW_HOURS:
+            self.buckets = [0] * WINDOW_HOURS
+            self.total = 0
+        else:
+            for h in range(self.hora_atual + 1, hora + 1):
+                self.total -= self.buckets[h % WINDOW_HOURS]
+                self.buckets[h % WINDOW_HOURS] = 0
+        self.hora_atual = hora
+
+    def debitar(self, hora: int, tokens: int) -> None:
+        self.avancar(hora)
+        if hora <= self.hora_atual - WINDOW_HOURS:
+            return
+        self.buckets[hora % WINDOW_HOURS] += tokens
+        self.total += tokens
+
+    def horas_ate_liberar(self) -> int:
+        """Horas até o bucket mais antigo com consumo sair da janela."""
+        for idade in range(WINDOW_HOURS - 1, -1, -1):
+            if self.buckets[(self.hora_atual - idade) % WINDOW_HOURS]:
+                return WINDOW_HOURS - idade
+        return 0
+
+
+@dataclass
+class Reserva:
+    """Tokens reservados para uma chamada à IA ainda em andamento."""
+
+    chaves: tuple[Chave, ...]
+    tokens: int
+    finalizada: bool = False
+
+
+class QuotaEngine:
+    """Controla as cotas diárias de tokens por usuário e por servidor."""
+
+    def __init__(
+        self,
+        user_limit: int | None = None,
+        guild_limit: int | None = None,
+        persist_interval: float | None = None,
+    ):
+        """
+        Inicializa o controlador (limites None usam as configurações).
+
+        Args:
+            user_limit: Tokens por usuário em 24h
+            guild_limit: Tokens por servidor em 24h
+            persist_interval: Segundos entre gravações no banco
+        """
+        self.user_limit = user_limit or settings.quota_user_daily_tokens
+        self.guild_limit = guild_limit or settings.quota_guild_daily_tokens
+        self.persist_interval = persist_interval or settings.quota_persist_interval_seconds
+        self._janelas: dict[Chave, _JanelaDiaria] = {}
+        # Consumo por (hora, chave) ainda não gravado
+        self._deltas: dict[tuple[int, Chave], int] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def habilitado(self) -> bool:
+        """Indica se alguma cota está configurada."""
+        return bool(self.user_limit or self.guild_limit)
+
+    @staticmethod
+    def _hora(now_ms: int | None = None) -> int:
+        return (now_ms if now_ms is not None else now_epoch_ms()) // HOUR_MS
+
+    def _limite(self, scope: str) -> int | None:
+        return self.user_limit if scope == "user" else self.guild_limit
+
+    def _chaves(self, user_id: int, guild_id: int | None) -> tuple[Chave, ...]:
+        chaves: list[Chave] = []
+        if self.user_limit:
+            chaves.append(("user", user_id))
+        if self.guild_limit and guild_id is not None:
+            chaves.append(("guild", guild_id))
+        return tuple(chaves)
+
+    def _janela(self, chave: Chave, hora: int) -> _JanelaDiaria:
+        janela = self._janelas.get(chave)
+        if janela is None:
+            janela = self._janelas[chave] = _JanelaDiaria(hora)
+        else:
+            janela.avancar(hora)
+        return janela
+
+    def reservar(self, user_id: int, guild_id: int | None, tokens: int) -> Reserva:
+        """
+        Reserva tokens nas cotas do usuário e do servidor.
+
+        Args:
+            user_id: ID do usuário Discord
+            guild_id: ID do servidor (None em DMs)
+            tokens: Estimativa de tokens da chamada
+
+        Returns:
+            Reserva a confirmar com o consumo real (ou cancelar)
+
+        Raises:
+            QuotaExceededError: Se alguma cota não comportar a reserva
+        """
+        chaves = self._chaves(user_id, guild_id)
+        hora = self._hora()
+        with self._lock:
+            for chave in chaves:
+                janela = self._janela(chave, hora)
+                limite = self._limite(chave[0]) or 0
+                usado = janela.total + janela.reservado
+                if usado + tokens > limite:
+                    metrics.incr("quota_rejected", scope=chave[0])
+                    raise QuotaExceededError(
+                        chave[0],
+                        limite,
+                        max(0, limite - usado),
+                        max(
+                            0,
+                            janela.horas_ate_liberar() * 3600 - (now_epoch_ms() % HOUR_MS) // 1000,
+                        ),
+                    )
+            for chave in chaves:
+                self._janelas[chave].reservado += tokens
+        return Reserva(chaves, tokens)
+
+    def confirmar(self, reserva: Reserva, tokens_reais: int) -> None:
+        """
+        Troca a reserva pelo consumo real.
+
+        Args:
+            reserva: Reserva feita antes da chamada
+            tokens_reais: Tokens efetivamente consumidos (prompt + completion)
+        """
+        if reserva.finalizada:
+            return
+        reserva.finalizada = True
+        hora = self._hora()
+        with self._lock:
+            for chave in reserva.chaves:
+                janela = self._janela(chave, hora)
+                janela.reservado -= reserva.tokens
+                janela.debitar(hora, tokens_reais)
+                self._deltas[(hora, chave)] = self._deltas.get((hora, chave), 0) + tokens_reais
+
+    def cancelar(self, reserva: Reserva) -> None:
+        """Libera uma reserva sem debitar nada (ex.: a chamada falhou)."""
+        if reserva.finalizada:
+            return
+        reserva.finalizada = True
+        with self._lock:
+            for chave in reserva.chaves:
+                janela = self._janelas.get(chave)
+                if janela is not None:
+                    janela.reservado -= reserva.tokens
+
+    def restante(self, user_id: int, guild_id: int | None = None) -> dict[str, int]:
+        """
+        Tokens disponíveis por escopo com cota configurada.
+
+        Args:
+            user_id: ID do usuário Discord
+            guild_id: ID do servidor (None em DMs)
+
+        Returns:
+            Dict escopo -> tokens restantes na janela
+        """
+        hora = self._hora()
+        with self._lock:
+            restante = {}
+            for chave in self._chaves(user_id, guild_id):
+                janela = self._janela(chave, hora)
+                limite = self._limite(chave[0]) or 0
+                restante[chave[0]] = max(0, limite - janela.total - janela.reservado)
+            return restante
+
+    def carregar(self) -> int:
+        """
+        Recarrega o consumo das últimas 24h do banco (síncrono).
+
+        O consumo deste processo ainda não gravado é somado ao do banco.
+
+        Returns:
+            Número de buckets carregados
+        """
+        hora = self._hora()
+        rows = get_quota_usage((hora - WINDOW_HOURS + 1) * HOUR_MS)
+        with self._lock:
+            for hour_ms, scope, subject_id, tokens in rows:
+                h = hour_ms // HOUR_MS
+                janela = self._janela((scope, subject_id), hora)
+                total = tokens + self._deltas.get((h, (scope, subject_id)), 0)
+                janela.total += total - janela.buckets[h % WINDOW_HOURS]
+                janela.buckets[h % WINDOW_HOURS] = total
+        return len(rows)
+
+    def persistir(self) -> int:
+        """
+        Grava o consumo desde a última gravação e remove as horas fora da janela (síncrono).
+
+        Returns:
+            Número de buckets gravados
+        """
+        hora = self._hora()
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            rows = [
+                (h * HOUR_MS, chave[0], chave[1], tokens)
+                for (h, chave), tokens in deltas.items()
+                if h > hora - WINDOW_HOURS and tokens
+            ]
+            # Janelas sem consumo nem reserva não precisam ficar em memória
+            for janela in self._janelas.values():
+                janela.avancar(hora)
+            for chave in [c for c, j in self._janelas.items() if j.total == 0 and j.reservado == 0]:
+                del self._janelas[chave]
+        try:
+            save_quota_usage(rows, (hora - WINDOW_HOURS + 1) * HOUR_MS)
+        except Exception:
+            with self._lock:
+                for chave_hora, tokens in deltas.items():
+                    self._deltas[chave_hora] = self._deltas.get(chave_hora, 0) + tokens
+            raise
+        return len(rows)
+
+    def sincronizar(self) -> int:
+        """
+        Grava o consumo deste processo e recarrega o de todos (síncrono).
+
+        Sem a recarga, cada processo veria só o próprio consumo mais o do
+        banco na inicialização: com N workers, até N vezes a cota diária.
+
+        Returns:
+            Número de buckets gravados
+        """
+        gravados = self.persistir()
+        self.carregar()
+        return gravados
+
+    def iniciar(self) -> None:
+        """Carrega o consumo persistido e inicia a gravação periódica."""
+        if not self.habilitado:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="quota-engine")
+
+    async def parar(self) -> None:
+        """Cancela o loop em background e grava o consumo pendente."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.habilitado:
+            await asyncio.to_thread(self.persistir)
+
+    async def _loop(self) -> None:
+        try:
+            carregados = await asyncio.to_thread(self.carregar)
+            logger.info("Consumo das cotas carregado", extra={"buckets": carregados})
+        except Exception as e:
+            logger.error("Erro ao carregar consumo das cotas", extra={"error": str(e)})
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            inicio = time.perf_counter()
+            try:
+                gravados = await asyncio.to_thread(self.sincronizar)
+                metrics.observe("quota_persist_ms", (time.perf_counter() - inicio) * 1000)
+                metrics.gauge("quota_subjects", len(self._janelas))
+                logger.debug("Consumo das cotas gravado", extra={"buckets": gravados})
+            except Exception as e:
+                logger.error("Erro ao gravar consumo das cotas", extra={"error": str(e)})
+
+
+# Singleton global
+quota_engine = QuotaEngine()
@@ -0,0 +1,204 @@
+"""
+Retenção do histórico de conversas.
+
+Responsável por:
+- Remover mensagens além do TTL global ou por canal
+- Limitar o número de mensagens por conversa (usuário, canal)
+- Arquivar mensagens removidas em arquivos .jsonl.gz mensais (opcional)
+- Devolver espaço ao sistema de arquivos com incremental vacuum (SQLite)
+
+As políticas valem para o backend do histórico (STORAGE_BACKEND). A remoção
+é feita em lotes pequenos, cada um em sua própria transação, com pausas entre
+lotes para não segurar o lock de escrita do SQLite por muito tempo.
+"""
+
+import asyncio
+import gzip
+import json
+import time
+from collections import defaultdict
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from config import settings
+from database import Message
+from logger import logger
+from metrics import metrics
+from storage import Storage
+
+# Pausa entre lotes para deixar outros escritores adquirirem o lock
+BATCH_PAUSE_SECONDS = 0.05
+
+
+class MessageArchiver:
+    """Arquiva mensagens em arquivos JSONL comprimidos, um por mês."""
+
+    def __init__(self, archive_dir: Path):
+        """
+        Inicializa o arquivador.
+
+        Args:
+            archive_dir: Diretório dos arquivos (criado no primeiro arquivamento)
+        """
+        self.archive_dir = archive_dir
+
+    def path_for(self, created_at: datetime) -> Path:
+        """Caminho do arquivo do mês de `created_at`."""
+        return self.archive_dir / f"messages-{created_at:%Y-%m}.jsonl.gz"
+
+    def arquivar(self, messages: list[Message]) -> None:
+        """
+        Acrescenta as mensagens aos arquivos mensais correspondentes.
+
+        Args:
+            messages: Mensagens a arquivar
+        """
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        por_mes: dict[Path, list[Message]] = defaultdict(list)
+        for message in messages:
+            por_mes[self.path_for(message.created_at)].append(message)
+
+        for path, lote in por_mes.items():
+            # gzip aceita append: cada chamada adiciona um novo membro ao arquivo
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                for message in lote:
+                    record = {
+                        "id": message.id,
+                        "user_id": message.user_id,
+                        "channel_id": message.channel_id,
+                        "role": message.role,
+                        "content": message.content,
+                        "created_at": message.created_at.isoformat(),
+                    }
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class RetentionPruner:
+    """Aplica as políticas de retenção em lotes, em background."""
+
+    def __init__(self, storage: Storage, archiver: MessageArchiver | None = None):
+        """
+        Inicializa o pruner.
+
+        Args:
+            storage: Backend do histórico
+            archiver: Arquivador opcional para as mensagens removidas
+        """
+        self.storage = storage
+        self.archiver = archiver
+        self._task: asyncio.Task | None = None
+
+    @property
+    def habilitado(self) -> bool:
+        """Indica se há alguma política de retenção configurada."""
+        return bool(
+            settings.retention_days
+            or settings.retention_channel_days
+            or settings.retention_max_messages_per_conversation
+        )
+
+    async def _remover(self, messages: list[Message]) -> int:
+        """Arquiva (se configurado) e remove um lote de mensagens."""
+        if not messages:
+            return 0
+        if self.archiver is not None:
+            await asyncio.to_thread(self.archiver.arquivar, messages)
+        removed = await self.storage.delete_messages([message.id for message in messages])
+        metrics.incr("retention_deleted", removed)
+        await asyncio.sleep(BATCH_PAUSE_SECONDS)
+        return removed
+
+    async def _limpar_expiradas(
+        self,
+        cutoff: datetime,
+        channel_id: int | None = None,
+        exclude_channel_ids: tuple[int, ...] = (),
+    ) -> int:
+        total = 0
+        while True:
+            lote = await self.storage.get_expired_messages(
+                cutoff,
+                settings.retention_batch_size,
+                channel_id=channel_id,
+                exclude_channel_ids=exclude_channel_ids,
+            )
+            total += await self._remover(lote)
+            if len(lote) < settings.retention_batch_size:
+                return total
+
+    async def _limpar_excedentes(self, max_messages: int) -> int:
+        total = 0
+        for user_id, channel_id in await self.storage.get_oversized_conversations(max_messages):
+            while True:
+                lote = await self.storage.get_overflow_messages(
+                    user_id, channel_id, keep=max_messages, limit=settings.retention_batch_size
+                )
+                total += await self._remover(lote)
+                if len(lote) < settings.retention_batch_size:
+                    break
+        return total
+
+    async def executar_ciclo(self, now: datetime | None = None) -> dict[str, int]:
+        """
+        Executa um ciclo completo de retenção.
+
+        Args:
+            now: Instante de referência (UTC); padrão é o instante atual
+
+        Returns:
+            Dict com mensagens removidas por política e páginas livres restantes
+        """
+        now = now or datetime.now(UTC)
+        resultado = {"expired": 0, "overflow": 0, "freelist_pages": 0}
+        inicio = time.perf_counter()
+
+        for channel_id, days in settings.retention_channel_days.items():
+            resultado["expired"] += await self._limpar_expiradas(
+                now - timedelta(days=days), channel_id=channel_id
+            )
+        if settings.retention_days:
+            resultado["expired"] += await self._limpar_expiradas(
+                now - timedelta(days=settings.retention_days),
+                exclude_channel_ids=tuple(settings.retention_channel_days),
+            )
+        if settings.retention_max_messages_per_conversation:
+            resultado["overflow"] = await self._limpar_excedentes(
+                settings.retention_max_messages_per_conversation
+            )
+        if settings.retention_vacuum_pages:
+            resultado["freelist_pages"] = await self.storage.incremental_vacuum(
+                settings.retention_vacuum_pages
+            )
+
+        metrics.observe("retention_cycle_ms", (time.perf_counter() - inicio) * 1000)
+        logger.info("Ciclo de retenção concluído", extra=resultado)
+        return resultado
+
+    def iniciar(self) -> None:
+        """Inicia o loop em background se houver política configurada."""
+        if not self.habilitado:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="retention-pruner")
+
+    def parar(self) -> None:
+        """Cancela o loop em background."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.executar_ciclo()
+            except Exception as e:
+                logger.error("Erro no ciclo de retenção", extra={"error": str(e)})
+            await asyncio.sleep(settings.retention_interval_minutes * 60)
+
+
+def criar_pruner(storage: Storage) -> RetentionPruner:
+    """Cria o pruner do backend com o arquivador configurado em RETENTION_ARCHIVE_DIR."""
+    archiver = (
+        MessageArchiver(settings.retention_archive_dir) if settings.retention_archive_dir else None
+    )
+    return RetentionPruner(storage, archiver)
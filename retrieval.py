@@ -0,0 +1,149 @@
+"""
+Montagem do contexto enviado à IA.
+
+No modo "recent" o contexto são as últimas mensagens da conversa. Nos modos
+"fts" e "vector" são as últimas RETRIEVAL_RECENT_MESSAGES mensagens mais os
+turnos antigos (pergunta + resposta) mais relevantes para a pergunta atual,
+limitados a RETRIEVAL_TOKEN_BUDGET tokens estimados:
+
+- fts: busca textual do histórico (bm25 no SQLite, ts_rank no PostgreSQL)
+- vector: similaridade de cosseno entre vetores bag-of-words (embeddings.py).
+  As mensagens ganham vetor na primeira busca da conversa depois de gravadas.
+"""
+
+from config import settings
+from database import Message, estimar_tokens, pair_turns
+from embeddings import embed, similaridades
+from lanes import executar_na_faixa
+from logger import logger
+from metrics import metrics
+from storage import Storage
+
+
+async def montar_contexto(
+    storage: Storage,
+    user_id: int,
+    channel_id: int,
+    pergunta: str,
+) -> list[dict[str, str]]:
+    """
+    Retorna o histórico a enviar à IA no formato da API OpenAI.
+
+    Args:
+        storage: Backend do histórico
+        user_id: ID do usuário Discord
+        channel_id: ID do canal/DM
+        pergunta: Pergunta atual (usada para buscar turnos relevantes)
+
+    Returns:
+        Mensagens em ordem cronológica (turnos recuperados antes dos recentes)
+    """
+    if settings.context_retrieval == "recent":
+        return await storage.get_context_messages(user_id, channel_id)
+
+    recentes = (
+        await storage.get_conversation_history(
+            user_id, channel_id, limit=settings.retrieval_recent_messages
+        )
+        if settings.retrieval_recent_messages
+        else []
+    )
+    ids_recentes = {m.id for m in recentes}
+
+    if settings.context_retrieval == "fts":
+        ids = await _relevantes_fts(storage, user_id, channel_id, pergunta, ids_recentes)
+    else:
+        ids = await _relevantes_vetor(storage, user_id, channel_id, pergunta, ids_recentes)
+    turnos = await _turnos_no_orcamento(storage, user_id, channel_id, ids, ids_recentes)
+
+    metrics.incr("context_retrieved_turns", len(ids))
+    logger.debug(
+        "Contexto montado com turnos recuperados",
+        extra={
+            "user_id": user_id,
+            "channel_id": channel_id,
+            "mode": settings.context_retrieval,
+            "recent": len(recentes),
+            "retrieved": len(turnos),
+        },
+    )
+    return [m.to_openai_format() for m in turnos + recentes]
+
+
+async def _relevantes_fts(
+    storage: Storage, user_id: int, channel_id: int, pergunta: str, ids_recentes: set[int]
+) -> list[int]:
+    """IDs das mensagens mais relevantes pela busca textual, da mais para a menos relevante."""
+    hits = await storage.search_messages(
+        user_id,
+        pergunta,
+        limit=settings.retrieval_top_k + len(ids_recentes),
+        channel_id=channel_id,
+        any_term=True,
+    )
+    ids = [h.message.id for h in hits if h.message.id not in ids_recentes]
+    return ids[: settings.retrieval_top_k]
+
+
+async def _relevantes_vetor(
+    storage: Storage, user_id: int, channel_id: int, pergunta: str, ids_recentes: set[int]
+) -> list[int]:
+    """IDs das mensagens mais similares à pergunta, da mais para a menos similar."""
+    limite = settings.retrieval_vector_scan_limit
+
+    novas = await storage.get_unindexed_messages(user_id, channel_id, limite)
+    if novas:
+        vetores = await executar_na_faixa(lambda: [(m.id, embed(m.content)) for m in novas])
+        await storage.save_message_vectors(user_id, channel_id, vetores)
+        metrics.incr("message_vectors_indexed", len(vetores))
+
+    candidatos = [
+        (message_id, vetor)
+        for message_id, vetor in await storage.get_message_vectors(user_id, channel_id, limite)
+        if message_id not in ids_recentes
+    ]
+    if not candidatos:
+        return []
+    scores = await executar_na_faixa(
+        similaridades, embed(pergunta), [vetor for _, vetor in candidatos]
+    )
+    ranking = sorted(
+        (
+            (score, message_id)
+            for score, (message_id, _) in zip(scores, candidatos, strict=True)
+            if score >= settings.retrieval_min_similarity
+        ),
+        reverse=True,
+    )
+    return [message_id for _, message_id in ranking[: settings.retrieval_top_k]]
+
+
+async def _turnos_no_orcamento(
+    storage: Storage, user_id: int, channel_id: int, ids: list[int], ids_recentes: set[int]
+) -> list[Message]:
+    """
+    Turnos das mensagens indicadas que cabem em RETRIEVAL_TOKEN_BUDGET.
+
+    Os turnos entram por ordem de relevância; um turno que estoura o
+    orçamento é pulado, mas os seguintes (menores) ainda podem entrar.
+
+    Returns:
+        Mensagens dos turnos escolhidos em ordem cronológica
+    """
+    if not ids:
+        return []
+    candidatas = await storage.get_turns(user_id, channel_id, ids)
+    escolhidas: dict[int, Message] = {}
+    usados = 0
+    for message_id in ids:
+        turno = [
+            m
+            for m in pair_turns(candidatas, [message_id])
+            if m.id not in ids_recentes and m.id not in escolhidas
+        ]
+        custo = sum(estimar_tokens(m.content) for m in turno)
+        if not turno or usados + custo > settings.retrieval_token_budget:
+            continue
+        usados += custo
+        escolhidas.update((m.id, m) for m in turno)
+    return [escolhidas[i] for i in sorted(escolhidas)]
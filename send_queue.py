@@ -0,0 +1,212 @@
+"""
+Fila de envio para o Discord com controle de rate limit por canal.
+
+Responsável por:
+- Serializar envios por canal em filas independentes (canais não se bloqueiam)
+- Espaçar envios com um token bucket por canal (limite do Discord ~5 msgs/5s)
+- Registrar latência de envio e taxa de respostas 429
+
+Os 429 que o próprio discord.py trata são contados pelo handler instalado em
+logger.configurar_log_discord.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+import discord
+
+from config import settings
+from logger import logger
+from message_splitter import Envio
+from metrics import metrics
+
+EnviarFn = Callable[..., Awaitable[Any]]
+
+# Tentativas de reenvio após um 429 que chegou até nós
+MAX_RETRIES_429 = 3
+
+
+class TokenBucket:
+    """Token bucket simples: `rate` envios a cada `per_seconds` segundos."""
+
+    def __init__(self, rate: int, per_seconds: float):
+        """
+        Inicializa o bucket cheio.
+
+        Args:
+            rate: Capacidade do bucket (envios em rajada)
+            per_seconds: Tempo para reabastecer o bucket inteiro
+        """
+        self.capacity = float(rate)
+        self.tokens = float(rate)
+        self.refill_per_second = rate / per_seconds
+        self.updated = time.monotonic()
+
+    def tempo_ate_token(self) -> float:
+        """Consome um token se disponível; senão retorna quanto esperar (segundos)."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.refill_per_second
+        )
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+    async def adquirir(self) -> None:
+        """Aguarda até haver um token disponível e o consome."""
+        while (espera := self.tempo_ate_token()) > 0:
+            metrics.incr("discord_send_paced")
+            await asyncio.sleep(espera)
+
+
+@dataclass
+class _Pedido:
+    """Envio enfileirado aguardando o worker do canal."""
+
+    enviar: EnviarFn
+    envio: Envio
+    future: asyncio.Future
+
+
+class OutboundDispatcher:
+    """Despachante de envios com uma fila e um worker por canal."""
+
+    def __init__(
+        self,
+        rate: int | None = None,
+        per_seconds: float | None = None,
+        idle_timeout: float = 60.0,
+    ):
+        """
+        Inicializa o despachante.
+
+        Args:
+            rate: Envios permitidos por janela em cada canal
+            per_seconds: Duração da janela em segundos
+            idle_timeout: Segundos sem envios até o worker do canal encerrar
+        """
+        self.rate = rate or settings.send_rate_per_channel
+        self.per_seconds = per_seconds or settings.send_rate_window_seconds
+        self.idle_timeout = idle_timeout
+        self._filas: dict[int, asyncio.Queue[_Pedido]] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._buckets: dict[int, TokenBucket] = {}
+
+    async def enviar(self, channel_id: int, enviar: EnviarFn, envio: Envio) -> Any:
+        """
+        Enfileira um envio e aguarda sua conclusão.
+
+        Args:
+            channel_id: Canal de destino (chave da fila)
+            enviar: Função de envio (reply, channel.send, followup.send)
+            envio: Conteúdo a enviar
+
+        Returns:
+            Resultado da função de envio (ex.: discord.Message)
+        """
+        (resultado,) = await self.enviar_varios(channel_id, [(enviar, envio)])
+        return resultado
+
+    async def enviar_varios(
+        self,
+        channel_id: int,
+        pedidos: list[tuple[EnviarFn, Envio]],
+    ) -> list[Any]:
+        """
+        Enfileira vários envios de uma vez (preservando a ordem) e aguarda todos.
+
+        Enfileirar tudo antes de aguardar permite ao worker enviar o próximo
+        assim que o bucket do canal permitir.
+
+        Args:
+            channel_id: Canal de destino
+            pedidos: Lista de (função de envio, envio)
+
+        Returns:
+            Resultados na mesma ordem dos pedidos
+        """
+        loop = asyncio.get_running_loop()
+        fila = self._fila(channel_id)
+        futures = []
+        for enviar, envio in pedidos:
+            future = loop.create_future()
+            fila.put_nowait(_Pedido(enviar, envio, future))
+            futures.append(future)
+        metrics.gauge("discord_send_queue_depth", fila.qsize(), channel=channel_id)
+        return list(await asyncio.gather(*futures))
+
+    def _fila(self, channel_id: int) -> asyncio.Queue[_Pedido]:
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done() or worker.get_loop() is not asyncio.get_running_loop():
+            fila: asyncio.Queue[_Pedido] = asyncio.Queue()
+            self._filas[channel_id] = fila
+            self._workers[channel_id] = asyncio.create_task(
+                self._worker(channel_id, fila), name=f"send-queue-{channel_id}"
+            )
+        return self._filas[channel_id]
+
+    async def _worker(self, channel_id: int, fila: asyncio.Queue[_Pedido]) -> None:
+        bucket = self._buckets.setdefault(channel_id, TokenBucket(self.rate, self.per_seconds))
+        try:
+            while True:
+                try:
+                    pedido = await asyncio.wait_for(fila.get(), timeout=self.idle_timeout)
+                except TimeoutError:
+                    return
+                await bucket.adquirir()
+                await self._despachar(channel_id, pedido)
+        finally:
+            # Libera estruturas de canais ociosos (evita crescimento ilimitado)
+            if self._workers.get(channel_id) is asyncio.current_task() and fila.empty():
+                self._workers.pop(channel_id, None)
+                self._filas.pop(channel_id, None)
+                self._buckets.pop(channel_id, None)
+
+    async def _despachar(self, channel_id: int, pedido: _Pedido) -> None:
+        """Envia um pedido com tratamento de 429."""
+        for tentativa in range(MAX_RETRIES_429 + 1):
+            inicio = time.perf_counter()
+            try:
+                resultado = await pedido.enviar(**pedido.envio.kwargs())
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429 or tentativa == MAX_RETRIES_429:
+                    self._falhar(pedido, e)
+                    return
+                retry_after = 1.0
+            except Exception as e:
+                self._falhar(pedido, e)
+                return
+            else:
+                metrics.observe("discord_send_latency_ms", (time.perf_counter() - inicio) * 1000)
+                metrics.incr("discord_sends")
+                if not pedido.future.done():
+                    pedido.future.set_result(resultado)
+                return
+
+            metrics.incr("discord_429")
+            if tentativa == MAX_RETRIES_429:
+                break
+            logger.warning(
+                "Rate limit do Discord ao enviar mensagem",
+                extra={"channel_id": channel_id, "retry_after": retry_after},
+            )
+            await asyncio.sleep(retry_after)
+
+        self._falhar(pedido, RuntimeError("Rate limit persistente ao enviar mensagem"))
+
+    @staticmethod
+    def _falhar(pedido: _Pedido, erro: BaseException) -> None:
+        metrics.incr("discord_send_errors")
+        if not pedido.future.done():
+            pedido.future.set_exception(erro)
+
+
+# Singleton global
+dispatcher = OutboundDispatcher()
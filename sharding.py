@@ -0,0 +1,145 @@
+"""
+Sharding do Sherlock Bot.
+
+Cria o bot no modo adequado (Bot simples ou AutoShardedBot) e coleta métricas
+de saúde e latência por shard.
+"""
+
+import asyncio
+import math
+from typing import Any
+
+import discord
+from discord.ext import commands
+
+from config import settings
+from logger import logger
+from metrics import metrics
+
+# Bot e AutoShardedBot não têm base pública em comum
+BotDiscord = commands.Bot | commands.AutoShardedBot
+
+
+def criar_bot(intents: discord.Intents) -> BotDiscord:
+    """
+    Cria a instância do bot conforme a configuração de sharding.
+
+    Args:
+        intents: Intents do gateway
+
+    Returns:
+        commands.Bot ou commands.AutoShardedBot
+    """
+    if not settings.sharding_enabled:
+        return commands.Bot(command_prefix="!", intents=intents)
+
+    logger.info(
+        "Iniciando em modo sharded",
+        extra={"shard_count": settings.shard_count, "shard_ids": settings.shard_ids},
+    )
+    if settings.shard_ids is None:
+        return commands.AutoShardedBot(
+            command_prefix="!", intents=intents, shard_count=settings.shard_count
+        )
+    return commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        shard_count=settings.shard_count,
+        shard_ids=settings.shard_ids,
+    )
+
+
+def processo_coordenador() -> bool:
+    """
+    Indica se este processo roda as tarefas que não podem se repetir por worker.
+
+    Com o launcher cada worker tem uma faixa de shards; o dono do shard 0 é o
+    coordenador. Sem faixa definida (processo único) o próprio processo é.
+    """
+    return settings.shard_ids is None or 0 in settings.shard_ids
+
+
+def coletar_metricas_shards(bot: BotDiscord) -> dict[int, dict[str, Any]]:
+    """
+    Coleta latência e estado de cada shard deste processo.
+
+    Args:
+        bot: Instância do bot
+
+    Returns:
+        Dict shard_id -> {"latency_ms": float | None, "up": bool}
+    """
+    if isinstance(bot, commands.AutoShardedBot):
+        shards = {
+            shard_id: (info.latency, info.is_closed()) for shard_id, info in bot.shards.items()
+        }
+    else:
+        shards = {bot.shard_id or 0: (bot.latency, bot.is_closed())}
+
+    resultado: dict[int, dict[str, Any]] = {}
+    for shard_id, (latency, closed) in shards.items():
+        latency_ms = latency * 1000 if math.isfinite(latency) else None
+        up = not closed and latency_ms is not None
+        if latency_ms is not None:
+            metrics.gauge("shard_latency_ms", latency_ms, shard=shard_id)
+        metrics.gauge("shard_up", 1 if up else 0, shard=shard_id)
+        resultado[shard_id] = {"latency_ms": latency_ms, "up": up}
+    return resultado
+
+
+def registrar_eventos_shards(bot: BotDiscord) -> None:
+    """Registra listeners que contam eventos de conexão por shard."""
+
+    async def on_shard_connect(shard_id: int) -> None:
+        metrics.incr("shard_events", shard=shard_id, event="connect")
+
+    async def on_shard_disconnect(shard_id: int) -> None:
+        metrics.incr("shard_events", shard=shard_id, event="disconnect")
+        logger.warning("Shard desconectado", extra={"shard_id": shard_id})
+
+    async def on_shard_resumed(shard_id: int) -> None:
+        metrics.incr("shard_events", shard=shard_id, event="resumed")
+
+    for listener in (on_shard_connect, on_shard_disconnect, on_shard_resumed):
+        bot.add_listener(listener)
+
+
+class MonitorShards:
+    """Tarefa em background que registra periodicamente a saúde dos shards."""
+
+    def __init__(self, bot: BotDiscord, interval_seconds: float):
+        """
+        Inicializa o monitor.
+
+        Args:
+            bot: Instância do bot
+            interval_seconds: Intervalo entre coletas
+        """
+        self.bot = bot
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    def iniciar(self) -> None:
+        """Inicia o monitor (chamadas repetidas são ignoradas)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="shard-monitor")
+
+    def parar(self) -> None:
+        """Cancela o monitor."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                shards = coletar_metricas_shards(self.bot)
+                down = [shard_id for shard_id, info in shards.items() if not info["up"]]
+                log = logger.warning if down else logger.info
+                log(
+                    "Saúde dos shards",
+                    extra={"shards": shards, "shards_down": down},
+                )
+            except Exception as e:
+                logger.error("Erro ao coletar métricas de shards", extra={"error": str(e)})
+            await asyncio.sleep(self.interval_seconds)
@@ -10,6 +10,14 @@ NC='\033[0m' # No Color
 
 PID_FILE=".bot.pid"
 
+# Tempo de espera pelo encerramento gracioso antes do SIGKILL: o bot drena as
+# respostas em andamento e executa as etapas de encerramento dentro de
+# SHUTDOWN_TIMEOUT_SECONDS (padrão 60s); a margem cobre a saída do interpretador
+STOP_MARGIN_SECONDS=5
+TIMEOUT_SECONDS=$(grep -E '^SHUTDOWN_TIMEOUT_SECONDS=' .env 2>/dev/null | cut -d= -f2)
+STOP_TIMEOUT=$(awk -v t="${TIMEOUT_SECONDS:-60}" -v m="$STOP_MARGIN_SECONDS" \
+    'BEGIN { t += m; print (t == int(t)) ? t : int(t) + 1 }')
+
 echo -e "${YELLOW}🛑 Parando Sherlock Bot...${NC}"
 
 # Verificar se PID file existe
@@ -45,8 +53,9 @@ fi
 echo -e "${YELLOW}📤 Enviando SIGTERM para PID $PID...${NC}"
 kill "$PID"
 
-# Aguardar até 10 segundos para o processo encerrar
-for i in {1..10}; do
+# Aguardar o encerramento gracioso (drenagem das respostas em andamento)
+echo "Aguardando respostas em andamento (até ${STOP_TIMEOUT}s)..."
+for ((i = 1; i <= STOP_TIMEOUT; i++)); do
     if ! ps -p "$PID" > /dev/null 2>&1; then
         echo -e "${GREEN}✅ Bot encerrado com sucesso!${NC}"
         rm "$PID_FILE"
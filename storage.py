@@ -0,0 +1,874 @@
+"""
+Backends de armazenamento do histórico de conversas.
+
+Responsável por:
+- Definir a interface assíncrona usada pelo bot para o histórico (Storage)
+- SQLiteStorage: o banco local de database.py, executado fora do event loop
+- PostgresStorage: PostgreSQL via asyncpg, para vários hosts do bot
+  compartilharem o mesmo histórico
+- Escolher o backend a partir de STORAGE_BACKEND
+
+A retenção (retention.py) age sobre o backend configurado. Registro de uso,
+cotas e estado de sincronização de comandos continuam no SQLite local de
+cada host.
+"""
+
+import asyncio
+import functools
+import importlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import ModuleType
+from typing import Any
+
+import database
+from config import settings
+from database import (
+    Message,
+    SearchHit,
+    from_epoch_ms,
+    pair_turns,
+    to_epoch_ms,
+    turn_candidate_ids,
+)
+from lanes import FAIXA_RAPIDA, conexoes_reservadas, executar_na_faixa, faixa_atual
+from logger import logger
+from migrations import INT_TO_ROLE, ROLE_TO_INT
+
+
+@functools.cache
+def _asyncpg() -> ModuleType | None:
+    """asyncpg, importado no primeiro uso: só o backend postgres precisa dele."""
+    try:
+        return importlib.import_module("asyncpg")
+    except ImportError:  # dependência opcional: pip install "sherlock-bot[postgres]"
+        return None
+
+
+# Mensagem de conversa a gravar: (role, content, tokens)
+NovaMensagem = tuple[str, str, int]
+
+
+class Storage(ABC):
+    """Interface assíncrona do histórico de conversas."""
+
+    async def close(self) -> None:  # noqa: B027 - opcional para backends sem recursos
+        """Libera conexões e recursos do backend."""
+
+    async def add_message(
+        self, user_id: int, channel_id: int, role: str, content: str, tokens: int = 0
+    ) -> int:
+        """
+        Adiciona uma mensagem ao histórico.
+
+        Args:
+            user_id: ID do usuário Discord
+            channel_id: ID do canal (ou DM)
+            role: "user" ou "assistant"
+            content: Conteúdo da mensagem
+            tokens: Tokens consumidos por esta mensagem
+
+        Returns:
+            ID da mensagem inserida
+        """
+        (message_id,) = await self.add_messages(user_id, channel_id, [(role, content, tokens)])
+        return message_id
+
+    @abstractmethod
+    async def add_messages(
+        self, user_id: int, channel_id: int, messages: list[NovaMensagem]
+    ) -> list[int]:
+        """
+        Adiciona várias mensagens de uma conversa em uma única transação.
+
+        Args:
+            user_id: ID do usuário Discord
+            channel_id: ID do canal (ou DM)
+            messages: Lista de (role, content, tokens), na ordem da conversa
+
+        Returns:
+            IDs das mensagens inseridas, na mesma ordem
+
+        Raises:
+            ValueError: Se algum role for inválido
+        """
+
+    @abstractmethod
+    async def get_conversation_history(
+        self, user_id: int, channel_id: int, limit: int | None = None
+    ) -> list[Message]:
+        """
+        Recupera o histórico de um usuário em um canal, da mais antiga para a mais recente.
+
+        Args:
+            user_id: ID do usuário Discord
+            channel_id: ID do canal
+            limit: Número máximo de mensagens (usa settings.max_context_messages se None)
+        """
+
+    @abstractmethod
+    async def get_channel_history(self, channel_id: int, limit: int) -> list[Message]:
+        """
+        Recupera as últimas mensagens de um canal, de todos os usuários.
+
+        Args:
+            channel_id: ID do canal
+            limit: Número máximo de mensagens
+        """
+
+    async def get_context_messages(self, user_id: int, channel_id: int) -> list[dict[str, str]]:
+        """Retorna o histórico no formato da API OpenAI."""
+        history = await self.get_conversation_history(user_id, channel_id)
+        return [msg.to_openai_format() for msg in history]
+
+    @abstractmethod
+    async def clear_user_history(self, user_id: int, channel_id: int | None = None) -> int:
+        """
+        Limpa o histórico de um usuário.
+
+        Args:
+            user_id: ID do usuário Discord
+            channel_id: Se None, limpa todos os canais
+
+        Returns:
+            Número de mensagens removidas
+        """
+
+    @abstractmethod
+    async def get_user_stats(self, user_id: int) -> dict[str, Any]:
+        """
+        Retorna estatísticas do usuário.
+
+        Returns:
+            Dict com total_messages, total_channels, total_tokens e last_active_at
+        """
+
+    @abstractmethod
+    async def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        limit: int,
+        offset: int = 0,
+        channel_id: int | None = None,
+        any_term: bool = False,
+    ) -> list[SearchHit]:
+        """
+        Busca textual no histórico de um usuário, por relevância.
+
+        Args:
+            user_id: ID do usuário Discord (a busca nunca cruza usuários)
+            query: Texto livre a buscar
+            limit: Máximo de resultados
+            offset: Resultados a pular (paginação)
+            channel_id: Se definido, busca apenas neste canal
+            any_term: Se True, basta um dos termos aparecer
+        """
+
+    @abstractmethod
+    async def get_turns(
+        self, user_id: int, channel_id: int, message_ids: list[int]
+    ) -> list[Message]:
+        """
+        Retorna as mensagens indicadas com o par de cada uma (pergunta/resposta).
+
+        Returns:
+            Mensagens dos turnos em ordem cronológica
+        """
+
+    @abstractmethod
+    async def get_unindexed_messages(
+        self, user_id: int, channel_id: int, limit: int
+    ) -> list[Message]:
+        """
+        Retorna as mensagens da conversa gravadas depois da última com vetor.
+
+        Returns:
+            Até `limit` mensagens sem vetor, da mais recente para a mais antiga
+        """
+
+    @abstractmethod
+    async def save_message_vectors(
+        self, user_id: int, channel_id: int, vectors: list[tuple[int, bytes]]
+    ) -> None:
+        """Grava os vetores (message_id, vetor) de mensagens de uma conversa."""
+
+    @abstractmethod
+    async def get_message_vectors(
+        self, user_id: int, channel_id: int, limit: int
+    ) -> list[tuple[int, bytes]]:
+        """
+        Retorna os vetores das mensagens mais recentes de uma conversa.
+
+        Returns:
+            Lista de (message_id, vetor), da mensagem mais recente para a mais antiga
+        """
+
+    # Retenção (retention.py)
+    @abstractmethod
+    async def get_expired_messages(
+        self,
+        cutoff: datetime,
+        limit: int,
+        channel_id: int | None = None,
+        exclude_channel_ids: tuple[int, ...] = (),
+    ) -> list[Message]:
+        """
+        Retorna um lote das mensagens mais antigas criadas antes de `cutoff`.
+
+        Args:
+            cutoff: Data limite (UTC); mensagens anteriores estão expiradas
+            limit: Tamanho máximo do lote
+            channel_id: Se definido, considera apenas este canal
+            exclude_channel_ids: Canais ignorados (possuem TTL próprio)
+        """
+
+    @abstractmethod
+    async def get_oversized_conversations(self, max_messages: int) -> list[tuple[int, int]]:
+        """Retorna as conversas (user_id, channel_id) com mais de `max_messages` mensagens."""
+
+    @abstractmethod
+    async def get_overflow_messages(
+        self, user_id: int, channel_id: int, keep: int, limit: int
+    ) -> list[Message]:
+        """
+        Retorna um lote das mensagens de uma conversa além das `keep` mais recentes.
+
+        Returns:
+            Mensagens excedentes, das mais recentes para as mais antigas
+        """
+
+    @abstractmethod
+    async def delete_messages(self, message_ids: list[int]) -> int:
+        """
+        Remove mensagens pelo ID (com seus vetores e estatísticas) em uma transação curta.
+
+        Returns:
+            Número de mensagens removidas
+        """
+
+    async def incremental_vacuum(self, pages: int) -> int:
+        """
+        Devolve até `pages` páginas livres ao sistema de arquivos.
+
+        O padrão não faz nada (o PostgreSQL recupera espaço com o autovacuum).
+
+        Returns:
+            Número de páginas livres restantes
+        """
+        return 0
+
+
+class SQLiteStorage(Storage):
+    """Histórico no SQLite local (database.py), com as chamadas nas threads da faixa atual."""
+
+    async def add_messages(
+        self, user_id: int, channel_id: int, messages: list[NovaMensagem]
+    ) -> list[int]:
+        return await executar_na_faixa(database.add_messages, user_id, channel_id, messages)
+
+    async def get_conversation_history(
+        self, user_id: int, channel_id: int, limit: int | None = None
+    ) -> list[Message]:
+        return await executar_na_faixa(
+            database.get_conversation_history, user_id, channel_id, limit
+        )
+
+    async def get_channel_history(self, channel_id: int, limit: int) -> list[Message]:
+        return await executar_na_faixa(database.get_channel_history, channel_id, limit)
+
+    async def clear_user_history(self, user_id: int, channel_id: int | None = None) -> int:
+        return await executar_na_faixa(database.clear_user_history, user_id, channel_id)
+
+    async def get_user_stats(self, user_id: int) -> dict[str, Any]:
+        return await executar_na_faixa(database.get_user_stats, user_id)
+
+    async def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        limit: int,
+        offset: int = 0,
+        channel_id: int | None = None,
+        any_term: bool = False,
+    ) -> list[SearchHit]:
+        return await executar_na_faixa(
+            database.search_messages, user_id, query, limit, offset, channel_id, any_term
+        )
+
+    async def get_turns(
+        self, user_id: int, channel_id: int, message_ids: list[int]
+    ) -> list[Message]:
+        return await executar_na_faixa(database.get_turns, user_id, channel_id, message_ids)
+
+    async def get_unindexed_messages(
+        self, user_id: int, channel_id: int, limit: int
+    ) -> list[Message]:
+        return await executar_na_faixa(database.get_unindexed_messages, user_id, channel_id, limit)
+
+    async def save_message_vectors(
+        self, user_id: int, channel_id: int, vectors: list[tuple[int, bytes]]
+    ) -> None:
+        await executar_na_faixa(database.save_message_vectors, user_id, channel_id, vectors)
+
+    async def get_message_vectors(
+        self, user_id: int, channel_id: int, limit: int
+    ) -> list[tuple[int, bytes]]:
+        return await executar_na_faixa(database.get_message_vectors, user_id, channel_id, limit)
+
+    async def get_expired_messages(
+        self,
+        cutoff: datetime,
+        limit: int,
+        channel_id: int | None = None,
+        exclude_channel_ids: tuple[int, ...] = (),
+    ) -> list[Message]:
+        return await executar_na_faixa(
+            database.get_expired_messages, cutoff, limit, channel_id, exclude_channel_ids
+        )
+
+    async def get_oversized_conversations(self, max_messages: int) -> list[tuple[int, int]]:
+        return await executar_na_faixa(database.get_oversized_conversations, max_messages)
+
+    async def get_overflow_messages(
+        self, user_id: int, channel_id: int, keep: int, limit: int
+    ) -> list[Message]:
+        return await executar_na_faixa(
+            database.get_overflow_messages, user_id, channel_id, keep, limit
+        )
+
+    async def delete_messages(self, message_ids: list[int]) -> int:
+        return await executar_na_faixa(database.delete_messages, message_ids)
+
+    async def incremental_vacuum(self, pages: int) -> int:
+        return await executar_na_faixa(database.incremental_vacuum, pages)
+
+
+# =============================================================================
+# PostgreSQL
+# =============================================================================
+# Schema criado na primeira conexão. Timestamps em epoch-ms e role inteiro,
+# como no SQLite. As estatísticas são mantidas na mesma transação das escritas.
+POSTGRES_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL,
+        role SMALLINT NOT NULL CHECK (role IN (0, 1)),
+        content TEXT NOT NULL,
+        created_at BIGINT NOT NULL,
+        tokens INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_user_channel
+    ON messages (user_id, channel_id, created_at)
+    """,
+    # Retenção por TTL: mensagens mais antigas primeiro
+    """
+    CREATE INDEX IF NOT EXISTS idx_created_at ON messages (created_at)
+    """,
+    # Contexto compartilhado: últimas mensagens do canal, de todos os autores
+    """
+    CREATE INDEX IF NOT EXISTS idx_channel_created ON messages (channel_id, created_at)
+    """,
+    # Busca textual: índice GIN sobre o tsvector do conteúdo
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_content_fts
+    ON messages USING GIN (to_tsvector('simple', content))
+    """,
+    # Vetores para a busca por similaridade (embeddings.py)
+    """
+    CREATE TABLE IF NOT EXISTS message_vectors (
+        user_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        vector BYTEA NOT NULL,
+        PRIMARY KEY (user_id, channel_id, message_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id BIGINT PRIMARY KEY,
+        total_messages BIGINT NOT NULL,
+        total_channels INTEGER NOT NULL,
+        total_tokens BIGINT NOT NULL,
+        last_active_at BIGINT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS conversation_stats (
+        user_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL,
+        message_count BIGINT NOT NULL,
+        PRIMARY KEY (user_id, channel_id)
+    )
+    """,
+)
+
+# Acumula a conversa; RETURNING informa se ela é nova (contagem == lote)
+PG_UPSERT_CONVERSATION = """
+    INSERT INTO conversation_stats (user_id, channel_id, message_count)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (user_id, channel_id) DO UPDATE SET
+        message_count = conversation_stats.message_count + EXCLUDED.message_count
+    RETURNING message_count
+"""
+
+PG_UPSERT_USER = """
+    INSERT INTO user_stats (user_id, total_messages, total_channels, total_tokens, last_active_at)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_messages = user_stats.total_messages + EXCLUDED.total_messages,
+        total_channels = user_stats.total_channels + EXCLUDED.total_channels,
+        total_tokens = user_stats.total_tokens + EXCLUDED.total_tokens,
+        last_active_at = CASE
+            WHEN user_stats.last_active_at IS NULL
+                OR EXCLUDED.last_active_at > user_stats.last_active_at
+            THEN EXCLUDED.last_active_at
+            ELSE user_stats.last_active_at
+        END
+"""
+
+PG_SELECT_HISTORY = """
+    SELECT id, user_id, channel_id, role, content, created_at
+    FROM messages
+    WHERE user_id = $1 AND channel_id = $2
+    ORDER BY created_at DESC, id DESC
+    LIMIT $3
+"""
+
+PG_SELECT_CHANNEL_HISTORY = """
+    SELECT id, user_id, channel_id, role, content, created_at
+    FROM messages
+    WHERE channel_id = $1
+    ORDER BY created_at DESC, id DESC
+    LIMIT $2
+"""
+
+PG_SELECT_STATS = """
+    SELECT total_messages, total_channels, total_tokens, last_active_at
+    FROM user_stats
+    WHERE user_id = $1
+"""
+
+PG_SEARCH = """
+    SELECT
+        id, user_id, channel_id, role, content, created_at,
+        ts_headline(
+            'simple', content, q, 'StartSel=**, StopSel=**, MaxWords=16, MinWords=6'
+        ) AS snippet
+    FROM messages, to_tsquery('simple', $2) AS q
+    WHERE user_id = $1
+        AND ($3::bigint IS NULL OR channel_id = $3)
+        AND to_tsvector('simple', content) @@ q
+    ORDER BY ts_rank(to_tsvector('simple', content), q) DESC, id DESC
+    LIMIT $4 OFFSET $5
+"""
+
+# Mensagens depois da última com vetor; o filtro por created_at limita a
+# varredura do índice às mensagens novas
+PG_SELECT_UNINDEXED = """
+    WITH ultimo AS (
+        SELECT v.message_id, m.created_at
+        FROM message_vectors v JOIN messages m ON m.id = v.message_id
+        WHERE v.user_id = $1 AND v.channel_id = $2
+        ORDER BY v.message_id DESC
+        LIMIT 1
+    )
+    SELECT id, user_id, channel_id, role, content, created_at
+    FROM messages
+    WHERE user_id = $1 AND channel_id = $2
+        AND created_at >= COALESCE((SELECT created_at FROM ultimo), 0)
+        AND id > COALESCE((SELECT message_id FROM ultimo), 0)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $3
+"""
+
+PG_UPSERT_VECTOR = """
+    INSERT INTO message_vectors (user_id, channel_id, message_id, vector)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id, channel_id, message_id) DO UPDATE SET vector = EXCLUDED.vector
+"""
+
+PG_SELECT_VECTORS = """
+    SELECT message_id, vector FROM message_vectors
+    WHERE user_id = $1 AND channel_id = $2
+    ORDER BY message_id DESC
+    LIMIT $3
+"""
+
+PG_SELECT_OVERSIZED = """
+    SELECT user_id, channel_id FROM conversation_stats WHERE message_count > $1
+"""
+
+PG_SELECT_OVERFLOW = """
+    SELECT id, user_id, channel_id, role, content, created_at
+    FROM messages
+    WHERE user_id = $1 AND channel_id = $2
+    ORDER BY created_at DESC, id DESC
+    LIMIT $3 OFFSET $4
+"""
+
+# Descontos da retenção; a conversa ou o usuário que chega a zero sai das
+# estatísticas, como nos triggers do SQLite
+PG_DECREMENT_CONVERSATION = """
+    UPDATE conversation_stats SET message_count = message_count - $3
+    WHERE user_id = $1 AND channel_id = $2
+    RETURNING message_count
+"""
+
+PG_DECREMENT_USER = """
+    UPDATE user_stats SET
+        total_messages = total_messages - $2,
+        total_channels = total_channels - $3,
+        total_tokens = total_tokens - $4,
+        last_active_at = (SELECT MAX(created_at) FROM messages WHERE user_id = $1)
+    WHERE user_id = $1
+    RETURNING total_messages
+"""
+
+# Recalcula a linha do usuário depois de uma remoção (operação rara)
+PG_RECOMPUTE_USER = """
+    INSERT INTO user_stats (user_id, total_messages, total_channels, total_tokens, last_active_at)
+    SELECT
+        user_id,
+        COUNT(*),
+        (SELECT COUNT(*) FROM conversation_stats WHERE user_id = $1),
+        SUM(tokens),
+        MAX(created_at)
+    FROM messages
+    WHERE user_id = $1
+    GROUP BY user_id
+"""
+
+
+class PostgresStorage(Storage):
+    """
+    Histórico no PostgreSQL com pool de conexões asyncpg.
+
+    O asyncpg prepara e mantém em cache cada consulta por conexão, então as
+    consultas fixas abaixo são executadas como prepared statements. Inserções
+    em lote usam um único INSERT com várias linhas.
+    """
+
+    def __init__(
+        self,
+        dsn: str | None = None,
+        min_size: int | None = None,
+        max_size: int | None = None,
+        pool: Any = None,
+    ):
+        """
+        Inicializa o backend (o pool é criado na primeira operação).
+
+        Args:
+            dsn: DSN do PostgreSQL (padrão: POSTGRES_DSN)
+            min_size: Conexões mínimas do pool
+            max_size: Conexões máximas do pool
+            pool: Pool já criado (compatível com asyncpg.Pool), ex.: em testes
+        """
+        if pool is None and _asyncpg() is None:
+            raise RuntimeError(
+                'STORAGE_BACKEND=postgres exige asyncpg: pip install "sherlock-bot[postgres]"'
+            )
+        self.dsn = dsn or settings.postgres_dsn
+        self.min_size = settings.postgres_pool_min_size if min_size is None else min_size
+        self.max_size = max_size or settings.postgres_pool_max_size
+        self._pool = pool
+        self._schema_pronto = False
+        self._init_lock = asyncio.Lock()
+        # Conexões que só a faixa rápida (/stats, /limpar, ...) pode usar
+        self._limite_outras_faixas = asyncio.Semaphore(
+            self.max_size - conexoes_reservadas(self.max_size)
+        )
+
+    @asynccontextmanager
+    async def _conectar(self) -> AsyncIterator[Any]:
+        """Conexão do pool; fora da faixa rápida, sem usar as reservadas a ela."""
+        pool = await self._obter_pool()
+        if faixa_atual.get() is FAIXA_RAPIDA:
+            async with pool.acquire() as conn:
+                yield conn
+        else:
+            async with self._limite_outras_faixas, pool.acquire() as conn:
+                yield conn
+
+    async def _obter_pool(self) -> Any:
+        if self._schema_pronto:
+            return self._pool
+        async with self._init_lock:
+            if self._pool is None:
+                asyncpg = _asyncpg()
+                assert asyncpg is not None  # verificado no __init__ quando não há pool
+                self._pool = await asyncpg.create_pool(
+                    self.dsn, min_size=self.min_size, max_size=self.max_size
+                )
+            if not self._schema_pronto:
+                async with self._pool.acquire() as conn:
+                    for ddl in POSTGRES_SCHEMA:
+                        await conn.execute(ddl)
+                self._schema_pronto = True
+                logger.info(
+                    "PostgreSQL pronto",
+                    extra={"min_size": self.min_size, "max_size": self.max_size},
+                )
+        return self._pool
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            self._schema_pronto = False
+
+    async def add_messages(
+        self, user_id: int, channel_id: int, messages: list[NovaMensagem]
+    ) -> list[int]:
+        for role, _, _ in messages:
+            if role not in ROLE_TO_INT:
+                raise ValueError(f"Role inválido: {role}. Deve ser 'user' ou 'assistant'.")
+        if not messages:
+            return []
+
+        created_at = database.now_epoch_ms()
+        valores = ", ".join(
+            f"(${i * 6 + 1}, ${i * 6 + 2}, ${i * 6 + 3}, ${i * 6 + 4}, ${i * 6 + 5}, ${i * 6 + 6})"
+            for i in range(len(messages))
+        )
+        params: list[Any] = []
+        for role, content, tokens in messages:
+            params += [user_id, channel_id, ROLE_TO_INT[role], content, created_at, tokens]
+        tokens_total = sum(tokens for _, _, tokens in messages)
+
+        async with self._conectar() as conn, conn.transaction():
+            rows = await conn.fetch(
+                "INSERT INTO messages (user_id, channel_id, role, content, created_at, tokens) "
+                f"VALUES {valores} RETURNING id",
+                *params,
+            )
+            count = await conn.fetchval(PG_UPSERT_CONVERSATION, user_id, channel_id, len(messages))
+            nova_conversa = 1 if count == len(messages) else 0
+            await conn.execute(
+                PG_UPSERT_USER, user_id, len(messages), nova_conversa, tokens_total, created_at
+            )
+        return [row["id"] for row in rows]
+
+    async def get_conversation_history(
+        self, user_id: int, channel_id: int, limit: int | None = None
+    ) -> list[Message]:
+        if limit is None:
+            limit = settings.max_context_messages
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SELECT_HISTORY, user_id, channel_id, limit)
+        return [_message_from_record(row) for row in reversed(rows)]
+
+    async def get_channel_history(self, channel_id: int, limit: int) -> list[Message]:
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SELECT_CHANNEL_HISTORY, channel_id, limit)
+        return [_message_from_record(row) for row in reversed(rows)]
+
+    async def clear_user_history(self, user_id: int, channel_id: int | None = None) -> int:
+        async with self._conectar() as conn, conn.transaction():
+            if channel_id is not None:
+                status = await conn.execute(
+                    "DELETE FROM messages WHERE user_id = $1 AND channel_id = $2",
+                    user_id,
+                    channel_id,
+                )
+                for tabela in ("conversation_stats", "message_vectors"):
+                    await conn.execute(
+                        f"DELETE FROM {tabela} WHERE user_id = $1 AND channel_id = $2",
+                        user_id,
+                        channel_id,
+                    )
+            else:
+                status = await conn.execute("DELETE FROM messages WHERE user_id = $1", user_id)
+                for tabela in ("conversation_stats", "message_vectors"):
+                    await conn.execute(f"DELETE FROM {tabela} WHERE user_id = $1", user_id)
+            await conn.execute("DELETE FROM user_stats WHERE user_id = $1", user_id)
+            await conn.execute(PG_RECOMPUTE_USER, user_id)
+        # Status do comando no formato "DELETE <linhas>"
+        return int(status.split()[-1])
+
+    async def get_user_stats(self, user_id: int) -> dict[str, Any]:
+        async with self._conectar() as conn:
+            row = await conn.fetchrow(PG_SELECT_STATS, user_id)
+        if row is None:
+            return {
+                "total_messages": 0,
+                "total_channels": 0,
+                "total_tokens": 0,
+                "last_active_at": None,
+            }
+        return {
+            "total_messages": row["total_messages"],
+            "total_channels": row["total_channels"],
+            "total_tokens": row["total_tokens"],
+            "last_active_at": (
+                from_epoch_ms(row["last_active_at"]) if row["last_active_at"] is not None else None
+            ),
+        }
+
+    async def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        limit: int,
+        offset: int = 0,
+        channel_id: int | None = None,
+        any_term: bool = False,
+    ) -> list[SearchHit]:
+        # Mesmos termos do FTS5; são só letras/dígitos, seguros no tsquery
+        terms = database.build_fts_query(query, any_term)
+        if terms is None:
+            return []
+        tsquery = terms.replace('"', "").replace(" AND ", " & ").replace(" OR ", " | ")
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SEARCH, user_id, tsquery, channel_id, limit, offset)
+        return [SearchHit(_message_from_record(row), row["snippet"]) for row in rows]
+
+    async def get_turns(
+        self, user_id: int, channel_id: int, message_ids: list[int]
+    ) -> list[Message]:
+        ids = turn_candidate_ids(message_ids)
+        if not ids:
+            return []
+        placeholders = ", ".join(f"${i + 3}" for i in range(len(ids)))
+        async with self._conectar() as conn:
+            rows = await conn.fetch(
+                "SELECT id, user_id, channel_id, role, content, created_at FROM messages "
+                f"WHERE user_id = $1 AND channel_id = $2 AND id IN ({placeholders})",
+                user_id,
+                channel_id,
+                *ids,
+            )
+        return pair_turns([_message_from_record(row) for row in rows], message_ids)
+
+    async def get_unindexed_messages(
+        self, user_id: int, channel_id: int, limit: int
+    ) -> list[Message]:
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SELECT_UNINDEXED, user_id, channel_id, limit)
+        return [_message_from_record(row) for row in rows]
+
+    async def save_message_vectors(
+        self, user_id: int, channel_id: int, vectors: list[tuple[int, bytes]]
+    ) -> None:
+        if not vectors:
+            return
+        async with self._conectar() as conn:
+            await conn.executemany(
+                PG_UPSERT_VECTOR,
+                [(user_id, channel_id, message_id, vector) for message_id, vector in vectors],
+            )
+
+    async def get_message_vectors(
+        self, user_id: int, channel_id: int, limit: int
+    ) -> list[tuple[int, bytes]]:
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SELECT_VECTORS, user_id, channel_id, limit)
+        return [(row["message_id"], bytes(row["vector"])) for row in rows]
+
+    async def get_expired_messages(
+        self,
+        cutoff: datetime,
+        limit: int,
+        channel_id: int | None = None,
+        exclude_channel_ids: tuple[int, ...] = (),
+    ) -> list[Message]:
+        conditions = ["created_at < $1"]
+        params: list[Any] = [to_epoch_ms(cutoff)]
+        if channel_id is not None:
+            params.append(channel_id)
+            conditions.append(f"channel_id = ${len(params)}")
+        if exclude_channel_ids:
+            placeholders = ", ".join(
+                f"${len(params) + i + 1}" for i in range(len(exclude_channel_ids))
+            )
+            params.extend(exclude_channel_ids)
+            conditions.append(f"channel_id NOT IN ({placeholders})")
+        params.append(limit)
+        async with self._conectar() as conn:
+            rows = await conn.fetch(
+                "SELECT id, user_id, channel_id, role, content, created_at FROM messages "
+                f"WHERE {' AND '.join(conditions)} ORDER BY created_at, id LIMIT ${len(params)}",
+                *params,
+            )
+        return [_message_from_record(row) for row in rows]
+
+    async def get_oversized_conversations(self, max_messages: int) -> list[tuple[int, int]]:
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SELECT_OVERSIZED, max_messages)
+        return [(row["user_id"], row["channel_id"]) for row in rows]
+
+    async def get_overflow_messages(
+        self, user_id: int, channel_id: int, keep: int, limit: int
+    ) -> list[Message]:
+        async with self._conectar() as conn:
+            rows = await conn.fetch(PG_SELECT_OVERFLOW, user_id, channel_id, limit, keep)
+        return [_message_from_record(row) for row in rows]
+
+    async def delete_messages(self, message_ids: list[int]) -> int:
+        if not message_ids:
+            return 0
+        placeholders = ", ".join(f"${i + 1}" for i in range(len(message_ids)))
+        async with self._conectar() as conn, conn.transaction():
+            rows = await conn.fetch(
+                "DELETE FROM messages "
+                f"WHERE id IN ({placeholders}) RETURNING id, user_id, channel_id, tokens",
+                *message_ids,
+            )
+            if not rows:
+                return 0
+            await conn.executemany(
+                "DELETE FROM message_vectors "
+                "WHERE user_id = $1 AND channel_id = $2 AND message_id = $3",
+                [(row["user_id"], row["channel_id"], row["id"]) for row in rows],
+            )
+            # Estatísticas mantidas na mesma transação, como nas inserções
+            por_conversa = Counter((row["user_id"], row["channel_id"]) for row in rows)
+            por_usuario = Counter(row["user_id"] for row in rows)
+            tokens: Counter[int] = Counter()
+            for row in rows:
+                tokens[row["user_id"]] += row["tokens"]
+            canais_vazios: Counter[int] = Counter()
+            for (user_id, channel_id), count in por_conversa.items():
+                restantes = await conn.fetchval(
+                    PG_DECREMENT_CONVERSATION, user_id, channel_id, count
+                )
+                if restantes is not None and restantes <= 0:
+                    await conn.execute(
+                        "DELETE FROM conversation_stats WHERE user_id = $1 AND channel_id = $2",
+                        user_id,
+                        channel_id,
+                    )
+                    canais_vazios[user_id] += 1
+            for user_id, count in por_usuario.items():
+                restantes = await conn.fetchval(
+                    PG_DECREMENT_USER, user_id, count, canais_vazios[user_id], tokens[user_id]
+                )
+                if restantes is not None and restantes <= 0:
+                    await conn.execute("DELETE FROM user_stats WHERE user_id = $1", user_id)
+        return len(rows)
+
+
+def _message_from_record(row: Any) -> Message:
+    return Message(
+        id=row["id"],
+        user_id=row["user_id"],
+        channel_id=row["channel_id"],
+        role=INT_TO_ROLE[row["role"]],
+        content=row["content"],
+        created_at=from_epoch_ms(row["created_at"]),
+    )
+
+
+def criar_storage() -> Storage:
+    """Cria o backend configurado em STORAGE_BACKEND."""
+    if settings.storage_backend == "postgres":
+        return PostgresStorage()
+    return SQLiteStorage()
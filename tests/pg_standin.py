@@ -0,0 +1,86 @@
+"""
+Stand-in em processo para o pool do asyncpg, usado nos testes do PostgresStorage.
+
+Implementa o subconjunto da API do asyncpg usado pelo backend (pool.acquire,
+connection.transaction, fetch/fetchrow/fetchval/execute/executemany) sobre um SQLite em
+memória. O SQL do backend é escrito num subconjunto portável; aqui só são
+traduzidos os placeholders ($1 -> ?1) e o tipo BIGSERIAL. A busca textual
+(tsvector/índice GIN) é específica do PostgreSQL e não é emulada: o índice
+é ignorado e os testes de busca rodam só no SQLite e no PostgreSQL real.
+"""
+
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any
+
+_PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+
+
+def _traduzir(sql: str) -> str:
+    sql = sql.replace("BIGSERIAL PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    return _PLACEHOLDER_RE.sub(r"?\1", sql)
+
+
+class StandInConnection:
+    """Conexão com a interface assíncrona do asyncpg.Connection."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def _executar(self, sql: str, args: tuple) -> sqlite3.Cursor:
+        return self._conn.execute(_traduzir(sql), args)
+
+    async def fetch(self, sql: str, *args: Any) -> list[sqlite3.Row]:
+        return self._executar(sql, args).fetchall()
+
+    async def fetchrow(self, sql: str, *args: Any) -> sqlite3.Row | None:
+        row: sqlite3.Row | None = self._executar(sql, args).fetchone()
+        return row
+
+    async def fetchval(self, sql: str, *args: Any) -> Any:
+        row = self._executar(sql, args).fetchone()
+        return row[0] if row else None
+
+    async def execute(self, sql: str, *args: Any) -> str:
+        if "USING GIN" in sql:
+            return "CREATE INDEX"
+        cursor = self._executar(sql, args)
+        comando = sql.split()[0].upper()
+        return f"{comando} {max(cursor.rowcount, 0)}"
+
+    async def executemany(self, sql: str, args: list[tuple]) -> None:
+        self._conn.executemany(_traduzir(sql), args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+class StandInPool:
+    """Pool com uma única conexão SQLite (autocommit), em memória por padrão."""
+
+    def __init__(self, database: str = ":memory:") -> None:
+        conn = sqlite3.connect(database, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        self._connection = StandInConnection(conn)
+        self._conn = conn
+        self.closed = False
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self._connection
+
+    def set_trace_callback(self, callback: Any) -> None:
+        """Registra o callback de trace do SQLite (SQL traduzido e expandido)."""
+        self._conn.set_trace_callback(callback)
+
+    async def close(self) -> None:
+        self.closed = True
+        self._conn.close()
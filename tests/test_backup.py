@@ -0,0 +1,191 @@
+"""
+Tests para snapshot, exportação e importação do histórico (backup.py).
+"""
+
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+import backup
+from config import settings
+from database import (
+    add_messages,
+    get_conversation_history,
+    get_user_stats,
+    init_db,
+    search_messages,
+)
+
+
+def _popular(conversas: int = 3) -> list[int]:
+    """Grava turnos pergunta/resposta em alguns canais."""
+    ids = []
+    for i in range(conversas):
+        ids += add_messages(
+            1, 10 + i, [("user", f"pergunta {i} sobre bolo", 3), ("assistant", f"resposta {i}", 5)]
+        )
+    return ids
+
+
+class TestSnapshot:
+    """Testes para o backup online."""
+
+    def test_snapshot_is_complete_copy(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa que o snapshot contém todas as mensagens do banco."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        _popular()
+
+        # Uma escrita em andamento não bloqueia nem entra no snapshot
+        escritor = sqlite3.connect(str(test_db_path))
+        escritor.execute("BEGIN IMMEDIATE")
+        escritor.execute(
+            "INSERT INTO messages (user_id, channel_id, role, content, created_at) "
+            "VALUES (1, 99, 0, 'pendente', 0)"
+        )
+        destino = tmp_path / "copia.db"
+        try:
+            backup.snapshot(destino)
+        finally:
+            escritor.rollback()
+            escritor.close()
+
+        conn = sqlite3.connect(str(destino))
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 6
+        conn.close()
+
+
+class TestExportImport:
+    """Testes para exportação e importação em JSONL."""
+
+    def test_round_trip(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa que exportar e importar em outro banco preserva histórico e índices."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        ids = _popular()
+
+        arquivo = tmp_path / "historico.jsonl.gz"
+        progresso = backup.exportar(arquivo, batch_size=4)
+        assert progresso.linhas == 6
+        with gzip.open(arquivo, "rt", encoding="utf-8") as f:
+            registros = [json.loads(linha) for linha in f]
+        assert [r["id"] for r in registros] == ids
+        assert registros[1]["role"] == "assistant"
+        assert not (tmp_path / "historico.jsonl.gz.checkpoint").exists()
+        assert not (tmp_path / "historico.jsonl.gz.snapshot.db").exists()
+
+        monkeypatch.setattr(settings, "db_path", tmp_path / "novo.db")
+        progresso = backup.importar(arquivo, batch_size=4)
+        assert (progresso.linhas, progresso.ignoradas) == (6, 0)
+        assert [m.id for m in get_conversation_history(1, 10)] == ids[:2]
+        assert get_user_stats(1)["total_tokens"] == 24
+        assert len(search_messages(1, "bolo", limit=10)) == 3
+
+        # Reimportar não duplica
+        assert backup.importar(arquivo).ignoradas == 6
+        assert get_user_stats(1)["total_messages"] == 6
+
+    def test_export_resume_after_interruption(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa que --resume continua do checkpoint sem duplicar nem perder linhas."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        ids = _popular()
+
+        arquivo = tmp_path / "historico.jsonl.gz"
+        real_compress = gzip.compress
+        chamadas = []
+
+        def compress_falho(dados: bytes) -> bytes:
+            chamadas.append(dados)
+            if len(chamadas) == 2:
+                raise OSError("disco cheio")
+            return real_compress(dados)
+
+        monkeypatch.setattr(backup.gzip, "compress", compress_falho)
+        with pytest.raises(OSError):
+            backup.exportar(arquivo, batch_size=2)
+        assert json.loads((tmp_path / "historico.jsonl.gz.checkpoint").read_text())["rows"] == 2
+
+        # Mensagens novas depois do snapshot não entram na exportação retomada
+        add_messages(1, 99, [("user", "depois do snapshot", 0)])
+        monkeypatch.setattr(backup.gzip, "compress", real_compress)
+        assert backup.exportar(arquivo, batch_size=2, resume=True).linhas == 6
+
+        with gzip.open(arquivo, "rt", encoding="utf-8") as f:
+            assert [json.loads(linha)["id"] for linha in f] == ids
+
+    def test_import_resume_skips_done_rows(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa que a importação retomada pula as linhas do checkpoint."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        _popular()
+        arquivo = tmp_path / "historico.jsonl"
+        backup.exportar(arquivo)
+
+        monkeypatch.setattr(settings, "db_path", tmp_path / "novo.db")
+        (tmp_path / "historico.jsonl.import-checkpoint").write_text(json.dumps({"rows": 4}))
+        progresso = backup.importar(arquivo, batch_size=3, resume=True)
+
+        assert progresso.linhas == 6
+        assert get_user_stats(1)["total_messages"] == 2
+
+    def test_id_collision_is_rejected(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa que um ID já usado por outra mensagem interrompe a importação."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        _popular(1)
+        arquivo = tmp_path / "historico.jsonl"
+        backup.exportar(arquivo)
+
+        # O banco de destino já tem mensagens próprias com os mesmos IDs
+        monkeypatch.setattr(settings, "db_path", tmp_path / "novo.db")
+        init_db()
+        add_messages(2, 20, [("user", "outra conversa", 1), ("assistant", "outra resposta", 1)])
+
+        with pytest.raises(ValueError, match="já usados por outras mensagens"):
+            backup.importar(arquivo)
+        assert get_user_stats(1)["total_messages"] == 0
+        assert [m.content for m in get_conversation_history(2, 20)] == [
+            "outra conversa",
+            "outra resposta",
+        ]
+
+    def test_invalid_role_is_rejected(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa que um registro com role desconhecido interrompe a importação."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        arquivo = tmp_path / "ruim.jsonl"
+        registro = {
+            "id": 1,
+            "user_id": 1,
+            "channel_id": 1,
+            "role": "system",
+            "content": "x",
+            "created_at": 0,
+        }
+        arquivo.write_text(json.dumps(registro) + "\n")
+
+        with pytest.raises(ValueError, match="Role inválido"):
+            backup.importar(arquivo)
+
+    def test_parquet_requires_pyarrow(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa a mensagem de erro sem a dependência opcional."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(backup, "pyarrow", None)
+        init_db()
+
+        with pytest.raises(RuntimeError, match="pyarrow"):
+            backup.exportar(tmp_path / "historico.parquet")
+
+    def test_cli(self, test_db_path, tmp_path, monkeypatch) -> None:
+        """Testa os subcomandos da linha de comando."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        _popular(1)
+
+        assert backup.main(["snapshot", str(tmp_path / "copia.db")]) == 0
+        assert backup.main(["export", str(tmp_path / "h.jsonl.gz")]) == 0
+        monkeypatch.setattr(settings, "db_path", tmp_path / "novo.db")
+        assert backup.main(["import", str(tmp_path / "h.jsonl.gz")]) == 0
+        assert get_user_stats(1)["total_messages"] == 2
@@ -2,6 +2,7 @@
 Unit tests for bot module.
 """
 
+from collections.abc import Awaitable, Callable
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -82,6 +83,17 @@ class TestBotRetryLogic:
 
         assert sample_function() is True
 
+    def test_only_transient_errors_are_retried(self) -> None:
+        """Test that rate limits and connection errors are retried, others are not."""
+        from openai import APIConnectionError, RateLimitError
+
+        from bot import _erro_transitorio
+
+        rate_limit = RateLimitError("429", response=MagicMock(status_code=429), body=None)
+        assert _erro_transitorio(rate_limit)
+        assert _erro_transitorio(APIConnectionError(request=MagicMock()))
+        assert not _erro_transitorio(ValueError("x"))
+
 
 class TestEnvironmentSetup:
     """Tests for environment setup and configuration."""
@@ -102,6 +114,316 @@ class TestEnvironmentSetup:
         assert env_example.exists(), ".env.example file not found"
 
 
+class TestPromptCache:
+    """Tests for prompt-prefix caching hints."""
+
+    def _messages(self) -> list[dict]:
+        return [
+            {"role": "system", "content": "system prompt"},
+            {"role": "user", "content": "old question"},
+            {"role": "assistant", "content": "old answer"},
+            {"role": "user", "content": "new question"},
+        ]
+
+    def test_marks_system_and_history_prefix(self) -> None:
+        """Test that system prompt and last history message get cache_control."""
+        from bot import aplicar_cache_prompt
+
+        messages = self._messages()
+        marked = aplicar_cache_prompt(messages, "anthropic/claude-3.5-sonnet")
+
+        assert marked[0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+        assert marked[0]["content"][0]["text"] == "system prompt"
+        assert marked[1] == messages[1]
+        assert marked[2]["content"][0]["cache_control"] == {"type": "ephemeral"}
+        assert marked[3] == {"role": "user", "content": "new question"}
+        # Original list is untouched
+        assert messages[0]["content"] == "system prompt"
+
+    def test_no_markers_for_automatic_cache_providers(self) -> None:
+        """Test that providers with automatic caching receive plain messages."""
+        from bot import aplicar_cache_prompt
+
+        messages = self._messages()
+        assert aplicar_cache_prompt(messages, "openai/gpt-4o") is messages
+
+    def test_disabled_by_settings(self, monkeypatch) -> None:
+        """Test that caching hints can be disabled."""
+        from bot import aplicar_cache_prompt
+        from config import settings
+
+        monkeypatch.setattr(settings, "prompt_cache_enabled", False)
+        messages = self._messages()
+        assert aplicar_cache_prompt(messages, "anthropic/claude-3.5-sonnet") is messages
+
+    @pytest.mark.asyncio
+    async def test_chamar_ia_records_cached_tokens(self, monkeypatch) -> None:
+        """Test that cached prompt tokens from usage end up in AIResponse."""
+        import bot
+
+        usage = MagicMock(prompt_tokens=100, completion_tokens=20)
+        usage.prompt_tokens_details.cached_tokens = 80
+        response = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="ok"))],
+            usage=usage,
+            model="anthropic/claude-3.5-sonnet",
+        )
+        create = AsyncMock(return_value=response)
+        monkeypatch.setattr(bot.cliente_ia().chat.completions, "create", create)
+
+        result = await bot.chamar_ia(self._messages())
+
+        assert result.tokens_cached == 80
+        assert result.tokens_total == 120
+        assert result.latency_ms >= 0
+
+
+class TestUsageCommand:
+    """Tests for usage recording in processar_ia and the /uso command."""
+
+    @pytest.mark.asyncio
+    async def test_processar_ia_records_usage(self, test_db_path, monkeypatch) -> None:
+        """Test that each reply is recorded with tokens, latency and cache flag."""
+        import bot
+        from config import settings
+        from database import USAGE_FLAG_CACHE_HIT, init_db
+        from usage import UsageRecorder
+
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        monkeypatch.setattr(bot, "usage_recorder", recorder)
+        monkeypatch.setattr(
+            bot,
+            "chamar_ia",
+            AsyncMock(
+                return_value=bot.AIResponse(
+                    content="ok",
+                    tokens_prompt=100,
+                    tokens_completion=20,
+                    tokens_cached=80,
+                    model="m/a",
+                    latency_ms=321,
+                )
+            ),
+        )
+
+        assert await bot.processar_ia("pergunta", user_id=1, channel_id=2) == "ok"
+
+        (record,) = recorder._pendentes
+        assert (record.user_id, record.channel_id, record.model) == (1, 2, "m/a")
+        assert record.latency_ms == 321
+        assert record.flags == USAGE_FLAG_CACHE_HIT
+
+    @pytest.mark.asyncio
+    async def test_processar_ia_enforces_token_quota(self, test_db_path, monkeypatch) -> None:
+        """Test that the actual tokens are debited and exhausted quotas reject early."""
+        import bot
+        from config import settings
+        from database import init_db
+        from quota import QuotaEngine
+        from usage import UsageRecorder
+
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "quota_reserve_tokens", 100)
+        init_db()
+        engine = QuotaEngine(user_limit=1000)
+        monkeypatch.setattr(bot, "quota_engine", engine)
+        monkeypatch.setattr(bot, "usage_recorder", UsageRecorder(batch_size=10))
+        chamar = AsyncMock(
+            return_value=bot.AIResponse(content="ok", tokens_prompt=700, tokens_completion=100)
+        )
+        monkeypatch.setattr(bot, "chamar_ia", chamar)
+
+        assert await bot.processar_ia("pergunta", user_id=1, channel_id=2) == "ok"
+        assert engine.restante(1) == {"user": 200}
+
+        resposta = await bot.processar_ia("x" * 1000, user_id=1, channel_id=2)
+        assert "cota diária" in resposta
+        assert chamar.await_count == 1
+
+        chamar.side_effect = RuntimeError("boom")
+        await bot.processar_ia("pergunta", user_id=1, channel_id=2)
+        assert engine.restante(1) == {"user": 200}
+
+    def test_eh_admin(self, monkeypatch) -> None:
+        """Test admin detection via ADMIN_USER_IDS and guild administrator."""
+        from bot import eh_admin
+        from config import settings
+
+        monkeypatch.setattr(settings, "admin_user_ids", [42])
+        interaction = MagicMock()
+        interaction.user.id = 42
+        assert eh_admin(interaction)
+
+        interaction.user.id = 7
+        interaction.user.guild_permissions.administrator = False
+        assert not eh_admin(interaction)
+        interaction.user.guild_permissions.administrator = True
+        assert eh_admin(interaction)
+        interaction.guild = None
+        assert not eh_admin(interaction)
+
+    @pytest.mark.asyncio
+    async def test_uso_responde_se_gravacao_falhar(self, test_db_path, monkeypatch) -> None:
+        """Test that /uso still answers from the stored aggregates when the flush fails."""
+        import bot
+        from config import settings
+        from database import init_db
+        from usage import UsageRecorder
+
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "admin_user_ids", [42])
+        init_db()
+        recorder = UsageRecorder(batch_size=10)
+        monkeypatch.setattr(recorder, "flush", MagicMock(side_effect=RuntimeError("locked")))
+        monkeypatch.setattr(bot, "usage_recorder", recorder)
+        interaction = MagicMock()
+        interaction.user.id = 42
+        interaction.response.send_message = AsyncMock()
+
+        uso: Callable[..., Awaitable[None]] = bot.slash_uso.callback
+        await uso(interaction, 24)
+
+        assert "Nenhum uso" in interaction.response.send_message.await_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_perfil_restrito_a_admin(self, monkeypatch) -> None:
+        """Test that /perfil refuses non-admins without starting a collection."""
+        import bot
+        from config import settings
+
+        monkeypatch.setattr(settings, "admin_user_ids", [])
+        perfilar = AsyncMock()
+        monkeypatch.setattr(bot.profiler, "perfilar", perfilar)
+        interaction = MagicMock()
+        interaction.user.id = 7
+        interaction.guild = None
+        interaction.response.send_message = AsyncMock()
+
+        perfil: Callable[..., Awaitable[None]] = bot.slash_perfil.callback
+        await perfil(interaction, 5)
+
+        assert "restrito" in interaction.response.send_message.await_args.args[0]
+        perfilar.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_sinais_instalados_antes_do_gateway(self, monkeypatch) -> None:
+        """Test that SIGTERM handling is installed in setup_hook, not on_ready."""
+        import bot
+
+        instalar = MagicMock()
+        monkeypatch.setattr(bot.ciclo_de_vida, "instalar_sinais", instalar)
+
+        await bot.bot.setup_hook()
+
+        instalar.assert_called_once_with()
+
+    @pytest.mark.asyncio
+    async def test_ia_recusada_durante_encerramento(self, monkeypatch) -> None:
+        """Test that /ia answers without calling the AI once shutdown has started."""
+        import bot
+        from config import settings
+
+        monkeypatch.setattr(settings, "rate_limit_enabled", False)
+        monkeypatch.setattr(bot.ciclo_de_vida, "encerrando", True)
+        processar = AsyncMock()
+        monkeypatch.setattr(bot, "processar_ia", processar)
+        interaction = MagicMock()
+        interaction.response.send_message = AsyncMock()
+
+        ia: Callable[..., Awaitable[None]] = bot.slash_ia.callback
+        await ia(interaction, "pergunta")
+
+        interaction.response.send_message.assert_awaited_once_with(
+            bot.MENSAGEM_ENCERRANDO, ephemeral=True
+        )
+        processar.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_dm_debounce_combina_mensagens(self, monkeypatch) -> None:
+        """Test that quick DMs get one typing indicator, one AI call and one reply."""
+        import asyncio
+
+        import discord
+
+        import bot
+        from config import settings
+        from conversation_queue import FilaConversas
+
+        monkeypatch.setattr(settings, "dm_debounce_ms", 50)
+        monkeypatch.setattr(bot, "fila_conversas", FilaConversas(max_conversas=100, mesclar=False))
+        processar = AsyncMock(return_value="resposta")
+        monkeypatch.setattr(bot, "processar_ia", processar)
+        enviar = AsyncMock()
+        monkeypatch.setattr(bot, "enviar_resposta", enviar)
+        monkeypatch.setattr(bot.bot, "process_commands", AsyncMock())
+
+        digitando = 0
+
+        class Typing:
+            async def __aenter__(self) -> None:
+                nonlocal digitando
+                digitando += 1
+
+            async def __aexit__(self, *exc: object) -> None:
+                pass
+
+        canal = MagicMock(spec=discord.DMChannel)
+        canal.id = 99
+        canal.typing = Typing
+        mensagens = []
+        for texto in ["oi", "tenho uma dúvida", "sobre python"]:
+            message = MagicMock()
+            message.author.id = 7
+            message.author.bot = False
+            message.channel = canal
+            message.content = texto
+            mensagens.append(message)
+
+        tarefas = []
+        for message in mensagens:
+            tarefas.append(asyncio.create_task(bot.on_message(message)))
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tarefas)
+
+        processar.assert_awaited_once()
+        assert processar.await_args is not None
+        assert processar.await_args.args[0] == "oi\ntenho uma dúvida\nsobre python"
+        enviar.assert_awaited_once_with(mensagens[0], "resposta")
+        assert digitando == 1
+
+    def test_formatar_uso(self) -> None:
+        """Test formatting of the per-model summary."""
+        from bot import formatar_uso
+        from usage import ResumoUso
+
+        assert "Nenhum uso" in formatar_uso(24, [])
+        texto = formatar_uso(
+            24,
+            [ResumoUso("m/a", requests=2, tokens_prompt=10, latency_ms_total=300, cache_hits=1)],
+        )
+        assert "`m/a`: 2 respostas" in texto
+        assert "50% com cache" in texto
+        assert "latência média 150 ms" in texto
+
+    def test_formatar_busca(self) -> None:
+        """Test formatting of a search results page."""
+        from datetime import UTC, datetime
+
+        from bot import RESULTADOS_POR_PAGINA, formatar_busca
+        from database import Message, SearchHit
+
+        assert "Nada encontrado" in formatar_busca("bolo", 1, [], False)
+        assert "página 2" in formatar_busca("bolo", 2, [], False)
+
+        message = Message(1, 7, 99, "assistant", "bolo", datetime(2025, 1, 1, tzinfo=UTC))
+        texto = formatar_busca("bolo", 2, [SearchHit(message, "um **bolo**\n  gostoso")], True)
+        assert f"**{RESULTADOS_POR_PAGINA + 1}.** <#99>" in texto
+        assert "Sherlock: um **bolo** gostoso" in texto
+        assert "pagina:3" in texto
+
+
 # Template for future tests
 
 # class TestAICommandHandling:
@@ -0,0 +1,207 @@
+"""
+Tests para o contexto compartilhado por canal (channel_context.py).
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from channel_context import ContextoCanal
+from config import settings
+from database import init_db
+from metrics import metrics
+from storage import SQLiteStorage
+
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def storage(test_db_path, monkeypatch) -> SQLiteStorage:
+    """Backend SQLite vazio."""
+    monkeypatch.setattr(settings, "db_path", test_db_path)
+    init_db()
+    return SQLiteStorage()
+
+
+class TestContextoCanal:
+    """Testes para o ring buffer e a gravação em lotes."""
+
+    async def test_contexto_de_todos_os_usuarios(self, storage) -> None:
+        """Testa que turnos de usuários diferentes formam um só contexto."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        assert await contexto.contexto(5) == []
+
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3), ("assistant", "Olá, Ana", 4)])
+        contexto.registrar(5, 2, [("user", "Bia: e eu?", 3), ("assistant", "Olá, Bia", 4)])
+
+        assert [m["content"] for m in await contexto.contexto(5)] == [
+            "Ana: oi",
+            "Olá, Ana",
+            "Bia: e eu?",
+            "Olá, Bia",
+        ]
+        assert await contexto.contexto(6) == []
+
+    async def test_ring_buffer_limitado(self, storage) -> None:
+        """Testa que só as últimas mensagens do canal ficam no contexto."""
+        contexto = ContextoCanal(storage, tamanho=3, max_canais=10, flush_interval=60)
+        await contexto.contexto(5)
+        for i in range(5):
+            contexto.registrar(5, 1, [("user", f"m{i}", 1)])
+
+        assert [m["content"] for m in await contexto.contexto(5)] == ["m2", "m3", "m4"]
+
+    async def test_grava_em_lote_e_recarrega(self, storage) -> None:
+        """Testa a gravação com o autor de cada turno e a carga depois de reiniciar."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3), ("assistant", "Olá, Ana", 4)])
+        contexto.registrar(5, 2, [("user", "Bia: oi", 3), ("assistant", "Olá, Bia", 4)])
+        contexto.registrar(5, 1, [("user", "Ana: tchau", 3)])
+        contexto.registrar(7, 2, [("user", "Bia: oi", 3)])
+
+        assert await contexto.flush() == 6
+        assert contexto.pendentes == 0
+        historico = await storage.get_conversation_history(1, 5)
+        assert [m.content for m in historico] == ["Ana: oi", "Olá, Ana", "Ana: tchau"]
+        assert (await storage.get_user_stats(2))["total_messages"] == 3
+        assert (await storage.get_user_stats(0))["total_messages"] == 0
+
+        reiniciado = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        assert [m["content"] for m in await reiniciado.contexto(5)] == [
+            "Ana: oi",
+            "Olá, Ana",
+            "Bia: oi",
+            "Olá, Bia",
+            "Ana: tchau",
+        ]
+        assert metrics.counter_value("shared_context_loads") == 1
+
+    async def test_carga_inclui_pendentes(self, storage) -> None:
+        """Testa que um canal recarregado inclui turnos ainda não gravados."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=1, flush_interval=60)
+        await contexto.contexto(5)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3)])
+
+        # Outro canal tira o 5 da memória antes da gravação
+        await contexto.contexto(6)
+        assert [m["content"] for m in await contexto.contexto(5)] == ["Ana: oi"]
+
+    async def test_gravacao_durante_a_carga(self, storage, monkeypatch) -> None:
+        """Testa que um lote gravado durante a carga não some do contexto."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3), ("assistant", "Olá", 4)])
+        ler = storage.get_channel_history
+
+        async def leitura_lenta(*args, **kwargs):
+            historico = await ler(*args, **kwargs)
+            await asyncio.sleep(0.05)
+            return historico
+
+        monkeypatch.setattr(storage, "get_channel_history", leitura_lenta)
+        carga = asyncio.create_task(contexto.contexto(5))
+        await asyncio.sleep(0.01)
+        await contexto.flush()
+
+        assert [m["content"] for m in await carga] == ["Ana: oi", "Olá"]
+        assert contexto.pendentes == 0
+
+    async def test_falha_na_gravacao_mantem_pendentes(self, storage, monkeypatch) -> None:
+        """Testa que mensagens voltam para a fila quando a gravação falha."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3)])
+        monkeypatch.setattr(
+            storage, "add_messages", AsyncMock(side_effect=RuntimeError("banco indisponível"))
+        )
+
+        with pytest.raises(RuntimeError):
+            await contexto.flush()
+        assert contexto.pendentes == 1
+
+    async def test_parar_grava_pendentes(self, storage) -> None:
+        """Testa que o encerramento grava o que estiver pendente."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        contexto.iniciar()
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3)])
+
+        await contexto.parar()
+
+        assert len(await storage.get_conversation_history(1, 5)) == 1
+
+    async def test_descartar_recarrega_do_banco(self, storage) -> None:
+        """Testa que o canal descartado volta sem as mensagens removidas."""
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        await contexto.contexto(5)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3)])
+        contexto.registrar(5, 2, [("user", "Bia: oi", 3)])
+        await contexto.flush()
+
+        await storage.clear_user_history(1, 5)
+        contexto.descartar(5)
+
+        assert [m["content"] for m in await contexto.contexto(5)] == ["Bia: oi"]
+
+    def test_chave_conversa(self, monkeypatch) -> None:
+        """Testa que os turnos de um canal compartilhado dividem a mesma vez."""
+        monkeypatch.setattr(settings, "shared_context_channel_ids", [5])
+
+        assert ContextoCanal.chave_conversa(1, 5) == ContextoCanal.chave_conversa(2, 5)
+        assert ContextoCanal.chave_conversa(1, 6) == (1, 6)
+
+
+class TestProcessarIaCompartilhado:
+    """Testes para processar_ia em um canal compartilhado."""
+
+    async def test_pergunta_identifica_autor(self, storage, monkeypatch) -> None:
+        """Testa que a IA recebe o contexto do canal e a pergunta com o autor."""
+        import bot
+
+        monkeypatch.setattr(settings, "shared_context_channel_ids", [5])
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3), ("assistant", "Olá, Ana", 4)])
+        monkeypatch.setattr(bot, "contexto_canal", contexto)
+        monkeypatch.setattr(bot, "storage", storage)
+        chamar = AsyncMock(return_value=bot.AIResponse(content="Olá, Bia", tokens_prompt=9))
+        monkeypatch.setattr(bot, "chamar_ia", chamar)
+
+        resposta = await bot.processar_ia("e eu?", user_id=2, channel_id=5, autor="Bia")
+
+        assert resposta == "Olá, Bia"
+        assert chamar.await_args is not None
+        enviadas = chamar.await_args.args[0]
+        assert [m["content"] for m in enviadas[1:]] == ["Ana: oi", "Olá, Ana", "Bia: e eu?"]
+        assert [m["content"] for m in await contexto.contexto(5)][-2:] == ["Bia: e eu?", "Olá, Bia"]
+        # O turno é gravado em lote, com a autora da pergunta
+        assert await storage.get_conversation_history(2, 5) == []
+        await contexto.flush()
+        historico = await storage.get_conversation_history(2, 5)
+        assert [m.content for m in historico] == ["Bia: e eu?", "Olá, Bia"]
+
+    async def test_limpar_remove_mensagens_do_autor(self, storage, monkeypatch) -> None:
+        """Testa o /limpar num canal compartilhado, inclusive com turnos pendentes."""
+        import bot
+
+        monkeypatch.setattr(settings, "shared_context_channel_ids", [5])
+        contexto = ContextoCanal(storage, tamanho=10, max_canais=10, flush_interval=60)
+        await contexto.contexto(5)
+        contexto.registrar(5, 1, [("user", "Ana: oi", 3), ("assistant", "Olá, Ana", 4)])
+        contexto.registrar(5, 2, [("user", "Bia: oi", 3), ("assistant", "Olá, Bia", 4)])
+        monkeypatch.setattr(bot, "contexto_canal", contexto)
+        monkeypatch.setattr(bot, "storage", storage)
+        interaction = MagicMock()
+        interaction.user.id = 1
+        interaction.channel_id = 5
+        interaction.response.send_message = AsyncMock()
+
+        limpar: Callable[..., Awaitable[None]] = bot.slash_limpar.callback
+        await limpar(interaction)
+
+        assert interaction.response.send_message.await_args is not None
+        assert "2 mensagem(ns)" in interaction.response.send_message.await_args.args[0]
+        assert [m["content"] for m in await contexto.contexto(5)] == ["Bia: oi", "Olá, Bia"]
@@ -0,0 +1,127 @@
+"""
+Unit tests for command_sync module.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import discord
+import pytest
+from discord import app_commands
+from discord.ext import commands
+
+from command_sync import CommandSyncManager, calcular_hash_arvore
+from config import settings
+from database import get_command_sync_hash, init_db
+
+
+def _make_bot() -> commands.Bot:
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.default())
+    bot._connection.application_id = 42
+
+    @bot.tree.command(name="ping", description="Ping")
+    async def ping(interaction: discord.Interaction) -> None:
+        pass
+
+    return bot
+
+
+@pytest.fixture
+def sync_db(test_db_path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_path", test_db_path)
+    init_db()
+
+
+class TestTreeHash:
+    """Tests for command tree hashing."""
+
+    def test_hash_is_stable(self) -> None:
+        """Test that the same tree always hashes the same."""
+        bot = _make_bot()
+        assert calcular_hash_arvore(bot.tree) == calcular_hash_arvore(bot.tree)
+
+    def test_hash_changes_with_commands(self) -> None:
+        """Test that adding a command changes the hash."""
+        bot = _make_bot()
+        before = calcular_hash_arvore(bot.tree)
+
+        @bot.tree.command(name="pong", description="Pong")
+        @app_commands.describe(texto="Texto")
+        async def pong(interaction: discord.Interaction, texto: str) -> None:
+            pass
+
+        assert calcular_hash_arvore(bot.tree) != before
+
+
+class TestCommandSyncManager:
+    """Tests for CommandSyncManager."""
+
+    @pytest.mark.asyncio
+    async def test_syncs_only_when_tree_changes(self, sync_db, monkeypatch) -> None:
+        """Test that a second sync with the same tree is skipped."""
+        bot = _make_bot()
+        sync = AsyncMock(return_value=[MagicMock()])
+        monkeypatch.setattr(bot.tree, "sync", sync)
+        manager = CommandSyncManager(bot.tree)
+
+        assert await manager.sync() is True
+        assert await manager.sync() is False
+        assert sync.await_count == 1
+        assert get_command_sync_hash("global:42") == calcular_hash_arvore(bot.tree)
+
+    @pytest.mark.asyncio
+    async def test_force_sync(self, sync_db, monkeypatch) -> None:
+        """Test that force=True syncs even without changes."""
+        bot = _make_bot()
+        sync = AsyncMock(return_value=[])
+        monkeypatch.setattr(bot.tree, "sync", sync)
+        manager = CommandSyncManager(bot.tree)
+
+        await manager.sync()
+        assert await manager.sync(force=True) is True
+        assert sync.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_dev_guild_sync(self, sync_db, monkeypatch) -> None:
+        """Test that a dev guild syncs guild-scoped with its own persisted hash."""
+        bot = _make_bot()
+        sync = AsyncMock(return_value=[])
+        monkeypatch.setattr(bot.tree, "sync", sync)
+        manager = CommandSyncManager(bot.tree, dev_guild_id=777)
+
+        await manager.sync()
+
+        assert sync.await_args is not None
+        guild = sync.await_args.kwargs["guild"]
+        assert guild.id == 777
+        assert get_command_sync_hash("guild:777:42") is not None
+        assert get_command_sync_hash("global:42") is None
+
+    @pytest.mark.asyncio
+    async def test_agendar_runs_once(self, sync_db, monkeypatch) -> None:
+        """Test that repeated scheduling (reconnects) does not resync."""
+        bot = _make_bot()
+        sync = AsyncMock(return_value=[])
+        monkeypatch.setattr(bot.tree, "sync", sync)
+        manager = CommandSyncManager(bot.tree)
+
+        manager.agendar()
+        first_task = manager._task
+        assert first_task is not None
+        manager.agendar()
+        assert manager._task is first_task
+        await asyncio.wait_for(first_task, timeout=5)
+        assert sync.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_sync_allows_retry(self, sync_db, monkeypatch) -> None:
+        """Test that a failed background sync can be scheduled again."""
+        bot = _make_bot()
+        sync = AsyncMock(side_effect=RuntimeError("boom"))
+        monkeypatch.setattr(bot.tree, "sync", sync)
+        manager = CommandSyncManager(bot.tree)
+
+        manager.agendar()
+        assert manager._task is not None
+        await asyncio.wait_for(manager._task, timeout=5)
+        assert manager._task is None
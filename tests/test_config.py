@@ -103,6 +103,18 @@ class TestSettingsConstraints:
                 request_timeout_seconds=150,  # Maior que 120
             )
 
+    def test_profiler_max_seconds_fits_interaction(self) -> None:
+        """Testa que a coleta do /perfil termina antes do token da interação expirar."""
+        from config import Settings
+
+        settings = Settings(
+            discord_token="t" * 50, openrouter_api_key="k" * 50, profiler_max_seconds=840
+        )
+        assert settings.profiler_max_seconds == 840
+
+        with pytest.raises(ValidationError):
+            Settings(discord_token="t" * 50, openrouter_api_key="k" * 50, profiler_max_seconds=900)
+
     def test_max_context_messages_min_constraint(self) -> None:
         """Testa que max_context_messages tem mínimo de 1."""
         from config import Settings
@@ -142,6 +154,58 @@ class TestSettingsConstraints:
                 rate_limit_requests_per_minute=70,
             )
 
+    def test_shard_ids_require_shard_count(self) -> None:
+        """Testa que shard_ids exige shard_count e valores dentro do intervalo."""
+        from config import Settings
+
+        settings = Settings(
+            discord_token="t" * 50,
+            openrouter_api_key="k" * 50,
+            shard_count=4,
+            shard_ids=[2, 3],
+        )
+        assert settings.shard_ids == [2, 3]
+
+        with pytest.raises(ValidationError):
+            Settings(discord_token="t" * 50, openrouter_api_key="k" * 50, shard_ids=[0])
+
+        with pytest.raises(ValidationError):
+            Settings(
+                discord_token="t" * 50,
+                openrouter_api_key="k" * 50,
+                shard_count=2,
+                shard_ids=[2],
+            )
+
+    def test_shutdown_drain_fits_timeout(self) -> None:
+        """Testa que a drenagem precisa caber no prazo total do encerramento."""
+        from config import Settings
+
+        with pytest.raises(ValidationError):
+            Settings(
+                discord_token="t" * 50,
+                openrouter_api_key="k" * 50,
+                shutdown_drain_seconds=60,
+                shutdown_timeout_seconds=60,
+            )
+
+    def test_postgres_backend_requires_dsn(self) -> None:
+        """Testa que o backend postgres exige POSTGRES_DSN."""
+        from config import Settings
+
+        settings = Settings(
+            discord_token="t" * 50,
+            openrouter_api_key="k" * 50,
+            storage_backend="postgres",
+            postgres_dsn="postgresql://localhost/sherlock",
+        )
+        assert settings.storage_backend == "postgres"
+
+        with pytest.raises(ValidationError):
+            Settings(
+                discord_token="t" * 50, openrouter_api_key="k" * 50, storage_backend="postgres"
+            )
+
 
 class TestSettingsSingleton:
     """Testes para o singleton global de settings."""
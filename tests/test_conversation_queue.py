@@ -0,0 +1,189 @@
+"""
+Tests para a serialização de turnos por conversa (conversation_queue.py).
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock
+
+import pytest
+
+from conversation_queue import MAX_DEBOUNCE_WINDOWS, FilaConversas
+from metrics import metrics
+
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class _Respostas:
+    """Corrotina de resposta que registra início e fim de cada turno."""
+
+    def __init__(self, liberar: asyncio.Event):
+        self.liberar = liberar
+        self.eventos: list[str] = []
+
+    async def __call__(self, conteudo: str) -> str:
+        self.eventos.append(f"inicio {conteudo}")
+        await self.liberar.wait()
+        self.eventos.append(f"fim {conteudo}")
+        return f"resposta {conteudo}"
+
+
+class TestFilaConversas:
+    """Testes para ordem, concorrência e mesclagem de turnos."""
+
+    async def test_serializa_mesma_conversa(self) -> None:
+        """Testa que o segundo turno só começa depois do primeiro terminar."""
+        fila = FilaConversas(max_conversas=10, mesclar=False)
+        responder = _Respostas(asyncio.Event())
+
+        primeira = asyncio.create_task(fila.executar((1, 2), "a", responder))
+        segunda = asyncio.create_task(fila.executar((1, 2), "b", responder))
+        await asyncio.sleep(0.01)
+        assert responder.eventos == ["inicio a"]
+
+        responder.liberar.set()
+        assert await asyncio.gather(primeira, segunda) == ["resposta a", "resposta b"]
+        assert responder.eventos == ["inicio a", "fim a", "inicio b", "fim b"]
+        assert metrics.counter_value("conversation_waits") == 1
+
+    async def test_conversas_diferentes_em_paralelo(self) -> None:
+        """Testa que outro usuário ou outro canal não espera."""
+        fila = FilaConversas(max_conversas=10, mesclar=False)
+        responder = _Respostas(asyncio.Event())
+
+        tarefas = [
+            asyncio.create_task(fila.executar(chave, conteudo, responder))
+            for chave, conteudo in [((1, 2), "a"), ((3, 2), "b"), ((1, 4), "c")]
+        ]
+        await asyncio.sleep(0.01)
+        assert responder.eventos == ["inicio a", "inicio b", "inicio c"]
+
+        responder.liberar.set()
+        await asyncio.gather(*tarefas)
+
+    async def test_mescla_mensagens_que_esperam(self) -> None:
+        """Testa que mensagens enquanto um turno espera viram uma só pergunta."""
+        fila = FilaConversas(max_conversas=10, mesclar=True)
+        responder = _Respostas(asyncio.Event())
+
+        tarefas = []
+        for conteudo in ["a", "b", "c"]:
+            tarefas.append(asyncio.create_task(fila.executar((1, 2), conteudo, responder)))
+            await asyncio.sleep(0)
+
+        responder.liberar.set()
+        assert await asyncio.gather(*tarefas) == ["resposta a", "resposta b\nc", None]
+        assert metrics.counter_value("conversation_merged") == 1
+
+    async def test_turno_nao_mesclavel_nao_recebe_mensagens(self) -> None:
+        """Testa que um /ia esperando a vez não absorve mensagens seguintes."""
+        fila = FilaConversas(max_conversas=10, mesclar=True)
+        responder = _Respostas(asyncio.Event())
+
+        tarefas = [asyncio.create_task(fila.executar((1, 2), "a", responder))]
+        await asyncio.sleep(0)
+        tarefas.append(asyncio.create_task(fila.executar((1, 2), "b", responder, mesclavel=False)))
+        await asyncio.sleep(0)
+        tarefas.append(asyncio.create_task(fila.executar((1, 2), "c", responder)))
+        await asyncio.sleep(0)
+
+        responder.liberar.set()
+        assert await asyncio.gather(*tarefas) == ["resposta a", "resposta b", "resposta c"]
+
+
+class TestLimiteConversas:
+    """Testes para o limite de memória da tabela de conversas."""
+
+    async def test_remove_ociosas_mais_antigas(self) -> None:
+        """Testa que a tabela não cresce além do limite com conversas ociosas."""
+        fila = FilaConversas(max_conversas=3, mesclar=False)
+
+        async def responder(conteudo: str) -> str:
+            return conteudo
+
+        for user_id in range(10):
+            await fila.executar((user_id, 1), "oi", responder)
+
+        assert len(fila) == 3
+        assert list(fila._conversas) == [(7, 1), (8, 1), (9, 1)]
+
+    async def test_conversas_ocupadas_nao_saem(self) -> None:
+        """Testa que uma conversa com turno em andamento mantém sua trava."""
+        fila = FilaConversas(max_conversas=1, mesclar=False)
+        responder = _Respostas(asyncio.Event())
+
+        ocupada = asyncio.create_task(fila.executar((1, 1), "a", responder))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(fila.executar((2, 1), "b", lambda c: asyncio.sleep(0, c)), 1)
+        assert (1, 1) in fila._conversas
+
+        # Nova mensagem da conversa ocupada ainda espera o turno em andamento
+        seguinte = asyncio.create_task(fila.executar((1, 1), "c", responder))
+        await asyncio.sleep(0.01)
+        assert responder.eventos == ["inicio a"]
+
+        responder.liberar.set()
+        await asyncio.gather(ocupada, seguinte)
+
+
+class TestDebounce:
+    """Testes para a janela de espera por mensagens seguidas (DMs)."""
+
+    async def test_junta_mensagens_da_janela(self) -> None:
+        """Testa que mensagens dentro da janela viram uma chamada com um indicador."""
+        fila = FilaConversas(max_conversas=10, mesclar=False)
+        perguntas: list[str] = []
+        indicadores: list[str] = []
+
+        @asynccontextmanager
+        async def digitando(conteudo: str) -> AsyncIterator[None]:
+            indicadores.append(conteudo)
+            yield
+
+        async def responder(conteudo: str) -> str:
+            perguntas.append(conteudo)
+            return "ok"
+
+        tarefas = []
+        for conteudo in ["a", "b", "c"]:
+            tarefas.append(
+                asyncio.create_task(
+                    fila.executar(
+                        (1, 2), conteudo, responder, espera=0.05, indicador=digitando(conteudo)
+                    )
+                )
+            )
+            await asyncio.sleep(0.02)
+
+        assert await asyncio.gather(*tarefas) == ["ok", None, None]
+        assert perguntas == ["a\nb\nc"]
+        assert indicadores == ["a"]
+        turno = metrics.histogram_summary("conversation_turn_messages")
+        assert turno is not None
+        assert turno["max"] == 3
+
+        # Depois da janela, uma mensagem nova abre outro turno
+        assert await fila.executar((1, 2), "d", responder, espera=0.01) == "ok"
+        assert perguntas[-1] == "d"
+
+    async def test_espera_tem_teto(self) -> None:
+        """Testa que mensagens contínuas não adiam a resposta indefinidamente."""
+        fila = FilaConversas(max_conversas=10, mesclar=False)
+        responder = AsyncMock(return_value="ok")
+
+        primeira = asyncio.create_task(fila.executar((1, 2), "a", responder, espera=0.02))
+        inicio = time.monotonic()
+        while not primeira.done() and time.monotonic() - inicio < 1:
+            await fila.executar((1, 2), "mais", responder, espera=0.02)
+            await asyncio.sleep(0.005)
+
+        assert primeira.done()
+        assert time.monotonic() - inicio < MAX_DEBOUNCE_WINDOWS * 0.02 + 0.1
+        responder.assert_awaited_once()
@@ -8,13 +8,21 @@ from config import settings
 from database import (
     Message,
     add_message,
+    add_messages,
+    build_fts_query,
     clear_user_history,
     get_connection,
     get_context_messages,
     get_conversation_history,
+    get_message_vectors,
+    get_turns,
+    get_unindexed_messages,
     get_user_stats,
     init_db,
+    save_message_vectors,
+    search_messages,
 )
+from migrations import ROLE_TO_INT
 
 
 class TestMessage:
@@ -128,7 +136,8 @@ class TestMessageOperations:
             )
             row = cursor.fetchone()
             assert row is not None
-            assert row["role"] == "assistant"
+            # Desde o schema v2 o role é armazenado como inteiro pequeno
+            assert row["role"] == ROLE_TO_INT["assistant"]
 
     def test_get_context_messages(self, test_db_path, monkeypatch) -> None:
         """Test retrieving context messages."""
@@ -204,3 +213,169 @@ class TestMessageOperations:
 
         messages = get_context_messages(user_id, channel_id)
         assert len(messages) <= limit
+
+
+class TestUserStats:
+    """Tests for the incrementally maintained user_stats table."""
+
+    def test_stats_for_unknown_user(self, test_db_path, monkeypatch) -> None:
+        """Test that a user without history gets zeroed stats."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        assert get_user_stats(4242) == {
+            "total_messages": 0,
+            "total_channels": 0,
+            "total_tokens": 0,
+            "last_active_at": None,
+        }
+
+    def test_stats_track_inserts(self, test_db_path, monkeypatch) -> None:
+        """Test messages, channels, tokens and last activity after inserts."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        add_message(1, 10, "user", "q1", tokens=100)
+        add_message(1, 10, "assistant", "a1", tokens=20)
+        add_message(1, 20, "user", "q2", tokens=5)
+        add_message(2, 10, "user", "other", tokens=999)
+
+        stats = get_user_stats(1)
+        assert stats["total_messages"] == 3
+        assert stats["total_channels"] == 2
+        assert stats["total_tokens"] == 125
+        last = get_conversation_history(1, 20)[-1].created_at
+        assert stats["last_active_at"] == last
+
+    def test_stats_track_deletes(self, test_db_path, monkeypatch) -> None:
+        """Test that clearing one channel decrements counts and channel total."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        add_message(1, 10, "user", "q1", tokens=100)
+        add_message(1, 20, "user", "q2", tokens=5)
+        clear_user_history(1, 20)
+
+        stats = get_user_stats(1)
+        assert stats["total_messages"] == 1
+        assert stats["total_channels"] == 1
+        assert stats["total_tokens"] == 100
+        assert stats["last_active_at"] == get_conversation_history(1, 10)[-1].created_at
+
+    def test_clearing_everything_removes_row(self, test_db_path, monkeypatch) -> None:
+        """Test that clearing all history leaves no summary row behind."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        add_message(1, 10, "user", "q1", tokens=100)
+        add_message(1, 20, "user", "q2")
+        clear_user_history(1)
+
+        assert get_user_stats(1)["total_messages"] == 0
+        with get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM user_stats").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM conversation_stats").fetchone()[0] == 0
+
+
+class TestSearch:
+    """Tests for full-text search over the history."""
+
+    def test_build_fts_query_neutralizes_syntax(self) -> None:
+        """Test that FTS5 operators typed by the user become plain terms."""
+        assert (
+            build_fts_query('Cachorro OR "gato" NEAR(x*)')
+            == '"cachorro" AND "or" AND "gato" AND "near"'
+        )
+        assert build_fts_query("a b", any_term=True) is None
+        assert build_fts_query("dog cat", any_term=True) == '"dog" OR "cat"'
+
+    def test_ranking_and_isolation(self, test_db_path, monkeypatch) -> None:
+        """Test bm25 ordering, per-user isolation and snippet markers."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        add_message(1, 10, "user", "receita de bolo de cenoura")
+        add_message(1, 10, "user", "bolo bolo bolo de chocolate")
+        add_message(1, 20, "user", "previsão do tempo")
+        add_message(2, 10, "user", "bolo do outro usuário")
+
+        hits = search_messages(1, "bolo", limit=10)
+        assert [h.message.content for h in hits] == [
+            "bolo bolo bolo de chocolate",
+            "receita de bolo de cenoura",
+        ]
+        assert "**bolo**" in hits[1].snippet
+        assert search_messages(2, "cenoura", limit=10) == []
+        assert search_messages(1, "bolo", limit=10, channel_id=20) == []
+
+    def test_accents_pagination_and_syntax(self, test_db_path, monkeypatch) -> None:
+        """Test accent-insensitive matching, offset paging and hostile input."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        for i in range(5):
+            add_message(1, 10, "user", f"previsão número {i}")
+
+        assert len(search_messages(1, "PREVISAO", limit=10)) == 5
+        first = search_messages(1, "previsao", limit=3)
+        rest = search_messages(1, "previsao", limit=3, offset=3)
+        assert len(first) == 3 and len(rest) == 2
+        assert not {h.message.id for h in first} & {h.message.id for h in rest}
+        assert search_messages(1, '"*) OR user_id:2', limit=10) == []
+        assert search_messages(1, "?!", limit=10) == []
+
+    def test_index_follows_deletes(self, test_db_path, monkeypatch) -> None:
+        """Test that cleared messages disappear from the search index."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        add_message(1, 10, "user", "segredo guardado")
+        clear_user_history(1)
+
+        assert search_messages(1, "segredo", limit=10) == []
+
+    def test_get_turns_pairs_question_and_answer(self, test_db_path, monkeypatch) -> None:
+        """Test that a hit on either side returns the whole question/answer turn."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        q1, a1 = add_messages(1, 10, [("user", "q1", 0), ("assistant", "a1", 0)])
+        q2, a2 = add_messages(1, 10, [("user", "q2", 0), ("assistant", "a2", 0)])
+        (other,) = add_messages(1, 20, [("user", "q3", 0)])
+
+        assert [m.id for m in get_turns(1, 10, [a1])] == [q1, a1]
+        assert [m.id for m in get_turns(1, 10, [q2, a1])] == [q1, a1, q2, a2]
+        assert get_turns(1, 10, [other]) == []
+        assert get_turns(2, 10, [q1]) == []
+
+
+class TestMessageVectors:
+    """Tests for the per-conversation message vectors."""
+
+    def test_unindexed_messages_follow_last_vector(self, test_db_path, monkeypatch) -> None:
+        """Test that only messages after the last stored vector are returned."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        ids = add_messages(1, 10, [("user", "q1", 0), ("assistant", "a1", 0)])
+        add_message(1, 20, "user", "other channel")
+
+        assert [m.id for m in get_unindexed_messages(1, 10, limit=10)] == ids[::-1]
+        assert [m.id for m in get_unindexed_messages(1, 10, limit=1)] == [ids[1]]
+
+        save_message_vectors(1, 10, [(ids[0], b"a"), (ids[1], b"b")])
+        assert get_unindexed_messages(1, 10, limit=10) == []
+        new_id = add_message(1, 10, "user", "q2")
+        assert [m.id for m in get_unindexed_messages(1, 10, limit=10)] == [new_id]
+        assert get_message_vectors(1, 10, limit=10) == [(ids[1], b"b"), (ids[0], b"a")]
+
+    def test_vectors_deleted_with_messages(self, test_db_path, monkeypatch) -> None:
+        """Test that clearing history also removes the vectors."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+
+        (message_id,) = add_messages(1, 10, [("user", "q1", 0)])
+        save_message_vectors(1, 10, [(message_id, b"v")])
+        clear_user_history(1)
+
+        assert get_message_vectors(1, 10, limit=10) == []
@@ -0,0 +1,57 @@
+"""
+Tests para os vetores bag-of-words (embeddings.py).
+"""
+
+import math
+from array import array
+
+import embeddings
+from embeddings import DIMENSIONS, embed, similaridades
+
+
+class TestEmbed:
+    """Testes para o cálculo dos vetores."""
+
+    def test_normalized_and_deterministic(self) -> None:
+        """Testa tamanho, norma unitária e estabilidade do vetor."""
+        vetor = embed("Como fazer bolo de cenoura?")
+        assert len(vetor) == 4 * DIMENSIONS
+        assert vetor == embed("Como fazer bolo de cenoura?")
+        assert math.isclose(math.sqrt(sum(v * v for v in array("f", vetor))), 1.0, rel_tol=1e-5)
+
+    def test_empty_text_is_zero_vector(self) -> None:
+        """Testa que texto sem palavras gera vetor nulo (similaridade zero)."""
+        assert embed("?! a") == bytes(4 * DIMENSIONS)
+        assert similaridades(embed("?!"), [embed("bolo")]) == [0.0]
+
+    def test_case_and_accents_are_ignored(self) -> None:
+        """Testa que maiúsculas e acentos não mudam o vetor."""
+        assert embed("PREVISÃO do Tempo") == embed("previsao do tempo")
+
+
+class TestSimilaridades:
+    """Testes para a similaridade de cosseno."""
+
+    def test_related_text_scores_higher(self) -> None:
+        """Testa que o texto com mais palavras em comum fica mais próximo."""
+        consulta = embed("receita de bolo de cenoura")
+        scores = similaridades(
+            consulta,
+            [embed("qual a capital da França"), embed("bolo de cenoura com chocolate")],
+        )
+        assert scores[1] > scores[0]
+        assert math.isclose(similaridades(consulta, [consulta])[0], 1.0, rel_tol=1e-5)
+
+    def test_wrong_dimension_scores_zero(self) -> None:
+        """Testa que vetores gravados com outra dimensão são ignorados."""
+        consulta = embed("bolo")
+        assert similaridades(consulta, [b"\x00" * 8, consulta])[0] == 0.0
+        assert similaridades(consulta, []) == []
+
+    def test_pure_python_fallback(self, monkeypatch) -> None:
+        """Testa o cálculo sem NumPy."""
+        monkeypatch.setattr(embeddings, "_numpy", lambda: None)
+        consulta = embed("bolo de cenoura")
+        scores = similaridades(consulta, [consulta, embed("previsão do tempo")])
+        assert math.isclose(scores[0], 1.0, rel_tol=1e-5)
+        assert scores[1] < scores[0]
@@ -0,0 +1,132 @@
+"""
+Tests para as faixas de prioridade (lanes.py).
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import settings
+from lanes import (
+    FAIXA_IA,
+    FAIXA_RAPIDA,
+    Faixa,
+    conexoes_reservadas,
+    executar_na_faixa,
+    faixa_atual,
+    na_faixa,
+)
+from metrics import metrics
+from storage import PostgresStorage
+from tests.pg_standin import StandInPool
+
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _thread_atual() -> str:
+    return threading.current_thread().name
+
+
+class TestFaixas:
+    """Testes para classificação e execução por faixa."""
+
+    async def test_handler_usa_threads_da_faixa(self) -> None:
+        """Testa que o trabalho de banco do handler roda no pool da sua faixa."""
+        faixa = Faixa("teste", 1)
+
+        @na_faixa(faixa)
+        async def handler_teste() -> str:
+            assert faixa_atual.get() is faixa
+            return await executar_na_faixa(_thread_atual)
+
+        try:
+            assert (await handler_teste()).startswith("faixa-teste")
+        finally:
+            faixa.fechar()
+        assert faixa_atual.get() is None
+        fila = metrics.histogram_summary("lane_queue_ms", lane="teste")
+        assert fila is not None
+        assert fila["count"] == 1
+        latencia = metrics.histogram_summary(
+            "lane_latency_ms", lane="teste", handler="handler_teste"
+        )
+        assert latencia is not None
+        assert latencia["count"] == 1
+
+    async def test_fora_de_handler_usa_executor_padrao(self) -> None:
+        """Testa que trabalho sem faixa continua no executor padrão."""
+        assert not (await executar_na_faixa(_thread_atual)).startswith("faixa-")
+
+    async def test_rapida_nao_espera_atras_da_ia(self) -> None:
+        """Testa que a faixa rápida responde com a faixa da IA saturada."""
+        ia, rapida = Faixa("ia-teste", 2), Faixa("rapida-teste", 1)
+
+        @na_faixa(ia)
+        async def gerar() -> None:
+            await executar_na_faixa(time.sleep, 0.5)
+
+        @na_faixa(rapida)
+        async def stats() -> float:
+            inicio = time.perf_counter()
+            await executar_na_faixa(time.sleep, 0.01)
+            return time.perf_counter() - inicio
+
+        try:
+            geracoes = [asyncio.create_task(gerar()) for _ in range(6)]
+            await asyncio.sleep(0.05)
+            assert await stats() < 0.3
+            await asyncio.gather(*geracoes)
+        finally:
+            ia.fechar()
+            rapida.fechar()
+        fila = metrics.histogram_summary("lane_queue_ms", lane="ia-teste")
+        assert fila is not None
+        assert fila["max"] >= 400
+
+
+class TestConexoesReservadas:
+    """Testes para a reserva de conexões do PostgreSQL."""
+
+    def test_reserva_deixa_uma_conexao(self, monkeypatch) -> None:
+        """Testa que a reserva nunca toma o pool inteiro."""
+        monkeypatch.setattr(settings, "lane_fast_db_workers", 2)
+        assert conexoes_reservadas(10) == 2
+        assert conexoes_reservadas(2) == 1
+        assert conexoes_reservadas(1) == 0
+
+    async def test_faixa_rapida_usa_conexao_reservada(self, monkeypatch) -> None:
+        """Testa que a IA não ocupa as conexões reservadas à faixa rápida."""
+        monkeypatch.setattr(settings, "lane_fast_db_workers", 1)
+        storage = PostgresStorage(pool=StandInPool(), max_size=2)
+        storage._schema_pronto = True
+        liberar = asyncio.Event()
+
+        @na_faixa(FAIXA_IA)
+        async def segurar_conexao() -> None:
+            async with storage._conectar():
+                await liberar.wait()
+
+        @na_faixa(FAIXA_RAPIDA)
+        async def conectar_rapida() -> None:
+            async with storage._conectar():
+                pass
+
+        primeira = asyncio.create_task(segurar_conexao())
+        await asyncio.sleep(0)
+
+        # A segunda geração espera: a conexão que sobra é da faixa rápida
+        segunda = asyncio.create_task(segurar_conexao())
+        await asyncio.wait_for(conectar_rapida(), timeout=1)
+        await asyncio.sleep(0.05)
+        assert not segunda.done()
+
+        liberar.set()
+        await asyncio.gather(primeira, segunda)
+        await storage.close()
@@ -0,0 +1,125 @@
+"""
+Tests para o encerramento gracioso (lifecycle.py).
+"""
+
+import asyncio
+import os
+import signal
+
+import pytest
+
+from lifecycle import CicloDeVida
+from metrics import metrics
+
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestCicloDeVida:
+    """Testes para drenagem e etapas de encerramento."""
+
+    async def test_drena_antes_das_etapas(self) -> None:
+        """Testa que as etapas só rodam depois do trabalho em andamento terminar."""
+        ciclo = CicloDeVida(drain_seconds=5, step_seconds=1)
+        eventos: list[str] = []
+
+        async def resposta() -> None:
+            async with ciclo.trabalho():
+                await asyncio.sleep(0.1)
+                eventos.append("resposta enviada")
+
+        async def fechar_pool() -> None:
+            eventos.append("pool fechado")
+
+        ciclo.ao_encerrar("registro de uso", lambda: eventos.append("uso gravado"))
+        ciclo.ao_encerrar("storage", fechar_pool)
+
+        tarefa = asyncio.create_task(resposta())
+        await asyncio.sleep(0)
+        assert ciclo.em_andamento == 1
+
+        await ciclo.encerrar()
+
+        assert ciclo.encerrando
+        assert eventos == ["resposta enviada", "uso gravado", "pool fechado"]
+        assert ciclo.em_andamento == 0
+        await tarefa
+
+    async def test_prazo_de_drenagem(self) -> None:
+        """Testa que trabalho além do prazo é abandonado e as etapas rodam mesmo assim."""
+        ciclo = CicloDeVida(drain_seconds=0.1, step_seconds=1)
+        etapas: list[str] = []
+        ciclo.ao_encerrar("storage", lambda: etapas.append("storage"))
+
+        async def lenta() -> None:
+            async with ciclo.trabalho():
+                await asyncio.sleep(10)
+
+        tarefa = asyncio.create_task(lenta())
+        await asyncio.sleep(0)
+        await ciclo.encerrar()
+
+        assert etapas == ["storage"]
+        assert metrics.counter_value("shutdown_abandoned") == 1
+        tarefa.cancel()
+
+    async def test_falha_e_prazo_de_etapa_nao_interrompem(self) -> None:
+        """Testa que uma etapa com erro ou travada não impede as seguintes."""
+        ciclo = CicloDeVida(drain_seconds=1, step_seconds=0.1)
+        etapas: list[str] = []
+
+        def quebrada() -> None:
+            raise RuntimeError("boom")
+
+        ciclo.ao_encerrar("quebrada", quebrada)
+        ciclo.ao_encerrar("travada", lambda: asyncio.sleep(10))
+        ciclo.ao_encerrar("discord", lambda: etapas.append("discord"))
+
+        await asyncio.wait_for(ciclo.encerrar(), timeout=2)
+
+        assert etapas == ["discord"]
+
+    async def test_prazo_total(self) -> None:
+        """Testa que as etapas além do prazo total são puladas."""
+        ciclo = CicloDeVida(drain_seconds=0.2, step_seconds=1, timeout_seconds=0.4)
+        etapas: list[str] = []
+        ciclo.ao_encerrar("travada", lambda: asyncio.sleep(10))
+        ciclo.ao_encerrar("discord", lambda: etapas.append("discord"))
+
+        async def lenta() -> None:
+            async with ciclo.trabalho():
+                await asyncio.sleep(10)
+
+        tarefa = asyncio.create_task(lenta())
+        await asyncio.sleep(0)
+        await asyncio.wait_for(ciclo.encerrar(), timeout=1)
+
+        assert etapas == []
+        assert metrics.counter_value("shutdown_steps_skipped") == 1
+        tarefa.cancel()
+
+    async def test_sigterm_inicia_encerramento(self) -> None:
+        """Testa que SIGTERM dispara o encerramento uma única vez."""
+        ciclo = CicloDeVida(drain_seconds=1, step_seconds=1)
+        etapas: list[str] = []
+        ciclo.ao_encerrar("discord", lambda: etapas.append("discord"))
+        ciclo.instalar_sinais()
+        loop = asyncio.get_running_loop()
+        try:
+            os.kill(os.getpid(), signal.SIGTERM)
+            os.kill(os.getpid(), signal.SIGTERM)
+            for _ in range(50):
+                await asyncio.sleep(0.02)
+                if etapas:
+                    break
+            await asyncio.sleep(0.05)
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            loop.remove_signal_handler(signal.SIGINT)
+
+        assert ciclo.encerrando
+        assert etapas == ["discord"]
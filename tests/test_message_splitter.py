@@ -0,0 +1,154 @@
+"""
+Tests para o módulo de divisão de mensagens (message_splitter.py).
+"""
+
+from unittest.mock import AsyncMock
+
+import discord
+import pytest
+
+from config import settings
+from message_splitter import (
+    ATTACHMENT_FILENAME,
+    DISCORD_MESSAGE_LIMIT,
+    dividir_markdown,
+    planejar_envio,
+)
+
+
+def _codigo(linhas: int) -> str:
+    return (
+        "```python\n" + "\n".join(f"x_{i} = {i}  # comentário {i}" for i in range(linhas)) + "\n```"
+    )
+
+
+class TestDividirMarkdown:
+    """Testes para dividir_markdown."""
+
+    def test_short_text_is_single_chunk(self) -> None:
+        """Testa que texto curto não é dividido."""
+        assert dividir_markdown("  Olá!  ") == ["Olá!"]
+
+    def test_empty_text(self) -> None:
+        """Testa texto vazio."""
+        assert dividir_markdown("   ") == []
+
+    def test_chunks_respect_limit(self) -> None:
+        """Testa que nenhum bloco excede o limite."""
+        texto = "\n\n".join("Frase de teste. " * 30 for _ in range(20))
+        chunks = dividir_markdown(texto, 500)
+        assert len(chunks) > 1
+        assert all(len(c) <= 500 for c in chunks)
+
+    def test_does_not_break_words(self) -> None:
+        """Testa que palavras não são cortadas no meio."""
+        texto = " ".join(f"palavra{i}" for i in range(1000))
+        chunks = dividir_markdown(texto, 300)
+        words = [w for c in chunks for w in c.split()]
+        assert words == texto.split()
+
+    def test_prefers_paragraph_boundaries(self) -> None:
+        """Testa que parágrafos inteiros são mantidos quando possível."""
+        paragrafos = [f"Parágrafo {i}. " + "texto " * 50 for i in range(6)]
+        chunks = dividir_markdown("\n\n".join(paragrafos), 700)
+        for chunk in chunks:
+            assert chunk.startswith("Parágrafo")
+            assert chunk.rstrip().endswith("texto")
+
+    def test_code_fences_closed_and_reopened(self) -> None:
+        """Testa que blocos de código são fechados e reabertos entre blocos."""
+        texto = "Veja o código:\n\n" + _codigo(200) + "\n\nFim."
+        chunks = dividir_markdown(texto, DISCORD_MESSAGE_LIMIT)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert len(chunk) <= DISCORD_MESSAGE_LIMIT
+            # Número par de cercas: todo bloco aberto é fechado no mesmo chunk
+            assert chunk.count("```") % 2 == 0
+        assert chunks[1].startswith("```python\n")
+
+    def test_content_is_preserved(self) -> None:
+        """Testa que o conteúdo (fora as cercas adicionadas) é preservado."""
+        texto = "Intro.\n\n" + _codigo(150) + "\n\nConclusão final."
+        chunks = dividir_markdown(texto, 800)
+        linhas = [
+            linha
+            for chunk in chunks
+            for linha in chunk.splitlines()
+            if linha.strip() and not linha.startswith("```")
+        ]
+        esperado = [
+            linha for linha in texto.splitlines() if linha.strip() and not linha.startswith("```")
+        ]
+        assert linhas == esperado
+
+    def test_very_long_word_is_hard_split(self) -> None:
+        """Testa que uma 'palavra' maior que o limite é cortada."""
+        chunks = dividir_markdown("a" * 5000, 1000)
+        assert "".join(chunks) == "a" * 5000
+        assert all(len(c) <= 1000 for c in chunks)
+
+
+class TestPlanejarEnvio:
+    """Testes para planejar_envio."""
+
+    def test_short_answer_is_plain_text(self) -> None:
+        """Testa resposta curta como texto simples."""
+        envios = planejar_envio("Resposta curta")
+        assert len(envios) == 1
+        assert envios[0].kwargs() == {"content": "Resposta curta"}
+
+    def test_empty_answer_sends_nothing(self) -> None:
+        """Testa que texto vazio ou só com espaços não gera envios."""
+        assert planejar_envio("") == []
+        assert planejar_envio(" \n\t ") == []
+
+    def test_medium_answer_uses_single_message_with_embeds(self) -> None:
+        """Testa que respostas de até 6000 caracteres usam uma mensagem com embeds."""
+        resposta = "\n\n".join("Linha de resposta. " * 20 for _ in range(12))
+        assert DISCORD_MESSAGE_LIMIT < len(resposta) <= 6000
+
+        envios = planejar_envio(resposta)
+
+        assert len(envios) == 1
+        embeds = envios[0].kwargs()["embeds"]
+        assert all(isinstance(e, discord.Embed) for e in embeds)
+        assert sum(len(e.description) for e in embeds) <= 6000
+
+    def test_long_answer_uses_attachment(self) -> None:
+        """Testa que respostas muito longas vão como arquivo anexo com prévia."""
+        resposta = "Parágrafo longo. " * 1000
+
+        envios = planejar_envio(resposta)
+
+        assert len(envios) == 1
+        kwargs = envios[0].kwargs()
+        assert kwargs["file"].filename == ATTACHMENT_FILENAME
+        assert len(kwargs["content"]) <= DISCORD_MESSAGE_LIMIT
+
+    def test_chunks_between_embed_limit_and_threshold(self, monkeypatch) -> None:
+        """Testa envio em vários textos quando o limiar de anexo é alto."""
+        monkeypatch.setattr(settings, "response_attachment_threshold", 50_000)
+        resposta = "Parágrafo longo. " * 1000
+
+        envios = planejar_envio(resposta)
+
+        assert len(envios) > 1
+        assert all(len(e.content or "") <= DISCORD_MESSAGE_LIMIT for e in envios)
+
+
+class TestEnviarResposta:
+    """Testes para o envio da resposta planejada."""
+
+    @pytest.mark.asyncio
+    async def test_sends_plan_in_order(self, mock_discord_message, monkeypatch) -> None:
+        """Testa que o primeiro bloco vai como reply e os demais no canal."""
+        from bot import enviar_resposta
+
+        monkeypatch.setattr(settings, "response_attachment_threshold", 50_000)
+        mock_discord_message.channel.send = AsyncMock()
+
+        await enviar_resposta(mock_discord_message, "Bloco de texto. " * 600)
+
+        mock_discord_message.reply.assert_awaited_once()
+        assert mock_discord_message.channel.send.await_count >= 1
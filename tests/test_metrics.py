@@ -0,0 +1,69 @@
+"""
+Tests para o módulo de métricas (metrics.py).
+"""
+
+from metrics import Metrics
+
+
+class TestMetrics:
+    """Testes para o registro de métricas."""
+
+    def test_counter_with_labels(self) -> None:
+        """Testa contadores separados por labels."""
+        registry = Metrics()
+        registry.incr("events", shard=0)
+        registry.incr("events", shard=0)
+        registry.incr("events", 5, shard=1)
+
+        assert registry.counter_value("events", shard=0) == 2
+        assert registry.counter_value("events", shard=1) == 5
+        assert registry.counter_value("events", shard=2) == 0
+
+    def test_gauge_overwrites(self) -> None:
+        """Testa que gauge mantém apenas o último valor."""
+        registry = Metrics()
+        registry.gauge("latency", 10)
+        registry.gauge("latency", 20)
+
+        assert registry.gauge_value("latency") == 20
+        assert registry.gauge_value("missing") is None
+
+    def test_histogram_percentiles(self) -> None:
+        """Testa percentis do histograma."""
+        registry = Metrics()
+        for value in range(1, 101):
+            registry.observe("latency_ms", value)
+
+        summary = registry.histogram_summary("latency_ms")
+        assert summary is not None
+        assert summary["count"] == 100
+        assert summary["max"] == 100
+        assert 49 <= summary["p50"] <= 51
+        assert 94 <= summary["p95"] <= 96
+        assert summary["avg"] == 50.5
+
+    def test_histogram_reservoir_is_bounded(self) -> None:
+        """Testa que o reservatório de amostras é limitado."""
+        registry = Metrics(reservoir_size=10)
+        for value in range(1000):
+            registry.observe("x", value)
+
+        summary = registry.histogram_summary("x")
+        assert summary is not None
+        assert summary["count"] == 1000
+        assert summary["p50"] >= 990
+
+    def test_snapshot_and_reset(self) -> None:
+        """Testa snapshot e reset."""
+        registry = Metrics()
+        registry.incr("a")
+        registry.gauge("b", 1)
+        registry.observe("c", 1)
+
+        snapshot = registry.snapshot()
+        assert snapshot["counters"] == {"a": 1}
+        assert snapshot["gauges"] == {"b": 1}
+        assert snapshot["histograms"]["c"]["count"] == 1
+
+        registry.reset()
+        assert registry.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
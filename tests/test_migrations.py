@@ -0,0 +1,196 @@
+"""
+Tests para o módulo de migrações (migrations.py).
+"""
+
+import sqlite3
+from datetime import UTC, datetime
+
+import pytest
+
+from config import settings
+from database import (
+    add_message,
+    get_connection,
+    get_conversation_history,
+    get_user_stats,
+    incremental_vacuum,
+    init_db,
+    search_messages,
+)
+from migrations import (
+    LATEST_VERSION,
+    check_stats,
+    get_schema_version,
+    main,
+    migrate,
+    rebuild_stats,
+)
+
+
+def _create_legacy_db(path) -> None:
+    """Cria um banco no formato anterior ao versionamento (timestamps em texto)."""
+    conn = sqlite3.connect(str(path))
+    conn.execute("""
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    rows = [
+        (1, 10, "user", "q1", "2025-01-01 10:00:00"),
+        (1, 10, "assistant", "a1", "2025-01-01 10:00:01.500000"),
+        (1, 10, "user", "q2", "2025-01-01T10:00:02"),
+        (2, 20, "user", "other", "2025-02-01T00:00:00.250000"),
+    ]
+    conn.executemany(
+        "INSERT INTO messages (user_id, channel_id, role, content, created_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestMigrations:
+    """Testes para aplicação das migrações."""
+
+    def test_fresh_database_is_latest(self, test_db_path, monkeypatch) -> None:
+        """Testa que um banco novo termina na versão mais recente."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        with get_connection() as conn:
+            assert get_schema_version(conn) == LATEST_VERSION
+
+    def test_migrate_is_idempotent(self, test_db_path, monkeypatch) -> None:
+        """Testa que rodar as migrações novamente não altera nada."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        add_message(1, 1, "user", "hello")
+        init_db()
+        assert [m.content for m in get_conversation_history(1, 1)] == ["hello"]
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+    def test_legacy_database_is_rewritten(self, test_db_path, monkeypatch, chunk_size) -> None:
+        """Testa a migração em lotes de um banco legado com timestamps em texto."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        _create_legacy_db(test_db_path)
+
+        with get_connection() as conn:
+            assert migrate(conn, chunk_size=chunk_size) == LATEST_VERSION
+            row = conn.execute("SELECT role, created_at FROM messages WHERE id = 2").fetchone()
+            assert row["role"] == 1
+            assert row["created_at"] == 1735725601500
+
+        history = get_conversation_history(1, 10)
+        assert [m.content for m in history] == ["q1", "a1", "q2"]
+        assert [m.role for m in history] == ["user", "assistant", "user"]
+        assert history[0].created_at == datetime(2025, 1, 1, 10, 0, tzinfo=UTC)
+
+    def test_ids_continue_after_migration(self, test_db_path, monkeypatch) -> None:
+        """Testa que novos IDs continuam após os migrados (AUTOINCREMENT preservado)."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        _create_legacy_db(test_db_path)
+        init_db()
+
+        assert add_message(3, 30, "user", "new") == 5
+
+    def test_context_query_uses_new_index(self, test_db_path, monkeypatch) -> None:
+        """Testa que o índice da consulta de contexto foi recriado no schema novo."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        _create_legacy_db(test_db_path)
+        init_db()
+
+        with get_connection() as conn:
+            indexes = {
+                r["name"]
+                for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+            }
+        assert {"idx_user_channel", "idx_created_at"} <= indexes
+
+
+class TestUserStatsMaintenance:
+    """Testes para backfill, verificação e rebuild de user_stats."""
+
+    def test_legacy_database_is_backfilled(self, test_db_path, monkeypatch) -> None:
+        """Testa que a migração preenche user_stats a partir do histórico existente."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        _create_legacy_db(test_db_path)
+        init_db()
+
+        stats = get_user_stats(1)
+        assert stats["total_messages"] == 3
+        assert stats["total_channels"] == 1
+        assert stats["last_active_at"] == datetime(2025, 1, 1, 10, 0, 2, tzinfo=UTC)
+        with get_connection() as conn:
+            assert check_stats(conn) == []
+
+    def test_check_detects_and_rebuild_fixes_drift(self, test_db_path, monkeypatch) -> None:
+        """Testa que divergências são detectadas e corrigidas pelo rebuild."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        add_message(1, 10, "user", "q1", tokens=7)
+        add_message(2, 20, "user", "q2", tokens=3)
+
+        with get_connection() as conn:
+            conn.execute("UPDATE user_stats SET total_tokens = 0 WHERE user_id = 1")
+            conn.execute("DELETE FROM conversation_stats WHERE user_id = 2")
+            conn.commit()
+            assert check_stats(conn) == [1, 2]
+
+            rebuild_stats(conn)
+            conn.commit()
+            assert check_stats(conn) == []
+
+        assert get_user_stats(1)["total_tokens"] == 7
+        assert get_user_stats(2)["total_channels"] == 1
+
+    def test_cli_check_exit_code(self, test_db_path, monkeypatch) -> None:
+        """Testa o código de saída de --check-stats e a correção via --rebuild-stats."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        add_message(1, 10, "user", "q1")
+        with get_connection() as conn:
+            conn.execute("UPDATE user_stats SET total_messages = 5")
+
+        assert main(["--check-stats"]) == 1
+        assert main(["--rebuild-stats"]) == 0
+        assert main(["--check-stats"]) == 0
+
+
+class TestFullTextSearchIndex:
+    """Testes para o índice FTS5 do histórico."""
+
+    def test_legacy_database_is_indexed(self, test_db_path, monkeypatch) -> None:
+        """Testa que a migração indexa as mensagens já existentes."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        _create_legacy_db(test_db_path)
+        init_db()
+
+        assert [h.message.content for h in search_messages(1, "a1", limit=10)] == ["a1"]
+        assert search_messages(1, "other", limit=10) == []
+        assert [h.message.user_id for h in search_messages(2, "other", limit=10)] == [2]
+
+
+class TestAutoVacuum:
+    """Testes para a conversão de bancos antigos para auto_vacuum incremental."""
+
+    def test_legacy_database_is_converted(self, test_db_path, monkeypatch) -> None:
+        """Testa que um banco sem auto_vacuum passa a devolver páginas livres."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        _create_legacy_db(test_db_path)
+        init_db()
+
+        with get_connection() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            conn.executemany(
+                "INSERT INTO messages (user_id, channel_id, role, content) VALUES (3, 3, 0, ?)",
+                [("x" * 4000,) for _ in range(50)],
+            )
+        with get_connection() as conn:
+            conn.execute("DELETE FROM messages WHERE user_id = 3")
+        assert incremental_vacuum(1000) == 0
+        assert [m.content for m in get_conversation_history(1, 10)] == ["q1", "a1", "q2"]
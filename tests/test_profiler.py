@@ -0,0 +1,117 @@
+"""
+Tests para o profiler por amostragem (profiler.py).
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from config import settings
+from profiler import PerfilEmAndamentoError, ProfilerAmostragem, colapsar, etiquetar
+
+
+async def handler_ocupado(guild_id: int, segundos: float) -> None:
+    """Simula um handler que gasta CPU no event loop em fatias de 20ms."""
+    etiquetar(guild=guild_id)
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim:
+        calcular(0.02)
+        await asyncio.sleep(0)
+
+
+def calcular(segundos: float) -> None:
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim:
+        sum(i * i for i in range(100))
+
+
+def _ler(arquivo) -> dict[str, int]:
+    linhas = {}
+    for linha in arquivo.read_text().splitlines():
+        pilha, contagem = linha.rsplit(" ", 1)
+        linhas[pilha] = int(contagem)
+    return linhas
+
+
+class TestColapsar:
+    """Testes para conversão de pilhas no formato collapsed."""
+
+    def test_pilha_atual(self) -> None:
+        """Testa que a pilha vai da raiz até o frame atual, com o handler na raiz."""
+        handler, pilha = colapsar(sys._getframe(), {"guild": 7})
+        frames = pilha.split(";")
+        assert frames[0] == f"handler:{handler}"
+        assert frames[1] == "guild:7"
+        assert frames[-1] == "test_profiler.TestColapsar.test_pilha_atual"
+        assert " " not in pilha
+
+    def test_etiquetar_fora_de_tarefa(self) -> None:
+        """Testa que etiquetar fora do event loop não falha."""
+        etiquetar(guild=1)
+
+
+class TestProfilerAmostragem:
+    """Testes para coleta de perfis."""
+
+    async def test_perfil_por_handler_e_guild(self, tmp_path, monkeypatch) -> None:
+        """Testa que as amostras são atribuídas ao handler e à guild da tarefa."""
+        monkeypatch.setattr(settings, "profiler_dir", tmp_path)
+        profiler = ProfilerAmostragem()
+
+        tarefa = asyncio.create_task(handler_ocupado(42, 0.5))
+        perfil = await profiler.perfilar(0.3, intervalo_ms=2)
+        await tarefa
+
+        assert perfil.arquivo.parent == tmp_path
+        assert perfil.amostras > 20
+        assert perfil.por_handler["handler_ocupado"] > perfil.amostras / 4
+
+        linhas = _ler(perfil.arquivo)
+        assert sum(linhas.values()) == perfil.amostras
+        ocupado = [p for p in linhas if p.startswith("handler:handler_ocupado;guild:42;")]
+        assert ocupado
+        assert any(p.endswith("test_profiler.calcular.<locals>.<genexpr>") for p in ocupado)
+
+    async def test_uma_coleta_por_vez(self, tmp_path, monkeypatch) -> None:
+        """Testa que uma segunda coleta simultânea é recusada."""
+        monkeypatch.setattr(settings, "profiler_dir", tmp_path)
+        profiler = ProfilerAmostragem()
+
+        primeira = asyncio.create_task(profiler.perfilar(0.2))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PerfilEmAndamentoError):
+            await profiler.perfilar(0.2)
+        await primeira
+        # Terminada a primeira, uma nova coleta é aceita
+        assert (await profiler.perfilar(0.05)).amostras > 0
+
+    async def test_limite_de_duracao(self, tmp_path, monkeypatch) -> None:
+        """Testa que a duração é limitada por PROFILER_MAX_SECONDS."""
+        monkeypatch.setattr(settings, "profiler_dir", tmp_path)
+        monkeypatch.setattr(settings, "profiler_max_seconds", 1)
+        inicio = time.monotonic()
+        perfil = await ProfilerAmostragem().perfilar(30, intervalo_ms=50)
+        assert perfil.segundos == 1
+        assert time.monotonic() - inicio < 3
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGUSR2"), reason="sem SIGUSR2")
+    async def test_sinal_dispara_coleta(self, tmp_path, monkeypatch) -> None:
+        """Testa que SIGUSR2 inicia uma coleta de PROFILER_SIGNAL_SECONDS."""
+        monkeypatch.setattr(settings, "profiler_dir", tmp_path)
+        monkeypatch.setattr(settings, "profiler_signal_seconds", 0.1)
+        profiler = ProfilerAmostragem()
+        profiler.instalar_sinal()
+        try:
+            os.kill(os.getpid(), signal.SIGUSR2)
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                if list(tmp_path.glob("*.collapsed")):
+                    break
+        finally:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR2)
+
+        assert len(list(tmp_path.glob("perfil-*.collapsed"))) == 1
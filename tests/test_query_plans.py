@@ -0,0 +1,378 @@
+"""
+Query plan regression tests for every database query.
+
+Every statement issued by database.py, and through it by retention.py and
+usage.py, is captured through the SQLite trace callback and checked with
+EXPLAIN QUERY PLAN against a synthetic database. The Postgres backend's SQL
+in storage.py runs on the stand-in (tests/pg_standin.py) over the same
+synthetic history with the Postgres schema and is checked the same way: this
+catches indexes missing from that schema, not Postgres planner choices.
+
+A statement fails if its plan scans a table that grows with traffic (a SCAN
+reads the whole table or index, with or without USING [COVERING] INDEX) or
+needs a temporary B-tree for ORDER BY/GROUP BY/DISTINCT. Expected scans are
+listed in ALLOWED_SCANS with the reason they stay bounded.
+
+The synthetic database size defaults to 100k rows; set
+SHERLOCK_QUERY_PLAN_ROWS (e.g. 5000000) to run against millions of rows.
+"""
+
+import asyncio
+import inspect
+import os
+import re
+import sqlite3
+from collections.abc import AsyncGenerator, Awaitable, Callable, Generator, Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+
+import database
+import retention
+import usage
+from config import settings
+from retention import RetentionPruner
+from storage import PostgresStorage, SQLiteStorage, Storage
+from tests.pg_standin import StandInPool
+
+ROWS = int(os.environ.get("SHERLOCK_QUERY_PLAN_ROWS", "100000"))
+USERS = max(1, ROWS // 100)
+CHANNELS = 50
+
+# Tables that grow with traffic: any SCAN of them is a violation
+SCAN_RE = re.compile(
+    r"^SCAN (messages|message_vectors|user_stats|conversation_stats|usage_\w+|quota_usage)\b"
+)
+
+# Scans that are expected, with the reason they stay bounded
+ALLOWED_SCANS = {
+    "SCAN conversation_stats": (
+        "retention reads the per-conversation counters; one row per conversation, not per message"
+    ),
+}
+
+# Postgres queries the stand-in cannot run, with the reason
+UNPLANNED_POSTGRES = {
+    "search_messages": "tsvector/GIN full-text search is not emulated by the stand-in",
+}
+
+
+def _synthetic_rows() -> Iterator[tuple[int, int, int, str, int]]:
+    for i in range(ROWS):
+        yield (i % USERS, i % CHANNELS, i % 2, f"message {i}", 1_700_000_000_000 + i * 1000)
+
+
+@pytest.fixture(scope="module")
+def synthetic_db(tmp_path_factory: pytest.TempPathFactory) -> Generator[Path, None, None]:
+    """Builds a synthetic database with ROWS messages and fresh statistics."""
+    path = tmp_path_factory.mktemp("query_plans") / "synthetic.db"
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "db_path", path)
+        database.init_db()
+        conn = sqlite3.connect(str(path))
+        conn.executemany(
+            "INSERT INTO messages (user_id, channel_id, role, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            _synthetic_rows(),
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.close()
+        yield path
+
+
+@pytest.fixture(scope="module")
+def postgres_db(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Builds the same synthetic history with the Postgres schema."""
+    path = tmp_path_factory.mktemp("query_plans") / "postgres.db"
+    pool = StandInPool(str(path))
+    # The first operation creates the schema
+    asyncio.run(PostgresStorage(pool=pool).get_user_stats(0))
+    conn = sqlite3.connect(str(path))
+    conn.executemany(
+        "INSERT INTO messages (user_id, channel_id, role, content, created_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        _synthetic_rows(),
+    )
+    conn.execute("""
+        INSERT INTO conversation_stats (user_id, channel_id, message_count)
+        SELECT user_id, channel_id, COUNT(*) FROM messages GROUP BY user_id, channel_id
+    """)
+    conn.execute("""
+        INSERT INTO user_stats (user_id, total_messages, total_channels, total_tokens, last_active_at)
+        SELECT user_id, COUNT(*), COUNT(DISTINCT channel_id), SUM(tokens), MAX(created_at)
+        FROM messages GROUP BY user_id
+    """)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def captured_sql(synthetic_db: Path, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Captures the (expanded) SQL of every statement database.py executes."""
+    statements: list[str] = []
+    real_connect = sqlite3.connect
+
+    def connect(*args, **kwargs) -> sqlite3.Connection:
+        conn: sqlite3.Connection = real_connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(settings, "db_path", synthetic_db)
+    monkeypatch.setattr(database.sqlite3, "connect", connect)
+    return statements
+
+
+@pytest.fixture
+async def postgres_storage(
+    postgres_db: Path,
+) -> AsyncGenerator[tuple[PostgresStorage, list[str]], None]:
+    """PostgresStorage on the stand-in, with the (translated) SQL it executes."""
+    pool = StandInPool(str(postgres_db))
+    backend = PostgresStorage(pool=pool)
+    await backend.get_user_stats(0)  # schema ready before capturing
+    statements: list[str] = []
+    pool.set_trace_callback(statements.append)
+    yield backend, statements
+    await backend.close()
+
+
+def _query_plan(path: Path, sql: str) -> list[str]:
+    conn = sqlite3.connect(str(path))
+    try:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    finally:
+        conn.close()
+
+
+def _plan_violations(path: Path, statements: list[str]) -> list[str]:
+    violations = []
+    for sql in statements:
+        if not re.match(r"\s*(SELECT|INSERT|DELETE|UPDATE|WITH)\b", sql, re.IGNORECASE):
+            continue
+        for detail in _query_plan(path, sql):
+            if detail in ALLOWED_SCANS:
+                continue
+            if "TEMP B-TREE" in detail or SCAN_RE.match(detail):
+                violations.append(f"{detail!r} in: {' '.join(sql.split())}")
+    return violations
+
+
+def _unindexed_before_and_after_saving() -> None:
+    database.get_unindexed_messages(9, 9, limit=50)
+    database.save_message_vectors(9, 9, [(1009, b"v")])
+    database.get_unindexed_messages(9, 9, limit=50)
+
+
+# Every function in database.py that queries the database, with sample arguments
+QUERY_CALLS: dict[str, Callable[[], object]] = {
+    "add_message": lambda: database.add_message(1, 1, "user", "plan test"),
+    "add_messages": lambda: database.add_messages(
+        1, 1, [("user", "plan test", 3), ("assistant", "reply", 5)]
+    ),
+    "get_conversation_history": lambda: database.get_conversation_history(1, 1, limit=10),
+    "get_context_messages": lambda: database.get_context_messages(2, 2),
+    "get_channel_history": lambda: database.get_channel_history(2, limit=30),
+    "get_user_stats": lambda: database.get_user_stats(3),
+    "clear_user_history": lambda: (
+        database.clear_user_history(4, 4),
+        database.clear_user_history(5),
+    ),
+    "get_expired_messages": lambda: (
+        database.get_expired_messages(datetime(2023, 11, 15, tzinfo=UTC), 100),
+        database.get_expired_messages(datetime(2023, 11, 15, tzinfo=UTC), 100, channel_id=7),
+        database.get_expired_messages(
+            datetime(2023, 11, 15, tzinfo=UTC), 100, exclude_channel_ids=(7, 8)
+        ),
+    ),
+    "search_messages": lambda: (
+        database.search_messages(7, "message 123", limit=6),
+        database.search_messages(7, "message", limit=6, offset=6, channel_id=7, any_term=True),
+    ),
+    "get_turns": lambda: database.get_turns(8, 8, [108, 208]),
+    "get_unindexed_messages": _unindexed_before_and_after_saving,
+    "save_message_vectors": lambda: database.save_message_vectors(9, 9, [(2009, b"v")]),
+    "get_message_vectors": lambda: database.get_message_vectors(9, 9, limit=50),
+    "get_oversized_conversations": lambda: database.get_oversized_conversations(50),
+    "get_overflow_messages": lambda: database.get_overflow_messages(6, 6, keep=5, limit=100),
+    "delete_messages": lambda: database.delete_messages([10, 11, 12]),
+    "get_command_sync_hash": lambda: database.get_command_sync_hash("global:1"),
+    "set_command_sync_hash": lambda: database.set_command_sync_hash("global:1", "abc"),
+    "add_usage_records": lambda: database.add_usage_records(
+        [database.UsageRecord(1, 1, "m/a", 10, 5, 0, 100)]
+    ),
+    "get_quota_usage": lambda: database.get_quota_usage(0),
+    "save_quota_usage": lambda: database.save_quota_usage([(0, "user", 1, 10)], 0),
+    "get_usage_hourly": lambda: database.get_usage_hourly(datetime(2023, 11, 15, tzinfo=UTC)),
+}
+
+
+async def _in_sequence(*calls: Awaitable[object]) -> None:
+    for call in calls:
+        await call
+
+
+# Every PostgresStorage method that queries the database, with sample arguments
+STORAGE_CALLS: dict[str, Callable[[PostgresStorage], Awaitable[object]]] = {
+    "add_messages": lambda s: s.add_messages(
+        1, 1, [("user", "plan test", 3), ("assistant", "reply", 5)]
+    ),
+    "get_conversation_history": lambda s: s.get_conversation_history(1, 1, limit=10),
+    "get_channel_history": lambda s: s.get_channel_history(2, limit=30),
+    "get_user_stats": lambda s: s.get_user_stats(3),
+    "clear_user_history": lambda s: _in_sequence(
+        s.clear_user_history(4, 4), s.clear_user_history(5)
+    ),
+    "get_expired_messages": lambda s: _in_sequence(
+        s.get_expired_messages(datetime(2023, 11, 15, tzinfo=UTC), 100),
+        s.get_expired_messages(datetime(2023, 11, 15, tzinfo=UTC), 100, channel_id=7),
+        s.get_expired_messages(datetime(2023, 11, 15, tzinfo=UTC), 100, exclude_channel_ids=(7, 8)),
+    ),
+    "get_turns": lambda s: s.get_turns(8, 8, [108, 208]),
+    "get_unindexed_messages": lambda s: _in_sequence(
+        s.get_unindexed_messages(9, 9, limit=50),
+        s.save_message_vectors(9, 9, [(1009, b"v")]),
+        s.get_unindexed_messages(9, 9, limit=50),
+    ),
+    "save_message_vectors": lambda s: s.save_message_vectors(9, 9, [(2009, b"v")]),
+    "get_message_vectors": lambda s: s.get_message_vectors(9, 9, limit=50),
+    "get_oversized_conversations": lambda s: s.get_oversized_conversations(50),
+    "get_overflow_messages": lambda s: s.get_overflow_messages(6, 6, keep=5, limit=100),
+    "delete_messages": lambda s: s.delete_messages([10, 11, 12]),
+}
+
+
+def _query_functions() -> set[str]:
+    """Public functions of database.py that open a connection, except schema setup."""
+    names = set()
+    for name, func in inspect.getmembers(database, inspect.isfunction):
+        if func.__module__ != "database" or name.startswith("_"):
+            continue
+        if "get_connection()" in inspect.getsource(func):
+            names.add(name)
+    return names - {"get_connection", "init_db", "incremental_vacuum"}
+
+
+def _postgres_query_methods() -> set[str]:
+    """PostgresStorage methods that take a connection from the pool."""
+    return {
+        name
+        for name, func in inspect.getmembers(PostgresStorage, inspect.isfunction)
+        if "self._conectar()" in inspect.getsource(func)
+    }
+
+
+def _database_functions_used(module: object) -> set[str]:
+    """database.py functions imported by a module."""
+    return {
+        name
+        for name, func in inspect.getmembers(module, inspect.isfunction)
+        if func.__module__ == "database"
+    }
+
+
+class TestQueryPlans:
+    """EXPLAIN QUERY PLAN assertions for every database query."""
+
+    def test_every_query_function_is_covered(self) -> None:
+        """New query functions must be added to QUERY_CALLS / STORAGE_CALLS."""
+        assert _query_functions() <= set(QUERY_CALLS)
+        assert _postgres_query_methods() <= set(STORAGE_CALLS) | set(UNPLANNED_POSTGRES)
+
+    def test_retention_and_usage_queries_are_covered(self) -> None:
+        """retention.py and usage.py reach the database only through checked calls."""
+        used = set(re.findall(r"self\.storage\.(\w+)\(", inspect.getsource(retention)))
+        # incremental_vacuum is a PRAGMA, with no query plan
+        assert used - {"incremental_vacuum"} <= set(QUERY_CALLS) & set(STORAGE_CALLS)
+        assert _database_functions_used(usage) <= set(QUERY_CALLS)
+
+    @pytest.mark.parametrize("name", sorted(QUERY_CALLS))
+    def test_query_uses_index_without_temp_btree(
+        self, name: str, synthetic_db: Path, captured_sql: list[str]
+    ) -> None:
+        """Each statement must be index-backed and need no temporary B-tree."""
+        QUERY_CALLS[name]()
+
+        assert captured_sql, f"{name} did not execute any statement"
+        assert _plan_violations(synthetic_db, captured_sql) == []
+
+    @pytest.mark.parametrize("name", sorted(STORAGE_CALLS))
+    async def test_postgres_query_uses_index_without_temp_btree(
+        self,
+        name: str,
+        postgres_db: Path,
+        postgres_storage: tuple[PostgresStorage, list[str]],
+    ) -> None:
+        """Postgres backend statements must be served by the Postgres schema's indexes."""
+        backend, statements = postgres_storage
+        await STORAGE_CALLS[name](backend)
+
+        assert statements, f"{name} did not execute any statement"
+        assert _plan_violations(postgres_db, statements) == []
+
+    @pytest.mark.parametrize("backend_name", ["sqlite", "postgres"])
+    async def test_retention_cycle_plans(
+        self,
+        backend_name: str,
+        synthetic_db: Path,
+        postgres_db: Path,
+        captured_sql: list[str],
+        postgres_storage: tuple[PostgresStorage, list[str]],
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """A retention cycle with every policy enabled stays index-backed."""
+        monkeypatch.setattr(settings, "retention_days", 1)
+        monkeypatch.setattr(settings, "retention_channel_days", {7: 1})
+        monkeypatch.setattr(settings, "retention_max_messages_per_conversation", ROWS)
+        monkeypatch.setattr(settings, "retention_vacuum_pages", 0)
+        backend: Storage
+        if backend_name == "sqlite":
+            backend, statements, path = SQLiteStorage(), captured_sql, synthetic_db
+        else:
+            (backend, statements), path = postgres_storage, postgres_db
+
+        # Nothing is older than the cutoffs: the cycle only queries
+        result = await RetentionPruner(backend).executar_ciclo(
+            now=datetime(2023, 11, 15, tzinfo=UTC)
+        )
+
+        assert result["expired"] == result["overflow"] == 0
+        assert statements
+        assert _plan_violations(path, statements) == []
+
+    def test_usage_recorder_plans(self, synthetic_db: Path, captured_sql: list[str]) -> None:
+        """Recording usage and summarizing it for /uso stay index-backed."""
+        recorder = usage.UsageRecorder(batch_size=10)
+        recorder.registrar(database.UsageRecord(1, 1, "m/a", 10, 5, 0, 100))
+        assert recorder.flush() == 1
+        usage.resumir_uso(24, now=datetime(2023, 11, 15, tzinfo=UTC))
+
+        assert captured_sql
+        assert _plan_violations(synthetic_db, captured_sql) == []
+
+    def test_context_query_reads_index_in_order(
+        self, synthetic_db: Path, captured_sql: list[str]
+    ) -> None:
+        """The context query is a single index SEARCH on (user_id, channel_id)."""
+        database.get_conversation_history(1, 1, limit=10)
+
+        (select,) = [sql for sql in captured_sql if sql.lstrip().startswith("SELECT")]
+        plan = _query_plan(synthetic_db, select)
+        assert plan == ["SEARCH messages USING INDEX idx_user_channel (user_id=? AND channel_id=?)"]
+
+    def test_plan_checker_detects_violations(self, synthetic_db: Path) -> None:
+        """Sanity check: the checker flags full scans, index scans and temp B-trees."""
+        violations = _plan_violations(
+            synthetic_db,
+            [
+                "SELECT * FROM messages WHERE content = 'x'",
+                "SELECT COUNT(*), COUNT(DISTINCT channel_id) FROM messages WHERE user_id = 1",
+                "SELECT user_id, channel_id FROM messages "
+                "GROUP BY user_id, channel_id HAVING COUNT(*) > 5",
+            ],
+        )
+        assert len(violations) == 3
+        assert "USING COVERING INDEX" in violations[2]
@@ -0,0 +1,174 @@
+"""
+Tests para as cotas de tokens (quota.py).
+"""
+
+import pytest
+
+import quota
+from config import settings
+from database import HOUR_MS, get_quota_usage, init_db
+from quota import QuotaEngine, QuotaExceededError
+
+START = 1_750_000_000_000 // HOUR_MS * HOUR_MS  # início de uma hora cheia
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[int]:
+    """Relógio controlado (epoch-ms) usado pelo módulo de cotas."""
+    now = [START]
+    monkeypatch.setattr(quota, "now_epoch_ms", lambda: now[0])
+    return now
+
+
+class TestReservas:
+    """Testes para reserva, confirmação e cancelamento."""
+
+    def test_disabled_without_limits(self, monkeypatch) -> None:
+        """Testa que sem cotas configuradas o controlador fica desabilitado."""
+        monkeypatch.setattr(settings, "quota_user_daily_tokens", None)
+        monkeypatch.setattr(settings, "quota_guild_daily_tokens", None)
+        assert not QuotaEngine().habilitado
+
+    def test_reserve_then_confirm_debits_actual(self, clock) -> None:
+        """Testa que a reserva é trocada pelo consumo real."""
+        engine = QuotaEngine(user_limit=1000)
+        reserva = engine.reservar(1, None, 400)
+        assert engine.restante(1) == {"user": 600}
+
+        engine.confirmar(reserva, 150)
+        assert engine.restante(1) == {"user": 850}
+
+        # Cancelar depois de confirmar não libera nada
+        engine.cancelar(reserva)
+        assert engine.restante(1) == {"user": 850}
+
+    def test_cancel_releases_reservation(self, clock) -> None:
+        """Testa que uma chamada que falhou não consome cota."""
+        engine = QuotaEngine(user_limit=1000)
+        engine.cancelar(engine.reservar(1, None, 400))
+        assert engine.restante(1) == {"user": 1000}
+
+    def test_rejects_when_reservation_does_not_fit(self, clock) -> None:
+        """Testa a rejeição quando consumo + reservas excederiam a cota."""
+        engine = QuotaEngine(user_limit=1000)
+        engine.confirmar(engine.reservar(1, None, 100), 700)
+        engine.reservar(1, None, 200)
+
+        with pytest.raises(QuotaExceededError) as exc:
+            engine.reservar(1, None, 200)
+        assert exc.value.scope == "user"
+        assert exc.value.remaining == 100
+        assert exc.value.retry_after_seconds == 24 * 3600
+
+        # Outros usuários não são afetados
+        engine.reservar(2, None, 200)
+
+    def test_guild_quota_is_shared(self, clock) -> None:
+        """Testa que a cota do servidor é compartilhada entre usuários."""
+        engine = QuotaEngine(user_limit=10_000, guild_limit=1000)
+        engine.confirmar(engine.reservar(1, 99, 10), 900)
+
+        with pytest.raises(QuotaExceededError) as exc:
+            engine.reservar(2, 99, 200)
+        assert exc.value.scope == "guild"
+        # Em DMs (sem servidor) só a cota do usuário vale
+        engine.reservar(2, None, 200)
+        # Reserva rejeitada não fica pendurada na cota do usuário
+        assert engine.restante(2) == {"user": 9800}
+
+
+class TestJanelaMovel:
+    """Testes para a janela móvel de 24h."""
+
+    def test_consumption_expires_after_24_hours(self, clock) -> None:
+        """Testa que o consumo sai da janela hora a hora."""
+        engine = QuotaEngine(user_limit=1000)
+        engine.confirmar(engine.reservar(1, None, 1), 600)
+        clock[0] += 10 * HOUR_MS
+        engine.confirmar(engine.reservar(1, None, 1), 300)
+
+        clock[0] += 13 * HOUR_MS
+        assert engine.restante(1) == {"user": 100}
+        clock[0] += HOUR_MS
+        assert engine.restante(1) == {"user": 700}
+        clock[0] += 10 * HOUR_MS
+        assert engine.restante(1) == {"user": 1000}
+
+    def test_retry_after_points_to_oldest_bucket(self, clock) -> None:
+        """Testa o tempo até o bucket mais antigo sair da janela."""
+        engine = QuotaEngine(user_limit=1000)
+        engine.confirmar(engine.reservar(1, None, 1), 1000)
+        clock[0] += 5 * HOUR_MS + 30 * 60 * 1000
+
+        with pytest.raises(QuotaExceededError) as exc:
+            engine.reservar(1, None, 1)
+        assert exc.value.retry_after_seconds == 18 * 3600 + 30 * 60
+
+
+class TestPersistencia:
+    """Testes para gravação e recarga do consumo."""
+
+    def test_persist_and_reload(self, test_db_path, monkeypatch, clock) -> None:
+        """Testa que o consumo sobrevive a um reinício."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        engine = QuotaEngine(user_limit=1000, guild_limit=5000)
+        engine.confirmar(engine.reservar(1, 99, 1), 300)
+        clock[0] += HOUR_MS
+        engine.confirmar(engine.reservar(1, 99, 1), 200)
+
+        assert engine.persistir() == 4
+        assert engine.persistir() == 0  # nada alterado desde a última gravação
+
+        reiniciado = QuotaEngine(user_limit=1000, guild_limit=5000)
+        assert reiniciado.carregar() == 4
+        assert reiniciado.restante(1, 99) == {"user": 500, "guild": 4500}
+
+    def test_processos_somam_consumo(self, test_db_path, monkeypatch, clock) -> None:
+        """Testa que dois processos no mesmo banco não apagam o consumo um do outro."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        worker_a = QuotaEngine(user_limit=1000)
+        worker_b = QuotaEngine(user_limit=1000)
+        worker_a.confirmar(worker_a.reservar(1, None, 1), 300)
+        worker_b.confirmar(worker_b.reservar(1, None, 1), 200)
+        worker_a.persistir()
+        worker_b.persistir()
+        worker_a.confirmar(worker_a.reservar(1, None, 1), 100)
+        worker_a.persistir()
+
+        assert get_quota_usage(0) == [(START, "user", 1, 600)]
+        reiniciado = QuotaEngine(user_limit=1000)
+        reiniciado.carregar()
+        assert reiniciado.restante(1) == {"user": 400}
+
+    def test_sincronizar_ve_consumo_dos_outros(self, test_db_path, monkeypatch, clock) -> None:
+        """Testa que cada processo aplica a cota ao consumo gravado pelos outros."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        worker_a = QuotaEngine(user_limit=1000)
+        worker_b = QuotaEngine(user_limit=1000)
+        worker_a.confirmar(worker_a.reservar(1, None, 1), 600)
+        worker_a.sincronizar()
+        worker_b.confirmar(worker_b.reservar(1, None, 1), 100)
+
+        assert worker_b.sincronizar() == 1
+        assert worker_b.restante(1) == {"user": 300}
+        with pytest.raises(QuotaExceededError):
+            worker_b.reservar(1, None, 400)
+        worker_a.sincronizar()
+        assert worker_a.restante(1) == {"user": 300}
+
+    def test_old_hours_are_pruned(self, test_db_path, monkeypatch, clock) -> None:
+        """Testa que horas fora da janela são removidas do banco."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        engine = QuotaEngine(user_limit=1000)
+        engine.confirmar(engine.reservar(1, None, 1), 300)
+        engine.persistir()
+
+        clock[0] += 30 * HOUR_MS
+        engine.confirmar(engine.reservar(2, None, 1), 100)
+        engine.persistir()
+
+        assert get_quota_usage(0) == [(START + 30 * HOUR_MS, "user", 2, 100)]
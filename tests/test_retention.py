@@ -0,0 +1,124 @@
+"""
+Tests para o módulo de retenção (retention.py).
+"""
+
+import gzip
+import json
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+import retention
+from config import settings
+from database import get_connection, init_db, to_epoch_ms
+from retention import MessageArchiver, RetentionPruner
+from storage import PostgresStorage, SQLiteStorage
+from tests.pg_standin import StandInPool
+
+NOW = datetime(2025, 6, 15, 12, 0, tzinfo=UTC)
+
+
+def _insert(user_id: int, channel_id: int, content: str, created_at: str) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT INTO messages (user_id, channel_id, role, content, created_at) "
+            "VALUES (?, ?, 0, ?, ?)",
+            (user_id, channel_id, content, to_epoch_ms(datetime.fromisoformat(created_at))),
+        )
+
+
+def _contents() -> list[str]:
+    with get_connection() as conn:
+        return [r["content"] for r in conn.execute("SELECT content FROM messages ORDER BY id")]
+
+
+@pytest.fixture
+def retention_db(test_db_path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_path", test_db_path)
+    monkeypatch.setattr(settings, "retention_batch_size", 2)
+    monkeypatch.setattr(settings, "retention_days", None)
+    monkeypatch.setattr(settings, "retention_channel_days", {})
+    monkeypatch.setattr(settings, "retention_max_messages_per_conversation", None)
+    monkeypatch.setattr(retention, "BATCH_PAUSE_SECONDS", 0)
+    init_db()
+
+
+class TestRetentionPruner:
+    """Testes para o RetentionPruner."""
+
+    def test_disabled_without_policies(self, retention_db) -> None:
+        """Testa que sem políticas o pruner não é habilitado."""
+        assert RetentionPruner(SQLiteStorage()).habilitado is False
+
+    async def test_global_ttl_in_batches(self, retention_db, monkeypatch) -> None:
+        """Testa remoção por TTL global em vários lotes."""
+        monkeypatch.setattr(settings, "retention_days", 30)
+        for i in range(5):
+            _insert(1, 10, f"old{i}", "2025-01-01 00:00:00")
+        _insert(1, 10, "new", "2025-06-10 00:00:00")
+
+        result = await RetentionPruner(SQLiteStorage()).executar_ciclo(now=NOW)
+
+        assert result["expired"] == 5
+        assert _contents() == ["new"]
+
+    async def test_channel_ttl_overrides_global(self, retention_db, monkeypatch) -> None:
+        """Testa que o TTL do canal sobrepõe o global."""
+        monkeypatch.setattr(settings, "retention_days", 365)
+        monkeypatch.setattr(settings, "retention_channel_days", {20: 1})
+        _insert(1, 10, "global-kept", "2025-06-01 00:00:00")
+        _insert(1, 20, "channel-expired", "2025-06-01 00:00:00")
+        _insert(1, 20, "channel-kept", "2025-06-15 11:00:00")
+
+        await RetentionPruner(SQLiteStorage()).executar_ciclo(now=NOW)
+
+        assert _contents() == ["global-kept", "channel-kept"]
+
+    async def test_max_messages_per_conversation(self, retention_db, monkeypatch) -> None:
+        """Testa que apenas as N mensagens mais recentes de cada conversa são mantidas."""
+        monkeypatch.setattr(settings, "retention_max_messages_per_conversation", 2)
+        for i in range(5):
+            _insert(1, 10, f"a{i}", f"2025-06-0{i + 1} 00:00:00")
+        _insert(2, 10, "b0", "2025-06-01 00:00:00")
+
+        result = await RetentionPruner(SQLiteStorage()).executar_ciclo(now=NOW)
+
+        assert result["overflow"] == 3
+        assert _contents() == ["a3", "a4", "b0"]
+
+    async def test_archives_before_deleting(self, retention_db, monkeypatch, tmp_path) -> None:
+        """Testa que mensagens removidas são arquivadas em arquivos mensais."""
+        monkeypatch.setattr(settings, "retention_days", 30)
+        _insert(1, 10, "jan", "2025-01-05 00:00:00")
+        _insert(1, 10, "feb", "2025-02-05 00:00:00")
+
+        archive_dir = tmp_path / "archive"
+        await RetentionPruner(SQLiteStorage(), MessageArchiver(archive_dir)).executar_ciclo(now=NOW)
+
+        with gzip.open(archive_dir / "messages-2025-01.jsonl.gz", "rt") as f:
+            records = [json.loads(line) for line in f]
+        assert [r["content"] for r in records] == ["jan"]
+        assert (archive_dir / "messages-2025-02.jsonl.gz").exists()
+        assert _contents() == []
+
+    async def test_postgres_backend(self, retention_db, monkeypatch) -> None:
+        """Testa que com STORAGE_BACKEND=postgres a retenção age no PostgreSQL."""
+        monkeypatch.setattr(settings, "retention_days", 30)
+        monkeypatch.setattr(settings, "retention_max_messages_per_conversation", 2)
+        storage = PostgresStorage(pool=StandInPool())
+        await storage.add_messages(1, 10, [("user", f"m{i}", 1) for i in range(5)])
+
+        result = await RetentionPruner(storage).executar_ciclo()
+        assert (result["expired"], result["overflow"]) == (0, 3)
+        assert [m.content for m in await storage.get_conversation_history(1, 10)] == ["m3", "m4"]
+
+        result = await RetentionPruner(storage).executar_ciclo(
+            now=datetime.now(UTC) + timedelta(days=31)
+        )
+        assert result == {"expired": 2, "overflow": 0, "freelist_pages": 0}
+        assert (await storage.get_user_stats(1))["total_messages"] == 0
+
+    def test_new_database_uses_incremental_vacuum(self, retention_db) -> None:
+        """Testa que bancos novos são criados com auto_vacuum incremental."""
+        with get_connection() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
@@ -0,0 +1,123 @@
+"""
+Tests para a montagem do contexto enviado à IA (retrieval.py).
+"""
+
+from config import settings
+from database import get_message_vectors, init_db
+from retrieval import montar_contexto
+from storage import SQLiteStorage
+
+
+async def _conversa(storage: SQLiteStorage) -> None:
+    """Grava turnos antigos sobre assuntos distintos e dois turnos recentes."""
+    await storage.add_messages(
+        1, 10, [("user", "como fazer bolo de cenoura?", 0), ("assistant", "Use cenouras.", 0)]
+    )
+    await storage.add_messages(
+        1, 10, [("user", "qual a capital da França?", 0), ("assistant", "Paris.", 0)]
+    )
+    await storage.add_messages(1, 20, [("user", "bolo em outro canal", 0), ("assistant", "x", 0)])
+    await storage.add_messages(1, 10, [("user", "oi", 0), ("assistant", "olá", 0)])
+    await storage.add_messages(1, 10, [("user", "tudo bem?", 0), ("assistant", "sim", 0)])
+
+
+class TestMontarContexto:
+    """Testes para os modos de recuperação do contexto."""
+
+    async def test_recent_mode(self, test_db_path, monkeypatch) -> None:
+        """Testa que o modo padrão envia as últimas mensagens da conversa."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "context_retrieval", "recent")
+        monkeypatch.setattr(settings, "max_context_messages", 4)
+        init_db()
+        storage = SQLiteStorage()
+        await _conversa(storage)
+
+        contexto = await montar_contexto(storage, 1, 10, "e o bolo?")
+        assert [m["content"] for m in contexto] == ["oi", "olá", "tudo bem?", "sim"]
+
+    async def test_fts_mode_adds_relevant_turns(self, test_db_path, monkeypatch) -> None:
+        """Testa que o modo fts antepõe o turno relevante às mensagens recentes."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "context_retrieval", "fts")
+        monkeypatch.setattr(settings, "retrieval_top_k", 1)
+        monkeypatch.setattr(settings, "retrieval_recent_messages", 2)
+        init_db()
+        storage = SQLiteStorage()
+        await _conversa(storage)
+
+        contexto = await montar_contexto(storage, 1, 10, "e aquele bolo?")
+        assert [m["content"] for m in contexto] == [
+            "como fazer bolo de cenoura?",
+            "Use cenouras.",
+            "tudo bem?",
+            "sim",
+        ]
+        assert [m["role"] for m in contexto] == ["user", "assistant", "user", "assistant"]
+
+    async def test_fts_mode_without_matches(self, test_db_path, monkeypatch) -> None:
+        """Testa que sem resultados o contexto fica só com as mensagens recentes."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "context_retrieval", "fts")
+        monkeypatch.setattr(settings, "retrieval_recent_messages", 2)
+        init_db()
+        storage = SQLiteStorage()
+        await _conversa(storage)
+
+        contexto = await montar_contexto(storage, 1, 10, "??")
+        assert [m["content"] for m in contexto] == ["tudo bem?", "sim"]
+
+    async def test_vector_mode_indexes_and_retrieves(self, test_db_path, monkeypatch) -> None:
+        """Testa que o modo vector indexa a conversa e recupera o turno similar."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "context_retrieval", "vector")
+        monkeypatch.setattr(settings, "retrieval_top_k", 1)
+        monkeypatch.setattr(settings, "retrieval_recent_messages", 2)
+        init_db()
+        storage = SQLiteStorage()
+        await _conversa(storage)
+
+        contexto = await montar_contexto(storage, 1, 10, "receita de bolo de cenoura")
+        assert [m["content"] for m in contexto] == [
+            "como fazer bolo de cenoura?",
+            "Use cenouras.",
+            "tudo bem?",
+            "sim",
+        ]
+        assert len(get_message_vectors(1, 10, limit=100)) == 8
+        assert get_message_vectors(1, 20, limit=100) == []
+
+        # Mensagens novas ganham vetor na busca seguinte
+        await storage.add_messages(1, 10, [("user", "capital", 0), ("assistant", "ok", 0)])
+        await montar_contexto(storage, 1, 10, "capital")
+        assert len(get_message_vectors(1, 10, limit=100)) == 10
+
+    async def test_vector_mode_min_similarity(self, test_db_path, monkeypatch) -> None:
+        """Testa que turnos pouco similares não entram no contexto."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "context_retrieval", "vector")
+        monkeypatch.setattr(settings, "retrieval_recent_messages", 2)
+        monkeypatch.setattr(settings, "retrieval_min_similarity", 0.9)
+        init_db()
+        storage = SQLiteStorage()
+        await _conversa(storage)
+
+        contexto = await montar_contexto(storage, 1, 10, "receita de bolo de cenoura")
+        assert [m["content"] for m in contexto] == ["tudo bem?", "sim"]
+
+    async def test_token_budget_skips_large_turns(self, test_db_path, monkeypatch) -> None:
+        """Testa que um turno que estoura o orçamento é pulado em favor de um menor."""
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        monkeypatch.setattr(settings, "context_retrieval", "fts")
+        monkeypatch.setattr(settings, "retrieval_top_k", 2)
+        monkeypatch.setattr(settings, "retrieval_recent_messages", 0)
+        monkeypatch.setattr(settings, "retrieval_token_budget", 50)
+        init_db()
+        storage = SQLiteStorage()
+        await storage.add_messages(
+            1, 10, [("user", "conte uma história", 0), ("assistant", "bolo " * 100, 0)]
+        )
+        await storage.add_messages(1, 10, [("user", "e o bolo?", 0), ("assistant", "feito", 0)])
+
+        contexto = await montar_contexto(storage, 1, 10, "bolo")
+        assert [m["content"] for m in contexto] == ["e o bolo?", "feito"]
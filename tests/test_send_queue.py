@@ -0,0 +1,149 @@
+"""
+Tests para a fila de envio ao Discord (send_queue.py).
+"""
+
+import asyncio
+import logging
+from unittest.mock import AsyncMock, MagicMock
+
+import discord
+import pytest
+
+from logger import configurar_log_discord
+from message_splitter import Envio
+from metrics import metrics
+from send_queue import OutboundDispatcher, TokenBucket
+
+
+def _http_429() -> discord.HTTPException:
+    response = MagicMock(status=429, reason="Too Many Requests")
+    return discord.HTTPException(response, "rate limited")
+
+
+class TestTokenBucket:
+    """Testes para o token bucket."""
+
+    def test_burst_then_wait(self) -> None:
+        """Testa que a capacidade é consumida e depois exige espera."""
+        bucket = TokenBucket(rate=2, per_seconds=1.0)
+        assert bucket.tempo_ate_token() == 0
+        assert bucket.tempo_ate_token() == 0
+        assert bucket.tempo_ate_token() > 0
+
+
+class TestOutboundDispatcher:
+    """Testes para o despachante de envios."""
+
+    def setup_method(self) -> None:
+        metrics.reset()
+
+    @pytest.mark.asyncio
+    async def test_sends_in_order(self) -> None:
+        """Testa que os envios de um canal saem na ordem enfileirada."""
+        enviados: list[tuple[str, str | None]] = []
+
+        async def reply(**kwargs):
+            enviados.append(("reply", kwargs.get("content")))
+
+        async def send(**kwargs):
+            enviados.append(("send", kwargs.get("content")))
+
+        dispatcher = OutboundDispatcher(rate=10, per_seconds=1.0)
+        await dispatcher.enviar_varios(
+            1,
+            [(reply, Envio(content="a")), (send, Envio(embeds=[discord.Embed()]))],
+        )
+
+        assert enviados == [("reply", "a"), ("send", None)]
+        latencia = metrics.histogram_summary("discord_send_latency_ms")
+        assert latencia is not None
+        assert latencia["count"] == 2
+
+    @pytest.mark.asyncio
+    async def test_each_block_is_its_own_message(self) -> None:
+        """Testa que cada envio vira uma mensagem, sem juntar blocos ou respostas."""
+        send = AsyncMock(side_effect=["m1", "m2", "m3"])
+        dispatcher = OutboundDispatcher(rate=10, per_seconds=1.0)
+
+        resultados = await asyncio.gather(
+            dispatcher.enviar_varios(
+                1, [(send, Envio(content="um")), (send, Envio(content="dois"))]
+            ),
+            dispatcher.enviar_varios(1, [(send, Envio(content="para Bia"))]),
+        )
+
+        assert [c.kwargs["content"] for c in send.await_args_list] == ["um", "dois", "para Bia"]
+        assert resultados == [["m1", "m2"], ["m3"]]
+
+    @pytest.mark.asyncio
+    async def test_paces_per_channel(self) -> None:
+        """Testa que envios acima do bucket aguardam, sem afetar outros canais."""
+        send = AsyncMock()
+        other = AsyncMock()
+        dispatcher = OutboundDispatcher(rate=1, per_seconds=0.2)
+        embed = [discord.Embed()]
+
+        inicio = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            dispatcher.enviar_varios(1, [(send, Envio(embeds=embed)), (send, Envio(embeds=embed))]),
+            dispatcher.enviar(2, other, Envio(embeds=embed)),
+        )
+        elapsed = asyncio.get_running_loop().time() - inicio
+
+        assert send.await_count == 2
+        other.assert_awaited_once()
+        assert elapsed >= 0.15
+        assert metrics.counter_value("discord_send_paced") >= 1
+
+    @pytest.mark.asyncio
+    async def test_retries_after_429(self, monkeypatch) -> None:
+        """Testa reenvio após 429 e contagem na métrica."""
+        monkeypatch.setattr(asyncio, "sleep", AsyncMock())
+        send = AsyncMock(side_effect=[_http_429(), "ok"])
+        dispatcher = OutboundDispatcher(rate=10, per_seconds=1.0)
+
+        resultado = await dispatcher.enviar(1, send, Envio(content="x"))
+
+        assert resultado == "ok"
+        assert send.await_count == 2
+        assert metrics.counter_value("discord_429") == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_recreates_attachment(self, monkeypatch) -> None:
+        """Testa que o reenvio após 429 usa um arquivo novo (o anterior foi fechado)."""
+        monkeypatch.setattr(asyncio, "sleep", AsyncMock())
+        arquivos: list[discord.File] = []
+
+        async def send(**kwargs):
+            arquivo = kwargs["file"]
+            assert not arquivo.fp.closed
+            assert arquivo.fp.read() == b"resposta longa"
+            arquivo.close()  # como o discord.py faz depois de cada requisição
+            arquivos.append(arquivo)
+            if len(arquivos) == 1:
+                raise _http_429()
+            return "ok"
+
+        dispatcher = OutboundDispatcher(rate=10, per_seconds=1.0)
+
+        assert await dispatcher.enviar(1, send, Envio(content="x", anexo=b"resposta longa")) == "ok"
+        assert len(arquivos) == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate(self) -> None:
+        """Testa que erros de envio chegam ao chamador."""
+        send = AsyncMock(side_effect=ValueError("boom"))
+        dispatcher = OutboundDispatcher(rate=10, per_seconds=1.0)
+
+        with pytest.raises(ValueError):
+            await dispatcher.enviar(1, send, Envio(content="x"))
+        assert metrics.counter_value("discord_send_errors") == 1
+
+    def test_counts_internal_rate_limits(self) -> None:
+        """Testa que 429 tratados pelo discord.py são contados via log."""
+        configurar_log_discord()
+        configurar_log_discord()
+        logging.getLogger("discord.http").warning(
+            "We are being rate limited. POST /x responded with 429. Retrying in 1.00 seconds."
+        )
+        assert metrics.counter_value("discord_429") == 1
@@ -0,0 +1,130 @@
+"""
+Tests para sharding (sharding.py) e o launcher multi-processo (launcher.py).
+"""
+
+import json
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+import discord
+import pytest
+from discord.ext import commands
+
+from config import settings
+from launcher import Launcher, Worker, dividir_shards
+from metrics import metrics
+from sharding import coletar_metricas_shards, criar_bot, processo_coordenador
+
+
+class TestCriarBot:
+    """Testes para criação do bot."""
+
+    def test_default_is_single_bot(self, monkeypatch) -> None:
+        """Testa que sem sharding é criado um Bot simples."""
+        monkeypatch.setattr(settings, "sharding_enabled", False)
+        bot = criar_bot(discord.Intents.default())
+        assert type(bot) is commands.Bot
+
+    def test_sharded_bot(self, monkeypatch) -> None:
+        """Testa criação de AutoShardedBot com faixa de shards."""
+        monkeypatch.setattr(settings, "sharding_enabled", True)
+        monkeypatch.setattr(settings, "shard_count", 4)
+        monkeypatch.setattr(settings, "shard_ids", [2, 3])
+        bot = criar_bot(discord.Intents.default())
+        assert isinstance(bot, commands.AutoShardedBot)
+        assert bot.shard_count == 4
+        assert bot.shard_ids == [2, 3]
+
+    def test_sharded_bot_without_ids(self, monkeypatch) -> None:
+        """Testa que sem faixa definida o AutoShardedBot cuida de todos os shards."""
+        monkeypatch.setattr(settings, "sharding_enabled", True)
+        monkeypatch.setattr(settings, "shard_count", 4)
+        monkeypatch.setattr(settings, "shard_ids", None)
+        bot = criar_bot(discord.Intents.default())
+        assert isinstance(bot, commands.AutoShardedBot)
+        assert bot.shard_ids is None
+
+    def test_coordinator_owns_shard_zero(self, monkeypatch) -> None:
+        """Testa que só o worker com o shard 0 (ou o processo único) coordena."""
+        monkeypatch.setattr(settings, "shard_ids", None)
+        assert processo_coordenador()
+        monkeypatch.setattr(settings, "shard_ids", [2, 3])
+        assert not processo_coordenador()
+        monkeypatch.setattr(settings, "shard_ids", [0, 1])
+        assert processo_coordenador()
+
+
+class TestMetricasShards:
+    """Testes para coleta de métricas por shard."""
+
+    def setup_method(self) -> None:
+        metrics.reset()
+
+    def test_sharded_metrics(self) -> None:
+        """Testa latência e estado por shard."""
+        bot = MagicMock(spec=commands.AutoShardedBot)
+        up = MagicMock(latency=0.05)
+        up.is_closed.return_value = False
+        down = MagicMock(latency=float("inf"))
+        down.is_closed.return_value = True
+        bot.shards = {0: up, 1: down}
+
+        result = coletar_metricas_shards(bot)
+
+        assert result[0] == {"latency_ms": pytest.approx(50.0), "up": True}
+        assert result[1] == {"latency_ms": None, "up": False}
+        assert metrics.gauge_value("shard_latency_ms", shard=0) == pytest.approx(50.0)
+        assert metrics.gauge_value("shard_up", shard=1) == 0
+
+    def test_single_bot_metrics(self) -> None:
+        """Testa que o bot sem sharding é reportado como shard 0."""
+        bot = MagicMock(spec=commands.Bot)
+        bot.shard_id = None
+        bot.latency = 0.1
+        bot.is_closed.return_value = False
+
+        result = coletar_metricas_shards(bot)
+
+        assert result == {0: {"latency_ms": pytest.approx(100.0), "up": True}}
+
+
+class TestLauncher:
+    """Testes para divisão de shards entre processos."""
+
+    def test_even_split(self) -> None:
+        """Testa divisão uniforme."""
+        assert dividir_shards(4, 2) == [[0, 1], [2, 3]]
+
+    def test_uneven_split(self) -> None:
+        """Testa que shards restantes vão para os primeiros processos."""
+        assert dividir_shards(5, 3) == [[0, 1], [2, 3], [4]]
+
+    def test_more_processes_than_shards(self) -> None:
+        """Testa que processos sem shards são omitidos."""
+        assert dividir_shards(2, 4) == [[0], [1]]
+
+    def test_invalid_values(self) -> None:
+        """Testa valores inválidos."""
+        with pytest.raises(ValueError):
+            dividir_shards(0, 1)
+
+    def test_worker_env(self) -> None:
+        """Testa variáveis de ambiente passadas ao worker."""
+        env = Worker(1, [2, 3], 4).env()
+        assert env["SHARDING_ENABLED"] == "true"
+        assert env["SHARD_COUNT"] == "4"
+        assert json.loads(env["SHARD_IDS"]) == [2, 3]
+
+    def test_aguardar_workers_mata_os_atrasados(self) -> None:
+        """Testa que um worker que ignora o SIGTERM é morto após o prazo."""
+        launcher = Launcher(shard_count=2, processos=2)
+        rapido, travado = launcher.workers
+        rapido.process = subprocess.Popen([sys.executable, "-c", "pass"])
+        travado.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+        launcher.aguardar_workers(timeout=2)
+
+        assert rapido.poll() == 0
+        assert travado.poll() is not None
+        assert travado.poll() != 0
@@ -0,0 +1,79 @@
+"""
+Tests de inicialização: custo de importar bot.py e efeitos colaterais do import.
+
+Rodam em subprocessos (import limpo, sem módulos já carregados pelo pytest).
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Dependências que só devem ser importadas sob demanda (primeira chamada à IA,
+# backend postgres, modo vector, export parquet)
+IMPORTS_SOB_DEMANDA = {"openai", "asyncpg", "numpy", "pyarrow"}
+
+# Tempo de import de bot.py além do próprio discord.py (framework obrigatório).
+# Com o SDK da OpenAI no import o valor passava de 1s.
+IMPORT_BUDGET_MS = 800
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    env = os.environ | {"DISCORD_TOKEN": "x" * 50, "OPENROUTER_API_KEY": "x" * 50}
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=60,
+    )
+
+
+def _importtime(modulo: str) -> dict[str, int]:
+    """Tempo cumulativo (us) de cada módulo importado por `import modulo`."""
+    saida = _python("-X", "importtime", "-c", f"import {modulo}").stderr
+    tempos: dict[str, int] = {}
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha.split("|")
+        tempos.setdefault(nome.strip(), int(cumulativo))
+    return tempos
+
+
+@pytest.fixture(scope="module")
+def imports_bot() -> list[dict[str, int]]:
+    # Três execuções: o orçamento usa a mais rápida (ruído da máquina)
+    return [_importtime("bot") for _ in range(3)]
+
+
+class TestImportBot:
+    """Testes do custo de importar bot.py."""
+
+    def test_dependencias_pesadas_sob_demanda(self, imports_bot) -> None:
+        """Testa que o import não carrega dependências usadas só sob demanda."""
+        pacotes = {nome.split(".")[0] for nome in imports_bot[0]}
+        assert pacotes & IMPORTS_SOB_DEMANDA == set()
+
+    def test_orcamento_de_import(self, imports_bot) -> None:
+        """Testa que importar bot.py cabe no orçamento (descontado o discord.py)."""
+        proprio_ms = min(t["bot"] - t["discord"] for t in imports_bot) / 1000
+        assert proprio_ms <= IMPORT_BUDGET_MS, f"import de bot.py: {proprio_ms:.0f} ms"
+
+    def test_import_sem_efeitos_em_disco(self, tmp_path) -> None:
+        """Testa que importar não configura log em arquivo e criar_app configura."""
+        codigo = (
+            "import sys, pathlib, bot, logger\n"
+            "print(logger.logs_dir)\n"
+            "logger.configurar_log_arquivo(pathlib.Path(sys.argv[1]))\n"
+            "logger.logger.info('teste')\n"
+        )
+        saida = _python("-c", codigo, str(tmp_path)).stdout
+        assert saida.strip() == "None"
+        assert list(tmp_path.glob("sherlock_*.log"))
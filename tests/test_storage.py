@@ -0,0 +1,255 @@
+"""
+Tests para os backends de armazenamento (storage.py).
+
+A mesma suíte roda contra o SQLite, o PostgresStorage sobre um stand-in em
+processo e, se SHERLOCK_TEST_POSTGRES_DSN estiver definido (e o asyncpg
+instalado), contra um PostgreSQL real. As tabelas do histórico nesse banco
+são recriadas a cada teste.
+"""
+
+import os
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+import storage as storage_module
+from config import settings
+from database import init_db
+from storage import PostgresStorage, SQLiteStorage, Storage, criar_storage
+from tests.pg_standin import StandInPool
+
+POSTGRES_DSN = os.environ.get("SHERLOCK_TEST_POSTGRES_DSN")
+
+
+@pytest.fixture(params=["sqlite", "postgres-standin", "postgres"])
+async def storage(request, test_db_path, monkeypatch) -> AsyncGenerator[Storage, None]:
+    """Backend de armazenamento vazio."""
+    if request.param == "sqlite":
+        monkeypatch.setattr(settings, "db_path", test_db_path)
+        init_db()
+        backend: Storage = SQLiteStorage()
+    elif request.param == "postgres-standin":
+        backend = PostgresStorage(pool=StandInPool())
+    else:
+        asyncpg = storage_module._asyncpg()
+        if not POSTGRES_DSN or asyncpg is None:
+            pytest.skip("SHERLOCK_TEST_POSTGRES_DSN não definido ou asyncpg ausente")
+        conn = await asyncpg.connect(POSTGRES_DSN)
+        await conn.execute(
+            "DROP TABLE IF EXISTS messages, message_vectors, user_stats, conversation_stats"
+        )
+        await conn.close()
+        backend = PostgresStorage(POSTGRES_DSN, min_size=1, max_size=2)
+    yield backend
+    await backend.close()
+
+
+class TestStorageContract:
+    """Comportamento comum a todos os backends."""
+
+    async def test_history_order_and_roles(self, storage: Storage) -> None:
+        """Testa que o histórico volta da mais antiga para a mais recente."""
+        await storage.add_message(1, 10, "user", "q1")
+        await storage.add_messages(1, 10, [("assistant", "a1", 0), ("user", "q2", 0)])
+        await storage.add_message(1, 20, "user", "outro canal")
+
+        history = await storage.get_conversation_history(1, 10)
+        assert [m.content for m in history] == ["q1", "a1", "q2"]
+        assert [m.role for m in history] == ["user", "assistant", "user"]
+        assert history[0].created_at.tzinfo is not None
+
+    async def test_history_limit_keeps_most_recent(self, storage: Storage) -> None:
+        """Testa que o limite mantém as mensagens mais recentes."""
+        for i in range(5):
+            await storage.add_message(1, 10, "user", f"m{i}")
+
+        history = await storage.get_conversation_history(1, 10, limit=2)
+        assert [m.content for m in history] == ["m3", "m4"]
+
+    async def test_channel_history_of_all_users(self, storage: Storage) -> None:
+        """Testa as últimas mensagens do canal, de todos os usuários, em ordem."""
+        await storage.add_messages(1, 10, [("user", "Ana: oi", 0), ("assistant", "a1", 0)])
+        await storage.add_messages(2, 10, [("user", "Bia: oi", 0)])
+        await storage.add_message(1, 20, "user", "outro canal")
+
+        historico = await storage.get_channel_history(10, limit=2)
+        assert [(m.user_id, m.content) for m in historico] == [(1, "a1"), (2, "Bia: oi")]
+
+    async def test_context_messages_format(self, storage: Storage) -> None:
+        """Testa o formato da API OpenAI."""
+        await storage.add_messages(1, 10, [("user", "q", 0), ("assistant", "a", 0)])
+
+        assert await storage.get_context_messages(1, 10) == [
+            {"role": "user", "content": "q"},
+            {"role": "assistant", "content": "a"},
+        ]
+
+    async def test_batch_returns_ids_in_order(self, storage: Storage) -> None:
+        """Testa que add_messages devolve IDs crescentes na ordem do lote."""
+        ids = await storage.add_messages(1, 10, [("user", "q", 0), ("assistant", "a", 0)])
+        assert len(ids) == 2
+        assert ids[0] < ids[1]
+
+    async def test_invalid_role(self, storage: Storage) -> None:
+        """Testa que roles inválidos são rejeitados sem gravar nada."""
+        with pytest.raises(ValueError):
+            await storage.add_messages(1, 10, [("user", "q", 0), ("system", "x", 0)])
+        assert await storage.get_conversation_history(1, 10) == []
+
+    async def test_clear_channel_and_all(self, storage: Storage) -> None:
+        """Testa a limpeza de um canal e de todo o histórico."""
+        await storage.add_messages(1, 10, [("user", "q", 0), ("assistant", "a", 0)])
+        await storage.add_message(1, 20, "user", "q")
+        await storage.add_message(2, 10, "user", "outro usuário")
+
+        assert await storage.clear_user_history(1, 10) == 2
+        assert await storage.get_conversation_history(1, 10) == []
+        assert len(await storage.get_conversation_history(1, 20)) == 1
+
+        assert await storage.clear_user_history(1) == 1
+        assert len(await storage.get_conversation_history(2, 10)) == 1
+
+    async def test_stats(self, storage: Storage) -> None:
+        """Testa estatísticas após inserções e remoções."""
+        assert (await storage.get_user_stats(1))["total_messages"] == 0
+
+        await storage.add_messages(1, 10, [("user", "q", 100), ("assistant", "a", 20)])
+        await storage.add_message(1, 20, "user", "q", tokens=5)
+        await storage.add_message(1, 20, "assistant", "a", tokens=1)
+
+        stats = await storage.get_user_stats(1)
+        assert stats["total_messages"] == 4
+        assert stats["total_channels"] == 2
+        assert stats["total_tokens"] == 126
+        last = (await storage.get_conversation_history(1, 20))[-1].created_at
+        assert stats["last_active_at"] == last
+
+        await storage.clear_user_history(1, 20)
+        stats = await storage.get_user_stats(1)
+        assert stats["total_messages"] == 2
+        assert stats["total_channels"] == 1
+        assert stats["total_tokens"] == 120
+
+        await storage.clear_user_history(1)
+        assert await storage.get_user_stats(1) == {
+            "total_messages": 0,
+            "total_channels": 0,
+            "total_tokens": 0,
+            "last_active_at": None,
+        }
+
+    async def test_search_ranking_and_isolation(self, storage: Storage) -> None:
+        """Testa a busca textual: relevância, isolamento por usuário e paginação."""
+        if isinstance(getattr(storage, "_pool", None), StandInPool):
+            pytest.skip("o stand-in não emula a busca textual do PostgreSQL")
+        await storage.add_message(1, 10, "user", "receita de bolo de cenoura")
+        await storage.add_message(1, 10, "user", "bolo bolo bolo de chocolate")
+        await storage.add_message(1, 20, "user", "bolo de fubá")
+        await storage.add_message(2, 10, "user", "bolo do outro usuário")
+
+        hits = await storage.search_messages(1, "bolo", limit=10)
+        assert len(hits) == 3
+        assert hits[0].message.content == "bolo bolo bolo de chocolate"
+        assert all(h.message.user_id == 1 for h in hits)
+        assert "bolo" in hits[0].snippet
+
+        page = await storage.search_messages(1, "bolo", limit=2, offset=2)
+        assert [h.message.id for h in page] == [hits[2].message.id]
+        assert len(await storage.search_messages(1, "bolo", limit=10, channel_id=20)) == 1
+        assert await storage.search_messages(1, "cenoura fubá", limit=10) == []
+        assert len(await storage.search_messages(1, "cenoura fubá", limit=10, any_term=True)) == 2
+        assert await storage.search_messages(1, "&|!", limit=10) == []
+
+    async def test_turns(self, storage: Storage) -> None:
+        """Testa que os turnos trazem a pergunta e a resposta de cada mensagem."""
+        q1, a1 = await storage.add_messages(1, 10, [("user", "q1", 0), ("assistant", "a1", 0)])
+        q2, a2 = await storage.add_messages(1, 10, [("user", "q2", 0), ("assistant", "a2", 0)])
+
+        assert [m.id for m in await storage.get_turns(1, 10, [a1])] == [q1, a1]
+        assert [m.id for m in await storage.get_turns(1, 10, [q2])] == [q2, a2]
+        assert await storage.get_turns(1, 20, [q1]) == []
+        assert await storage.get_turns(1, 10, []) == []
+
+    async def test_message_vectors(self, storage: Storage) -> None:
+        """Testa a gravação incremental dos vetores e a remoção junto do histórico."""
+        q1, a1 = await storage.add_messages(1, 10, [("user", "q1", 0), ("assistant", "a1", 0)])
+        await storage.add_message(1, 20, "user", "outro canal")
+
+        novas = await storage.get_unindexed_messages(1, 10, limit=10)
+        assert [m.id for m in novas] == [a1, q1]
+        await storage.save_message_vectors(1, 10, [(q1, b"\x01"), (a1, b"\x02")])
+        assert await storage.get_unindexed_messages(1, 10, limit=10) == []
+
+        q2 = await storage.add_message(1, 10, "user", "q2")
+        assert [m.id for m in await storage.get_unindexed_messages(1, 10, limit=10)] == [q2]
+        assert await storage.get_message_vectors(1, 10, limit=1) == [(a1, b"\x02")]
+
+        await storage.clear_user_history(1, 10)
+        assert await storage.get_message_vectors(1, 10, limit=10) == []
+
+    async def test_retention_queries_and_delete(self, storage: Storage) -> None:
+        """Testa as consultas da retenção e a remoção com vetores e estatísticas."""
+        ids = await storage.add_messages(
+            1, 10, [("user", "q1", 10), ("assistant", "a1", 20), ("user", "q2", 30)]
+        )
+        (outro,) = await storage.add_messages(1, 20, [("user", "outro canal", 5)])
+        await storage.add_message(2, 10, "user", "outro usuário")
+        await storage.save_message_vectors(1, 20, [(outro, b"\x01")])
+        futuro = datetime.now(UTC) + timedelta(days=1)
+
+        expiradas = await storage.get_expired_messages(futuro, limit=10, exclude_channel_ids=(20,))
+        assert [m.content for m in expiradas] == ["q1", "a1", "q2", "outro usuário"]
+        assert [m.id for m in await storage.get_expired_messages(futuro, 10, channel_id=20)] == [
+            outro
+        ]
+        assert await storage.get_expired_messages(futuro - timedelta(days=2), limit=10) == []
+        assert await storage.get_oversized_conversations(2) == [(1, 10)]
+        excedentes = await storage.get_overflow_messages(1, 10, keep=1, limit=10)
+        assert [m.id for m in excedentes] == ids[1::-1]
+
+        assert await storage.delete_messages([m.id for m in excedentes] + [outro]) == 3
+        assert await storage.delete_messages([]) == 0
+        assert [m.content for m in await storage.get_conversation_history(1, 10)] == ["q2"]
+        assert await storage.get_message_vectors(1, 20, limit=10) == []
+        stats = await storage.get_user_stats(1)
+        assert (stats["total_messages"], stats["total_channels"], stats["total_tokens"]) == (
+            1,
+            1,
+            30,
+        )
+        assert await storage.get_oversized_conversations(0) == [(1, 10), (2, 10)]
+
+    async def test_delete_messages_updates_last_active(self, storage: Storage) -> None:
+        """Testa last_active_at após remover a mais recente e todas as mensagens."""
+        antiga, recente = await storage.add_messages(1, 10, [("user", "q", 0), ("user", "r", 0)])
+        antiga_em = (await storage.get_conversation_history(1, 10))[0].created_at
+
+        await storage.delete_messages([recente])
+        assert (await storage.get_user_stats(1))["last_active_at"] == antiga_em
+
+        await storage.delete_messages([antiga])
+        assert await storage.get_user_stats(1) == {
+            "total_messages": 0,
+            "total_channels": 0,
+            "total_tokens": 0,
+            "last_active_at": None,
+        }
+        assert await storage.get_oversized_conversations(-1) == []
+
+
+class TestCriarStorage:
+    """Testes para a escolha do backend."""
+
+    def test_default_is_sqlite(self, monkeypatch) -> None:
+        """Testa o backend padrão."""
+        monkeypatch.setattr(settings, "storage_backend", "sqlite")
+        assert isinstance(criar_storage(), SQLiteStorage)
+
+    def test_postgres_requires_asyncpg(self, monkeypatch) -> None:
+        """Testa a mensagem de erro sem a dependência opcional."""
+        monkeypatch.setattr(settings, "storage_backend", "postgres")
+        monkeypatch.setattr(settings, "postgres_dsn", "postgresql://localhost/sherlock")
+        monkeypatch.setattr(storage_module, "_asyncpg", lambda: None)
+        with pytest.raises(RuntimeError, match="asyncpg"):
+            criar_storage()
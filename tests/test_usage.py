@@ -0,0 +1,155 @@
+"""
+Tests para o registro de uso (usage.py).
+"""
+
+from datetime import UTC, datetime
+from typing import Any
+
+import pytest
+
+import usage
+from config import settings
+from database import (
+    HOUR_MS,
+    USAGE_FLAG_CACHE_HIT,
+    UsageRecord,
+    get_connection,
+    get_usage_hourly,
+    init_db,
+    to_epoch_ms,
+)
+from usage import UsageRecorder, resumir_uso
+
+NOW = datetime(2025, 6, 1, 12, 30, tzinfo=UTC)
+
+
+def _record(model: str = "m/a", at: datetime = NOW, **kwargs) -> UsageRecord:
+    values: dict[str, Any] = {
+        "user_id": 1,
+        "channel_id": 10,
+        "model": model,
+        "tokens_prompt": 100,
+        "tokens_completion": 20,
+        "tokens_cached": 0,
+        "latency_ms": 500,
+        "created_at": to_epoch_ms(at),
+    }
+    values.update(kwargs)
+    return UsageRecord(**values)
+
+
+@pytest.fixture
+def db(test_db_path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_path", test_db_path)
+    init_db()
+
+
+class TestUsageRecorder:
+    """Testes para o acúmulo e gravação em lote."""
+
+    def test_registrar_does_not_touch_database(self, db) -> None:
+        """Testa que registrar apenas acumula em memória."""
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        recorder.registrar(_record())
+
+        assert recorder.pendentes == 1
+        with get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM usage_ledger").fetchone()[0] == 0
+
+    def test_flush_writes_ledger_and_rollups(self, db) -> None:
+        """Testa que um lote grava o ledger e soma os agregados por (hora, modelo)."""
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        recorder.registrar(_record(latency_ms=300))
+        recorder.registrar(_record(tokens_cached=80, flags=USAGE_FLAG_CACHE_HIT, latency_ms=900))
+        recorder.registrar(_record(model="m/b"))
+
+        assert recorder.flush() == 3
+        assert recorder.pendentes == 0
+
+        rows = get_usage_hourly(NOW)
+        assert [(r["model"], r["requests"]) for r in rows] == [("m/a", 2), ("m/b", 1)]
+        a = rows[0]
+        assert a["hour"] == datetime(2025, 6, 1, 12, tzinfo=UTC)
+        assert a["tokens_prompt"] == 200
+        assert a["tokens_cached"] == 80
+        assert a["latency_ms_total"] == 1200
+        assert a["latency_ms_max"] == 900
+        assert a["cache_hits"] == 1
+        with get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM usage_ledger").fetchone()[0] == 3
+
+    def test_rollups_accumulate_across_batches(self, db) -> None:
+        """Testa que lotes sucessivos na mesma hora somam no mesmo agregado."""
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        for _ in range(2):
+            recorder.registrar(_record())
+            recorder.flush()
+
+        (row,) = get_usage_hourly(NOW)
+        assert row["requests"] == 2
+        assert row["tokens_completion"] == 40
+
+    def test_failed_flush_keeps_records(self, db, monkeypatch) -> None:
+        """Testa que registros voltam para a fila se a gravação falhar."""
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        recorder.registrar(_record())
+
+        def falhar(records):
+            raise RuntimeError("database is locked")
+
+        monkeypatch.setattr(usage, "add_usage_records", falhar)
+        with pytest.raises(RuntimeError):
+            recorder.flush()
+        assert recorder.pendentes == 1
+
+    @pytest.mark.asyncio
+    async def test_full_batch_triggers_background_flush(self, db) -> None:
+        """Testa que atingir batch_size antecipa a gravação em background."""
+        recorder = UsageRecorder(batch_size=2, flush_interval=60)
+        recorder.iniciar()
+        recorder.registrar(_record())
+        recorder.registrar(_record())
+
+        for _ in range(100):
+            if recorder.pendentes == 0:
+                break
+            await usage.asyncio.sleep(0.01)
+
+        assert recorder.pendentes == 0
+        await recorder.parar()
+        assert get_usage_hourly(NOW)[0]["requests"] == 2
+
+
+class TestResumirUso:
+    """Testes para o resumo por modelo a partir dos agregados."""
+
+    def test_summary_window_and_ordering(self, db) -> None:
+        """Testa que só as horas do período entram e a ordem é por tokens."""
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        recorder.registrar(_record(model="m/small", tokens_prompt=1, tokens_completion=1))
+        recorder.registrar(_record(model="m/big", tokens_prompt=1000))
+        recorder.registrar(
+            _record(
+                model="m/big", at=datetime.fromtimestamp((to_epoch_ms(NOW) - HOUR_MS) / 1000, UTC)
+            )
+        )
+        recorder.registrar(_record(model="m/old", at=datetime(2025, 5, 1, tzinfo=UTC)))
+        recorder.flush()
+
+        resumos = resumir_uso(2, now=NOW)
+
+        assert [r.model for r in resumos] == ["m/big", "m/small"]
+        big = resumos[0]
+        assert big.requests == 2
+        assert big.tokens_total == 1000 + 20 + 100 + 20
+        assert big.latency_ms_avg == 500
+
+    def test_only_current_hour(self, db) -> None:
+        """Testa que horas=1 considera apenas a hora corrente."""
+        recorder = UsageRecorder(batch_size=10, flush_interval=60)
+        recorder.registrar(
+            _record(at=datetime.fromtimestamp((to_epoch_ms(NOW) - HOUR_MS) / 1000, UTC))
+        )
+        recorder.flush()
+
+        assert resumir_uso(1, now=NOW) == []
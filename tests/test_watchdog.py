@@ -0,0 +1,117 @@
+"""
+Tests para o watchdog do event loop (watchdog.py).
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import settings
+from metrics import metrics
+from watchdog import LoopWatchdog, amostrar_pilha
+
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+async def handler_lento() -> None:
+    """Simula um handler que faz trabalho síncrono no event loop."""
+    await asyncio.sleep(0)
+    time.sleep(0.4)
+
+
+class TestAmostrarPilha:
+    """Testes para amostragem de pilha."""
+
+    def test_thread_inexistente(self) -> None:
+        """Testa que uma thread que não existe não gera amostra."""
+        assert amostrar_pilha(-1) is None
+
+    def test_identifica_funcao_do_projeto(self) -> None:
+        """Testa que o handler e o local apontam para código do projeto."""
+        pronto = threading.Event()
+        liberar = threading.Event()
+
+        def alvo() -> None:
+            pronto.set()
+            liberar.wait(5)
+
+        thread = threading.Thread(target=alvo)
+        thread.start()
+        pronto.wait(5)
+        assert thread.ident is not None
+        try:
+            amostra = amostrar_pilha(thread.ident)
+        finally:
+            liberar.set()
+            thread.join()
+
+        assert amostra is not None
+        assert amostra.handler == "alvo"
+        assert amostra.local.startswith("test_watchdog.py:")
+        assert "liberar.wait" in amostra.pilha
+
+
+class TestLoopWatchdog:
+    """Testes para detecção de bloqueios do event loop."""
+
+    async def test_bloqueio_atribuido_ao_handler(self, monkeypatch) -> None:
+        """Testa que um bloqueio longo é registrado com o handler que o causou."""
+        monkeypatch.setattr(settings, "loop_watchdog_enabled", True)
+        watchdog = LoopWatchdog(interval=0.02, threshold_ms=100)
+        watchdog.iniciar()
+        try:
+            await asyncio.sleep(0.05)
+            await asyncio.create_task(handler_lento())
+            await asyncio.sleep(0.2)
+        finally:
+            await watchdog.parar()
+
+        assert metrics.counter_value("event_loop_stalls", handler="handler_lento") == 1
+        resumo = metrics.histogram_summary("event_loop_stall_ms", handler="handler_lento")
+        assert resumo is not None
+        assert 200 <= resumo["max"] < 1000
+
+    async def test_mede_atraso(self, monkeypatch) -> None:
+        """Testa que o atraso do loop é medido a cada intervalo."""
+        monkeypatch.setattr(settings, "loop_watchdog_enabled", True)
+        watchdog = LoopWatchdog(interval=0.01, threshold_ms=1000)
+        watchdog.iniciar()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await watchdog.parar()
+
+        resumo = metrics.histogram_summary("event_loop_lag_ms")
+        assert resumo is not None
+        assert resumo["count"] >= 3
+        assert metrics.counter_value("event_loop_stalls", handler="handler_lento") == 0
+
+    async def test_desativado(self, monkeypatch) -> None:
+        """Testa que com o watchdog desativado nada é iniciado."""
+        monkeypatch.setattr(settings, "loop_watchdog_enabled", False)
+        watchdog = LoopWatchdog(interval=0.01, threshold_ms=100)
+        watchdog.iniciar()
+        await asyncio.sleep(0.05)
+        await watchdog.parar()
+
+        assert metrics.histogram_summary("event_loop_lag_ms") is None
+
+    async def test_iniciar_repetido(self, monkeypatch) -> None:
+        """Testa que iniciar de novo (on_ready repetido) não duplica a medição."""
+        monkeypatch.setattr(settings, "loop_watchdog_enabled", True)
+        watchdog = LoopWatchdog(interval=0.01, threshold_ms=100)
+        watchdog.iniciar()
+        task, thread = watchdog._task, watchdog._thread
+        assert thread is not None
+        watchdog.iniciar()
+        assert watchdog._task is task
+        assert watchdog._thread is thread
+        await watchdog.parar()
+        assert not thread.is_alive()
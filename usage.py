@@ -0,0 +1,167 @@
+"""
+Registro de uso da IA (tokens, modelo, latência) para análise de custo.
+
+Responsável por:
+- Acumular um registro por resposta em memória, sem tocar o banco no caminho
+  da resposta
+- Gravar os registros em lotes (usage_ledger) junto com os agregados por hora
+  (usage_hourly), em background
+- Resumir os agregados por modelo para o comando /uso
+"""
+
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from config import settings
+from database import UsageRecord, add_usage_records, get_usage_hourly
+from logger import logger
+from metrics import metrics
+
+
+@dataclass
+class ResumoUso:
+    """Totais de uso de um modelo em um período."""
+
+    model: str
+    requests: int = 0
+    tokens_prompt: int = 0
+    tokens_completion: int = 0
+    tokens_cached: int = 0
+    latency_ms_total: int = 0
+    latency_ms_max: int = 0
+    cache_hits: int = 0
+
+    @property
+    def tokens_total(self) -> int:
+        """Total de tokens (prompt + completion)."""
+        return self.tokens_prompt + self.tokens_completion
+
+    @property
+    def latency_ms_avg(self) -> float:
+        """Latência média por resposta em milissegundos."""
+        return self.latency_ms_total / self.requests if self.requests else 0.0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Fração das respostas que reaproveitaram o cache de prompt."""
+        return self.cache_hits / self.requests if self.requests else 0.0
+
+
+class UsageRecorder:
+    """Acumula registros de uso e os grava em lotes."""
+
+    def __init__(self, batch_size: int | None = None, flush_interval: float | None = None):
+        """
+        Inicializa o gravador.
+
+        Args:
+            batch_size: Registros acumulados que antecipam a gravação
+            flush_interval: Intervalo máximo entre gravações em segundos
+        """
+        self.batch_size = batch_size or settings.usage_batch_size
+        self.flush_interval = flush_interval or settings.usage_flush_interval_seconds
+        self._pendentes: list[UsageRecord] = []
+        self._lock = threading.Lock()
+        self._lote_cheio: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pendentes(self) -> int:
+        """Registros ainda não gravados."""
+        return len(self._pendentes)
+
+    def registrar(self, record: UsageRecord) -> None:
+        """
+        Acumula um registro (não bloqueia; a gravação ocorre em background).
+
+        Args:
+            record: Uso de uma resposta
+        """
+        with self._lock:
+            self._pendentes.append(record)
+            cheio = len(self._pendentes) >= self.batch_size
+        if cheio and self._lote_cheio is not None:
+            self._lote_cheio.set()
+
+    def flush(self) -> int:
+        """
+        Grava os registros pendentes (síncrono, chamar fora do event loop).
+
+        Em caso de erro os registros voltam para a fila e a próxima gravação
+        tenta novamente.
+
+        Returns:
+            Número de registros gravados
+        """
+        with self._lock:
+            lote, self._pendentes = self._pendentes, []
+        if not lote:
+            return 0
+        try:
+            add_usage_records(lote)
+        except Exception:
+            with self._lock:
+                self._pendentes[:0] = lote
+            raise
+        metrics.incr("usage_records_written", len(lote))
+        return len(lote)
+
+    def iniciar(self) -> None:
+        """Inicia a gravação periódica em background."""
+        if self._task is None or self._task.done():
+            self._lote_cheio = asyncio.Event()
+            self._task = asyncio.create_task(self._loop(), name="usage-recorder")
+
+    async def parar(self) -> None:
+        """Cancela o loop em background e grava o que estiver pendente."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _loop(self) -> None:
+        assert self._lote_cheio is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._lote_cheio.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._lote_cheio.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(
+                    "Erro ao gravar registros de uso",
+                    extra={"pending": self.pendentes, "error": str(e)},
+                )
+
+
+def resumir_uso(horas: int, now: datetime | None = None) -> list[ResumoUso]:
+    """
+    Resume o uso por modelo nas últimas `horas` a partir dos agregados por hora.
+
+    Args:
+        horas: Tamanho do período em horas (a hora corrente é incluída)
+        now: Instante de referência (UTC); padrão é o instante atual
+
+    Returns:
+        Resumos por modelo, do maior para o menor consumo de tokens
+    """
+    now = now or datetime.now(UTC)
+    resumos: dict[str, ResumoUso] = {}
+    for row in get_usage_hourly(now - timedelta(hours=horas - 1)):
+        resumo = resumos.setdefault(row["model"], ResumoUso(row["model"]))
+        resumo.requests += row["requests"]
+        resumo.tokens_prompt += row["tokens_prompt"]
+        resumo.tokens_completion += row["tokens_completion"]
+        resumo.tokens_cached += row["tokens_cached"]
+        resumo.latency_ms_total += row["latency_ms_total"]
+        resumo.latency_ms_max = max(resumo.latency_ms_max, row["latency_ms_max"])
+        resumo.cache_hits += row["cache_hits"]
+    return sorted(resumos.values(), key=lambda r: r.tokens_total, reverse=True)
+
+
+# Singleton global
+usage_recorder = UsageRecorder()
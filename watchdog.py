@@ -0,0 +1,184 @@
+"""
+Watchdog do event loop: mede o atraso de agendamento e identifica bloqueios.
+
+Responsável por:
+- Medir o atraso do event loop (event_loop_lag_ms) com uma tarefa que dorme
+  em intervalos fixos e compara o tempo real com o esperado
+- Detectar, a partir de uma thread separada, quando o loop fica parado mais
+  que LOOP_WATCHDOG_THRESHOLD_MS (ex.: chamada síncrona ao banco, log em
+  disco lento) e amostrar a pilha da thread do loop enquanto ele está parado
+- Atribuir cada bloqueio ao handler do projeto em execução (on_message,
+  slash_stats, ...) e ao ponto mais interno do projeto na pilha, registrando
+  em log (com a pilha) e nas métricas event_loop_stalls/event_loop_stall_ms
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import settings
+from logger import logger
+from metrics import metrics
+
+# Diretório do projeto: frames fora dele (stdlib, dependências) não nomeiam handlers
+PROJECT_DIR = str(Path(__file__).resolve().parent)
+
+# Funções internas dos decorators (rate_limit, na_faixa): o handler é o que elas envolvem
+DECORATOR_FRAMES = {"wrapper"}
+
+# Amostras de pilha guardadas por bloqueio
+MAX_SAMPLES = 20
+
+# Frames da pilha incluídos no log
+STACK_FRAMES_LOGGED = 15
+
+
+@dataclass
+class Amostra:
+    """Pilha da thread do event loop em um instante de bloqueio."""
+
+    handler: str
+    local: str
+    pilha: str
+
+
+@dataclass
+class _Bloqueio:
+    tick: float  # último tick do loop antes do bloqueio
+    amostras: Counter = field(default_factory=Counter)
+    primeira: Amostra | None = None
+
+
+def _do_projeto(frame: traceback.FrameSummary) -> bool:
+    return frame.filename.startswith(PROJECT_DIR) and "site-packages" not in frame.filename
+
+
+def amostrar_pilha(thread_id: int) -> Amostra | None:
+    """
+    Captura a pilha atual de uma thread e identifica o handler responsável.
+
+    Args:
+        thread_id: Identificador da thread (threading.get_ident())
+
+    Returns:
+        Amostra, ou None se a thread não existir mais
+    """
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    pilha = traceback.extract_stack(frame)
+    # Só interessa o que roda dentro do callback atual do loop: os frames
+    # acima dele (main, asyncio.run, ...) são os mesmos em todo bloqueio
+    callback = max(
+        (i for i, f in enumerate(pilha) if f.name == "_run" and f.filename.endswith("events.py")),
+        default=-1,
+    )
+    do_projeto = [f for f in pilha[callback + 1 :] if _do_projeto(f)]
+    # O frame mais externo do projeto é o ponto de entrada (handler/tarefa);
+    # o mais interno é onde o código do projeto chamou o que bloqueou
+    handler = next((f.name for f in do_projeto if f.name not in DECORATOR_FRAMES), pilha[-1].name)
+    interno = do_projeto[-1] if do_projeto else pilha[-1]
+    return Amostra(
+        handler=handler,
+        local=f"{Path(interno.filename).name}:{interno.lineno} {interno.name}",
+        pilha="".join(traceback.format_list(pilha[-STACK_FRAMES_LOGGED:])),
+    )
+
+
+class LoopWatchdog:
+    """Monitora o event loop em que foi iniciado."""
+
+    def __init__(self, interval: float | None = None, threshold_ms: float | None = None):
+        """
+        Inicializa o watchdog (valores None usam as configurações).
+
+        Args:
+            interval: Segundos entre medições do atraso
+            threshold_ms: Tempo parado a partir do qual o loop é considerado bloqueado
+        """
+        self.interval = interval or settings.loop_watchdog_interval_seconds
+        self.threshold_ms = threshold_ms or settings.loop_watchdog_threshold_ms
+        self._ultimo_tick = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._parar = threading.Event()
+
+    def iniciar(self) -> None:
+        """Inicia a medição e a thread de vigilância (chamadas repetidas são ignoradas)."""
+        if not settings.loop_watchdog_enabled:
+            return
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._ultimo_tick = time.monotonic()
+        self._parar.clear()
+        self._task = asyncio.create_task(self._medir(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._vigiar, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def parar(self) -> None:
+        """Cancela a medição e encerra a thread de vigilância."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._parar.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _medir(self) -> None:
+        while True:
+            inicio = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._ultimo_tick = agora = time.monotonic()
+            metrics.observe("event_loop_lag_ms", max(0.0, agora - inicio - self.interval) * 1000)
+
+    def _vigiar(self) -> None:
+        """Thread: amostra a pilha do loop enquanto ele estiver parado."""
+        bloqueio: _Bloqueio | None = None
+        while not self._parar.wait(self.threshold_ms / 4000):
+            tick = self._ultimo_tick
+            if bloqueio is not None and tick != bloqueio.tick:
+                self._registrar(bloqueio, tick)
+                bloqueio = None
+            parado_ms = (time.monotonic() - tick - self.interval) * 1000
+            if parado_ms < self.threshold_ms or self._loop_thread_id is None:
+                continue
+            if bloqueio is None:
+                bloqueio = _Bloqueio(tick)
+            if sum(bloqueio.amostras.values()) < MAX_SAMPLES:
+                amostra = amostrar_pilha(self._loop_thread_id)
+                if amostra is not None:
+                    bloqueio.primeira = bloqueio.primeira or amostra
+                    bloqueio.amostras[(amostra.handler, amostra.local)] += 1
+
+    def _registrar(self, bloqueio: _Bloqueio, retomada: float) -> None:
+        """Registra um bloqueio encerrado (loop voltou a rodar em `retomada`)."""
+        if bloqueio.primeira is None:
+            return
+        bloqueado_ms = max(0.0, (retomada - bloqueio.tick - self.interval) * 1000)
+        # O local mais frequente entre as amostras é o mais provável culpado
+        (handler, local), vezes = bloqueio.amostras.most_common(1)[0]
+        metrics.incr("event_loop_stalls", handler=handler)
+        metrics.observe("event_loop_stall_ms", bloqueado_ms, handler=handler)
+        logger.warning(
+            "Event loop bloqueado",
+            extra={
+                "handler": handler,
+                "location": local,
+                "blocked_ms": round(bloqueado_ms),
+                "samples": sum(bloqueio.amostras.values()),
+                "samples_at_location": vezes,
+                "stack": bloqueio.primeira.pilha,
+            },
+        )
+
+
+# Singleton global
+loop_watchdog = LoopWatchdog()